@@ -21,7 +21,6 @@ Routing:
 import structlog
 from langchain_core.messages import AIMessage, SystemMessage
 from langchain_core.runnables import RunnableConfig
-from langchain_openai import ChatOpenAI
 from langgraph.graph import END, StateGraph
 from langgraph.prebuilt import ToolNode
 
@@ -36,6 +35,7 @@ from app.agents.tools import ORCHESTRATOR_TOOLS
 from app.config import Settings
 from app.services import supabase_client as db
 from app.services.knowledge_store import build_knowledge_base
+from app.services.openai_client import get_chat_model
 
 logger = structlog.get_logger(__name__)
 
@@ -132,12 +132,8 @@ async def agent_node(state: OrchestratorState, config: RunnableConfig) -> dict:
     model_name = cfg.get("orchestrator_model", "gpt-4o")
     openai_api_key = cfg.get("openai_api_key", "")
 
-    llm = ChatOpenAI(
-        model=model_name,
-        api_key=openai_api_key,
-        streaming=True,
-        temperature=0,
-    )
+    # Shared per model: reuses the pooled OpenAI connections across steps
+    llm = get_chat_model(model_name, openai_api_key, streaming=True, temperature=0)
     llm_with_tools = llm.bind_tools(ORCHESTRATOR_TOOLS)
 
     messages = state["messages"]
@@ -54,6 +54,16 @@ def _get_renovation_graph(config: RunnableConfig):
     return config.get("configurable", {}).get("renovation_graph")
 
 
+def _get_idealista_service(config: RunnableConfig):
+    """Extract the Idealista scraping service from config (None if absent)."""
+    return config.get("configurable", {}).get("idealista_service")
+
+
+def _get_analysis_flights(config: RunnableConfig):
+    """Extract the analysis single-flight registry from config (None if absent)."""
+    return config.get("configurable", {}).get("analysis_flights")
+
+
 def _ok(tool_call_id: str, msg: str, state_updates: dict) -> Command:
     """Build a Command with a ToolMessage and state updates."""
     return Command(
@@ -601,15 +611,20 @@ async def trigger_property_analysis(
     state: Annotated[OrchestratorState, InjectedState],
     tool_call_id: Annotated[str, InjectedToolCallId],
     config: RunnableConfig,
+    refresh: bool = False,
 ) -> Command:
     """Scrape and analyze a property from an Idealista URL.
     Runs the full renovation pipeline and stores results in the knowledge base.
-    Automatically adds the property to the portfolio when analysis is complete."""
+    Automatically adds the property to the portfolio when analysis is complete.
+    Listing data scraped recently is reused; set refresh=True to re-scrape the
+    listing (e.g. the user says the price or photos changed)."""
     from app.agents.context import write_knowledge_entry as wke
     from app.agents.summaries import generate_analysis_chat_summary, generate_portfolio_index_line
-    from app.graphs.state import create_initial_state
+    from app.services.analysis_runs import join_analysis
+    from app.services.single_flight import StreamSingleFlight
 
     graph = _get_renovation_graph(config)
+    flights = _get_analysis_flights(config) or StreamSingleFlight()
     supabase = _get_supabase(config)
     user_id = state["user_id"]
 
@@ -621,8 +636,13 @@ async def trigger_property_analysis(
     updated_events.append({"type": "thinking", "message": "A analisar imóvel..."})
 
     try:
-        initial_state = create_initial_state(url, user_id)
-        final_state = await graph.ainvoke(initial_state)
+        # Joins an analysis of the same listing already running for the API;
+        # a refresh starts its own run so it never reuses older listing data
+        run = join_analysis(flights, graph, url, user_id, scrape_max_age=0 if refresh else None)
+        try:
+            final_state = await run.wait()
+        finally:
+            flights.leave(run)
 
         if final_state.get("error"):
             return _err(tool_call_id, f"Falha na análise: {final_state['error']}")
@@ -665,6 +685,7 @@ async def trigger_property_analysis(
             property_id = await persist_analysis_to_db(
                 supabase, url, user_id, estimate_dict,
                 conversation_id=state.get("conversation_id"),
+                idealista=_get_idealista_service(config),
             )
             if property_id is None:
                 updated_events.append({
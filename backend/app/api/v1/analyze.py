@@ -7,9 +7,15 @@ It supports both streaming (SSE) and non-streaming responses.
 Endpoints:
 - POST /api/v1/analyze - Analyze a property with streaming progress
 - POST /api/v1/analyze/sync - Analyze a property without streaming (simpler)
+- POST /api/v1/analyze/batch - Analyze many listings, streaming each result as it completes
+- POST /api/v1/analyze/{run_id}/resume - Resume a failed analysis from its last good step
+- DELETE /api/v1/analyze/cache/{property_id} - Drop a listing's cached analysis
+- POST /api/v1/analyze/jobs - Queue a background analysis, returns a job id
+- GET /api/v1/analyze/jobs/{job_id} - Job status (and estimate once finished)
+- GET /api/v1/analyze/jobs/{job_id}/events - Replay + follow a job's progress (SSE)
 """
 
-import inspect
+import asyncio
 import json
 from typing import Any, AsyncGenerator
 
@@ -19,19 +25,73 @@ from pydantic import BaseModel, Field, HttpUrl
 from sse_starlette.sse import EventSourceResponse
 
 from app.auth import CurrentUser
-from app.graphs.state import create_initial_state
+from app.config import get_settings
 from app.models.property import RenovationEstimate
+from app.services.analysis_jobs import AnalysisJob, AnalysisJobManager, JobQueueFullError
 from app.services.analysis_persistence import persist_analysis_to_db
+from app.services.analysis_runs import (
+    join_analysis,
+    resume_or_join_analysis,
+    resume_or_reattach_analysis,
+    run_state,
+    unexpected_error_event,
+)
+from app.services.batch_analysis import analyze_batch
+from app.services.idealista import IdealistaService, extract_property_id
+from app.services.openai_rate_limiter import get_rate_limiter
+from app.services.single_flight import SharedRun, StreamSingleFlight, parse_event_id
 
 logger = structlog.get_logger(__name__)
 
 router = APIRouter(prefix="/analyze", tags=["analysis"])
 
+# How often /analyze/sync checks whether its client is still connected
+DISCONNECT_POLL_SECONDS = 1.0
+
 
 class AnalyzeRequest(BaseModel):
     """Request body for property analysis."""
 
     url: HttpUrl = Field(description="Idealista listing URL")
+    refresh: bool = Field(
+        default=False,
+        description="Ignore any cached analysis or listing data and re-run the pipeline",
+    )
+
+
+class AnalyzeBatchRequest(BaseModel):
+    """Request body for a multi-listing analysis."""
+
+    urls: list[HttpUrl] = Field(min_length=1, description="Idealista listing URLs")
+
+
+class AnalyzeJobRequest(AnalyzeRequest):
+    """Request body for a background analysis job."""
+
+    priority: int | None = Field(
+        default=None,
+        ge=0,
+        le=9,
+        description="0 = most urgent, 9 = background; never more urgent than the default",
+    )
+
+
+class JobResponse(BaseModel):
+    """Status of a background analysis job."""
+
+    job_id: str
+    url: str
+    status: str
+    priority: int
+    created_at: float
+    started_at: float | None = None
+    finished_at: float | None = None
+    error: str | None = None
+    estimate: RenovationEstimate | None = None
+
+    @classmethod
+    def from_job(cls, job: AnalysisJob) -> "JobResponse":
+        return cls(job_id=job.id, **job.model_dump(exclude={"id", "user_id", "events", "attempts"}))
 
 
 class AnalyzeResponse(BaseModel):
@@ -43,74 +103,121 @@ class AnalyzeResponse(BaseModel):
 
 
 async def stream_analysis(
-    url: str, user_id: str, graph: Any, supabase: Any = None
-) -> AsyncGenerator[str, None]:
+    url: str,
+    user_id: str,
+    graph: Any,
+    supabase: Any = None,
+    flights: StreamSingleFlight | None = None,
+    last_event_id: str | None = None,
+    idealista: IdealistaService | None = None,
+) -> AsyncGenerator[dict[str, str], None]:
     """
     Generator that streams analysis events as SSE.
 
-    Runs the pre-compiled LangGraph and yields each stream event as it occurs.
-    After streaming completes, persists the result to the database.
+    Joins the listing's in-flight run in flights (or starts it): the graph
+    runs once per listing in "custom" + "updates" stream mode, nodes push
+    each StreamEvent through the custom channel as soon as it is created, and
+    every subscriber — including ones that join late, which first replay the
+    events already emitted — forwards them while a node is still running. The
+    run's final state, rebuilt from node deltas, feeds the DB save after
+    streaming completes.
+
+    When the client disconnects, EventSourceResponse cancels this generator
+    and it leaves the run; once no subscriber is left (and none reconnects
+    within the resume grace period) the graph task is cancelled, which stops
+    every pending GPT call, download and scrape.
+
+    Each event carries an SSE id ("<run id>:<seq>"). A client that reconnects
+    with that id as Last-Event-ID while the run is still retained gets only
+    the events after it, then follows live.
 
     Args:
         url: Idealista URL to analyze
         user_id: Optional user ID
         graph: Pre-compiled LangGraph instance from app.state
         supabase: Optional Supabase client for DB persistence
+        flights: Single-flight registry shared by concurrent requests; None
+                 runs the graph for this caller alone
+        last_event_id: Last-Event-ID header of a reconnecting client
+        idealista: Scraping service, to persist the raw Apify payload kept
+                   in its raw data store
 
     Yields:
-        SSE-formatted event strings
+        SSE event dicts (id + JSON data) for EventSourceResponse
     """
-    initial_state = create_initial_state(url, user_id)
-
-    # Track which events we've already sent, and the last full state for DB save
-    sent_events = 0
-    last_state: dict | None = None
-
+    flights = flights if flights is not None else StreamSingleFlight()
+    run, after = resume_or_join_analysis(flights, graph, url, user_id, last_event_id)
+    async for sse in _forward_run(run, after, flights, url, user_id, supabase, idealista):
+        yield sse
+
+
+async def _forward_run(
+    run: SharedRun,
+    after: int,
+    flights: StreamSingleFlight,
+    url: str,
+    user_id: str,
+    supabase: Any = None,
+    idealista: IdealistaService | None = None,
+) -> AsyncGenerator[dict[str, str], None]:
+    """Send a joined run's events after seq `after` as SSE, then persist its estimate."""
     try:
-        async for state in graph.astream(initial_state):
-            # Some LangGraph configurations may yield a coroutine instead of a plain dict.
-            # If that happens, await it here so we always work with the resolved state.
-            if inspect.iscoroutine(state):
-                state = await state
+        async for seq, event in run.follow(after):
+            yield {"id": run.event_id(seq), "data": json.dumps(event, ensure_ascii=False)}
+    finally:
+        flights.leave(run)
+
+    if run.error is not None:
+        logger.error("stream_analysis_error", error=str(run.error))
+        yield {"data": json.dumps(unexpected_error_event(run.error), ensure_ascii=False)}
+        return
 
-            if isinstance(state, dict):
-                # Handle different state formats from LangGraph
-                actual_state = state
-                if len(state) == 1:
-                    # State is wrapped in node name dict
-                    actual_state = list(state.values())[0]
+    # Persist to DB after streaming completes (per subscriber: each user gets their row)
+    final_state = run.result or {}
+    if supabase:
+        estimate = final_state.get("estimate")
+        if estimate is not None:
+            estimate_dict = estimate.model_dump() if hasattr(estimate, "model_dump") else estimate
+            await persist_analysis_to_db(
+                supabase, url, user_id, estimate_dict, idealista=idealista
+            )
 
-                last_state = actual_state  # keep the latest full state for DB save
 
-                events = actual_state.get("stream_events", [])
-                new_events = events[sent_events:]
+async def stream_resumed_analysis(
+    run_id: str,
+    url: str,
+    user_id: str,
+    graph: Any,
+    supabase: Any = None,
+    flights: StreamSingleFlight | None = None,
+    last_event_id: str | None = None,
+    idealista: IdealistaService | None = None,
+) -> AsyncGenerator[dict[str, str], None]:
+    """
+    Generator that streams a resumed analysis as SSE.
 
-                for event in new_events:
-                    if hasattr(event, "model_dump"):
-                        event_data = event.model_dump()
-                    else:
-                        event_data = event
+    Same contract as stream_analysis, for a run continued from its last
+    checkpoint: the events up to the last successful node are replayed, then
+    the remaining nodes stream live. A client whose resume stream dropped
+    re-attaches with Last-Event-ID instead of resuming a second time.
+    """
+    flights = flights if flights is not None else StreamSingleFlight()
+    run, after = resume_or_reattach_analysis(flights, graph, run_id, url, last_event_id)
+    async for sse in _forward_run(run, after, flights, url, user_id, supabase, idealista):
+        yield sse
 
-                    yield json.dumps(event_data, ensure_ascii=False)
-                    sent_events += 1
 
-    except Exception as e:
-        logger.error("stream_analysis_error", error=str(e))
-        error_event = {
-            "type": "error",
-            "message": f"Erro inesperado: {str(e)}",
-            "step": 0,
-            "total_steps": 5,
-        }
-        yield json.dumps(error_event, ensure_ascii=False)
+async def _invalidate_if_requested(body: AnalyzeRequest, request: Request) -> None:
+    """Drop the listing's cached analysis and scrape when the client asked for a fresh run."""
+    property_id = extract_property_id(str(body.url))
+    if not body.refresh or not property_id:
         return
-
-    # Persist to DB after streaming completes
-    if supabase and last_state:
-        estimate = last_state.get("estimate")
-        if estimate is not None:
-            estimate_dict = estimate.model_dump() if hasattr(estimate, "model_dump") else estimate
-            await persist_analysis_to_db(supabase, url, user_id, estimate_dict)
+    cache = getattr(request.app.state, "analysis_cache", None)
+    if cache is not None:
+        await cache.invalidate(property_id)
+    idealista = getattr(request.app.state, "idealista_service", None)
+    if idealista is not None and idealista.cache is not None:
+        await idealista.cache.invalidate(property_id)
 
 
 @router.post("", response_class=EventSourceResponse)
@@ -131,6 +238,18 @@ async def analyze_property_stream(
     - result: Final result with complete estimate
     - error: Error message if something fails
 
+    Concurrent requests for the same listing share one pipeline run; a
+    request that arrives mid-run first receives the events already sent.
+
+    Every event has an SSE id. After a dropped connection, re-send the same
+    request with the last id received in the Last-Event-ID header: within
+    the resume grace period only the missed events are sent, then the
+    stream continues live, without starting a new run.
+
+    A listing analysed before and unchanged since (same price, photos and
+    description) replays its cached result right after scraping; the result
+    event then carries data.cached = true. Send "refresh": true to re-run.
+
     Example usage with curl:
     ```
     curl -N -X POST http://localhost:8000/api/v1/analyze \
@@ -140,14 +259,44 @@ async def analyze_property_stream(
     ```
     """
     structlog.contextvars.bind_contextvars(property_url=str(body.url), user_id=user.id)
+    await _invalidate_if_requested(body, request)
     graph = request.app.state.graph
     supabase = getattr(request.app.state, "supabase", None)
+    flights = getattr(request.app.state, "analysis_flights", None)
     return EventSourceResponse(
-        stream_analysis(str(body.url), user.id, graph, supabase),
+        stream_analysis(
+            str(body.url),
+            user.id,
+            graph,
+            supabase,
+            flights,
+            last_event_id=request.headers.get("last-event-id"),
+            idealista=getattr(request.app.state, "idealista_service", None),
+        ),
         media_type="text/event-stream",
     )
 
 
+async def _wait_while_connected(request: Request, run: SharedRun) -> dict[str, Any] | None:
+    """
+    Wait for run's final state, giving up if the client disconnects first.
+
+    Returns:
+        The final state, or None when the client went away; the caller then
+        leaves the run, which cancels it if nobody else is subscribed.
+    """
+    result = asyncio.ensure_future(run.wait())
+    try:
+        while True:
+            done, _ = await asyncio.wait({result}, timeout=DISCONNECT_POLL_SECONDS)
+            if done:
+                return result.result() or {}
+            if await request.is_disconnected():
+                return None
+    finally:
+        result.cancel()
+
+
 @router.post("/sync", response_model=AnalyzeResponse)
 async def analyze_property_sync(
     body: AnalyzeRequest,
@@ -164,10 +313,19 @@ async def analyze_property_sync(
     """
     try:
         structlog.contextvars.bind_contextvars(property_url=str(body.url), user_id=user.id)
+        await _invalidate_if_requested(body, request)
         graph = request.app.state.graph
-        initial_state = create_initial_state(str(body.url), user.id)
+        flights = getattr(request.app.state, "analysis_flights", None) or StreamSingleFlight()
+
+        run = join_analysis(flights, graph, str(body.url), user.id)
+        try:
+            final_state = await _wait_while_connected(request, run)
+        finally:
+            flights.leave(run)
 
-        final_state = await graph.ainvoke(initial_state)
+        if final_state is None:
+            logger.info("sync_analysis_client_disconnected")
+            return AnalyzeResponse(success=False, error="Cliente desligado")
 
         if final_state.get("error"):
             return AnalyzeResponse(
@@ -195,7 +353,248 @@ async def analyze_property_sync(
         )
 
 
+@router.post("/batch", response_class=EventSourceResponse)
+async def analyze_batch_stream(
+    body: AnalyzeBatchRequest,
+    request: Request,
+    user: CurrentUser,
+) -> EventSourceResponse:
+    """
+    Analyze many listings at once, streaming each result as it completes.
+
+    Duplicate listings are analysed once and every listing is scraped with
+    a single Apify request. Each listing's analysis starts as soon as the
+    actor streams its data, at most BATCH_ANALYSIS__MAX_CONCURRENT_LISTINGS
+    at a time, sharing the process's OpenAI budget. Results
+    arrive in completion order, not submission order:
+
+    - status: batch size first, counters (listings/minute included) last
+    - result: one per listing, data.estimate plus data.url / data.property_id
+    - error: one per listing that could not be analysed
+
+    Returns 422 when more than BATCH_ANALYSIS__MAX_URLS URLs are sent.
+    Disconnecting cancels the listings still running.
+    """
+    config = get_settings().batch_analysis
+    if len(body.urls) > config.max_urls:
+        raise HTTPException(
+            status_code=422,
+            detail=f"Máximo de {config.max_urls} imóveis por pedido",
+        )
+    structlog.contextvars.bind_contextvars(user_id=user.id, batch_size=len(body.urls))
+    flights = getattr(request.app.state, "analysis_flights", None) or StreamSingleFlight()
+
+    async def _events() -> AsyncGenerator[dict[str, str], None]:
+        async for event in analyze_batch(
+            [str(url) for url in body.urls],
+            user.id,
+            request.app.state.graph,
+            request.app.state.idealista_service,
+            flights,
+            config,
+            getattr(request.app.state, "supabase", None),
+        ):
+            yield {"data": json.dumps(event, ensure_ascii=False)}
+
+    return EventSourceResponse(_events(), media_type="text/event-stream")
+
+
+@router.post("/{run_id}/resume", response_class=EventSourceResponse)
+async def resume_analysis_stream(
+    run_id: str,
+    request: Request,
+    user: CurrentUser,
+) -> EventSourceResponse:
+    """
+    Resume a failed or interrupted analysis from its last successful node.
+
+    run_id is the part before ":" in the SSE event ids of the original
+    stream. The stored listing data, classifications and room groups are
+    reused — no new scrape or photo classification when those steps had
+    succeeded — and of a failed estimate only the rooms that failed are
+    analysed again. Streams like POST /analyze: the events up to the last
+    successful node are replayed first. The resumed stream keeps the run id,
+    so a run that fails again can be resumed again.
+
+    Returns 404 when the run is unknown, belongs to another user, already
+    completed or expired, or when checkpointing is disabled.
+    """
+    graph = request.app.state.graph
+    state = await run_state(graph, run_id)
+    if state is None or state.get("user_id", "") != user.id:
+        raise HTTPException(status_code=404, detail="Análise não encontrada ou já concluída")
+
+    url = state["url"]
+    structlog.contextvars.bind_contextvars(property_url=url, user_id=user.id, run_id=run_id)
+    return EventSourceResponse(
+        stream_resumed_analysis(
+            run_id,
+            url,
+            user.id,
+            graph,
+            getattr(request.app.state, "supabase", None),
+            getattr(request.app.state, "analysis_flights", None),
+            last_event_id=request.headers.get("last-event-id"),
+            idealista=getattr(request.app.state, "idealista_service", None),
+        ),
+        media_type="text/event-stream",
+    )
+
+
+@router.delete("/cache/{property_id}")
+async def invalidate_cached_analysis(
+    property_id: str, request: Request, user: CurrentUser
+) -> dict:
+    """
+    Drop the cached analysis for an Idealista property ID.
+
+    The next analysis of that listing runs the full pipeline. Returns 404
+    when the analysis cache is disabled.
+    """
+    cache = getattr(request.app.state, "analysis_cache", None)
+    if cache is None:
+        raise HTTPException(status_code=404, detail="Cache de análises desativada")
+    await cache.invalidate(property_id)
+    return {"property_id": property_id, "invalidated": True}
+
+
+def _job_manager(request: Request) -> AnalysisJobManager:
+    jobs = getattr(request.app.state, "analysis_jobs", None)
+    if jobs is None:
+        raise HTTPException(status_code=503, detail="Análises em segundo plano indisponíveis")
+    return jobs
+
+
+async def _owned_job(request: Request, job_id: str, user_id: str) -> AnalysisJob:
+    job = await _job_manager(request).get(job_id)
+    if job is None or job.user_id != user_id:
+        raise HTTPException(status_code=404, detail="Análise não encontrada")
+    return job
+
+
+@router.post("/jobs", response_model=JobResponse, status_code=202)
+async def submit_analysis_job(
+    body: AnalyzeJobRequest,
+    request: Request,
+    user: CurrentUser,
+) -> JobResponse:
+    """
+    Queue an analysis and return immediately with its job id.
+
+    The job runs on the process's bounded worker pool, so it survives client
+    disconnects, and is re-queued after a restart. Attach to
+    GET /analyze/jobs/{job_id}/events to stream (or replay) its progress.
+    Returns 429 when the queue is full.
+
+    Clients may only lower their job's priority: anything more urgent than
+    default_priority is raised to it. Only jobs count against the worker
+    pool; /analyze, /analyze/sync and /analyze/batch run on the request.
+    """
+    structlog.contextvars.bind_contextvars(property_url=str(body.url), user_id=user.id)
+    jobs = _job_manager(request)
+    await _invalidate_if_requested(body, request)
+    try:
+        priority = body.priority
+        if priority is not None:
+            priority = max(priority, jobs.config.default_priority)
+        job = await jobs.submit(str(body.url), user.id, priority)
+    except JobQueueFullError as e:
+        raise HTTPException(
+            status_code=429,
+            detail=f"Demasiadas análises em fila: {e}",
+            headers={"Retry-After": "30"},
+        )
+    return JobResponse.from_job(job)
+
+
+@router.get("/jobs/{job_id}", response_model=JobResponse)
+async def get_analysis_job(job_id: str, request: Request, user: CurrentUser) -> JobResponse:
+    """Current status of a job; includes the estimate once it has succeeded."""
+    return JobResponse.from_job(await _owned_job(request, job_id, user.id))
+
+
+@router.get("/jobs/{job_id}/events", response_class=EventSourceResponse)
+async def stream_analysis_job(
+    job_id: str, request: Request, user: CurrentUser
+) -> EventSourceResponse:
+    """
+    Stream a job's events as SSE: everything emitted so far, then live.
+
+    Same event types as POST /analyze. For a finished job the full log is
+    replayed and the stream ends. Disconnecting does not affect the job;
+    reconnect with Last-Event-ID to skip the events already received.
+    """
+    job = await _owned_job(request, job_id, user.id)
+    resume_from = parse_event_id(request.headers.get("last-event-id"))
+    after = resume_from[1] if resume_from is not None and resume_from[0] == job.id else 0
+
+    async def _events() -> AsyncGenerator[dict[str, str], None]:
+        async for seq, event in job.log.follow(after):
+            yield {"id": f"{job.id}:{seq}", "data": json.dumps(event, ensure_ascii=False)}
+
+    return EventSourceResponse(_events(), media_type="text/event-stream")
+
+
 @router.get("/health")
 async def health_check() -> dict:
     """Health check endpoint."""
     return {"status": "healthy", "service": "rehabify-analyzer"}
+
+
+@router.get("/metrics")
+async def analysis_metrics(request: Request, user: CurrentUser) -> dict:
+    """
+    Pipeline counters since process start, one section per feature.
+
+        classification_cache, analysis_cache, scrape_cache  hits, misses, savings
+        single_flight                                       joined analyses and scrapes
+        apify                                               circuit breaker, retry budget
+        raw_data_store                                      side-store compression
+        analysis_jobs                                       queue depth, outcomes
+        image_preparation, image_dedup, local_clustering    bytes and GPT calls saved
+        image_store                                         usage
+        openai_rate_limit                                   queue wait, throttles
+
+    A section is null when that feature is disabled.
+    """
+    cache = getattr(request.app.state, "classification_cache", None)
+    analysis_cache = getattr(request.app.state, "analysis_cache", None)
+    flights = getattr(request.app.state, "analysis_flights", None)
+    idealista = getattr(request.app.state, "idealista_service", None)
+    jobs = getattr(request.app.state, "analysis_jobs", None)
+    preparer = getattr(request.app.state, "image_preparer", None)
+    classifier = getattr(request.app.state, "classifier_service", None)
+    store = getattr(request.app.state, "image_store", None)
+    rate_limit = get_settings().openai_rate_limit
+    return {
+        "classification_cache": cache.stats() if cache is not None else None,
+        "analysis_cache": analysis_cache.stats() if analysis_cache is not None else None,
+        "scrape_cache": (
+            idealista.cache.stats() if idealista is not None and idealista.cache is not None
+            else None
+        ),
+        "single_flight": {
+            "analyses": flights.stats() if flights is not None else None,
+            "scrapes": idealista.scrapes.stats() if idealista is not None else None,
+        },
+        "apify": idealista.upstream_stats() if idealista is not None else None,
+        "raw_data_store": (
+            idealista.raw_store.stats()
+            if idealista is not None and idealista.raw_store is not None
+            else None
+        ),
+        "analysis_jobs": jobs.stats() if jobs is not None else None,
+        "image_preparation": preparer.stats() if preparer is not None else None,
+        "image_dedup": (
+            classifier.deduplicator.stats()
+            if classifier is not None and classifier.deduplicator is not None
+            else None
+        ),
+        "local_clustering": (
+            classifier.local_clusterer.stats()
+            if classifier is not None and classifier.local_clusterer is not None
+            else None
+        ),
+        "image_store": store.stats() if store is not None else None,
+        "openai_rate_limit": get_rate_limiter().stats() if rate_limit.enabled else None,
+    }
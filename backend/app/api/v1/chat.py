@@ -21,7 +21,7 @@ SSE event types:
 """
 
 import json
-from typing import AsyncGenerator
+from typing import Any, AsyncGenerator
 
 import structlog
 from fastapi import APIRouter, HTTPException, Request
@@ -31,6 +31,7 @@ from sse_starlette.sse import EventSourceResponse
 
 from app.auth import CurrentUser
 from app.config import get_settings
+from app.services.single_flight import SharedRun, StreamSingleFlight, parse_event_id
 
 logger = structlog.get_logger(__name__)
 
@@ -44,54 +45,19 @@ class ChatRequest(BaseModel):
     conversation_id: str | None = None
 
 
-async def stream_chat(
-    message: str,
+async def _produce_chat_turn(
+    run: SharedRun,
+    graph: Any,
+    initial_state: dict[str, Any],
+    run_config: dict[str, Any],
     user_id: str,
-    conversation_id: str | None,
-    request: Request,
-) -> AsyncGenerator[str, None]:
-    """
-    Generator that streams orchestrator agent events as SSE.
-
-    Invokes the orchestrator graph with the user message and
-    yields each stream event as a JSON string.
-    """
-    settings = get_settings()
-    graph = getattr(request.app.state, "orchestrator_graph", None)
-    supabase = getattr(request.app.state, "supabase", None)
-
-    if graph is None:
-        yield json.dumps({"type": "error", "message": "Agente não disponível."})
-        return
-
-    # Build initial state for this turn
-    initial_state = {
-        "messages": [HumanMessage(content=message)],
-        "user_id": user_id,
-        "conversation_id": conversation_id or "",
-        "knowledge": {},
-        "todos": [],
-        "current_focus": None,
-        "executed_actions": [],
-        "stream_events": [],
-    }
-
-    # Config injected into every node via config["configurable"]
-    run_config = {
-        "configurable": {
-            "supabase": supabase,
-            "openai_api_key": settings.openai_api_key,
-            "orchestrator_model": settings.orchestrator.model,
-            "renovation_graph": getattr(request.app.state, "graph", None),
-        }
-    }
-
+) -> None:
+    """Run one orchestrator turn, publishing every client event on run."""
     sent_events: set[int] = set()
-    sent_event_count = 0
 
     try:
         # Yield an immediate "thinking" event so the UI shows activity
-        yield json.dumps({"type": "thinking", "message": "A processar..."})
+        run.publish({"type": "thinking", "message": "A processar..."})
 
         async for chunk in graph.astream(initial_state, config=run_config):
             # chunk is {node_name: state_update}
@@ -107,14 +73,13 @@ async def stream_chat(
             for i, event in enumerate(events):
                 if i not in sent_events:
                     sent_events.add(i)
-                    sent_event_count += 1
                     if isinstance(event, dict):
-                        yield json.dumps(event, ensure_ascii=False)
+                        run.publish(event)
 
             # Stream todo updates when todos change
             todos = node_state.get("todos")
             if todos is not None:
-                yield json.dumps({"type": "todo_update", "todos": todos})
+                run.publish({"type": "todo_update", "todos": todos})
 
             # Stream tool call notifications
             messages = node_state.get("messages") or []
@@ -123,15 +88,86 @@ async def stream_chat(
                     for tc in msg.tool_calls:
                         tool_name = tc.get("name") if isinstance(tc, dict) else getattr(tc, "name", "")
                         tool_args = tc.get("args") if isinstance(tc, dict) else getattr(tc, "args", {})
-                        yield json.dumps({
+                        run.publish({
                             "type": "tool_call",
                             "tool": tool_name,
                             "args": tool_args,
-                        }, ensure_ascii=False)
+                        })
 
     except Exception as e:
         logger.exception("stream_chat_error", user_id=user_id)
-        yield json.dumps({"type": "error", "message": f"Erro inesperado: {str(e)}"})
+        run.publish({"type": "error", "message": f"Erro inesperado: {str(e)}"})
+
+
+async def stream_chat(
+    message: str,
+    user_id: str,
+    conversation_id: str | None,
+    request: Request,
+    last_event_id: str | None = None,
+) -> AsyncGenerator[dict[str, str], None]:
+    """
+    Generator that streams orchestrator agent events as SSE.
+
+    Invokes the orchestrator graph with the user message and
+    yields each stream event as a JSON string with an SSE id.
+
+    The turn runs as a resumable run in app.state.chat_runs: when
+    last_event_id names a turn of this user that is still retained, the
+    message is ignored and only the events after that id are sent before
+    following the turn live.
+    """
+    settings = get_settings()
+    graph = getattr(request.app.state, "orchestrator_graph", None)
+    supabase = getattr(request.app.state, "supabase", None)
+    runs = getattr(request.app.state, "chat_runs", None) or StreamSingleFlight()
+    key = f"chat:{user_id}"
+
+    run, after = None, 0
+    resume_from = parse_event_id(last_event_id)
+    if resume_from is not None:
+        run = runs.resume(resume_from[0], key)
+        after = resume_from[1] if run is not None else 0
+
+    if run is None:
+        if graph is None:
+            yield {"data": json.dumps({"type": "error", "message": "Agente não disponível."})}
+            return
+
+        # Build initial state for this turn
+        initial_state = {
+            "messages": [HumanMessage(content=message)],
+            "user_id": user_id,
+            "conversation_id": conversation_id or "",
+            "knowledge": {},
+            "todos": [],
+            "current_focus": None,
+            "executed_actions": [],
+            "stream_events": [],
+        }
+
+        # Config injected into every node via config["configurable"]
+        run_config = {
+            "configurable": {
+                "supabase": supabase,
+                "openai_api_key": settings.openai_api_key,
+                "orchestrator_model": settings.orchestrator.model,
+                "renovation_graph": getattr(request.app.state, "graph", None),
+                "analysis_flights": getattr(request.app.state, "analysis_flights", None),
+                "idealista_service": getattr(request.app.state, "idealista_service", None),
+            }
+        }
+
+        async def _produce(run: SharedRun) -> None:
+            await _produce_chat_turn(run, graph, initial_state, run_config, user_id)
+
+        run = runs.start(key, _produce)
+
+    try:
+        async for seq, event in run.follow(after):
+            yield {"id": run.event_id(seq), "data": json.dumps(event, ensure_ascii=False)}
+    finally:
+        runs.leave(run)
 
 
 @router.post("", response_class=EventSourceResponse)
@@ -154,6 +190,10 @@ async def chat_stream(
     - **todo_update**: Task list changed
     - **error**: An error occurred
 
+    Every event has an SSE id. After a dropped connection, re-send the
+    request with the last id received in the Last-Event-ID header to get
+    only the missed events of the same turn (the message is not re-run).
+
     Example usage with curl:
     ```
     curl -N -X POST http://localhost:8000/api/v1/chat \\
@@ -173,6 +213,7 @@ async def chat_stream(
             user_id=user.id,
             conversation_id=body.conversation_id,
             request=request,
+            last_event_id=request.headers.get("last-event-id"),
         ),
         media_type="text/event-stream",
     )
@@ -22,6 +22,9 @@ class OpenAIConfig(BaseModel):
     """OpenAI API call parameters."""
 
     classification_max_tokens: int = 200
+    # Images per classification request; 1 = one request per image.
+    # Indices missing or invalid in a batched reply are retried one by one.
+    classification_batch_size: int = Field(default=1, ge=1)
     clustering_max_tokens: int = 1000
     room_analysis_max_tokens: int = 2000
     floor_plan_max_tokens: int = 1500
@@ -30,25 +33,250 @@ class OpenAIConfig(BaseModel):
     estimation_detail: str = "high"      # "high" or "auto" — used for room analysis
 
 
+class OpenAIHTTPConfig(BaseModel):
+    """Connection pool shared by all OpenAI clients with the same key and base URL."""
+
+    http2: bool = True
+    max_connections: int = 64
+    max_keepalive_connections: int = 32
+    keepalive_expiry_seconds: float = 90.0
+
+
+class ModelRateLimits(BaseModel):
+    """Per-model OpenAI account limits."""
+
+    requests_per_minute: int
+    tokens_per_minute: int
+
+
+class OpenAIRateLimitConfig(BaseModel):
+    """Process-wide OpenAI rate limiter (shared by every OpenAI call site)."""
+
+    enabled: bool = True
+    # Defaults for models without an override — set to your account tier
+    requests_per_minute: int = 5000
+    tokens_per_minute: int = 450_000
+    model_overrides: dict[str, ModelRateLimits] = Field(default_factory=dict)
+    burst_seconds: float = 10.0          # Bucket capacity, in seconds of refill
+    # Adaptive concurrency (AIMD): shrink on 429, grow back on success
+    max_concurrency: int = 32
+    min_concurrency: int = 1
+    decrease_factor: float = 0.5
+    default_retry_after_seconds: float = 1.0   # Pause after a 429 without retry-after
+
+
 class ImageProcessingConfig(BaseModel):
     """Image download and processing limits."""
 
     max_images_in_memory: int = 25
     download_timeout_seconds: float = 10.0
     max_concurrent_downloads: int = 10
+    # Pooled download client (shared across analyses for connection reuse)
+    download_http2: bool = True
+    download_max_connections: int = 20
+    download_max_keepalive_connections: int = 10
+    download_keepalive_expiry_seconds: float = 30.0
+    download_max_connections_per_host: int = 6
+    # Downloaded image bytes kept in memory (shared by all runs, LRU-evicted)
+    image_store_max_mb: int = 256
+    # Classify each image as soon as its download finishes (no download-all barrier)
+    stream_classification: bool = True
+    stream_queue_size: int = 8           # Downloaded-but-unclassified images buffered
     max_concurrent_classifications: int = 5
     max_concurrent_estimations: int = 3
+    # Estimate each room as soon as its group is final (fused group+estimate node)
+    pipelined_estimation: bool = False
     max_clustering_images: int = 10
     images_per_room_analysis: int = 4
 
 
+class ImagePreparationConfig(BaseModel):
+    """Downscaling/re-encoding of downloaded images per OpenAI detail level.
+
+    Env-overridable via IMAGE_PREPARATION__KEY format, e.g.:
+        IMAGE_PREPARATION__FORMAT=webp
+        IMAGE_PREPARATION__QUALITY=80
+    """
+
+    enabled: bool = True
+    format: str = "jpeg"          # "jpeg" or "webp"
+    quality: int = 85
+    max_workers: int = 4          # Thread pool for decode/resize/encode
+    cache_max_mb: int = 128       # Byte cap for cached variants (process-wide)
+
+
+class ImageDedupConfig(BaseModel):
+    """Perceptual-hash collapse of near-duplicate photos before classification.
+
+    Env-overridable via IMAGE_DEDUP__KEY format, e.g.:
+        IMAGE_DEDUP__MAX_DISTANCE=4
+        IMAGE_DEDUP__ENABLED=false
+    """
+
+    enabled: bool = True
+    hash_size: int = 8               # dHash of hash_size^2 bits
+    max_distance: int = 6            # Differing bits still counted as the same shot
+    max_workers: int = 2             # Thread pool decoding photos (also for local clustering)
+    max_cached_hashes: int = 20_000  # Signatures kept by content digest (process-wide)
+
+
+class LocalClusteringConfig(BaseModel):
+    """Offline visual clustering of bedroom/bathroom photos, GPT only when unsure.
+
+    Off by default: the thresholds are calibrated on synthetic listings only.
+    Enable once bench_local_clustering --replay against recorded GPT clusters
+    confirms them.
+
+    Env-overridable via LOCAL_CLUSTERING__KEY format, e.g.:
+        LOCAL_CLUSTERING__ENABLED=true
+        LOCAL_CLUSTERING__MIN_CONFIDENCE=0.6
+    """
+
+    enabled: bool = False
+    min_confidence: float = 0.5          # Below this, the bucket goes to GPT clustering
+    distance_threshold: float = 0.4      # Max average linkage within one room (0-1)
+
+
 class ApifyConfig(BaseModel):
-    """Apify scraper configuration."""
+    """Apify scraper configuration.
+
+    Env-overridable via APIFY__KEY format, e.g.:
+        APIFY__MAX_RETRIES=5
+        APIFY__BREAKER_FAILURE_THRESHOLD=10
+    """
 
     standby_url: str = "https://dz-omar--idealista-scraper-api.apify.actor"
-    max_retries: int = 3
-    retry_base_delay_seconds: int = 2
+    max_retries: int = 3                     # Attempts per call, first one included
+    retry_base_delay_seconds: float = 2      # Minimum jittered backoff delay
+    retry_max_delay_seconds: float = 20.0    # Cap on backoff and on honoured Retry-After
     request_timeout_seconds: float = 120.0
+    # Retry budget shared by all calls: ratio x first attempts (+ min) per window
+    retry_budget_ratio: float = 0.2
+    retry_budget_min_retries: int = 3
+    retry_budget_window_seconds: float = 10.0
+    # Circuit breaker: open after N consecutive failures, probe again after reset
+    breaker_failure_threshold: int = 5
+    breaker_reset_seconds: float = 30.0
+
+
+class ScrapeCacheConfig(BaseModel):
+    """Scraped listing cache in IdealistaService (one entry per property ID).
+
+    Env-overridable via SCRAPE_CACHE__KEY format, e.g.:
+        SCRAPE_CACHE__TTL_SECONDS=3600
+        SCRAPE_CACHE__STALE_SECONDS=0
+    """
+
+    enabled: bool = True
+    backend: str = "sqlite"              # "memory" (in-process LRU) or "sqlite" (LRU + on-disk)
+    sqlite_path: str = "data/scrape_cache.sqlite3"
+    ttl_seconds: float = 6 * 3600        # Served as-is up to this age
+    stale_seconds: float = 18 * 3600     # Then served while a background refresh runs
+    max_entries: int = 10_000            # On-disk LRU cap
+    max_memory_entries: int = 500        # In-process LRU cap
+
+
+class RawDataStoreConfig(BaseModel):
+    """Compressed side store for raw Apify payloads (PropertyData.raw_data).
+
+    Env-overridable via RAW_DATA_STORE__KEY format, e.g.:
+        RAW_DATA_STORE__BACKEND=memory
+        RAW_DATA_STORE__ENABLED=false   # keep raw_data inline
+    """
+
+    enabled: bool = True
+    backend: str = "sqlite"              # "memory" (in-process LRU) or "sqlite" (on-disk)
+    sqlite_path: str = "data/raw_listings.sqlite3"
+    max_entries: int = 10_000            # LRU cap
+    compression_level: int = 6           # zlib, 1 (fast) to 9 (small)
+
+
+class ClassificationCacheConfig(BaseModel):
+    """Content-addressed image classification cache.
+
+    Env-overridable via CLASSIFICATION_CACHE__KEY format, e.g.:
+        CLASSIFICATION_CACHE__BACKEND=memory
+        CLASSIFICATION_CACHE__TTL_SECONDS=86400
+    """
+
+    enabled: bool = True
+    backend: str = "sqlite"              # "memory" (in-process LRU) or "sqlite" (LRU + on-disk)
+    sqlite_path: str = "data/classification_cache.sqlite3"
+    ttl_seconds: float = 30 * 24 * 3600  # Photos rarely change meaning; expire after 30 days
+    max_entries: int = 100_000           # On-disk LRU cap
+    max_memory_entries: int = 5000       # In-process LRU cap
+
+
+class AnalysisCacheConfig(BaseModel):
+    """Whole-analysis result cache (one entry per Idealista listing).
+
+    Env-overridable via ANALYSIS_CACHE__KEY format, e.g.:
+        ANALYSIS_CACHE__BACKEND=supabase
+        ANALYSIS_CACHE__TTL_SECONDS=86400
+    """
+
+    enabled: bool = True
+    # "memory" (in-process LRU), "sqlite" (LRU + on-disk) or "supabase" (LRU + shared table)
+    backend: str = "sqlite"
+    sqlite_path: str = "data/analysis_cache.sqlite3"
+    ttl_seconds: float = 7 * 24 * 3600   # Listing edits miss via the fingerprint; TTL bounds drift
+    max_entries: int = 10_000            # On-disk LRU cap
+    max_memory_entries: int = 500        # In-process LRU cap
+
+
+class AnalysisJobsConfig(BaseModel):
+    """Background analysis jobs (POST /api/v1/analyze/jobs).
+
+    Env-overridable via ANALYSIS_JOBS__KEY format, e.g.:
+        ANALYSIS_JOBS__WORKERS=8
+        ANALYSIS_JOBS__MAX_QUEUED=200
+    """
+
+    enabled: bool = True
+    workers: int = 4                     # Analyses running at once per process
+    max_queued: int = 100                # Admission control: submissions beyond this get 429
+    backend: str = "sqlite"              # "memory" (lost on restart) or "sqlite"
+    sqlite_path: str = "data/analysis_jobs.sqlite3"
+    retention_seconds: float = 7 * 24 * 3600   # Finished jobs kept for replay
+    default_priority: int = 5            # 0 = most urgent, 9 = background
+
+
+class BatchAnalysisConfig(BaseModel):
+    """Multi-listing analyses (POST /api/v1/analyze/batch).
+
+    Env-overridable via BATCH_ANALYSIS__KEY format, e.g.:
+        BATCH_ANALYSIS__MAX_URLS=50
+        BATCH_ANALYSIS__MAX_CONCURRENT_LISTINGS=4
+    """
+
+    max_urls: int = 100                  # Larger batches are rejected with 422
+    # Listings whose graph runs at once; GPT calls share the process-wide budget
+    max_concurrent_listings: int = 8
+
+
+class StreamResumeConfig(BaseModel):
+    """SSE reconnection for /analyze and /chat (Last-Event-ID).
+
+    Env-overridable via STREAM_RESUME__KEY format, e.g.:
+        STREAM_RESUME__GRACE_SECONDS=120
+    """
+
+    grace_seconds: float = 10.0          # Run outlives its last connection / stays resumable
+    buffer_events: int = 1000            # Per-run ring buffer; older events can't be replayed
+
+
+class GraphCheckpointsConfig(BaseModel):
+    """Per-node checkpoints of analysis runs (POST /api/v1/analyze/{run_id}/resume).
+
+    Env-overridable via GRAPH_CHECKPOINTS__KEY format, e.g.:
+        GRAPH_CHECKPOINTS__BACKEND=memory
+        GRAPH_CHECKPOINTS__RETENTION_SECONDS=3600
+    """
+
+    enabled: bool = True
+    backend: str = "sqlite"              # "memory" (lost on restart) or "sqlite"
+    sqlite_path: str = "data/graph_checkpoints.sqlite3"
+    retention_seconds: float = 24 * 3600  # Failed runs stay resumable this long
 
 
 class OrchestratorConfig(BaseModel):
@@ -95,6 +323,7 @@ class Settings(BaseSettings):
     # OpenAI Model Configuration
     openai_vision_model: str = "gpt-4o"
     openai_classification_model: str = "gpt-4o-mini"
+    openai_base_url: str = ""  # Empty = SDK default (api.openai.com)
 
     # LangSmith / Observability
     langsmith_api_key: str = ""
@@ -120,9 +349,24 @@ class Settings(BaseSettings):
 
     # Nested config groups (env-overridable via SECTION__KEY format)
     openai_config: OpenAIConfig = Field(default_factory=OpenAIConfig)
+    openai_http: OpenAIHTTPConfig = Field(default_factory=OpenAIHTTPConfig)
+    openai_rate_limit: OpenAIRateLimitConfig = Field(default_factory=OpenAIRateLimitConfig)
     image_processing: ImageProcessingConfig = Field(default_factory=ImageProcessingConfig)
+    image_preparation: ImagePreparationConfig = Field(default_factory=ImagePreparationConfig)
+    image_dedup: ImageDedupConfig = Field(default_factory=ImageDedupConfig)
+    local_clustering: LocalClusteringConfig = Field(default_factory=LocalClusteringConfig)
     apify: ApifyConfig = Field(default_factory=ApifyConfig)
+    scrape_cache: ScrapeCacheConfig = Field(default_factory=ScrapeCacheConfig)
+    raw_data_store: RawDataStoreConfig = Field(default_factory=RawDataStoreConfig)
     orchestrator: OrchestratorConfig = Field(default_factory=OrchestratorConfig)
+    classification_cache: ClassificationCacheConfig = Field(
+        default_factory=ClassificationCacheConfig
+    )
+    analysis_cache: AnalysisCacheConfig = Field(default_factory=AnalysisCacheConfig)
+    analysis_jobs: AnalysisJobsConfig = Field(default_factory=AnalysisJobsConfig)
+    batch_analysis: BatchAnalysisConfig = Field(default_factory=BatchAnalysisConfig)
+    stream_resume: StreamResumeConfig = Field(default_factory=StreamResumeConfig)
+    graph_checkpoints: GraphCheckpointsConfig = Field(default_factory=GraphCheckpointsConfig)
 
 
 @lru_cache
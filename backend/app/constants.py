@@ -156,6 +156,14 @@ CONDITION_MAP: dict[str, RoomCondition] = {
 KNOWN_IMAGE_TYPES: set[str] = {"image/jpeg", "image/png", "image/webp", "image/gif"}
 DEFAULT_IMAGE_CONTENT_TYPE = "image/jpeg"
 
+# --- OpenAI vision tile geometry ---
+# detail="low" sees one 512px thumbnail; detail="high" first fits the image in
+# 2048x2048, then scales so the shortest side is 768px before tiling at 512px.
+# Anything larger is downscaled by OpenAI anyway — sending it only costs upload.
+LOW_DETAIL_MAX_SIDE = 512
+HIGH_DETAIL_MAX_SIDE = 2048
+HIGH_DETAIL_SHORT_SIDE = 768
+
 # --- API metadata ---
 API_TITLE = "Rehabify API"
 API_VERSION = "0.1.0"
@@ -3,40 +3,103 @@ Main LangGraph definition for the renovation estimation pipeline.
 
 This graph orchestrates the entire analysis process:
 1. scrape: Fetch property data from Idealista via Apify
+   (cached_result: replay a stored estimate for an unchanged listing and stop)
 2. classify: Classify each image to identify room types using GPT-4 Vision
+   (near-duplicate photos are collapsed by perceptual hash first and inherit
+   their representative's room; the GPT calls saved are reported)
+   (floor plans already tagged by Apify start their layout analysis here,
+   joined in estimate)
 3. group: Group images by room to avoid duplicate estimates
 4. estimate: Analyze each room and estimate renovation costs
 5. summarize: Generate final report with totals and summary
 
+With image_processing.pipelined_estimation, steps 3 and 4 run as a single
+group_estimate node: each room is estimated as soon as its group is final
+instead of after every room type has been clustered.
+
 Each node emits stream events that are sent to the frontend in real-time.
+Events are pushed through LangGraph's custom stream channel the moment they
+are created, so per-image and per-room progress reaches the client while a
+node is still running instead of when it returns.
+
+Nodes return only the keys they change. `stream_events` is an append-only
+channel (see RenovationGraphState), so each node returns just the events it
+emitted and LangGraph's reducer appends them to the run's event log.
+
+Compiled with a checkpointer, the graph saves its state after every node, so
+a failed run can be resumed from its last good node (see analysis_runs). The
+estimate nodes return the rooms they finished even when they fail, and skip
+rooms that a resumed state already holds.
 
 Usage:
     graph = build_renovation_graph(settings, idealista_service, classifier_service, estimator_service)
-    async for event in graph.astream({"url": "...", "user_id": "..."}):
-        # Handle stream events
+    async for mode, chunk in graph.astream(initial_state, stream_mode=["custom", "updates"]):
+        # mode == "custom":  chunk is a StreamEvent emitted live by a node
+        # mode == "updates": chunk is {node_name: state} after a node finishes
         pass
 """
 
 import asyncio
+from contextlib import aclosing
 from typing import Any
 
 import structlog
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from langgraph.config import get_stream_writer
 from langgraph.graph import END, StateGraph
 
 from app.config import Settings
 from app.constants import PIPELINE_TOTAL_STEPS, SKIPPED_ROOM_TYPES
-from app.models.property import ImageClassification, RoomType, StreamEvent
+from app.graphs.state import RenovationGraphState
+from app.models.property import (
+    ImageClassification,
+    RenovationEstimate,
+    RoomAnalysis,
+    RoomType,
+    StreamEvent,
+)
+from app.services.analysis_cache import AnalysisCache
 from app.services.idealista import IdealistaService
-from app.services.image_classifier import ImageClassifierService, get_room_label
+from app.services.image_classifier import (
+    ImageClassifierService,
+    classify_from_tag,
+    get_room_label,
+)
 from app.services.image_downloader import ImageDownloaderService
-from app.services.renovation_estimator import RenovationEstimatorService
+from app.services.image_store import original_url
+from app.services.renovation_estimator import (
+    FloorPlanPrefetch,
+    RenovationEstimatorService,
+    is_fallback_analysis,
+)
 
 logger = structlog.get_logger(__name__)
 
 
-# Type alias for state (using dict for LangGraph compatibility)
+# Type alias for node input/output (full state in, partial update out)
 GraphState = dict[str, Any]
 
+# configurable key of the run's FloorPlanPrefetch (see with_floor_plan_prefetch)
+FLOOR_PLAN_PREFETCH = "floor_plan_prefetch"
+
+
+def _emit(events: list[StreamEvent], event: StreamEvent) -> None:
+    """
+    Record a stream event in the node's update and push it to live consumers.
+
+    Inside a running graph the event is also written to the custom stream
+    channel, which stream_analysis reads while the node is still executing.
+    Outside a runnable context (nodes called directly from tests or notebooks)
+    there is no writer and the event is only returned in the node's update.
+    """
+    events.append(event)
+    try:
+        writer = get_stream_writer()
+    except RuntimeError:
+        return
+    writer(event)
+
 
 async def scrape_node(
     state: GraphState,
@@ -48,12 +111,15 @@ async def scrape_node(
     """
     Node 1: Scrape property data from Idealista.
 
-    Fetches the listing data and image URLs using Apify.
+    Fetches the listing data and image URLs using Apify (or the scrape cache,
+    within state["scrape_max_age"]), unless the initial state already holds
+    the listing (scraped together with other listings by a batch request).
     """
     url = state["url"]
-    events = list(state.get("stream_events", []))
+    events: list[StreamEvent] = []
 
-    events.append(
+    _emit(
+        events,
         StreamEvent(
             type="status",
             message="A obter dados do Idealista...",
@@ -63,10 +129,13 @@ async def scrape_node(
     )
 
     try:
-        property_data = await idealista_service.scrape_property(url)
+        property_data = state.get("property_data") or await idealista_service.scrape_property(
+            url, max_age=state.get("scrape_max_age")
+        )
 
         num_images = len(property_data.image_urls)
-        events.append(
+        _emit(
+            events,
             StreamEvent(
                 type="status",
                 message=f"Encontradas {num_images} fotografias",
@@ -76,9 +145,11 @@ async def scrape_node(
             )
         )
 
-        # Resolve image URLs: download once to base64 when toggle is on
+        # Resolve image URLs: download once when toggle is on. With an ImageStore
+        # the downloader returns short handles; bytes stay out of graph state.
         if use_base64_images and downloader is not None:
-            events.append(
+            _emit(
+                events,
                 StreamEvent(
                     type="status",
                     message="A descarregar fotografias...",
@@ -96,8 +167,8 @@ async def scrape_node(
                 converted=len(image_data),
             )
 
-            # Remap image_tags: keys change from original URL to resolved URL (base64 or
-            # original fallback). Without this, classify_node can't find tags for base64
+            # Remap image_tags: keys change from original URL to resolved URL (handle,
+            # base64 or original fallback). Without this, classify_node can't find tags for base64
             # strings and falls back to GPT for every image, defeating the tag optimisation.
             if property_data.image_tags:
                 orig_to_resolved = dict(zip(property_data.image_urls, resolved_urls))
@@ -112,7 +183,6 @@ async def scrape_node(
             resolved_image_tags = property_data.image_tags
 
         return {
-            **state,
             "property_data": property_data,
             "image_urls": resolved_urls,
             "image_tags": resolved_image_tags,
@@ -122,7 +192,8 @@ async def scrape_node(
 
     except Exception as e:
         logger.error("scrape_node_failed", error=str(e))
-        events.append(
+        _emit(
+            events,
             StreamEvent(
                 type="error",
                 message=f"Erro ao obter dados: {str(e)}",
@@ -131,29 +202,133 @@ async def scrape_node(
             )
         )
         return {
-            **state,
             "error": str(e),
             "stream_events": events,
             "current_step": "error",
         }
 
 
+def _result_event(estimate: RenovationEstimate, **extra: Any) -> StreamEvent:
+    """Final "result" event carrying the serialised estimate."""
+    return StreamEvent(
+        type="result",
+        message=(
+            f"Estimativa completa: {estimate.total_cost_min:,.0f}€ - "
+            f"{estimate.total_cost_max:,.0f}€"
+        ),
+        step=5,
+        total_steps=PIPELINE_TOTAL_STEPS,
+        data={"estimate": estimate.model_dump(), **extra},
+    )
+
+
+async def cached_result_node(
+    state: GraphState, *, analysis_cache: AnalysisCache
+) -> GraphState:
+    """
+    Replay a cached estimate when the scraped listing is unchanged.
+
+    Runs between scrape and classify. On a hit the stored estimate is emitted
+    as the run's result event and the graph ends; on a miss (or after a scrape
+    error) the update is empty and the pipeline continues as usual.
+    """
+    property_data = state.get("property_data")
+    if state.get("error") or property_data is None:
+        return {}
+
+    estimate = await analysis_cache.get(state["url"], property_data)
+    if estimate is None:
+        return {}
+
+    events: list[StreamEvent] = []
+    _emit(
+        events,
+        StreamEvent(
+            type="status",
+            message="Anúncio sem alterações desde a última análise — a reutilizar resultado",
+            step=5,
+            total_steps=PIPELINE_TOTAL_STEPS,
+            data={"cached": True},
+        )
+    )
+    _emit(events, _result_event(estimate, cached=True))
+
+    return {
+        "room_analyses": estimate.room_analyses,
+        "floor_plan_analysis": estimate.floor_plan_ideas,
+        "estimate": estimate,
+        "summary": estimate.summary,
+        "stream_events": events,
+        "current_step": "completed",
+    }
+
+
+def _route_after_cache(state: GraphState) -> str:
+    """End the run when cached_result_node produced the estimate."""
+    return END if state.get("estimate") is not None else "classify"
+
+
+def _dedup_savings(
+    classifications: list[ImageClassification], image_tags: dict[str, str] | None
+) -> dict[str, int]:
+    """
+    Near-duplicates collapsed before classification, and the GPT calls saved.
+
+    A duplicate saved a GPT call unless its own Apify tag would have
+    classified it for free (classification-cache hits are not discounted).
+    """
+    duplicates = [c for c in classifications if c.duplicate_of is not None]
+    tags = image_tags or {}
+    saved = sum(
+        1 for c in duplicates if classify_from_tag(c.image_url, tags.get(c.image_url, "")) is None
+    )
+    return {"duplicates": len(duplicates), "gpt_calls_saved": saved}
+
+
+def _tagged_floor_plan_urls(image_urls: list[str], image_tags: dict[str, str] | None) -> list[str]:
+    """Images whose Apify tag already marks them as a floor plan, in listing order."""
+    if not image_tags:
+        return []
+    return [
+        url
+        for url in image_urls
+        if (c := classify_from_tag(url, image_tags.get(url, ""))) is not None
+        and c.room_type == RoomType.FLOOR_PLAN
+    ]
+
+
 async def classify_node(
-    state: GraphState, *, classifier_service: ImageClassifierService
+    state: GraphState,
+    *,
+    classifier_service: ImageClassifierService,
+    downloader: ImageDownloaderService | None = None,
+    estimator_service: RenovationEstimatorService | None = None,
+    floor_plan_prefetch: FloorPlanPrefetch | None = None,
 ) -> GraphState:
     """
     Node 2: Classify each image to identify room types.
 
     Uses GPT-4 Vision (mini model) to classify each photo.
     Emits progress events for each image processed.
+
+    When a downloader is passed (streaming mode), scrape_node has left the
+    original URLs in state and this node downloads and classifies together:
+    each image is classified as soon as its own download completes.
+
+    When an estimator and the run's floor_plan_prefetch are passed, floor
+    plans identified by their Apify tag are sent for layout analysis before
+    classification starts; estimate_node joins that call (see
+    RenovationEstimatorService.prefetch_floor_plan). It is cancelled if
+    classification fails.
     """
     if state.get("error"):
-        return state
+        return {}
 
     image_urls = state.get("image_urls", [])
-    events = list(state.get("stream_events", []))
+    events: list[StreamEvent] = []
 
-    events.append(
+    _emit(
+        events,
         StreamEvent(
             type="status",
             message=f"A classificar {len(image_urls)} fotografias...",
@@ -172,6 +347,13 @@ async def classify_node(
             "image_tags", property_data.image_tags if property_data else None
         )
 
+        if estimator_service is not None and floor_plan_prefetch is not None:
+            tagged_plans = _tagged_floor_plan_urls(image_urls, image_tags)
+            if tagged_plans:
+                estimator_service.prefetch_floor_plan(
+                    tagged_plans, floor_plan_prefetch, property_data
+                )
+
         # Progress callback to emit events for each image
         async def progress_callback(
             current: int, total: int, classification: ImageClassification
@@ -179,7 +361,8 @@ async def classify_node(
             room_label = get_room_label(classification.room_type, classification.room_number)
             # High confidence (≥0.9) means tag-based; lower means GPT-based
             source = "tag" if classification.confidence >= 0.9 else "GPT"
-            events.append(
+            _emit(
+                events,
                 StreamEvent(
                     type="progress",
                     message=f"A classificar foto {current}/{total}: {room_label} detectada ({source})",
@@ -195,9 +378,31 @@ async def classify_node(
                 )
             )
 
-        classifications = await classifier_service.classify_images(
-            image_urls, image_tags=image_tags, progress_callback=progress_callback
-        )
+        update: GraphState = {}
+        if downloader is not None:
+            # Streaming: downloads feed classification through a bounded queue
+            resolved: dict[str, str] = {}
+
+            async def _downloaded_images():
+                async with aclosing(downloader.stream_images(image_urls)) as downloads:
+                    async for url, reference in downloads:
+                        resolved[url] = reference or url
+                        yield resolved[url], (image_tags or {}).get(url)
+
+            # aclosing: a cancelled run stops the downloads now, not at GC time
+            async with aclosing(_downloaded_images()) as images:
+                classifications = await classifier_service.classify_image_stream(
+                    images, total=len(image_urls), progress_callback=progress_callback
+                )
+            update["image_urls"] = [resolved.get(url, url) for url in image_urls]
+            if image_tags:
+                update["image_tags"] = {
+                    resolved.get(url, url): tag for url, tag in image_tags.items()
+                }
+        else:
+            classifications = await classifier_service.classify_images(
+                image_urls, image_tags=image_tags, progress_callback=progress_callback
+            )
 
         # Summary of classifications
         room_counts: dict[str, int] = {}
@@ -210,25 +415,41 @@ async def classify_node(
             if room_type not in ["exterior", "outro"]:
                 summary_parts.append(f"{count}x {room_type}")
 
-        events.append(
+        message = f"Divisões identificadas: {', '.join(summary_parts)}"
+        dedup = _dedup_savings(classifications, update.get("image_tags", image_tags))
+        if dedup["duplicates"]:
+            message += (
+                f" ({dedup['duplicates']} fotografias duplicadas, "
+                f"{dedup['gpt_calls_saved']} chamadas GPT evitadas)"
+            )
+        _emit(
+            events,
             StreamEvent(
                 type="status",
-                message=f"Divisões identificadas: {', '.join(summary_parts)}",
+                message=message,
                 step=2,
                 total_steps=PIPELINE_TOTAL_STEPS,
+                data={"image_dedup": dedup},
             )
         )
 
         return {
-            **state,
+            **update,
             "classifications": classifications,
             "stream_events": events,
             "current_step": "classified",
         }
 
+    except asyncio.CancelledError:
+        if floor_plan_prefetch is not None:
+            floor_plan_prefetch.cancel()
+        raise
     except Exception as e:
+        if floor_plan_prefetch is not None:
+            floor_plan_prefetch.cancel()
         logger.error("classify_node_failed", error=str(e))
-        events.append(
+        _emit(
+            events,
             StreamEvent(
                 type="error",
                 message=f"Erro na classificação: {str(e)}",
@@ -237,56 +458,30 @@ async def classify_node(
             )
         )
         return {
-            **state,
             "error": str(e),
             "stream_events": events,
             "current_step": "error",
         }
 
 
-async def group_node(
-    state: GraphState, *, classifier_service: ImageClassifierService
-) -> GraphState:
-    """
-    Node 3: Group images by room.
-
-    This step is crucial to avoid counting the same room multiple times.
-    Multiple photos of the kitchen should be analyzed together as ONE kitchen.
+def _serialize_room_groups(
+    grouped: dict[str, list[ImageClassification]],
+) -> tuple[dict[str, list[dict[str, Any]]], list[str]]:
     """
-    if state.get("error"):
-        return state
+    Split grouped classifications into estimable rooms and floor plan URLs.
 
-    classifications = state.get("classifications", [])
-    events = list(state.get("stream_events", []))
-
-    events.append(
-        StreamEvent(
-            type="status",
-            message="A comparar fotografias para identificar divisões distintas...",
-            step=3,
-            total_steps=PIPELINE_TOTAL_STEPS,
-        )
-    )
+    Floor plans are collected for the dedicated layout analysis; exterior and
+    other non-room images (SKIPPED_ROOM_TYPES) are dropped from estimation.
 
-    # Extract room/bathroom counts from scraped metadata for smart fallback
-    property_data = state.get("property_data")
-    num_rooms = property_data.num_rooms if property_data else None
-    num_bathrooms = property_data.num_bathrooms if property_data else None
-
-    grouped = await classifier_service.group_by_room(
-        classifications,
-        num_rooms=num_rooms,
-        num_bathrooms=num_bathrooms,
-    )
-
-    # Separate floor plan images, filter out exterior/other non-room images for estimation
-    room_groups = {}
+    Returns:
+        (JSON-serialisable room groups for state, floor plan image URLs)
+    """
+    room_groups: dict[str, list[dict[str, Any]]] = {}
     floor_plan_urls: list[str] = []
 
     for room_key, room_classifications in grouped.items():
         room_type = room_classifications[0].room_type.value
         if room_type == RoomType.FLOOR_PLAN.value:
-            # Collect floor plan URLs for dedicated layout analysis
             floor_plan_urls.extend(c.image_url for c in room_classifications)
         elif room_type not in SKIPPED_ROOM_TYPES:
             room_groups[room_key] = [
@@ -299,24 +494,131 @@ async def group_node(
                 for c in room_classifications
             ]
 
+    return room_groups, floor_plan_urls
+
+
+def _grouped_event(
+    room_groups: dict[str, list[dict[str, Any]]], floor_plan_urls: list[str]
+) -> StreamEvent:
+    """Step 3 summary: how many photos were grouped into how many rooms."""
     msg_parts = [
         f"Agrupadas {sum(len(v) for v in room_groups.values())} fotos em {len(room_groups)} divisões"
     ]
     if floor_plan_urls:
         msg_parts.append(f"{len(floor_plan_urls)} planta(s) identificada(s)")
 
-    events.append(
+    return StreamEvent(
+        type="status",
+        message="; ".join(msg_parts),
+        step=3,
+        total_steps=PIPELINE_TOTAL_STEPS,
+        data={"num_rooms": len(room_groups), "rooms": list(room_groups.keys())},
+    )
+
+
+def _room_progress_event(current: int, total: int, analysis: Any) -> StreamEvent:
+    """Step 4 progress: one room's condition and cost range."""
+    room_label = get_room_label(analysis.room_type, analysis.room_number)
+    return StreamEvent(
+        type="progress",
+        message=(
+            f"{room_label}: estado {analysis.condition.value}, "
+            f"custo {analysis.cost_min:,.0f}€ - {analysis.cost_max:,.0f}€"
+        ),
+        step=4,
+        total_steps=PIPELINE_TOTAL_STEPS,
+        data={
+            "room": room_label,
+            "condition": analysis.condition.value,
+            "cost_min": analysis.cost_min,
+            "cost_max": analysis.cost_max,
+            "current": current,
+            "total": total,
+        },
+    )
+
+
+def _floor_plan_ideas_event(floor_plan_analysis: Any) -> StreamEvent:
+    """Step 4 status once the floor plan layout analysis is done."""
+    return StreamEvent(
+        type="status",
+        message=f"Encontradas {len(floor_plan_analysis.ideas)} ideias para otimização do espaço",
+        step=4,
+        total_steps=PIPELINE_TOTAL_STEPS,
+    )
+
+
+def _room_images(classifications: list[ImageClassification]) -> tuple[str, ...]:
+    """A room's identity across a resume: the photos it was grouped from."""
+    return tuple(c.image_url for c in classifications)
+
+
+def _reusable_rooms(state: GraphState) -> dict[tuple[str, ...], RoomAnalysis]:
+    """
+    Room analyses a resumed run already has, keyed by their photos.
+
+    When estimation fails, the rooms that did finish are checkpointed in
+    state["room_analyses"]; a resume estimates only the others. Fallback
+    placeholders (the GPT call failed) are analysed again.
+    """
+    return {
+        tuple(analysis.images): analysis
+        for analysis in state.get("room_analyses") or []
+        if not is_fallback_analysis(analysis)
+    }
+
+
+def _rooms_reused_event(num_rooms: int) -> StreamEvent:
+    """Step 4 status when a resumed run skips rooms estimated before the failure."""
+    return StreamEvent(
+        type="status",
+        message=f"A retomar análise: {num_rooms} divisões já estimadas",
+        step=4,
+        total_steps=PIPELINE_TOTAL_STEPS,
+        data={"reused_rooms": num_rooms},
+    )
+
+
+async def group_node(
+    state: GraphState, *, classifier_service: ImageClassifierService
+) -> GraphState:
+    """
+    Node 3: Group images by room.
+
+    This step is crucial to avoid counting the same room multiple times.
+    Multiple photos of the kitchen should be analyzed together as ONE kitchen.
+    """
+    if state.get("error"):
+        return {}
+
+    classifications = state.get("classifications", [])
+    events: list[StreamEvent] = []
+
+    _emit(
+        events,
         StreamEvent(
             type="status",
-            message="; ".join(msg_parts),
+            message="A comparar fotografias para identificar divisões distintas...",
             step=3,
             total_steps=PIPELINE_TOTAL_STEPS,
-            data={"num_rooms": len(room_groups), "rooms": list(room_groups.keys())},
         )
     )
 
+    # Extract room/bathroom counts from scraped metadata for smart fallback
+    property_data = state.get("property_data")
+    num_rooms = property_data.num_rooms if property_data else None
+    num_bathrooms = property_data.num_bathrooms if property_data else None
+
+    grouped = await classifier_service.group_by_room(
+        classifications,
+        num_rooms=num_rooms,
+        num_bathrooms=num_bathrooms,
+    )
+
+    room_groups, floor_plan_urls = _serialize_room_groups(grouped)
+    _emit(events, _grouped_event(room_groups, floor_plan_urls))
+
     return {
-        **state,
         "grouped_images": room_groups,
         "floor_plan_urls": floor_plan_urls,
         "stream_events": events,
@@ -325,21 +627,32 @@ async def group_node(
 
 
 async def estimate_node(
-    state: GraphState, *, estimator_service: RenovationEstimatorService
+    state: GraphState,
+    *,
+    estimator_service: RenovationEstimatorService,
+    floor_plan_prefetch: FloorPlanPrefetch | None = None,
 ) -> GraphState:
     """
     Node 4: Estimate renovation costs for each room.
 
     Uses GPT-4 Vision to analyze each room and provide cost estimates.
     Each room is analyzed only once, even if it has multiple photos.
+
+    On failure the rooms that did finish are returned with the error, so the
+    run's checkpoint keeps them and a resume re-analyses only the rest.
+    Floor plan analysis (the run's prefetch included) does not outlive the node.
     """
     if state.get("error"):
-        return state
+        return {}
 
     grouped_images = state.get("grouped_images", {})
-    events = list(state.get("stream_events", []))
+    events: list[StreamEvent] = []
+    # Rooms done so far; returned with an error so a resumed run skips them
+    finished: list[RoomAnalysis] = []
+    floor_plan_task: asyncio.Task | None = None
 
-    events.append(
+    _emit(
+        events,
         StreamEvent(
             type="status",
             message=f"A analisar estado de {len(grouped_images)} divisões...",
@@ -363,36 +676,35 @@ async def estimate_node(
             for room_key, room_data in grouped_images.items()
         }
 
+        # A resumed run already has the rooms that finished before the failure
+        reusable = _reusable_rooms(state)
+        pending = {
+            room_key: room_classifications
+            for room_key, room_classifications in grouped_classifications.items()
+            if _room_images(room_classifications) not in reusable
+        }
+        finished.extend(
+            reusable[_room_images(room_classifications)]
+            for room_key, room_classifications in grouped_classifications.items()
+            if room_key not in pending
+        )
+        reused = len(finished)
+        if reused:
+            _emit(events, _rooms_reused_event(reused))
+
         # Progress callback fires as each room completes (out-of-order is fine)
         async def room_progress_callback(
             current: int, total: int, analysis: Any
         ) -> None:
-            room_label = get_room_label(analysis.room_type, analysis.room_number)
-            events.append(
-                StreamEvent(
-                    type="progress",
-                    message=(
-                        f"{room_label}: estado {analysis.condition.value}, "
-                        f"custo {analysis.cost_min:,.0f}€ - {analysis.cost_max:,.0f}€"
-                    ),
-                    step=4,
-                    total_steps=PIPELINE_TOTAL_STEPS,
-                    data={
-                        "room": room_label,
-                        "condition": analysis.condition.value,
-                        "cost_min": analysis.cost_min,
-                        "cost_max": analysis.cost_max,
-                        "current": current,
-                        "total": total,
-                    },
-                )
-            )
+            finished.append(analysis)
+            _emit(events, _room_progress_event(current + reused, total + reused, analysis))
 
         floor_plan_urls: list[str] = state.get("floor_plan_urls", [])
         property_data = state.get("property_data")
 
         if floor_plan_urls:
-            events.append(
+            _emit(
+                events,
                 StreamEvent(
                     type="status",
                     message="A analisar planta do imóvel...",
@@ -400,34 +712,33 @@ async def estimate_node(
                     total_steps=PIPELINE_TOTAL_STEPS,
                 )
             )
-            # Run room analyses and floor plan analysis concurrently
-            room_analyses, floor_plan_analysis = await asyncio.gather(
-                estimator_service.analyze_all_rooms(
-                    grouped_classifications,
-                    progress_callback=room_progress_callback,
-                    property_data=property_data,
-                ),
-                estimator_service.analyze_floor_plan(floor_plan_urls, property_data),
+            # Run room analyses and floor plan analysis concurrently. Tagged
+            # plans were already sent by classify_node; this joins that call.
+            floor_plan_task = asyncio.create_task(
+                estimator_service.analyze_floor_plan(
+                    floor_plan_urls, property_data, floor_plan_prefetch
+                )
+            )
+            room_analyses = await estimator_service.analyze_all_rooms(
+                pending,
+                progress_callback=room_progress_callback,
+                property_data=property_data,
             )
+            floor_plan_analysis = await floor_plan_task
             if floor_plan_analysis:
-                events.append(
-                    StreamEvent(
-                        type="status",
-                        message=f"Encontradas {len(floor_plan_analysis.ideas)} ideias para otimização do espaço",
-                        step=4,
-                        total_steps=PIPELINE_TOTAL_STEPS,
-                    )
-                )
+                _emit(events, _floor_plan_ideas_event(floor_plan_analysis))
         else:
             # No floor plan images — run room analyses only
             room_analyses = await estimator_service.analyze_all_rooms(
-                grouped_classifications,
+                pending,
                 progress_callback=room_progress_callback,
                 property_data=property_data,
             )
             floor_plan_analysis = None
+        room_analyses = finished[:reused] + room_analyses
 
-        events.append(
+        _emit(
+            events,
             StreamEvent(
                 type="status",
                 message=f"Análise completa de {len(room_analyses)} divisões",
@@ -437,7 +748,6 @@ async def estimate_node(
         )
 
         return {
-            **state,
             "room_analyses": room_analyses,
             "floor_plan_analysis": floor_plan_analysis,
             "stream_events": events,
@@ -445,8 +755,9 @@ async def estimate_node(
         }
 
     except Exception as e:
-        logger.error("estimate_node_failed", error=str(e))
-        events.append(
+        logger.error("estimate_node_failed", error=str(e), rooms_done=len(finished))
+        _emit(
+            events,
             StreamEvent(
                 type="error",
                 message=f"Erro na estimativa: {str(e)}",
@@ -455,11 +766,162 @@ async def estimate_node(
             )
         )
         return {
-            **state,
+            "room_analyses": finished,
             "error": str(e),
             "stream_events": events,
             "current_step": "error",
         }
+    finally:
+        if floor_plan_task is not None:
+            floor_plan_task.cancel()
+        if floor_plan_prefetch is not None:
+            floor_plan_prefetch.cancel()
+
+
+async def group_estimate_node(
+    state: GraphState,
+    *,
+    classifier_service: ImageClassifierService,
+    estimator_service: RenovationEstimatorService,
+    floor_plan_prefetch: FloorPlanPrefetch | None = None,
+) -> GraphState:
+    """
+    Nodes 3+4 pipelined: estimate each room as soon as its group is final.
+
+    Replaces group -> estimate when image_processing.pipelined_estimation is
+    on. Rooms that need no clustering (kitchen, living room, ...) go to the
+    estimator straight away, and the floor plan analysis starts as soon as
+    plan images are seen, while bedroom/bathroom clustering is still running.
+    The critical path becomes max(clustering + its rooms, other rooms) instead
+    of clustering + the slowest room.
+
+    Step 3 and step 4 events interleave, and a progress event's `total` counts
+    the rooms grouped so far. Returns the same keys as group_node and
+    estimate_node combined. Like estimate_node, it skips rooms a resumed run
+    already estimated and returns the finished rooms along with an error.
+    """
+    if state.get("error"):
+        return {}
+
+    classifications = state.get("classifications", [])
+    property_data = state.get("property_data")
+    events: list[StreamEvent] = []
+
+    _emit(
+        events,
+        StreamEvent(
+            type="status",
+            message="A comparar fotografias e a analisar cada divisão assim que identificada...",
+            step=3,
+            total_steps=PIPELINE_TOTAL_STEPS,
+        )
+    )
+
+    room_groups: dict[str, list[dict[str, Any]]] = {}
+    floor_plan_urls: list[str] = []
+    floor_plan_task: asyncio.Task | None = None
+    reusable = _reusable_rooms(state)
+    reused: list[RoomAnalysis] = []
+    finished: list[RoomAnalysis] = []
+
+    async def _estimable_batches():
+        nonlocal floor_plan_task
+        batches = classifier_service.iter_room_groups(
+            classifications,
+            num_rooms=property_data.num_rooms if property_data else None,
+            num_bathrooms=property_data.num_bathrooms if property_data else None,
+        )
+        async with aclosing(batches):
+            async for batch in batches:
+                rooms, plans = _serialize_room_groups(batch)
+                if plans and floor_plan_task is None:
+                    floor_plan_urls.extend(plans)
+                    _emit(
+                        events,
+                        StreamEvent(
+                            type="status",
+                            message="A analisar planta do imóvel...",
+                            step=4,
+                            total_steps=PIPELINE_TOTAL_STEPS,
+                        )
+                    )
+                    floor_plan_task = asyncio.create_task(
+                        estimator_service.analyze_floor_plan(
+                            floor_plan_urls, property_data, floor_plan_prefetch
+                        )
+                    )
+                room_groups.update(rooms)
+                pending = {}
+                for room_key in rooms:
+                    if (images := _room_images(batch[room_key])) in reusable:
+                        reused.append(reusable[images])
+                    else:
+                        pending[room_key] = batch[room_key]
+                if pending:
+                    yield pending
+        _emit(events, _grouped_event(room_groups, floor_plan_urls))
+        if reused:
+            _emit(events, _rooms_reused_event(len(reused)))
+
+    async def room_progress_callback(current: int, total: int, analysis: Any) -> None:
+        finished.append(analysis)
+        _emit(
+            events,
+            _room_progress_event(current + len(reused), total + len(reused), analysis),
+        )
+
+    try:
+        room_analyses = await estimator_service.analyze_rooms_as_ready(
+            _estimable_batches(),
+            progress_callback=room_progress_callback,
+            property_data=property_data,
+        )
+        room_analyses = reused + room_analyses
+        floor_plan_analysis = await floor_plan_task if floor_plan_task is not None else None
+        if floor_plan_analysis:
+            _emit(events, _floor_plan_ideas_event(floor_plan_analysis))
+
+        _emit(
+            events,
+            StreamEvent(
+                type="status",
+                message=f"Análise completa de {len(room_analyses)} divisões",
+                step=4,
+                total_steps=PIPELINE_TOTAL_STEPS,
+            )
+        )
+
+        return {
+            "grouped_images": room_groups,
+            "floor_plan_urls": floor_plan_urls,
+            "room_analyses": room_analyses,
+            "floor_plan_analysis": floor_plan_analysis,
+            "stream_events": events,
+            "current_step": "estimated",
+        }
+
+    except Exception as e:
+        logger.error("group_estimate_node_failed", error=str(e), rooms_done=len(finished))
+        _emit(
+            events,
+            StreamEvent(
+                type="error",
+                message=f"Erro na estimativa: {str(e)}",
+                step=4,
+                total_steps=PIPELINE_TOTAL_STEPS,
+            )
+        )
+        return {
+            "room_analyses": reused + finished,
+            "error": str(e),
+            "stream_events": events,
+            "current_step": "error",
+        }
+    finally:
+        if floor_plan_task is not None:
+            floor_plan_task.cancel()
+        if floor_plan_prefetch is not None:
+            floor_plan_prefetch.cancel()
 
 
 async def summarize_node(
@@ -471,13 +933,14 @@ async def summarize_node(
     Calculates totals and generates a human-readable summary.
     """
     if state.get("error"):
-        return state
+        return {}
 
     property_data = state.get("property_data")
     room_analyses = state.get("room_analyses", [])
-    events = list(state.get("stream_events", []))
+    events: list[StreamEvent] = []
 
-    events.append(
+    _emit(
+        events,
         StreamEvent(
             type="status",
             message="A calcular custos finais...",
@@ -494,26 +957,29 @@ async def summarize_node(
             property_data, room_analyses, total_min, total_max
         )
 
+        # Outputs (SSE result, persisted rows) carry CDN URLs, never store handles
+        room_analyses = [
+            r.model_copy(update={"images": [original_url(u) for u in r.images]})
+            for r in room_analyses
+        ]
+        floor_plan_analysis = state.get("floor_plan_analysis")
+        if floor_plan_analysis is not None:
+            floor_plan_analysis = floor_plan_analysis.model_copy(
+                update={"images": [original_url(u) for u in floor_plan_analysis.images]}
+            )
+
         estimate = estimator_service.create_estimate(
             state["url"],
             property_data,
             room_analyses,
             summary,
-            floor_plan_analysis=state.get("floor_plan_analysis"),
+            floor_plan_analysis=floor_plan_analysis,
         )
 
-        events.append(
-            StreamEvent(
-                type="result",
-                message=f"Estimativa completa: {total_min:,.0f}€ - {total_max:,.0f}€",
-                step=5,
-                total_steps=PIPELINE_TOTAL_STEPS,
-                data={"estimate": estimate.model_dump()},
-            )
-        )
+        dedup = _dedup_savings(state.get("classifications", []), state.get("image_tags"))
+        _emit(events, _result_event(estimate, image_dedup=dedup))
 
         return {
-            **state,
             "estimate": estimate,
             "summary": summary,
             "stream_events": events,
@@ -522,7 +988,8 @@ async def summarize_node(
 
     except Exception as e:
         logger.error("summarize_node_failed", error=str(e))
-        events.append(
+        _emit(
+            events,
             StreamEvent(
                 type="error",
                 message=f"Erro ao gerar resumo: {str(e)}",
@@ -531,19 +998,38 @@ async def summarize_node(
             )
         )
         return {
-            **state,
             "error": str(e),
             "stream_events": events,
             "current_step": "error",
         }
 
 
+def with_floor_plan_prefetch(
+    config: RunnableConfig, prefetch: FloorPlanPrefetch
+) -> RunnableConfig:
+    """
+    Run config carrying the run's floor plan prefetch slot.
+
+    Lets classify start the analysis of tagged floor plans and estimate join
+    it. The caller owns the slot and cancels it when the run ends, so a
+    failed or disconnected run makes no further GPT call.
+    """
+    configurable = {**config.get("configurable", {}), FLOOR_PLAN_PREFETCH: prefetch}
+    return {**config, "configurable": configurable}
+
+
+def _floor_plan_prefetch(config: RunnableConfig | None) -> FloorPlanPrefetch | None:
+    return ((config or {}).get("configurable") or {}).get(FLOOR_PLAN_PREFETCH)
+
+
 def build_renovation_graph(
     settings: Settings,
     idealista_service: IdealistaService,
     classifier_service: ImageClassifierService,
     estimator_service: RenovationEstimatorService,
     downloader: ImageDownloaderService | None = None,
+    analysis_cache: AnalysisCache | None = None,
+    checkpointer: BaseCheckpointSaver | None = None,
 ) -> StateGraph:
     """
     Build the complete LangGraph for renovation estimation.
@@ -551,52 +1037,113 @@ def build_renovation_graph(
     The graph flows linearly:
     scrape -> classify -> group -> estimate -> summarize -> END
 
+    With an analysis cache, scrape -> cached_result first and a hit ends the
+    run there; every completed estimate is written back to the cache.
+
+    With image_processing.pipelined_estimation, group and estimate are fused
+    into one dataflow node (group_estimate) that starts each room's estimate
+    as soon as its photo group is final.
+
+    With a checkpointer, state is saved after every node under the run's
+    thread_id (see graph_checkpoints.run_config), so a failed run can be
+    resumed from its last successful node.
+
     Args:
         settings: Application settings (retained for future use)
         idealista_service: Pre-built Idealista scraping service
         classifier_service: Pre-built image classification service
         estimator_service: Pre-built renovation estimation service
+        downloader: Image downloader (base64 pipeline), or None
+        analysis_cache: Whole-analysis result cache, or None to always run
+        checkpointer: LangGraph checkpoint saver, or None for no checkpoints
 
     Returns:
         Compiled StateGraph ready for execution
     """
-    graph = StateGraph(dict)
+    graph = StateGraph(RenovationGraphState)
 
     # IMPORTANT: We wrap each async node in an async function instead of a lambda
     # so LangGraph correctly detects and awaits the coroutine rather than
     # treating the node as a sync function that returns an un-awaited coroutine.
 
+    # Streaming mode moves downloading from scrape into classify so each image is
+    # classified as soon as it arrives, instead of after the slowest download.
+    stream_downloads = (
+        settings.use_base64_images
+        and downloader is not None
+        and settings.image_processing.stream_classification
+    )
+
     async def scrape_with_services(state: GraphState) -> GraphState:
         return await scrape_node(
             state,
             idealista_service=idealista_service,
-            downloader=downloader,
+            downloader=None if stream_downloads else downloader,
             use_base64_images=settings.use_base64_images,
         )
 
-    async def classify_with_services(state: GraphState) -> GraphState:
-        return await classify_node(state, classifier_service=classifier_service)
+    async def classify_with_services(state: GraphState, config: RunnableConfig) -> GraphState:
+        return await classify_node(
+            state,
+            classifier_service=classifier_service,
+            downloader=downloader if stream_downloads else None,
+            estimator_service=estimator_service,
+            floor_plan_prefetch=_floor_plan_prefetch(config),
+        )
 
     async def group_with_services(state: GraphState) -> GraphState:
         return await group_node(state, classifier_service=classifier_service)
 
-    async def estimate_with_services(state: GraphState) -> GraphState:
-        return await estimate_node(state, estimator_service=estimator_service)
+    async def estimate_with_services(state: GraphState, config: RunnableConfig) -> GraphState:
+        return await estimate_node(
+            state,
+            estimator_service=estimator_service,
+            floor_plan_prefetch=_floor_plan_prefetch(config),
+        )
+
+    async def group_estimate_with_services(
+        state: GraphState, config: RunnableConfig
+    ) -> GraphState:
+        return await group_estimate_node(
+            state,
+            classifier_service=classifier_service,
+            estimator_service=estimator_service,
+            floor_plan_prefetch=_floor_plan_prefetch(config),
+        )
 
     async def summarize_with_services(state: GraphState) -> GraphState:
-        return await summarize_node(state, estimator_service=estimator_service)
+        update = await summarize_node(state, estimator_service=estimator_service)
+        if analysis_cache is not None and update.get("estimate") is not None:
+            await analysis_cache.set(state["property_data"], update["estimate"])
+        return update
+
+    async def cached_result_with_cache(state: GraphState) -> GraphState:
+        return await cached_result_node(state, analysis_cache=analysis_cache)
 
     graph.add_node("scrape", scrape_with_services)
     graph.add_node("classify", classify_with_services)
-    graph.add_node("group", group_with_services)
-    graph.add_node("estimate", estimate_with_services)
+    pipelined = settings.image_processing.pipelined_estimation
+    if pipelined:
+        graph.add_node("group_estimate", group_estimate_with_services)
+    else:
+        graph.add_node("group", group_with_services)
+        graph.add_node("estimate", estimate_with_services)
     graph.add_node("summarize", summarize_with_services)
 
     graph.set_entry_point("scrape")
-    graph.add_edge("scrape", "classify")
-    graph.add_edge("classify", "group")
-    graph.add_edge("group", "estimate")
-    graph.add_edge("estimate", "summarize")
+    if analysis_cache is not None:
+        graph.add_node("cached_result", cached_result_with_cache)
+        graph.add_edge("scrape", "cached_result")
+        graph.add_conditional_edges("cached_result", _route_after_cache, ["classify", END])
+    else:
+        graph.add_edge("scrape", "classify")
+    if pipelined:
+        graph.add_edge("classify", "group_estimate")
+        graph.add_edge("group_estimate", "summarize")
+    else:
+        graph.add_edge("classify", "group")
+        graph.add_edge("group", "estimate")
+        graph.add_edge("estimate", "summarize")
     graph.add_edge("summarize", END)
 
-    return graph.compile()
+    return graph.compile(checkpointer=checkpointer)
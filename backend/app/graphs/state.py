@@ -6,9 +6,15 @@ The state accumulates data as it passes through each node:
 scrape -> classify -> group -> estimate -> summarize
 
 Each node reads what it needs from state and adds its results.
+
+PropertyState documents the fields with validation; RenovationGraphState is the
+TypedDict schema the compiled graph actually runs on. Its `stream_events` key is
+backed by an append reducer, so nodes return only the events they emitted and
+never copy the whole event history.
 """
 
-from typing import Any
+import operator
+from typing import Annotated, Any, TypedDict
 
 from pydantic import BaseModel, Field
 
@@ -34,6 +40,10 @@ class PropertyState(BaseModel):
     # These are provided when starting the graph
     url: str = Field(description="Idealista listing URL to analyze")
     user_id: str = Field(default="", description="User ID for tracking (optional)")
+    scrape_max_age: float | None = Field(
+        default=None,
+        description="Oldest cached listing data to accept, in seconds (0 = always re-scrape)",
+    )
 
     # === SCRAPING RESULTS ===
     # Filled by the 'scrape' node
@@ -43,6 +53,9 @@ class PropertyState(BaseModel):
     image_urls: list[str] = Field(
         default_factory=list, description="List of image URLs from the listing"
     )
+    image_tags: dict[str, str] = Field(
+        default_factory=dict, description="Apify room tags keyed by the URLs in image_urls"
+    )
 
     # === CLASSIFICATION RESULTS ===
     # Filled by the 'classify' node
@@ -93,13 +106,48 @@ class PropertyState(BaseModel):
         arbitrary_types_allowed = True
 
 
-def create_initial_state(url: str, user_id: str = "") -> dict[str, Any]:
+class RenovationGraphState(TypedDict, total=False):
+    """
+    LangGraph channel schema for the renovation pipeline.
+
+    Mirrors PropertyState. Every key is a last-value channel except
+    `stream_events`, which appends each node's new events to the run log.
+    """
+
+    url: str
+    user_id: str
+    scrape_max_age: float | None
+    property_data: PropertyData | None
+    image_urls: list[str]
+    image_tags: dict[str, str]
+    classifications: list[ImageClassification]
+    grouped_images: dict[str, list[dict[str, Any]]]
+    floor_plan_urls: list[str]
+    room_analyses: list[RoomAnalysis]
+    floor_plan_analysis: FloorPlanAnalysis | None
+    estimate: RenovationEstimate | None
+    summary: str
+    stream_events: Annotated[list[StreamEvent], operator.add]
+    error: str | None
+    current_step: str
+
+
+def create_initial_state(
+    url: str,
+    user_id: str = "",
+    property_data: PropertyData | None = None,
+    scrape_max_age: float | None = None,
+) -> dict[str, Any]:
     """
     Create the initial state for starting a new analysis.
 
     Args:
         url: Idealista listing URL
         user_id: Optional user ID
+        property_data: Listing already scraped (e.g. by a batch request);
+                       the scrape node then skips Apify
+        scrape_max_age: Oldest cached listing data the scrape node may use,
+                        in seconds; None applies the scrape cache's TTL
 
     Returns:
         Initial state dictionary
@@ -107,8 +155,10 @@ def create_initial_state(url: str, user_id: str = "") -> dict[str, Any]:
     return {
         "url": url,
         "user_id": user_id,
-        "property_data": None,
+        "scrape_max_age": scrape_max_age,
+        "property_data": property_data,
         "image_urls": [],
+        "image_tags": {},
         "classifications": [],
         "grouped_images": {},
         "floor_plan_urls": [],
@@ -26,10 +26,26 @@ from app.constants import API_TITLE, API_VERSION
 from app.graphs.main_graph import build_renovation_graph
 from app.logging_config import setup_logging
 from app.middleware import RequestContextMiddleware
+from app.services.analysis_cache import build_analysis_cache, pipeline_version
+from app.services.analysis_jobs import AnalysisJobManager
+from app.services.classification_cache import build_classification_cache
+from app.services.graph_checkpoints import (
+    build_graph_checkpointer,
+    close_checkpointer,
+    purge_expired,
+)
 from app.services.idealista import IdealistaService
 from app.services.image_classifier import ImageClassifierService
+from app.services.image_dedup import ImageDeduplicator
 from app.services.image_downloader import ImageDownloaderService
+from app.services.image_preparer import ImagePreparer
+from app.services.image_store import ImageStore
+from app.services.local_clustering import LocalRoomClusterer
+from app.services.openai_client import close_openai_clients
+from app.services.raw_data_store import build_raw_data_store
 from app.services.renovation_estimator import RenovationEstimatorService
+from app.services.scrape_cache import build_scrape_cache
+from app.services.single_flight import StreamSingleFlight
 from supabase import acreate_client
 
 # Get settings before logging setup so we know the debug flag
@@ -81,12 +97,46 @@ async def lifespan(_app: FastAPI) -> AsyncGenerator[None, None]:
     _app.state.supabase = supabase_client
 
     # Create services once at startup
-    idealista_service = IdealistaService(settings.apify_token, settings.apify)
+    # Listings scraped recently are served from the cache (stale ones refreshed in the background)
+    scrape_cache = build_scrape_cache(settings.scrape_cache)
+    # Raw actor items are kept compressed off the hot path (graph state, checkpoints, events)
+    raw_data_store = build_raw_data_store(settings.raw_data_store)
+    idealista_service = IdealistaService(
+        settings.apify_token, settings.apify, cache=scrape_cache, raw_store=raw_data_store
+    )
+    classification_cache = build_classification_cache(settings.classification_cache)
+    # Downloaded images live in the store; graph state carries handles and the
+    # store resolves them (downscaled per detail level) when payloads are built.
+    image_preparer: ImagePreparer | None = None
+    image_store: ImageStore | None = None
+    # Near-duplicate photos inherit one classification (needs downloaded bytes)
+    image_deduplicator: ImageDeduplicator | None = None
+    # Bedrooms/bathrooms clustered offline first; GPT only when unsure (same)
+    local_clusterer: LocalRoomClusterer | None = None
+    if settings.use_base64_images:
+        if settings.image_preparation.enabled:
+            image_preparer = ImagePreparer(settings.image_preparation)
+        image_store = ImageStore(
+            settings.image_processing.image_store_max_mb * 1024 * 1024, preparer=image_preparer
+        )
+        if settings.image_dedup.enabled or settings.local_clustering.enabled:
+            # One decode per photo: local clustering reads the deduplicator's thumbnails
+            image_deduplicator = ImageDeduplicator(
+                settings.image_dedup,
+                image_store,
+                keep_thumbnails=settings.local_clustering.enabled,
+            )
+        if settings.local_clustering.enabled:
+            local_clusterer = LocalRoomClusterer(settings.local_clustering, image_deduplicator)
     classifier_service = ImageClassifierService(
         settings.openai_api_key,
         model=settings.openai_classification_model,
         max_concurrent=settings.image_processing.max_concurrent_classifications,
         openai_config=settings.openai_config,
+        cache=classification_cache,
+        image_resolver=image_store,
+        deduplicator=image_deduplicator if settings.image_dedup.enabled else None,
+        local_clusterer=local_clusterer,
     )
     estimator_service = RenovationEstimatorService(
         settings.openai_api_key,
@@ -94,23 +144,67 @@ async def lifespan(_app: FastAPI) -> AsyncGenerator[None, None]:
         max_concurrent=settings.image_processing.max_concurrent_estimations,
         openai_config=settings.openai_config,
         image_processing=settings.image_processing,
+        image_resolver=image_store,
+    )
+    downloader = (
+        ImageDownloaderService(settings.image_processing, image_store=image_store)
+        if settings.use_base64_images
+        else None
     )
-    downloader = ImageDownloaderService(settings.image_processing) if settings.use_base64_images else None
 
     if settings.use_base64_images:
         logger.info("base64_image_pipeline_enabled")
     else:
         logger.info("base64_image_pipeline_disabled", detail="passing URLs directly to OpenAI")
 
+    # Unchanged listings replay their last estimate instead of re-running the pipeline
+    analysis_cache = build_analysis_cache(
+        settings.analysis_cache, pipeline_version(settings), supabase=supabase_client
+    )
+
+    # Per-node checkpoints let a failed analysis resume from its last good node
+    graph_checkpointer = await build_graph_checkpointer(settings.graph_checkpoints)
+    if graph_checkpointer is not None:
+        await purge_expired(graph_checkpointer, settings.graph_checkpoints.retention_seconds)
+
     # Compile graph once and store on app state
     graph = build_renovation_graph(
-        settings, idealista_service, classifier_service, estimator_service, downloader
+        settings,
+        idealista_service,
+        classifier_service,
+        estimator_service,
+        downloader,
+        analysis_cache=analysis_cache,
+        checkpointer=graph_checkpointer,
     )
 
     _app.state.idealista_service = idealista_service
     _app.state.classifier_service = classifier_service
+    _app.state.classification_cache = classification_cache
+    _app.state.analysis_cache = analysis_cache
+    _app.state.image_preparer = image_preparer
+    _app.state.image_store = image_store
     _app.state.estimator_service = estimator_service
     _app.state.graph = graph
+    # Concurrent analyses of the same listing share one graph run; runs (and
+    # chat turns) outlive a dropped SSE connection for the resume grace period
+    resume = settings.stream_resume
+    analysis_flights = StreamSingleFlight(resume.grace_seconds, resume.buffer_events)
+    _app.state.analysis_flights = analysis_flights
+    _app.state.chat_runs = StreamSingleFlight(resume.grace_seconds, resume.buffer_events)
+
+    # Background jobs: bounded worker pool, persisted queue
+    analysis_jobs: AnalysisJobManager | None = None
+    if settings.analysis_jobs.enabled:
+        analysis_jobs = AnalysisJobManager(
+            settings.analysis_jobs,
+            graph,
+            analysis_flights,
+            supabase=supabase_client,
+            idealista=idealista_service,
+        )
+        await analysis_jobs.start()
+    _app.state.analysis_jobs = analysis_jobs
 
     # Compile orchestrator graph once at startup
     orchestrator_graph = build_orchestrator_graph(settings)
@@ -121,7 +215,28 @@ async def lifespan(_app: FastAPI) -> AsyncGenerator[None, None]:
 
     yield
 
+    if analysis_jobs is not None:
+        await analysis_jobs.stop()
     await idealista_service.close()
+    if scrape_cache is not None:
+        scrape_cache.close()
+    if classification_cache is not None:
+        classification_cache.close()
+    if analysis_cache is not None:
+        analysis_cache.close()
+    if raw_data_store is not None:
+        raw_data_store.close()
+    if downloader is not None:
+        await downloader.close()
+    if image_preparer is not None:
+        image_preparer.close()
+    if image_deduplicator is not None:
+        image_deduplicator.close()
+    if local_clusterer is not None:
+        local_clusterer.close()
+    if graph_checkpointer is not None:
+        await close_checkpointer(graph_checkpointer)
+    await close_openai_clients()
     logger.info("api_shutdown")
 
 
@@ -42,6 +42,10 @@ class ImageClassification(BaseModel):
     room_type: RoomType = Field(description="Type of room identified")
     room_number: int = Field(default=1, description="Room number for multiple rooms of same type")
     confidence: float = Field(ge=0.0, le=1.0, description="Classification confidence score")
+    duplicate_of: str | None = Field(
+        default=None,
+        description="Representative image this near-duplicate inherited its classification from",
+    )
 
 
 class RoomCluster(BaseModel):
@@ -168,6 +172,10 @@ class PropertyData(BaseModel):
     virtual_tours: list[dict[str, Any]] = Field(default_factory=list, description="3D tour links (Matterport, etc.)")
 
     raw_data: dict[str, Any] = Field(default_factory=dict, description="Raw scraped data")
+    raw_data_ref: str | None = Field(
+        default=None,
+        description="Property ID of raw_data in the raw data store (raw_data is then empty)",
+    )
 
 
 class RenovationEstimate(BaseModel):
@@ -38,6 +38,44 @@ IMPORTANTE:
 - Se não conseguires distinguir quartos/WCs múltiplos, usa 1"""
 
 
+
+# Prompt for classifying several photos in one call (batched classification mode)
+IMAGE_BATCH_CLASSIFICATION_PROMPT = """Analisa estas {num_images} fotografias de um imóvel em Portugal e identifica a divisão mostrada em cada uma.
+
+Cada fotografia vem precedida do seu índice ("Fotografia 0", "Fotografia 1", ...).
+
+INSTRUÇÕES:
+1. Classifica CADA fotografia de forma independente
+2. Se for quarto ou casa de banho, indica o número (1, 2, 3...) baseado em características únicas
+3. Avalia a tua confiança em cada classificação
+
+TIPOS DE DIVISÃO VÁLIDOS:
+- cozinha: Cozinha
+- sala: Sala de estar/jantar
+- quarto: Quarto (indica número se possível distinguir)
+- casa_de_banho: Casa de banho/WC
+- corredor: Corredor/Hall de entrada
+- varanda: Varanda/Terraço
+- exterior: Vista exterior do edifício/fachada
+- garagem: Garagem
+- arrecadacao: Arrecadação/Despensa
+- planta: Planta/Desenho técnico do imóvel
+- outro: Não identificável ou espaço misto
+
+Responde APENAS em JSON com este formato exato:
+{{
+    "classifications": [
+        {{"index": 0, "room_type": "cozinha", "room_number": 1, "confidence": 0.9}},
+        {{"index": 1, "room_type": "quarto", "room_number": 2, "confidence": 0.7}}
+    ]
+}}
+
+IMPORTANTE:
+- Devolve exatamente UMA entrada por fotografia, com índices de 0 a {last_index}
+- room_number deve ser sempre um número inteiro >= 1 (nunca null ou 0)
+- Se houver apenas uma divisão deste tipo, usa 1
+- confidence entre 0.0 e 1.0"""
+
 # Prompt for analyzing a room's condition and estimating renovation costs
 ROOM_ANALYSIS_PROMPT = """És um especialista em remodelações de imóveis em Portugal. Analisa as fotografias desta divisão e estima os custos de remodelação.
 
@@ -0,0 +1,282 @@
+"""
+Whole-analysis result cache keyed by listing fingerprint.
+
+Users (and the orchestrator's trigger_property_analysis tool) re-run the full
+pipeline for listings that were analysed minutes ago — dozens of GPT calls
+and 30+ seconds for an identical answer. The renovation graph consults this
+cache right after scraping; a hit replays the stored RenovationEstimate as
+stream events and skips classify → group → estimate → summarize entirely.
+
+## Keys and validity
+
+Entries are stored under the Idealista property ID, one per listing, and
+carry two stamps that must both match for a hit:
+
+    fingerprint  sha256(price, sorted image URL set, sha256(description))
+    version      sha256(models, OpenAI call config, feature tier, prompt texts,
+                        ANALYSIS_CACHE_VERSION)
+
+A relisting with new photos or a price change produces a new fingerprint, and
+changing a model or editing a prompt produces a new version, so neither serves
+a stale estimate. Keying by property ID means the fresh result simply
+replaces the outdated one and invalidate(property_id) removes it everywhere.
+
+## Backends
+
+    InMemoryLRUBackend  — per-process, TTL + max_entries eviction
+    SQLiteBackend       — on-disk, survives restarts (table analysis_cache)
+    SupabaseBackend     — shared across instances (migration 003)
+
+Reads go through the tiers in order (memory first) and promote hits into the
+faster tiers with their original age, so reading an entry never extends its
+TTL. Estimates containing fallback room analyses (GPT failed for a room) are
+not stored, so a transient API error is not replayed for a week.
+
+Usage:
+    cache = build_analysis_cache(settings.analysis_cache, pipeline_version(settings))
+    graph = build_renovation_graph(..., analysis_cache=cache)
+    await cache.invalidate("12345678")
+"""
+
+import hashlib
+import json
+from datetime import datetime, timedelta, timezone
+from types import ModuleType
+from typing import Any, Protocol
+
+import structlog
+
+from app.config import AnalysisCacheConfig, Settings
+from app.constants import FALLBACK_CONFIDENCE
+from app.models.property import PropertyData, RenovationEstimate
+from app.prompts import feature_extraction, renovation
+from app.services import supabase_client as db
+from app.services.classification_cache import InMemoryLRUBackend, SQLiteBackend
+from app.services.idealista import extract_property_id
+
+logger = structlog.get_logger(__name__)
+
+# Bump when estimation logic or cost tables change in ways prompts don't capture
+ANALYSIS_CACHE_VERSION = 1
+
+_PROMPT_MODULES: tuple[ModuleType, ...] = (renovation, feature_extraction)
+
+
+def listing_fingerprint(property_data: PropertyData) -> str:
+    """Hash of the listing fields that change the analysis: price, photos, description."""
+    parts = {
+        "price": property_data.price,
+        "images": sorted(set(property_data.image_urls)),
+        "description": hashlib.sha256(property_data.description.encode()).hexdigest(),
+    }
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode()).hexdigest()
+
+
+def pipeline_version(settings: Settings) -> str:
+    """Hash of the models, call parameters and prompt texts that produce an estimate."""
+    prompts = {
+        f"{module.__name__}.{name}": value
+        for module in _PROMPT_MODULES
+        for name, value in vars(module).items()
+        if name.isupper() and isinstance(value, str)
+    }
+    parts = {
+        "schema": ANALYSIS_CACHE_VERSION,
+        "classification_model": settings.openai_classification_model,
+        "vision_model": settings.openai_vision_model,
+        "feature_tier": settings.feature_tier,
+        "openai_config": settings.openai_config.model_dump(),
+        "image_dedup": settings.image_dedup.model_dump(),
+        "local_clustering": settings.local_clustering.model_dump(),
+        "prompts": prompts,
+    }
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode()).hexdigest()[:16]
+
+
+class AnalysisCacheBackend(Protocol):
+    """Storage tier for cached analyses (plain dict payloads)."""
+
+    async def get_with_age(self, key: str) -> tuple[dict[str, Any], float] | None: ...
+
+    async def set(self, key: str, value: dict[str, Any], age: float = 0.0) -> None: ...
+
+    async def delete(self, key: str) -> None: ...
+
+    def close(self) -> None: ...
+
+
+class SupabaseBackend:
+    """Shared tier in the Supabase analysis_cache table; TTL checked on read."""
+
+    def __init__(self, client: Any, ttl_seconds: float | None = None):
+        self.client = client
+        self.ttl_seconds = ttl_seconds
+
+    async def get(self, key: str) -> dict[str, Any] | None:
+        entry = await self.get_with_age(key)
+        return entry[0] if entry is not None else None
+
+    async def get_with_age(self, key: str) -> tuple[dict[str, Any], float] | None:
+        """Return (value, age_seconds), or None if missing or expired."""
+        row = await db.get_analysis_cache_entry(self.client, key)
+        if not row:
+            return None
+        created_at = datetime.fromisoformat(row["created_at"])
+        age = (datetime.now(timezone.utc) - created_at).total_seconds()
+        if self.ttl_seconds is not None and age > self.ttl_seconds:
+            return None
+        return row["value"], age
+
+    async def set(self, key: str, value: dict[str, Any], age: float = 0.0) -> None:
+        """Store value; age backdates its created_at (an entry copied from another tier)."""
+        created_at = datetime.now(timezone.utc) - timedelta(seconds=age)
+        await db.upsert_analysis_cache_entry(self.client, key, value, created_at)
+
+    async def delete(self, key: str) -> None:
+        await db.delete_analysis_cache_entry(self.client, key)
+
+    def close(self) -> None:
+        """Nothing to release: the Supabase client is owned by the app."""
+
+
+class AnalysisCache:
+    """Read-through tiered cache of RenovationEstimate results with hit/miss counters."""
+
+    def __init__(self, backends: list[AnalysisCacheBackend], version: str):
+        """
+        Args:
+            backends: Storage tiers, fastest first. Hits in a later tier are
+                      copied into every earlier tier.
+            version:  pipeline_version() of the running configuration.
+        """
+        self.backends = backends
+        self.version = version
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.stores = 0
+        self.invalidations = 0
+
+    async def get(self, url: str, property_data: PropertyData) -> RenovationEstimate | None:
+        """
+        Look up a cached estimate for a freshly scraped listing.
+
+        Args:
+            url:           URL being analysed (the replayed estimate is re-bound to it).
+            property_data: Scraped listing; its fingerprint must match the entry's.
+
+        Returns:
+            RenovationEstimate carrying the fresh property_data, or None on a miss.
+        """
+        property_id = extract_property_id(property_data.url) or extract_property_id(url)
+        if property_id is None:
+            return None
+        fingerprint = listing_fingerprint(property_data)
+
+        for tier, backend in enumerate(self.backends):
+            try:
+                entry = await backend.get_with_age(property_id)
+            except Exception as e:
+                logger.warning("analysis_cache_read_error", tier=tier, error=str(e))
+                continue
+            if entry is None:
+                continue
+            value, age = entry
+            if value.get("fingerprint") != fingerprint or value.get("version") != self.version:
+                self.stale += 1
+                continue
+            for faster_tier, faster in enumerate(self.backends[:tier]):
+                try:
+                    await faster.set(property_id, value, age=age)
+                except Exception as e:
+                    logger.warning("analysis_cache_write_error", tier=faster_tier, error=str(e))
+            self.hits += 1
+            logger.info("analysis_cache_hit", property_id=property_id, tier=tier)
+            estimate = RenovationEstimate.model_validate(value["estimate"])
+            return estimate.model_copy(update={"property_url": url, "property_data": property_data})
+
+        self.misses += 1
+        return None
+
+    async def set(self, property_data: PropertyData, estimate: RenovationEstimate) -> None:
+        """Store an estimate. Estimates with fallback room analyses are skipped."""
+        property_id = extract_property_id(property_data.url)
+        if property_id is None:
+            return
+        if any(r.confidence <= FALLBACK_CONFIDENCE for r in estimate.room_analyses):
+            logger.info("analysis_cache_skip_degraded", property_id=property_id)
+            return
+        value = {
+            "fingerprint": listing_fingerprint(property_data),
+            "version": self.version,
+            # property_data is re-attached from the fresh scrape on every hit
+            "estimate": estimate.model_dump(mode="json", exclude={"property_data"}),
+        }
+        for tier, backend in enumerate(self.backends):
+            try:
+                await backend.set(property_id, value)
+            except Exception as e:
+                logger.warning("analysis_cache_write_error", tier=tier, error=str(e))
+        self.stores += 1
+
+    async def invalidate(self, property_id: str) -> None:
+        """Drop the cached analysis for an Idealista property ID from every tier."""
+        for tier, backend in enumerate(self.backends):
+            try:
+                await backend.delete(property_id)
+            except Exception as e:
+                logger.warning("analysis_cache_delete_error", tier=tier, error=str(e))
+        self.invalidations += 1
+        logger.info("analysis_cache_invalidated", property_id=property_id)
+
+    def close(self) -> None:
+        """Close every tier (releases the SQLite connection)."""
+        for backend in self.backends:
+            backend.close()
+
+    def stats(self) -> dict[str, Any]:
+        """Hit/miss counters; stale counts entries rejected for a changed fingerprint/version."""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale": self.stale,
+            "stores": self.stores,
+            "invalidations": self.invalidations,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "version": self.version,
+        }
+
+
+def build_analysis_cache(
+    config: AnalysisCacheConfig, version: str, supabase: Any = None
+) -> AnalysisCache | None:
+    """
+    Create the cache described by config, or None when caching is disabled.
+
+    Every backend puts an in-process LRU in front; "sqlite" adds an on-disk
+    store and "supabase" the shared table (falls back to memory only when no
+    Supabase client is configured).
+    """
+    if not config.enabled:
+        return None
+
+    backends: list[AnalysisCacheBackend] = [
+        InMemoryLRUBackend(config.max_memory_entries, config.ttl_seconds)
+    ]
+    if config.backend == "sqlite":
+        backends.append(
+            SQLiteBackend(
+                config.sqlite_path, config.max_entries, config.ttl_seconds, table="analysis_cache"
+            )
+        )
+    elif config.backend == "supabase":
+        if supabase is not None:
+            backends.append(SupabaseBackend(supabase, config.ttl_seconds))
+        else:
+            logger.warning("analysis_cache_supabase_unavailable", detail="using memory only")
+    elif config.backend != "memory":
+        raise ValueError(f"Unknown analysis cache backend: {config.backend!r}")
+
+    logger.info("analysis_cache_enabled", backend=config.backend, version=version)
+    return AnalysisCache(backends, version)
@@ -0,0 +1,305 @@
+"""
+Background analysis jobs: a priority queue drained by a bounded worker pool.
+
+POST /api/v1/analyze runs the graph inside the request's SSE generator, so a
+disconnect or a worker restart kills the work and nothing caps how many
+analyses hit OpenAI at once. Job mode decouples the two:
+
+    submit()       admission control (429 past max_queued), then enqueue
+    workers        `workers` tasks pull (priority, submission order) from an
+                   asyncio.PriorityQueue and run the analysis through the same
+                   single-flight registry as the streaming endpoint
+    job.log        SharedRun event log: clients attach at any time, replay
+                   what was emitted so far and follow the rest live
+
+Job records persist to SQLite (one JSON row per job) on submit, on start and
+on completion, events included once finished. On startup, jobs that were
+queued or running when the process stopped are queued again — a running
+job restarts from scratch, since its in-memory progress died with the
+process. Finished jobs stay replayable until retention_seconds.
+
+Only job-mode analyses count against `workers`: /analyze, /analyze/sync and
+/analyze/batch still run on the request, as before.
+
+Usage:
+    jobs = AnalysisJobManager(settings.analysis_jobs, graph, flights)
+    await jobs.start()
+    job = await jobs.submit(url, user_id, priority=0)
+    async for event in job.log.subscribe():
+        ...
+    await jobs.stop()
+"""
+
+import asyncio
+import itertools
+import time
+import uuid
+from enum import Enum
+from typing import Any
+
+import structlog
+from pydantic import BaseModel, Field, PrivateAttr
+
+from app.config import AnalysisJobsConfig
+from app.services.analysis_persistence import persist_analysis_to_db
+from app.services.analysis_runs import join_analysis, unexpected_error_event
+from app.services.idealista import IdealistaService
+from app.services.single_flight import SharedRun, StreamSingleFlight
+from app.services.sqlite_store import SQLiteKVStore
+
+logger = structlog.get_logger(__name__)
+
+
+class JobStatus(str, Enum):
+    """Lifecycle of an analysis job."""
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+
+
+FINISHED_STATUSES = {JobStatus.SUCCEEDED, JobStatus.FAILED}
+
+
+class JobQueueFullError(Exception):
+    """Raised by submit() when admission control rejects a job."""
+
+
+class AnalysisJob(BaseModel):
+    """A queued, running or finished background analysis."""
+
+    id: str = Field(default_factory=lambda: uuid.uuid4().hex)
+    url: str
+    user_id: str = ""
+    priority: int = 5
+    status: JobStatus = JobStatus.QUEUED
+    created_at: float = Field(default_factory=time.time)
+    started_at: float | None = None
+    finished_at: float | None = None
+    attempts: int = 0
+    error: str | None = None
+    estimate: dict[str, Any] | None = None
+    events: list[dict[str, Any]] = Field(default_factory=list)
+
+    _log: SharedRun | None = PrivateAttr(default=None)
+
+    @property
+    def log(self) -> SharedRun:
+        """Replayable event log; already finished for jobs loaded from storage."""
+        if self._log is None:
+            self._log = SharedRun(self.id)
+            for event in self.events:
+                self._log.publish(event)
+            if self.status in FINISHED_STATUSES:
+                self._log.finish()
+        return self._log
+
+
+class AnalysisJobManager:
+    """Owns the job queue, the worker pool and the job store."""
+
+    def __init__(
+        self,
+        config: AnalysisJobsConfig,
+        graph: Any,
+        flights: StreamSingleFlight | None = None,
+        supabase: Any = None,
+        idealista: IdealistaService | None = None,
+    ):
+        """
+        Args:
+            config:   Pool size, admission limit and storage settings.
+            graph:    Compiled renovation graph.
+            flights:  Single-flight registry shared with the streaming
+                      endpoints, so a job and an SSE request for the same
+                      listing share one run.
+            supabase: Optional Supabase client; finished estimates are
+                      persisted for the job's user like streamed ones.
+            idealista: Scraping service, to persist the raw Apify payload
+                      kept in its raw data store.
+        """
+        if config.backend not in ("memory", "sqlite"):
+            raise ValueError(f"Unknown analysis jobs backend: {config.backend!r}")
+        self.config = config
+        self.graph = graph
+        self.flights = flights or StreamSingleFlight()
+        self.supabase = supabase
+        self.idealista = idealista
+        path = config.sqlite_path if config.backend == "sqlite" else ":memory:"
+        self.store = SQLiteKVStore(path, table="analysis_jobs")
+        self._queue: asyncio.PriorityQueue[tuple[int, int, str]] = asyncio.PriorityQueue()
+        self._order = itertools.count()
+        self._active: dict[str, AnalysisJob] = {}
+        self._workers: list[asyncio.Task[None]] = []
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    # --- lifecycle ---
+
+    async def start(self) -> None:
+        """Purge expired jobs, re-queue interrupted ones and start the workers."""
+        await self.store.purge_expired(self.config.retention_seconds)
+        jobs = [AnalysisJob.model_validate_json(raw) for _, raw in await self.store.items()]
+        interrupted = [job for job in jobs if job.status not in FINISHED_STATUSES]
+        # Store rows are ordered by last write; re-queue in submission order
+        for job in sorted(interrupted, key=lambda j: j.created_at):
+            job.status = JobStatus.QUEUED
+            job.events = []
+            await self._enqueue(job)
+
+        self._workers = [
+            asyncio.create_task(self._worker(i)) for i in range(self.config.workers)
+        ]
+        logger.info(
+            "analysis_jobs_started", workers=self.config.workers, requeued=len(interrupted)
+        )
+
+    async def stop(self) -> None:
+        """Cancel the workers. Unfinished jobs stay queued in the store."""
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        self.store.close()
+
+    # --- API ---
+
+    async def submit(self, url: str, user_id: str = "", priority: int | None = None) -> AnalysisJob:
+        """
+        Queue an analysis.
+
+        Args:
+            url:      Idealista listing URL.
+            user_id:  Owner of the job (only they can read it).
+            priority: 0 (most urgent) … 9; defaults to config.default_priority.
+
+        Raises:
+            JobQueueFullError: When max_queued jobs are already waiting.
+        """
+        if self._queue.qsize() >= self.config.max_queued:
+            self.rejected += 1
+            raise JobQueueFullError(f"{self._queue.qsize()} analyses already queued")
+        job = AnalysisJob(
+            url=url,
+            user_id=user_id,
+            priority=self.config.default_priority if priority is None else priority,
+        )
+        await self._enqueue(job)
+        logger.info("analysis_job_submitted", job_id=job.id, priority=job.priority)
+        return job
+
+    async def get(self, job_id: str) -> AnalysisJob | None:
+        """Active job (live log) or a finished one from the store."""
+        job = self._active.get(job_id)
+        if job is not None:
+            return job
+        raw = await self.store.get(job_id)
+        return AnalysisJob.model_validate_json(raw) if raw is not None else None
+
+    def stats(self) -> dict[str, Any]:
+        """Queue depth, running jobs and lifetime outcome counters."""
+        running = sum(1 for j in self._active.values() if j.status == JobStatus.RUNNING)
+        return {
+            "workers": len(self._workers),
+            "queued": self._queue.qsize(),
+            "running": running,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+        }
+
+    # --- internals ---
+
+    async def _enqueue(self, job: AnalysisJob) -> None:
+        self._active[job.id] = job
+        await self._save(job)
+        self._queue.put_nowait((job.priority, next(self._order), job.id))
+
+    async def _save(self, job: AnalysisJob) -> None:
+        await self.store.set(job.id, job.model_dump_json().encode())
+
+    async def _worker(self, index: int) -> None:
+        while True:
+            _, _, job_id = await self._queue.get()
+            job = self._active.get(job_id)
+            try:
+                if job is not None:
+                    await self._run(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("analysis_job_worker_error", job_id=job_id, error=str(e))
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job: AnalysisJob) -> None:
+        """Run a job to a terminal status; any failure (store, persistence) marks it failed."""
+        try:
+            await self._execute(job)
+        except Exception as e:
+            logger.error("analysis_job_error", job_id=job.id, error=str(e))
+            job.log.publish(unexpected_error_event(e))
+            job.error = str(e)
+        await self._finish(job)
+
+    async def _execute(self, job: AnalysisJob) -> None:
+        job.status = JobStatus.RUNNING
+        job.started_at = time.time()
+        job.attempts += 1
+        await self._save(job)
+        logger.info(
+            "analysis_job_started", job_id=job.id, queue_wait=job.started_at - job.created_at
+        )
+
+        run = join_analysis(self.flights, self.graph, job.url, job.user_id)
+        try:
+            async for event in run.subscribe():
+                job.log.publish(event)
+        finally:
+            self.flights.leave(run)
+
+        final_state = run.result or {}
+        estimate = final_state.get("estimate")
+        if run.error is not None:
+            job.log.publish(unexpected_error_event(run.error))
+            job.error = str(run.error)
+        elif final_state.get("error"):
+            job.error = final_state["error"]
+        elif estimate is None:
+            job.error = "Não foi possível gerar a estimativa"
+        else:
+            job.estimate = estimate.model_dump(mode="json")
+            if self.supabase:
+                await persist_analysis_to_db(
+                    self.supabase,
+                    job.url,
+                    job.user_id,
+                    estimate.model_dump(),
+                    idealista=self.idealista,
+                )
+
+    async def _finish(self, job: AnalysisJob) -> None:
+        """Close the job's log, store the result and retire the job from the active set."""
+        job.status = JobStatus.FAILED if job.error else JobStatus.SUCCEEDED
+        job.finished_at = time.time()
+        job.events = list(job.log.events)
+        job.log.finish()
+        if job.error:
+            self.failed += 1
+        else:
+            self.completed += 1
+        try:
+            await self._save(job)
+        except Exception as e:
+            # The row keeps its last stored status and is re-queued on restart
+            logger.error("analysis_job_save_error", job_id=job.id, error=str(e))
+        # Only now: get() falls back to the store for jobs no longer active
+        del self._active[job.id]
+        logger.info(
+            "analysis_job_finished",
+            job_id=job.id,
+            status=job.status.value,
+            seconds=round(job.finished_at - (job.started_at or job.created_at), 3),
+        )
@@ -3,6 +3,10 @@ Shared helper for persisting a completed renovation analysis to Supabase.
 
 Used by both the analyze endpoint (POST /api/v1/analyze) and the
 trigger_property_analysis orchestrator tool so the DB logic lives in one place.
+
+The estimate's property_data carries only raw_data_ref when the raw Apify
+payload was moved to the raw data store; it is loaded back (through the
+IdealistaService passed in) so properties.raw_scraped_data keeps the full item.
 """
 
 import re
@@ -10,17 +14,35 @@ import re
 import structlog
 
 from app.agents.summaries import generate_analysis_chat_summary, generate_portfolio_index_line
+from app.models.property import PropertyData
 from app.services import supabase_client as db
+from app.services.idealista import IdealistaService
 
 logger = structlog.get_logger(__name__)
 
 
+async def _raw_scraped_data(prop_data: dict, idealista: IdealistaService | None) -> dict:
+    """The listing as scraped, raw_data loaded back from the raw data store."""
+    if idealista is None or prop_data.get("raw_data") or not prop_data.get("raw_data_ref"):
+        return prop_data
+    try:
+        raw_data = await idealista.load_raw_data(PropertyData.model_validate(prop_data))
+    except Exception as e:
+        logger.warning("analysis_raw_data_load_failed", error=str(e))
+        raw_data = {}
+    if not raw_data:
+        logger.warning("analysis_raw_data_unavailable", raw_data_ref=prop_data["raw_data_ref"])
+        return prop_data
+    return {**prop_data, "raw_data": raw_data, "raw_data_ref": None}
+
+
 async def persist_analysis_to_db(
     supabase: object,
     url: str,
     user_id: str,
     estimate_dict: dict,
     conversation_id: str | None = None,
+    idealista: IdealistaService | None = None,
 ) -> str | None:
     """
     Persist a completed renovation analysis to Supabase.
@@ -31,6 +53,8 @@ async def persist_analysis_to_db(
         user_id: Authenticated user ID.
         estimate_dict: Serialized RenovationEstimate dict (result of model_dump()).
         conversation_id: Optional chat conversation ID for audit log.
+        idealista: Service whose raw data store holds the listing's raw Apify
+                   payload (property_data.raw_data_ref), or None.
 
     Returns:
         The property_id (UUID string) on success, None on failure.
@@ -73,7 +97,7 @@ async def persist_analysis_to_db(
             "location": prop_data.get("location"),
             "description": prop_data.get("description"),
             "image_urls": prop_data.get("image_urls"),
-            "raw_scraped_data": prop_data,
+            "raw_scraped_data": await _raw_scraped_data(prop_data, idealista),
             "price_per_m2": prop_data.get("price_per_m2"),
         }
 
@@ -0,0 +1,281 @@
+"""
+Shared analysis runs — one renovation graph execution per listing at a time.
+
+Used by the analyze endpoints (POST /api/v1/analyze, /analyze/sync) and the
+trigger_property_analysis orchestrator tool. Concurrent requests for the same
+Idealista listing join the run already in flight through a StreamSingleFlight
+registry: they replay the events emitted so far and then follow it live,
+instead of paying for a second scrape and a second set of GPT calls.
+
+Each subscriber still does its own per-user work (DB persistence) with the
+shared run's final state.
+
+Usage:
+    run = join_analysis(flights, graph, url, user_id)
+    try:
+        async for event in run.subscribe():   # StreamEvent dicts
+            ...
+    finally:
+        flights.leave(run)
+    final_state = run.result                  # run.error if the run failed
+
+A client whose SSE connection dropped reconnects with Last-Event-ID;
+resume_or_join_analysis() re-attaches it to the same run so it only receives
+the events it missed.
+
+With a checkpointing graph, each run is checkpointed under its run id.
+A run that failed (or was cut off) can be continued with resume_analysis():
+it replays the events up to the last node that succeeded, then runs the
+remaining nodes on the stored state. Checkpoints of completed runs are
+dropped.
+"""
+
+from typing import Any
+
+import structlog
+
+from app.constants import PIPELINE_TOTAL_STEPS
+from app.graphs.main_graph import with_floor_plan_prefetch
+from app.graphs.state import create_initial_state
+from app.models.property import PropertyData
+from app.services.graph_checkpoints import discard_run, graph_checkpointer, run_config
+from app.services.idealista import extract_property_id
+from app.services.renovation_estimator import FloorPlanPrefetch
+from app.services.single_flight import SharedRun, StreamSingleFlight, parse_event_id
+
+logger = structlog.get_logger(__name__)
+
+
+def analysis_key(url: str) -> str:
+    """Deduplication key: the Idealista property ID, or the URL if it has none."""
+    property_id = extract_property_id(url)
+    return f"idealista:{property_id}" if property_id else url
+
+
+async def produce_analysis(
+    graph: Any,
+    url: str,
+    user_id: str,
+    run: SharedRun,
+    property_data: PropertyData | None = None,
+    scrape_max_age: float | None = None,
+) -> dict[str, Any]:
+    """
+    Execute the renovation graph once, publishing its stream events on run.
+
+    Runs in "custom" + "updates" stream mode: custom chunks are the live
+    StreamEvents (published as dicts), update chunks are node deltas merged —
+    minus the event log, already published — into the returned final state.
+    A checkpointing graph saves the run under run.id. With property_data
+    (already scraped), the graph does not call Apify; scrape_max_age bounds
+    the age of cached listing data it may use instead (0 forces a scrape).
+    """
+    initial_state = create_initial_state(url, user_id, property_data, scrape_max_age)
+    return await _stream_graph(graph, initial_state, run_config(run.id), run, {})
+
+
+async def _stream_graph(
+    graph: Any,
+    graph_input: dict[str, Any] | None,
+    config: dict[str, Any],
+    run: SharedRun,
+    final_state: dict[str, Any],
+) -> dict[str, Any]:
+    """
+    Publish a graph execution's events on run and merge its deltas into final_state.
+
+    The run's floor plan prefetch is cancelled when the execution ends, so a
+    failed or cancelled run (client gone) makes no GPT call after it.
+    """
+    prefetch = FloorPlanPrefetch()
+    try:
+        async for mode, chunk in graph.astream(
+            graph_input,
+            config=with_floor_plan_prefetch(config, prefetch),
+            stream_mode=["custom", "updates"],
+        ):
+            if mode == "custom":
+                run.publish(_event_dict(chunk))
+                continue
+
+            # "updates" chunks are wrapped in a {node_name: delta} dict
+            for delta in chunk.values():
+                if isinstance(delta, dict):
+                    final_state.update(
+                        (key, value) for key, value in delta.items() if key != "stream_events"
+                    )
+    finally:
+        prefetch.cancel()
+
+    if not final_state.get("error"):
+        await discard_run(graph, run.id)
+    return final_state
+
+
+def _event_dict(event: Any) -> dict[str, Any]:
+    return event.model_dump() if hasattr(event, "model_dump") else event
+
+
+async def run_state(graph: Any, run_id: str) -> dict[str, Any] | None:
+    """
+    Latest checkpointed state of a run.
+
+    Returns:
+        The state values, or None when the graph has no checkpointer or the
+        run has no checkpoints (unknown, completed or expired).
+    """
+    if graph_checkpointer(graph) is None:
+        return None
+    snapshot = await graph.aget_state(run_config(run_id))
+    return snapshot.values or None
+
+
+async def produce_resumed_analysis(graph: Any, run_id: str, run: SharedRun) -> dict[str, Any]:
+    """
+    Continue a checkpointed run from the last node that succeeded.
+
+    Nodes record failures in state["error"] instead of raising, so the run's
+    newest checkpoint without an error is the last good one. Its events are
+    replayed, then the graph is forked there and the remaining nodes run on
+    the stored state — no new scrape or classification when those nodes had
+    succeeded. Room analyses checkpointed by a failed estimate are carried
+    onto the fork, so only the rooms that failed are analysed again.
+    """
+    history = [snapshot async for snapshot in graph.aget_state_history(run_config(run_id))]
+    latest = history[0]
+    good = next(snapshot for snapshot in history if not snapshot.values.get("error"))
+
+    for event in good.values.get("stream_events", []):
+        run.publish(_event_dict(event))
+    final_state = {
+        key: value for key, value in good.values.items() if key != "stream_events"
+    }
+    if not good.next:
+        # Completed before the checkpoints could be dropped: nothing to re-run
+        await discard_run(graph, run_id)
+        return final_state
+
+    room_analyses = latest.values.get("room_analyses") or good.values.get("room_analyses") or []
+    config = await graph.aupdate_state(good.config, {"room_analyses": room_analyses})
+    logger.info(
+        "analysis_resumed",
+        run_id=run_id,
+        next_node=good.next[0],
+        rooms_done=len(room_analyses),
+    )
+    return await _stream_graph(graph, None, config, run, final_state)
+
+
+def unexpected_error_event(error: BaseException) -> dict[str, Any]:
+    """Terminal error event sent when the run itself failed (not a node error)."""
+    return {
+        "type": "error",
+        "message": f"Erro inesperado: {str(error)}",
+        "step": 0,
+        "total_steps": PIPELINE_TOTAL_STEPS,
+    }
+
+
+def join_analysis(
+    flights: StreamSingleFlight,
+    graph: Any,
+    url: str,
+    user_id: str = "",
+    property_data: PropertyData | None = None,
+    scrape_max_age: float | None = None,
+) -> SharedRun:
+    """
+    Join the in-flight analysis of url's listing, or start one.
+
+    property_data, when given, seeds a new run with the already-scraped
+    listing. scrape_max_age limits the run's use of cached listing data; a
+    run already in flight may have used older data, so a caller that sets it
+    always starts a separate run (flights.start) that later joins do not
+    coalesce into. Pair with flights.leave(run) when done listening.
+    """
+
+    async def _produce(run: SharedRun) -> dict[str, Any]:
+        return await produce_analysis(graph, url, user_id, run, property_data, scrape_max_age)
+
+    if scrape_max_age is not None:
+        return flights.start(analysis_key(url), _produce)
+    return flights.join(analysis_key(url), _produce)
+
+
+def resume_or_join_analysis(
+    flights: StreamSingleFlight,
+    graph: Any,
+    url: str,
+    user_id: str = "",
+    last_event_id: str | None = None,
+) -> tuple[SharedRun, int]:
+    """
+    Re-attach to the run named in last_event_id, or fall back to join_analysis.
+
+    Returns:
+        (run, seq): iterate run.follow(after=seq); seq is 0 unless resumed.
+        Pair with flights.leave(run) when done listening.
+    """
+    resume_from = parse_event_id(last_event_id)
+    if resume_from is not None:
+        run_id, seq = resume_from
+        run = flights.resume(run_id, analysis_key(url))
+        if run is not None:
+            return run, seq
+        logger.info("analysis_resume_missed", run_id=run_id)
+    return join_analysis(flights, graph, url, user_id), 0
+
+
+def resume_analysis(
+    flights: StreamSingleFlight, graph: Any, run_id: str, url: str
+) -> SharedRun:
+    """
+    Continue the checkpointed run run_id of url's listing.
+
+    Joins an analysis of the listing already in flight (including run_id
+    itself, if it is still running); otherwise starts produce_resumed_analysis
+    under the same run id, so the resumed stream's event ids — and a later
+    resume — still name the original run. Pair with flights.leave(run).
+    """
+
+    async def _produce(run: SharedRun) -> dict[str, Any]:
+        return await produce_resumed_analysis(graph, run_id, run)
+
+    return flights.join(analysis_key(url), _produce, run_id=run_id)
+
+
+def resume_or_reattach_analysis(
+    flights: StreamSingleFlight,
+    graph: Any,
+    run_id: str,
+    url: str,
+    last_event_id: str | None = None,
+) -> tuple[SharedRun, int]:
+    """
+    Re-attach a dropped resume stream to its run, or resume run_id.
+
+    last_event_id is honoured only for a run of run_id still in flight or one
+    that finished without an error. A failed run — typically the original run
+    the client asked to resume, retained for the grace period under the same
+    id — would only replay its failure, so it is resumed instead.
+
+    Returns:
+        (run, seq): iterate run.follow(after=seq); seq is 0 unless re-attached.
+        Pair with flights.leave(run) when done listening.
+    """
+    resume_from = parse_event_id(last_event_id)
+    if resume_from is not None and resume_from[0] == run_id:
+        run = flights.resume(run_id, analysis_key(url))
+        if run is not None and not _failed(run):
+            return run, resume_from[1]
+        if run is not None:
+            flights.leave(run)
+            logger.info("analysis_reattach_skipped_failed_run", run_id=run_id)
+    return resume_analysis(flights, graph, run_id, url), 0
+
+
+def _failed(run: SharedRun) -> bool:
+    """Whether a finished run raised or ended with a node error in its final state."""
+    if not run.done:
+        return False
+    return run.error is not None or bool((run.result or {}).get("error"))
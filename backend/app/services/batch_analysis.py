@@ -0,0 +1,215 @@
+"""
+Batch analyses — many Idealista listings in one request.
+
+Investors paste 30–100 listings at a time. Sent as separate /analyze calls,
+each listing pays for its own Apify standby request and the client decides
+how many run at once. analyze_batch() takes the whole list instead:
+
+    dedupe     listings keyed like single analyses (analysis_key), so the
+               same property pasted twice is analysed once
+    scrape     one multi-URL Apify request for every listing
+               (IdealistaService.scrape_properties), read incrementally
+    schedule   each listing's graph run starts as soon as its NDJSON line
+               arrives, max_concurrent_listings at a time; the others wait
+               in arrival order. Their classification and estimation calls
+               go through the process-wide classifier/estimator semaphores
+               and OpenAI rate limiter, so the whole batch shares one budget
+               with every other analysis in the process
+    stream     one result (or error) event per listing as soon as it
+               finishes, then a summary event
+
+Listings run through the same single-flight registry as POST /analyze: a
+listing already being analysed for another request is joined, not re-run,
+and the analysis cache still replays unchanged listings after the scrape.
+
+Usage:
+    async for event in analyze_batch(urls, user_id, graph, idealista, flights, config):
+        ...  # StreamEvent dicts
+"""
+
+import asyncio
+import time
+from collections.abc import AsyncGenerator
+from typing import Any
+
+import structlog
+
+from app.config import BatchAnalysisConfig
+from app.constants import PIPELINE_TOTAL_STEPS
+from app.models.property import PropertyData, StreamEvent
+from app.services.analysis_persistence import persist_analysis_to_db
+from app.services.analysis_runs import analysis_key, join_analysis
+from app.services.idealista import IdealistaService, extract_property_id
+from app.services.single_flight import StreamSingleFlight
+
+logger = structlog.get_logger(__name__)
+
+
+def dedupe_listings(urls: list[str]) -> tuple[list[str], int]:
+    """
+    Drop URLs naming a listing that appears earlier in the list.
+
+    Returns:
+        (unique URLs in submission order, number of duplicates dropped)
+    """
+    unique: dict[str, str] = {}
+    for url in urls:
+        unique.setdefault(analysis_key(url), url)
+    return list(unique.values()), len(urls) - len(unique)
+
+
+def _event(type_: str, message: str, step: int, data: dict[str, Any]) -> dict[str, Any]:
+    return StreamEvent(
+        type=type_, message=message, step=step, total_steps=PIPELINE_TOTAL_STEPS, data=data
+    ).model_dump()
+
+
+async def _analyze_listing(
+    url: str,
+    scraped: PropertyData | Exception,
+    user_id: str,
+    graph: Any,
+    flights: StreamSingleFlight,
+    supabase: Any = None,
+    idealista: IdealistaService | None = None,
+) -> tuple[str, dict[str, Any] | None, str | None]:
+    """
+    Run (or join) one listing's analysis on its pre-scraped data.
+
+    Returns:
+        (url, estimate dict or None, error message or None)
+    """
+    if isinstance(scraped, Exception):
+        return url, None, f"Erro ao obter dados: {scraped}"
+
+    run = join_analysis(flights, graph, url, user_id, scraped)
+    try:
+        final_state = await run.wait() or {}
+    except Exception as e:
+        return url, None, f"Erro inesperado: {e}"
+    finally:
+        flights.leave(run)
+
+    if final_state.get("error"):
+        return url, None, final_state["error"]
+    estimate = final_state.get("estimate")
+    if estimate is None:
+        return url, None, "Não foi possível gerar a estimativa"
+    if supabase:
+        await persist_analysis_to_db(
+            supabase, url, user_id, estimate.model_dump(), idealista=idealista
+        )
+    return url, estimate.model_dump(mode="json"), None
+
+
+async def analyze_batch(
+    urls: list[str],
+    user_id: str,
+    graph: Any,
+    idealista_service: IdealistaService,
+    flights: StreamSingleFlight,
+    config: BatchAnalysisConfig,
+    supabase: Any = None,
+) -> AsyncGenerator[dict[str, Any], None]:
+    """
+    Analyse many listings, yielding each one's outcome as soon as it is known.
+
+    Closing the generator (client disconnect) cancels the listings still
+    running — each one leaves its shared run, which stops once no other
+    request follows it.
+
+    Yields:
+        StreamEvent dicts: a "status" event with the batch size, one
+        "result" (data.estimate) or "error" event per listing — both carry
+        data.url, data.property_id and data.current / data.total — and a
+        final "status" event with the batch counters.
+    """
+    start = time.perf_counter()
+    listings, duplicates = dedupe_listings(urls)
+    total = len(listings)
+    logger.info("batch_analysis_started", listings=total, duplicates=duplicates)
+    yield _event(
+        "status",
+        f"A obter dados de {total} imóveis...",
+        1,
+        {"listings": total, "duplicates": duplicates},
+    )
+
+    num_workers = min(config.max_concurrent_listings, total)
+    scraped: asyncio.Queue[tuple[str, PropertyData | Exception] | None] = asyncio.Queue()
+    finished: asyncio.Queue[tuple[str, dict[str, Any] | None, str | None]] = asyncio.Queue()
+
+    async def _scrape() -> None:
+        # Listings are handed to the workers as their NDJSON lines arrive
+        missing = set(listings)
+        try:
+            async for url, result in idealista_service.scrape_properties(listings):
+                missing.discard(url)
+                scraped.put_nowait((url, result))
+        except Exception as e:
+            logger.error("batch_scrape_failed", error=str(e), unscraped=len(missing))
+            for url in listings:
+                if url in missing:
+                    scraped.put_nowait((url, e))
+        finally:
+            for _ in range(num_workers):
+                scraped.put_nowait(None)
+
+    async def _worker() -> None:
+        while (listing := await scraped.get()) is not None:
+            url, result = listing
+            finished.put_nowait(
+                await _analyze_listing(
+                    url, result, user_id, graph, flights, supabase, idealista_service
+                )
+            )
+
+    tasks = [asyncio.create_task(_scrape())]
+    tasks += [asyncio.create_task(_worker()) for _ in range(num_workers)]
+    failed = 0
+    try:
+        for current in range(1, total + 1):
+            url, estimate, error = await finished.get()
+            listing = {
+                "url": url,
+                "property_id": extract_property_id(url),
+                "current": current,
+                "total": total,
+            }
+            if error is not None:
+                failed += 1
+                yield _event("error", error, 0, listing)
+            else:
+                yield _event(
+                    "result",
+                    f"Imóvel {current}/{total} analisado",
+                    PIPELINE_TOTAL_STEPS,
+                    {**listing, "estimate": estimate},
+                )
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    seconds = time.perf_counter() - start
+    listings_per_minute = round(total / seconds * 60, 1) if seconds > 0 else 0.0
+    logger.info(
+        "batch_analysis_finished",
+        listings=total,
+        failed=failed,
+        seconds=round(seconds, 3),
+        listings_per_minute=listings_per_minute,
+    )
+    yield _event(
+        "status",
+        f"Análise concluída: {total - failed} de {total} imóveis",
+        PIPELINE_TOTAL_STEPS,
+        {
+            "listings": total,
+            "completed": total - failed,
+            "failed": failed,
+            "duplicates": duplicates,
+            "seconds": round(seconds, 3),
+            "listings_per_minute": listings_per_minute,
+        },
+    )
@@ -0,0 +1,209 @@
+"""
+Circuit breaker, retry budget and jittered backoff for upstream HTTP calls.
+
+When the Apify actor degrades, every analysis used to walk the full retry
+ladder on its own (2 s, 4 s, 8 s, same delays for every caller) and then
+fail, holding a request worker for up to two minutes each. These pieces give
+IdealistaService a memory of upstream health shared by all its calls:
+
+    CircuitBreaker   closed → open after failure_threshold consecutive
+                     failures; open rejects calls at once (CircuitOpenError)
+                     for reset_seconds; half-open then admits
+                     half_open_max_calls probes, whose outcome closes or
+                     re-opens the circuit
+    RetryBudget      retries allowed in a sliding window: ratio x requests,
+                     plus min_retries so a quiet process can still retry.
+                     A struggling upstream sees at most ~(1 + ratio) x load
+                     instead of max_retries x load
+    decorrelated_jitter
+                     "decorrelated jitter" backoff: each delay is drawn from
+                     [base, 3 x previous], capped, so concurrent callers
+                     spread out instead of retrying in lockstep
+
+A Retry-After header (see openai_rate_limiter.parse_retry_after) raises the
+next delay to at least what the upstream asked for.
+
+Usage:
+    breaker = CircuitBreaker(failure_threshold=5, reset_seconds=30)
+    breaker.before_call()          # raises CircuitOpenError when open
+    try:
+        ...
+    except UpstreamError:
+        breaker.record_failure()
+    else:
+        breaker.record_success()
+"""
+
+import random
+import time
+from collections import deque
+from typing import Any
+
+import structlog
+
+logger = structlog.get_logger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream whose circuit is open."""
+
+    def __init__(self, name: str, retry_in: float):
+        super().__init__(
+            f"{name} indisponível (circuito aberto); tente novamente em {retry_in:.0f}s"
+        )
+        self.name = name
+        self.retry_in = retry_in
+
+
+def decorrelated_jitter(base: float, previous: float, cap: float) -> float:
+    """
+    Next retry delay: uniform in [base, 3 x previous], at most cap.
+
+    Args:
+        base:     Minimum delay (and the first call's "previous").
+        previous: Delay used before the last attempt.
+        cap:      Maximum delay.
+    """
+    return min(cap, random.uniform(base, max(base, previous * 3)))
+
+
+class CircuitBreaker:
+    """Closed / open / half-open breaker over consecutive upstream failures."""
+
+    def __init__(
+        self,
+        name: str = "upstream",
+        failure_threshold: int = 5,
+        reset_seconds: float = 30.0,
+        half_open_max_calls: int = 1,
+    ):
+        """
+        Args:
+            name:                Upstream name used in errors and logs.
+            failure_threshold:   Consecutive failures that open the circuit.
+            reset_seconds:       Time the circuit stays open before probing.
+            half_open_max_calls: Probe calls admitted while half-open.
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.half_open_max_calls = half_open_max_calls
+        self._state = CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._probes = 0
+        self.rejected = 0
+        self.opened = 0
+
+    @property
+    def state(self) -> str:
+        """Current state; an open circuit turns half-open once reset_seconds pass."""
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_seconds:
+            self._state = HALF_OPEN
+            self._probes = 0
+            logger.info("circuit_half_open", upstream=self.name)
+        return self._state
+
+    def before_call(self) -> None:
+        """
+        Admit a call or reject it.
+
+        Raises:
+            CircuitOpenError: While open, and while half-open once the probe
+                              slots are taken.
+        """
+        state = self.state
+        if state == CLOSED:
+            return
+        if state == HALF_OPEN and self._probes < self.half_open_max_calls:
+            self._probes += 1
+            return
+        self.rejected += 1
+        retry_in = max(0.0, self.reset_seconds - (time.monotonic() - self._opened_at))
+        raise CircuitOpenError(self.name, retry_in)
+
+    def record_success(self) -> None:
+        """The upstream answered; closes a half-open circuit."""
+        if self._state != CLOSED:
+            logger.info("circuit_closed", upstream=self.name)
+        self._state = CLOSED
+        self._consecutive_failures = 0
+
+    def record_failure(self) -> None:
+        """The upstream failed (5xx, 429, timeout, connection error)."""
+        self._consecutive_failures += 1
+        if self._state == HALF_OPEN or (
+            self._state == CLOSED and self._consecutive_failures >= self.failure_threshold
+        ):
+            self._trip()
+
+    def record_abandoned(self) -> None:
+        """A call ended with no outcome (e.g. cancelled); frees its half-open probe slot."""
+        if self._state == HALF_OPEN and self._probes > 0:
+            self._probes -= 1
+
+    def _trip(self) -> None:
+        self._state = OPEN
+        self._opened_at = time.monotonic()
+        self.opened += 1
+        logger.warning(
+            "circuit_opened",
+            upstream=self.name,
+            consecutive_failures=self._consecutive_failures,
+            reset_seconds=self.reset_seconds,
+        )
+
+    def stats(self) -> dict[str, Any]:
+        """State, consecutive failures, times opened and calls rejected while open."""
+        return {
+            "state": self.state,
+            "consecutive_failures": self._consecutive_failures,
+            "opened": self.opened,
+            "rejected": self.rejected,
+        }
+
+
+class RetryBudget:
+    """Sliding-window cap on retries relative to first attempts, shared by all callers."""
+
+    def __init__(self, ratio: float = 0.2, min_retries: int = 3, window_seconds: float = 10.0):
+        """
+        Args:
+            ratio:          Retries allowed per first attempt in the window.
+            min_retries:    Retries always allowed per window (low traffic).
+            window_seconds: Length of the sliding window.
+        """
+        self.ratio = ratio
+        self.min_retries = min_retries
+        self.window_seconds = window_seconds
+        self._requests: deque[float] = deque()
+        self._retries: deque[float] = deque()
+        self.exhausted = 0
+
+    def record_request(self) -> None:
+        """Count a first attempt."""
+        self._requests.append(time.monotonic())
+
+    def try_retry(self) -> bool:
+        """Spend one retry if the budget allows it."""
+        now = time.monotonic()
+        for stamps in (self._requests, self._retries):
+            while stamps and now - stamps[0] > self.window_seconds:
+                stamps.popleft()
+        if len(self._retries) >= self.min_retries + self.ratio * len(self._requests):
+            self.exhausted += 1
+            return False
+        self._retries.append(now)
+        return True
+
+    def stats(self) -> dict[str, Any]:
+        """Requests and retries in the current window, and retries refused."""
+        return {
+            "requests": len(self._requests),
+            "retries": len(self._retries),
+            "exhausted": self.exhausted,
+        }
@@ -0,0 +1,284 @@
+"""
+Content-addressed cache of image classifications.
+
+Agencies reuse the same photos across relistings and users re-analyse the same
+URL all the time, so most GPT classification calls repeat work that was already
+paid for. This cache maps an image fingerprint to its classification result so
+classify_images() can skip Phase 2 for images it has seen before.
+
+## Keys
+
+    sha256(model + ":" + content digest)  for ImageStore handles and data URIs
+    sha256(model + ":" + image URL)       when base64 downloading is disabled
+
+Hashing the content means the same photo hosted under two listing URLs
+still hits. The model name is part of the key so switching classification
+models never serves stale answers.
+
+## Backends
+
+    InMemoryLRUBackend  — per-process OrderedDict, TTL + max_entries eviction
+    SQLiteBackend       — on-disk, survives restarts, same TTL/size policy
+
+ClassificationCache reads through its backends in order (memory first) and
+promotes lower-tier hits into the faster tiers with their original age, so a
+promoted entry still expires ttl_seconds after it was first stored. Only
+confident results (confidence > 0) are stored, so API errors and refusals are
+retried next time.
+
+Usage:
+    cache = build_classification_cache(settings.classification_cache)
+    classifier = ImageClassifierService(api_key, cache=cache)
+    ...
+    cache.stats()  # {"hits": 12, "misses": 3, "hit_rate": 0.8, ...}
+"""
+
+import base64
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Protocol
+
+import structlog
+
+from app.config import ClassificationCacheConfig
+from app.models.property import ImageClassification, RoomType
+from app.services.image_store import IMAGE_DIGEST_CHARS, handle_digest, is_image_handle
+from app.services.sqlite_store import SQLiteKVStore
+
+logger = structlog.get_logger(__name__)
+
+
+def image_fingerprint(image_url: str) -> bytes:
+    """
+    Return the bytes that identify an image's content.
+
+    Store handles carry a content digest and data URIs are decoded, so
+    identical photos share a key regardless of where they were downloaded
+    from; plain URLs are used as-is.
+    """
+    if is_image_handle(image_url):
+        return b"sha256:" + handle_digest(image_url).encode()
+    if image_url.startswith("data:") and ";base64," in image_url:
+        try:
+            raw = base64.b64decode(image_url.split(",", 1)[1])
+        except (ValueError, TypeError):
+            return image_url.encode()
+        # Same digest prefix ImageStore handles carry, so both forms share keys
+        return b"sha256:" + hashlib.sha256(raw).hexdigest()[:IMAGE_DIGEST_CHARS].encode()
+    return image_url.encode()
+
+
+def classification_cache_key(image_url: str, model: str) -> str:
+    """SHA-256 cache key for an image classified by a given model."""
+    digest = hashlib.sha256(model.encode() + b":")
+    digest.update(image_fingerprint(image_url))
+    return digest.hexdigest()
+
+
+class ClassificationCacheBackend(Protocol):
+    """Storage tier for cached classifications (plain dict payloads)."""
+
+    async def get_with_age(self, key: str) -> tuple[dict[str, Any], float] | None: ...
+
+    async def set(self, key: str, value: dict[str, Any], age: float = 0.0) -> None: ...
+
+    def close(self) -> None: ...
+
+
+class InMemoryLRUBackend:
+    """Per-process LRU with TTL. Not shared across workers."""
+
+    def __init__(self, max_entries: int = 5000, ttl_seconds: float | None = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict[str, tuple[float, dict[str, Any]]] = OrderedDict()
+
+    async def get(self, key: str) -> dict[str, Any] | None:
+        entry = await self.get_with_age(key)
+        return entry[0] if entry is not None else None
+
+    async def get_with_age(self, key: str) -> tuple[dict[str, Any], float] | None:
+        """Return (value, age_seconds), or None if missing or expired."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        stored_at, value = entry
+        age = time.monotonic() - stored_at
+        if self.ttl_seconds is not None and age > self.ttl_seconds:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value, age
+
+    async def set(self, key: str, value: dict[str, Any], age: float = 0.0) -> None:
+        """Store value; age backdates it (an entry promoted from a slower tier)."""
+        self._entries[key] = (time.monotonic() - age, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def delete(self, key: str) -> None:
+        self._entries.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def close(self) -> None:
+        """Nothing to release: entries live in process memory."""
+
+
+class SQLiteBackend:
+    """On-disk tier backed by SQLiteKVStore; survives process restarts."""
+
+    def __init__(
+        self,
+        path: str,
+        max_entries: int = 100_000,
+        ttl_seconds: float | None = None,
+        table: str = "image_classifications",
+    ):
+        self.store = SQLiteKVStore(path, table=table)
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+
+    async def get(self, key: str) -> dict[str, Any] | None:
+        entry = await self.get_with_age(key)
+        return entry[0] if entry is not None else None
+
+    async def get_with_age(self, key: str) -> tuple[dict[str, Any], float] | None:
+        """Return (value, age_seconds), or None if missing or expired."""
+        entry = await self.store.get_with_age(key, ttl_seconds=self.ttl_seconds)
+        if entry is None:
+            return None
+        raw, age = entry
+        return json.loads(raw), age
+
+    async def set(self, key: str, value: dict[str, Any], age: float = 0.0) -> None:
+        """Store value; age backdates it (an entry promoted from a slower tier)."""
+        await self.store.set(
+            key, json.dumps(value).encode(), max_entries=self.max_entries, age=age
+        )
+
+    async def delete(self, key: str) -> None:
+        await self.store.delete(key)
+
+    def close(self) -> None:
+        """Close the SQLite connection."""
+        self.store.close()
+
+
+class ClassificationCache:
+    """Read-through tiered cache of ImageClassification results with hit/miss counters."""
+
+    def __init__(self, backends: list[ClassificationCacheBackend]):
+        """
+        Args:
+            backends: Storage tiers, fastest first. Hits in a later tier are
+                      copied into every earlier tier.
+        """
+        self.backends = backends
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        # Observed cost of a real GPT classification, used to estimate savings
+        self._gpt_calls = 0
+        self._gpt_seconds = 0.0
+
+    async def get(self, image_url: str, model: str) -> ImageClassification | None:
+        """
+        Look up a cached classification for image_url.
+
+        Returns:
+            ImageClassification re-bound to image_url, or None on a miss.
+        """
+        key = classification_cache_key(image_url, model)
+        for tier, backend in enumerate(self.backends):
+            try:
+                entry = await backend.get_with_age(key)
+            except Exception as e:
+                logger.warning("classification_cache_read_error", tier=tier, error=str(e))
+                continue
+            if entry is None:
+                continue
+            value, age = entry
+            for faster_tier, faster in enumerate(self.backends[:tier]):
+                try:
+                    await faster.set(key, value, age=age)
+                except Exception as e:
+                    logger.warning(
+                        "classification_cache_write_error", tier=faster_tier, error=str(e)
+                    )
+            self.hits += 1
+            return ImageClassification(
+                image_url=image_url,
+                room_type=RoomType(value["room_type"]),
+                room_number=value["room_number"],
+                confidence=value["confidence"],
+            )
+        self.misses += 1
+        return None
+
+    async def set(self, classification: ImageClassification, model: str) -> None:
+        """Store a classification. Zero-confidence (error/refusal) results are skipped."""
+        if classification.confidence <= 0:
+            return
+        key = classification_cache_key(classification.image_url, model)
+        value = {
+            "room_type": classification.room_type.value,
+            "room_number": classification.room_number,
+            "confidence": classification.confidence,
+        }
+        for tier, backend in enumerate(self.backends):
+            try:
+                await backend.set(key, value)
+            except Exception as e:
+                logger.warning("classification_cache_write_error", tier=tier, error=str(e))
+        self.stores += 1
+
+    def close(self) -> None:
+        """Close every tier (releases the SQLite connection)."""
+        for backend in self.backends:
+            backend.close()
+
+    def record_gpt_call(self, seconds: float) -> None:
+        """Record the latency of an uncached GPT classification."""
+        self._gpt_calls += 1
+        self._gpt_seconds += seconds
+
+    def stats(self) -> dict[str, Any]:
+        """Hit/miss counters plus the estimated GPT calls and latency saved."""
+        lookups = self.hits + self.misses
+        avg_latency = self._gpt_seconds / self._gpt_calls if self._gpt_calls else 0.0
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "stores": self.stores,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "gpt_calls_saved": self.hits,
+            "avg_gpt_latency_seconds": round(avg_latency, 3),
+            "estimated_seconds_saved": round(self.hits * avg_latency, 3),
+        }
+
+
+def build_classification_cache(config: ClassificationCacheConfig) -> ClassificationCache | None:
+    """
+    Create the cache described by config, or None when caching is disabled.
+
+    backend="memory" gives a single in-process LRU; backend="sqlite" puts the
+    same LRU in front of an on-disk store.
+    """
+    if not config.enabled:
+        return None
+
+    backends: list[ClassificationCacheBackend] = [
+        InMemoryLRUBackend(config.max_memory_entries, config.ttl_seconds)
+    ]
+    if config.backend == "sqlite":
+        backends.append(SQLiteBackend(config.sqlite_path, config.max_entries, config.ttl_seconds))
+    elif config.backend != "memory":
+        raise ValueError(f"Unknown classification cache backend: {config.backend!r}")
+
+    logger.info("classification_cache_enabled", backend=config.backend, ttl=config.ttl_seconds)
+    return ClassificationCache(backends)
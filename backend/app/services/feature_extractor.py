@@ -32,6 +32,7 @@ from app.models.features.modules import (
 )
 from app.models.property import PropertyData, RoomType
 from app.prompts.feature_extraction import build_extraction_prompt
+from app.services.image_preparer import ImageResolver, image_content_parts
 from app.services.openai_client import get_openai_client
 
 logger = structlog.get_logger(__name__)
@@ -50,10 +51,12 @@ class FeatureExtractorService:
         openai_api_key: str,
         model: str = "gpt-4o",
         openai_config: OpenAIConfig | None = None,
+        image_resolver: ImageResolver | None = None,
     ):
         self.client = get_openai_client(openai_api_key)
         self.model = model
         self.openai_config = openai_config or OpenAIConfig()
+        self.image_resolver = image_resolver
 
     async def extract_room_features(
         self,
@@ -79,16 +82,11 @@ class FeatureExtractorService:
         prompt = build_extraction_prompt(room_label, room_type, len(capped_urls))
 
         content_payload: list[dict] = [{"type": "text", "text": prompt}]
-        for url in capped_urls:
-            content_payload.append({
-                "type": "image_url",
-                "image_url": {
-                    "url": url,
-                    "detail": self.openai_config.estimation_detail,
-                },
-            })
 
         try:
+            content_payload += await image_content_parts(
+                capped_urls, self.openai_config.estimation_detail, self.image_resolver
+            )
             response = await self.client.chat.completions.create(
                 model=self.model,
                 messages=[{"role": "user", "content": content_payload}],
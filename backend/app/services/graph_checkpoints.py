@@ -0,0 +1,150 @@
+"""
+Per-node checkpoints of renovation graph runs, for resuming failed analyses.
+
+A transient OpenAI error in estimate_node used to cost the user a full retry:
+new Apify scrape, every photo classified again. With a checkpointer the
+compiled graph saves its state after every node, keyed by the analysis run id
+(the "<run id>" part of the SSE event ids), so POST /analyze/{run_id}/resume
+can continue from the last node that succeeded and reuse the stored
+property_data, classifications and grouped_images.
+
+The savers are LangGraph's own (langgraph-checkpoint-sqlite):
+
+    sqlite  — AsyncSqliteSaver on an aiosqlite connection, survives restarts
+    memory  — InMemorySaver, lost on restart
+
+Both use a JsonPlusSerializer whose msgpack allowlist covers the app's state
+models, so PropertyData, RoomAnalysis, enums... come back as models. Any
+other BaseCheckpointSaver (e.g. a Postgres one) can be passed to
+build_renovation_graph instead.
+
+Checkpoints of completed runs are discarded right away (discard_run); those
+of failed or interrupted runs are kept for retention_seconds (purge_expired).
+
+Usage:
+    checkpointer = await build_graph_checkpointer(settings.graph_checkpoints)
+    await purge_expired(checkpointer, settings.graph_checkpoints.retention_seconds)
+    graph = build_renovation_graph(..., checkpointer=checkpointer)
+    async for chunk in graph.astream(initial_state, config=run_config(run.id)):
+        ...
+    await close_checkpointer(checkpointer)
+"""
+
+import inspect
+from datetime import UTC, datetime, timedelta
+from enum import Enum
+from pathlib import Path
+from types import ModuleType
+from typing import Any
+
+import aiosqlite
+import structlog
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+from pydantic import BaseModel
+
+from app.config import GraphCheckpointsConfig
+from app.models import property as property_models
+from app.models.features import enums as feature_enums
+from app.models.features import modules as feature_modules
+from app.models.features import outputs as feature_outputs
+
+logger = structlog.get_logger(__name__)
+
+# Modules whose models and enums appear in RenovationGraphState
+STATE_MODEL_MODULES: tuple[ModuleType, ...] = (
+    property_models,
+    feature_enums,
+    feature_modules,
+    feature_outputs,
+)
+
+
+def run_config(run_id: str) -> RunnableConfig:
+    """Graph config that checkpoints a run under its analysis run id."""
+    return {"configurable": {"thread_id": run_id}}
+
+
+def state_model_types() -> list[tuple[str, str]]:
+    """(module, name) of every pydantic model and enum the graph state can hold."""
+    return [
+        (module.__name__, name)
+        for module in STATE_MODEL_MODULES
+        for name, obj in vars(module).items()
+        if inspect.isclass(obj)
+        and obj.__module__ == module.__name__
+        and issubclass(obj, (BaseModel, Enum))
+    ]
+
+
+def checkpoint_serializer() -> JsonPlusSerializer:
+    """LangGraph serializer that may rebuild the app's state models from msgpack."""
+    return JsonPlusSerializer(allowed_msgpack_modules=state_model_types())
+
+
+async def build_graph_checkpointer(config: GraphCheckpointsConfig) -> BaseCheckpointSaver | None:
+    """
+    Build the renovation graph's checkpointer from settings.
+
+    Must be called on the event loop that will run the graph (the SQLite
+    saver's connection is bound to it).
+
+    Returns:
+        The saver, or None when checkpointing (and so resume) is disabled.
+    """
+    if not config.enabled:
+        return None
+    if config.backend == "memory":
+        return InMemorySaver(serde=checkpoint_serializer())
+    if config.backend != "sqlite":
+        raise ValueError(f"Unknown graph checkpoints backend: {config.backend!r}")
+
+    Path(config.sqlite_path).parent.mkdir(parents=True, exist_ok=True)
+    conn = await aiosqlite.connect(config.sqlite_path)
+    saver = AsyncSqliteSaver(conn, serde=checkpoint_serializer())
+    await saver.setup()
+    return saver
+
+
+async def purge_expired(checkpointer: BaseCheckpointSaver, retention_seconds: float) -> int:
+    """
+    Delete runs whose newest checkpoint is older than retention_seconds.
+
+    Returns:
+        The number of runs removed.
+    """
+    cutoff = datetime.now(UTC) - timedelta(seconds=retention_seconds)
+    newest: dict[str, datetime] = {}
+    async for checkpoint_tuple in checkpointer.alist(None):
+        thread_id = checkpoint_tuple.config["configurable"]["thread_id"]
+        written = datetime.fromisoformat(checkpoint_tuple.checkpoint["ts"])
+        newest[thread_id] = max(written, newest.get(thread_id, written))
+
+    expired = [thread_id for thread_id, written in newest.items() if written < cutoff]
+    for thread_id in expired:
+        await checkpointer.adelete_thread(thread_id)
+    if expired:
+        logger.info("graph_checkpoints_purged", runs=len(expired))
+    return len(expired)
+
+
+async def close_checkpointer(checkpointer: BaseCheckpointSaver) -> None:
+    """Close the SQLite saver's connection (the memory saver holds none)."""
+    if isinstance(checkpointer, AsyncSqliteSaver):
+        await checkpointer.conn.close()
+
+
+def graph_checkpointer(graph: Any) -> BaseCheckpointSaver | None:
+    """The checkpointer a compiled graph was built with, if any."""
+    checkpointer = getattr(graph, "checkpointer", None)
+    return checkpointer if isinstance(checkpointer, BaseCheckpointSaver) else None
+
+
+async def discard_run(graph: Any, run_id: str) -> None:
+    """Drop a completed run's checkpoints: there is nothing left to resume."""
+    checkpointer = graph_checkpointer(graph)
+    if checkpointer is not None:
+        await checkpointer.adelete_thread(run_id)
@@ -3,47 +3,119 @@ Idealista scraping service using Apify.
 
 This service fetches property data from Idealista listings using the
 dz_omar/idealista-scraper-api Apify actor in STANDBY mode. A single POST
-returns results directly via NDJSON — no polling required.
-Then parsed and return the PropertyData pydantic model
+returns results directly via NDJSON — no polling required. The body is read
+line by line as the actor streams it, and each property item is parsed into
+the PropertyData pydantic model as soon as it arrives.
+
+With a ScrapeCache, parsed listings are kept per property ID: fresh entries
+skip the actor entirely, and stale ones are served at once while a
+background request refreshes them (stale-while-revalidate). Callers that
+need current data pass max_age.
+
+With a RawDataStore, the raw actor item (PropertyData.raw_data) is moved to
+that compressed side store as soon as a listing is parsed; the returned and
+cached PropertyData carry only raw_data_ref, and load_raw_data() fetches the
+payload for the rare callers that need it.
 
 Usage:
-    service = IdealistaService(apify_token="...")
+    service = IdealistaService(apify_token="...", cache=build_scrape_cache(config))
     property_data = await service.scrape_property("https://www.idealista.pt/imovel/...")
+    property_data = await service.scrape_property(url, max_age=0)  # never cached data
+    async for url, result in service.scrape_properties(urls):  # one request, many listings
+        ...
 """
 
 import asyncio
 import json
 import logging
 import re
+from collections.abc import AsyncIterator
+from contextlib import aclosing
+from typing import Any
 from urllib.parse import urlparse
 
 import httpx
 
 from app.config import ApifyConfig
 from app.models.property import PropertyData
+from app.services.circuit_breaker import (
+    CircuitBreaker,
+    CircuitOpenError,
+    RetryBudget,
+    decorrelated_jitter,
+)
+from app.services.openai_rate_limiter import parse_retry_after
+from app.services.raw_data_store import RawDataStore
+from app.services.scrape_cache import ScrapeCache
+from app.services.single_flight import SingleFlight
 
 logger = logging.getLogger(__name__)
 
+PROPERTY_ID_RE = re.compile(r"/imovel/(\d+)")
+
+# Transport errors worth another attempt (others, e.g. a protocol error, are not)
+RETRYABLE_TRANSPORT_ERRORS = (httpx.TimeoutException, httpx.ConnectError)
+
+
+def extract_property_id(url: str) -> str | None:
+    """Return the Idealista property ID in a listing URL, or None if absent."""
+    match = PROPERTY_ID_RE.search(url)
+    return match.group(1) if match else None
+
+
+def _is_upstream_failure(status_code: int) -> bool:
+    """Statuses that mean Apify is unhealthy or overloaded (retried, trip the breaker)."""
+    return status_code >= 500 or status_code == 429
+
 
 class IdealistaService:
     """Service for scraping property data from Idealista using Apify."""
 
-    def __init__(self, apify_token: str, apify_config: ApifyConfig | None = None):
+    def __init__(
+        self,
+        apify_token: str,
+        apify_config: ApifyConfig | None = None,
+        cache: ScrapeCache | None = None,
+        raw_store: RawDataStore | None = None,
+    ):
         """
         Initialize the Idealista service.
 
         Args:
             apify_token:  Apify API token for authentication
             apify_config: Apify operational config (URL, retries, timeouts).
+            cache:        Scraped listing cache; None always calls the actor.
+            raw_store:    Side store for raw actor items; None keeps raw_data inline.
         """
         self.apify_token = apify_token
         self.apify_config = apify_config or ApifyConfig()
         self._client = httpx.AsyncClient(
             timeout=self.apify_config.request_timeout_seconds
         )
+        # Concurrent scrapes of the same listing share one Apify request
+        self.scrapes: SingleFlight[PropertyData] = SingleFlight()
+        self.cache = cache
+        self.raw_store = raw_store
+        # Background refreshes of stale cache entries, by property ID
+        self._revalidating: dict[str, asyncio.Task] = {}
+        # Upstream health shared by every call, so a degraded actor is not
+        # hammered by each analysis walking its own retry ladder
+        config = self.apify_config
+        self.breaker = CircuitBreaker(
+            "Apify", config.breaker_failure_threshold, config.breaker_reset_seconds
+        )
+        self.retry_budget = RetryBudget(
+            config.retry_budget_ratio,
+            config.retry_budget_min_retries,
+            config.retry_budget_window_seconds,
+        )
 
     async def close(self):
-        """Close the HTTP client."""
+        """Cancel pending background refreshes and close the HTTP client."""
+        refreshes = set(self._revalidating.values())
+        for task in refreshes:
+            task.cancel()
+        await asyncio.gather(*refreshes, return_exceptions=True)
         await self._client.aclose()
 
     def _validate_url(self, url: str) -> bool:
@@ -76,77 +148,127 @@ class IdealistaService:
         Returns:
             Property ID string or None if not found
         """
-        match = re.search(r"/imovel/(\d+)", url)
-        return match.group(1) if match else None
+        return extract_property_id(url)
 
     @staticmethod
-    def _parse_ndjson_response(text: str) -> list[dict]:
+    def _parse_ndjson_line(line: str) -> dict | None:
         """
-        Parse a newline-delimited JSON response into a list of dicts.
+        Parse one line of a newline-delimited JSON response.
 
         Args:
-            text: Raw NDJSON string (one JSON object per line)
+            line: Raw NDJSON line
 
         Returns:
-            List of parsed dictionaries
+            The parsed object, or None for a blank or malformed line (logged
+            and skipped, so one bad line does not lose the rest of the reply)
         """
-        results: list[dict] = []
-        for line in text.splitlines():
-            stripped = line.strip()
-            if not stripped:
-                continue
-            results.append(json.loads(stripped))
-        return results
+        stripped = line.strip()
+        if not stripped:
+            return None
+        try:
+            item = json.loads(stripped)
+        except json.JSONDecodeError:
+            logger.warning("Skipping malformed Apify NDJSON line: %.200s", stripped)
+            return None
+        return item if isinstance(item, dict) else None
 
     # Method that calls the Apify Actor
-    async def _request_with_retry(self, url: str, payload: dict) -> httpx.Response:
+    async def _stream_with_retry(self, url: str, payload: dict) -> AsyncIterator[dict]:
         """
-        POST to the given URL with retry logic for transient failures.
+        POST to the given URL and yield each NDJSON item as its line arrives.
 
-        Retries up to MAX_RETRIES times with exponential backoff on:
-        - HTTP 5xx errors
+        The body is read incrementally (aiter_lines), never buffered whole.
+        Every attempt passes the service's circuit breaker, which fails fast
+        while Apify is known to be down. Retries up to MAX_RETRIES attempts on:
+        - HTTP 5xx and 429 errors
         - Timeout errors
         - Connection errors
 
-        Does NOT retry on 4xx errors or ValueErrors.
+        while the shared retry budget allows, after a decorrelated-jitter
+        delay (at least the response's Retry-After, both capped at
+        retry_max_delay_seconds).
+
+        Does NOT retry on other 4xx errors, nor once an item has been yielded
+        (a retry would repeat it); later failures propagate to the caller.
 
         Args:
             url: The endpoint URL
             payload: JSON body to send
 
-        Returns:
-            httpx.Response on success
+        Yields:
+            Parsed NDJSON items, in arrival order
 
         Raises:
+            CircuitOpenError: If the circuit is open (no request is sent)
             httpx.HTTPStatusError: On non-retryable HTTP errors or exhausted retries
             httpx.TimeoutException: If all retries time out
             httpx.ConnectError: If all retries fail to connect
         """
+        config = self.apify_config
         last_exception: Exception | None = None
-        max_retries = self.apify_config.max_retries
-        retry_base_delay = self.apify_config.retry_base_delay_seconds
-
-        for attempt in range(max_retries):
+        delay = config.retry_base_delay_seconds
+
+        for attempt in range(config.max_retries):
+            self.breaker.before_call()
+            if attempt == 0:
+                self.retry_budget.record_request()
+            received = False
+            settled = False
+            retry_after: float | None = None
             try:
-                response = await self._client.post(
+                async with self._client.stream(
+                    "POST",
                     url,
                     json=payload,
                     headers={"Authorization": f"Bearer {self.apify_token}"},
-                )
-                response.raise_for_status()
-                return response
+                ) as response:
+                    if not _is_upstream_failure(response.status_code):
+                        # Any other answer, 4xx included, shows the actor is up
+                        self.breaker.record_success()
+                        settled = True
+                    response.raise_for_status()
+                    async for line in response.aiter_lines():
+                        item = self._parse_ndjson_line(line)
+                        if item is not None:
+                            received = True
+                            yield item
+                return
             except httpx.HTTPStatusError as exc:
-                if exc.response.status_code < 500:
+                if not _is_upstream_failure(exc.response.status_code):
                     raise
+                self.breaker.record_failure()
+                settled = True
+                retry_after = parse_retry_after(exc.response.headers)
                 last_exception = exc
-            except (httpx.TimeoutException, httpx.ConnectError) as exc:
+            except httpx.TransportError as exc:
+                self.breaker.record_failure()
+                settled = True
+                if received or not isinstance(exc, RETRYABLE_TRANSPORT_ERRORS):
+                    raise
                 last_exception = exc
-
-            delay = retry_base_delay * (2 ** attempt)
+            finally:
+                if not settled:
+                    # Cancelled before Apify answered: free a half-open probe slot
+                    self.breaker.record_abandoned()
+
+            if attempt + 1 == config.max_retries:
+                break
+            if not self.retry_budget.try_retry():
+                logger.warning(
+                    "Apify retry budget exhausted; giving up after attempt %d: %s",
+                    attempt + 1,
+                    last_exception,
+                )
+                break
+            delay = decorrelated_jitter(
+                config.retry_base_delay_seconds, delay, config.retry_max_delay_seconds
+            )
+            if retry_after is not None:
+                delay = min(max(delay, retry_after), config.retry_max_delay_seconds)
             logger.warning(
-                "Apify request attempt %d/%d failed: %s. Retrying in %ds...",
+                "Apify request attempt %d/%d failed: %s. Retrying in %.1fs...",
                 attempt + 1,
-                max_retries,
+                config.max_retries,
                 last_exception,
                 delay,
             )
@@ -154,21 +276,34 @@ class IdealistaService:
 
         raise last_exception  # type: ignore[misc]
 
+    def upstream_stats(self) -> dict[str, Any]:
+        """Circuit breaker state and retry budget usage of the Apify client."""
+        return {"circuit_breaker": self.breaker.stats(), "retry_budget": self.retry_budget.stats()}
+
     # Method that controls the whole process of scraping and parsing the data
-    async def scrape_property(self, url: str) -> PropertyData:
+    async def scrape_property(self, url: str, max_age: float | None = None) -> PropertyData:
         """
         Scrape property data from an Idealista listing.
 
         Uses the dz_omar/idealista-scraper-api actor in STANDBY mode.
+        Concurrent calls for the same property ID share one Apify request.
+        A cached listing within the cache TTL is returned without a request;
+        one in the stale window is returned too, and refreshed in the
+        background for the next caller. While the Apify circuit is open the
+        call fails fast, or returns the cached listing of any age if there is
+        one.
 
         Args:
-            url: Full Idealista property URL
+            url:     Full Idealista property URL
+            max_age: Only accept cached data at most this many seconds old
+                     (0 forces a fresh scrape). None uses the cache's TTL.
 
         Returns:
             PropertyData object with scraped information
 
         Raises:
             ValueError: If URL is invalid or property cannot be found
+            CircuitOpenError: If Apify is failing and the listing was never cached
             httpx.HTTPError: If Apify API request fails after retries
         """
         if not self._validate_url(url):
@@ -184,33 +319,293 @@ class IdealistaService:
         if not self.apify_token:
             return self._get_mock_data(url, property_id)
 
-        payload = {"Property_urls": [{"url": url}]}
-        response = await self._request_with_retry(self.apify_config.standby_url, payload)
+        if self.cache is not None:
+            cached = await self._cached({property_id: [url]}, max_age)
+            if property_id in cached:
+                return self._rebind(cached[property_id], url)
 
-        items = self._parse_ndjson_response(response.text)
+        try:
+            return await self.scrapes.do(
+                property_id, lambda: self._scrape_apify(url, property_id)
+            )
+        except CircuitOpenError:
+            fallback = await self._fallback(property_id, url)
+            if fallback is None:
+                raise
+            return fallback
+
+    async def _fallback(self, property_id: str, url: str) -> PropertyData | None:
+        """Cached listing of any age, served while the Apify circuit is open."""
+        if self.cache is None:
+            return None
+        cached = await self.cache.fallback(property_id)
+        return self._rebind(cached.property_data, url) if cached is not None else None
+
+    async def _cached(
+        self, urls_by_id: dict[str, list[str]], max_age: float | None
+    ) -> dict[str, PropertyData]:
+        """
+        Look up listings in the cache, scheduling a refresh of the stale ones.
 
-        if not items:
-            raise ValueError(f"Não foi possível obter dados do imóvel {property_id}")
+        Returns:
+            Cached PropertyData by property ID (misses are absent)
+        """
+        hits: dict[str, PropertyData] = {}
+        stale: dict[str, str] = {}
+        for property_id, group in urls_by_id.items():
+            cached = await self.cache.get(property_id, max_age)
+            if cached is None:
+                continue
+            hits[property_id] = cached.property_data
+            if cached.stale:
+                stale[property_id] = group[0]
+        if stale:
+            self._revalidate(stale)
+        return hits
 
-        # Find the property data item (type: "property")
-        property_item = next(
-            (item for item in items if item.get("type") == "property"),
-            None
-        )
+    @staticmethod
+    def _rebind(property_data: PropertyData, url: str) -> PropertyData:
+        """Cached listing as requested under url (tracking parameters may differ)."""
+        if property_data.url == url:
+            return property_data
+        return property_data.model_copy(update={"url": url})
+
+    def _revalidate(self, urls_by_id: dict[str, str]) -> None:
+        """Refresh stale listings in one background request (skips ones already refreshing)."""
+        pending = {
+            property_id: url
+            for property_id, url in urls_by_id.items()
+            if property_id not in self._revalidating
+        }
+        if not pending:
+            return
+
+        task = asyncio.create_task(self._refresh(pending))
+        for property_id in pending:
+            self._revalidating[property_id] = task
+
+        def _done(_: asyncio.Task) -> None:
+            for property_id in pending:
+                self._revalidating.pop(property_id, None)
+
+        task.add_done_callback(_done)
+
+    async def _refresh(self, urls_by_id: dict[str, str]) -> None:
+        """Re-scrape stale cached listings; on failure the stale entries stay cached."""
+        failed = False
+        try:
+            if len(urls_by_id) == 1:
+                # Shared with a foreground scrape of the same listing
+                [(property_id, url)] = urls_by_id.items()
+                await self.scrapes.do(property_id, lambda: self._scrape_apify(url, property_id))
+            else:
+                async with aclosing(self._scrape_apify_batch(urls_by_id)) as results:
+                    async for property_id, result in results:
+                        if isinstance(result, Exception):
+                            failed = True
+                            logger.warning("Could not refresh listing %s: %s", property_id, result)
+        except Exception as exc:
+            failed = True
+            logger.warning(
+                "Background refresh of %d cached listings failed: %s", len(urls_by_id), exc
+            )
+        self.cache.record_refresh(failed)
+
+    async def _store(self, property_id: str, property_data: PropertyData) -> PropertyData:
+        """Detach raw_data into the raw store, then cache; returns the listing as kept."""
+        if self.raw_store is not None:
+            property_data = await self.raw_store.detach(property_id, property_data)
+        if self.cache is not None:
+            await self.cache.set(property_id, property_data)
+        return property_data
+
+    async def load_raw_data(self, property_data: PropertyData) -> dict[str, Any]:
+        """
+        The raw actor item of a listing, inline or from the raw store.
+
+        Returns:
+            The raw item, or {} if it was never kept (or has been evicted).
+        """
+        if self.raw_store is None:
+            return property_data.raw_data
+        return await self.raw_store.load(property_data)
+
+    async def _scrape_apify(self, url: str, property_id: str) -> PropertyData:
+        """Fetch and parse one listing from the Apify actor (see scrape_property)."""
+        payload = {"Property_urls": [{"url": url}]}
+        # Stop reading at the property item (type: "property")
+        property_item = None
+        async with aclosing(
+            self._stream_with_retry(self.apify_config.standby_url, payload)
+        ) as items:
+            async for item in items:
+                if item.get("type") == "property":
+                    property_item = item
+                    break
 
         if not property_item:
             raise ValueError(f"Não foi possível obter dados do imóvel {property_id}")
 
+        property_data = self._property_from_item(url, property_item)
+        return await self._store(property_id, property_data)
+
+    def _property_from_item(self, url: str, item: dict) -> PropertyData:
+        """
+        Parse an actor "property" item into PropertyData.
+
+        Raises:
+            ValueError: If the actor reports the listing as failed
+        """
+        data = item.get("data") or {}
+
         # Check for actor-level failure
-        if property_item.get("status") == "failed":
-            error_msg = property_item.get("error", "Unknown error")
+        if item.get("status") == "failed" or data.get("status") == "failed":
+            error_msg = item.get("error") or data.get("error") or "Unknown error"
             raise ValueError(
                 f"O scraper não conseguiu extrair dados do imóvel: {error_msg}"
             )
 
         # Extract the actual data from the property item
-        property_data = property_item.get("data", {})
-        return self._parse_apify_result(url, property_data)
+        return self._parse_apify_result(url, data)
+
+    async def scrape_properties(
+        self, urls: list[str], max_age: float | None = None
+    ) -> AsyncIterator[tuple[str, PropertyData | Exception]]:
+        """
+        Scrape several Idealista listings with a single Apify request.
+
+        Yields each listing as soon as its NDJSON line arrives, so callers
+        can start on the first listing while the actor is still scraping the
+        rest. URLs naming the same property ID are fetched once, and cached
+        listings are not fetched at all (see scrape_property). A listing
+        that is invalid, unparseable, missing from the actor's reply or
+        failed on the actor side yields its error instead of failing the
+        whole batch. While the Apify circuit is open, listings not yet
+        received fall back to cached data of any age, or yield the
+        CircuitOpenError.
+
+        Args:
+            urls:    Idealista property URLs
+            max_age: Oldest cached data to accept, in seconds (see scrape_property)
+
+        Yields:
+            (url, PropertyData or the ValueError explaining why it could not
+            be scraped), once per input URL; invalid URLs come first, then
+            cached listings
+
+        Raises:
+            httpx.HTTPError: If the Apify request fails after retries or the
+                stream breaks (listings already yielded stay valid)
+        """
+        urls_by_id: dict[str, list[str]] = {}
+        for url in urls:
+            property_id = self._extract_property_id(url) if self._validate_url(url) else None
+            if property_id is None:
+                yield url, ValueError(
+                    "URL inválido. Deve ser um anúncio do Idealista Portugal "
+                    "(ex: https://www.idealista.pt/imovel/12345678/)"
+                )
+            else:
+                urls_by_id.setdefault(property_id, []).append(url)
+
+        cached: dict[str, PropertyData] = {}
+        if self.apify_token and self.cache is not None:
+            cached = await self._cached(urls_by_id, max_age)
+            for property_id, property_data in cached.items():
+                for url in urls_by_id.pop(property_id):
+                    yield url, self._rebind(property_data, url)
+
+        if not urls_by_id:
+            return
+
+        if self.apify_token:
+            scraped = self._scrape_apify_batch(
+                {property_id: group[0] for property_id, group in urls_by_id.items()}
+            )
+        else:
+            scraped = self._mock_batch(urls_by_id)
+
+        failed = 0
+        pending = set(urls_by_id)
+        circuit_open: CircuitOpenError | None = None
+        try:
+            async with aclosing(scraped):
+                async for property_id, result in scraped:
+                    pending.discard(property_id)
+                    failed += isinstance(result, Exception)
+                    for url in urls_by_id[property_id]:
+                        yield url, result
+        except CircuitOpenError as exc:
+            circuit_open = exc
+
+        if circuit_open is not None:
+            for property_id in [pid for pid in urls_by_id if pid in pending]:
+                group = urls_by_id[property_id]
+                fallback = await self._fallback(property_id, group[0])
+                failed += fallback is None
+                for url in group:
+                    yield url, self._rebind(fallback, url) if fallback else circuit_open
+        logger.info(
+            "Apify batch scrape: %d URLs, %d listings fetched, %d cached, %d failed",
+            len(urls),
+            len(urls_by_id),
+            len(cached),
+            failed,
+        )
+
+    async def _mock_batch(
+        self, urls_by_id: dict[str, list[str]]
+    ) -> AsyncIterator[tuple[str, PropertyData | Exception]]:
+        for property_id, group in urls_by_id.items():
+            yield property_id, self._get_mock_data(group[0], property_id)
+
+    async def _scrape_apify_batch(
+        self, urls_by_id: dict[str, str]
+    ) -> AsyncIterator[tuple[str, PropertyData | Exception]]:
+        """Fetch and parse many listings in one actor call (see scrape_properties)."""
+        payload = {"Property_urls": [{"url": url} for url in urls_by_id.values()]}
+        pending = dict(urls_by_id)
+
+        async with aclosing(
+            self._stream_with_retry(self.apify_config.standby_url, payload)
+        ) as items:
+            async for item in items:
+                if item.get("type") != "property":
+                    continue
+                property_id = self._item_property_id(item)
+                url = pending.pop(property_id, None)
+                if url is None:
+                    continue
+                result: PropertyData | Exception
+                try:
+                    result = self._property_from_item(url, item)
+                except ValueError as exc:
+                    result = exc
+                except Exception as exc:
+                    logger.warning("Could not parse Apify item %s: %s", property_id, exc)
+                    result = ValueError(f"Não foi possível ler os dados do imóvel {property_id}")
+                if isinstance(result, PropertyData):
+                    result = await self._store(property_id, result)
+                yield property_id, result
+                if not pending:
+                    break
+
+        for property_id in pending:
+            yield property_id, ValueError(
+                f"Não foi possível obter dados do imóvel {property_id}"
+            )
+
+    @staticmethod
+    def _item_property_id(item: dict) -> str | None:
+        """Property ID of an actor "property" item (multi-URL replies mix listings)."""
+        data = item.get("data") or {}
+        for key in ("propertyId", "adid"):
+            if data.get(key):
+                return str(data[key])
+        for url in (data.get("originalUrl"), item.get("url")):
+            if url and (property_id := extract_property_id(url)):
+                return property_id
+        return None
 
     def _parse_apify_result(self, url: str, data: dict) -> PropertyData:
         """
@@ -372,10 +767,13 @@ class IdealistaService:
 
 
 def create_idealista_service(
-    apify_token: str, apify_config: ApifyConfig | None = None
+    apify_token: str,
+    apify_config: ApifyConfig | None = None,
+    cache: ScrapeCache | None = None,
+    raw_store: RawDataStore | None = None,
 ) -> IdealistaService:
     """Create an IdealistaService instance."""
-    return IdealistaService(apify_token, apify_config)
+    return IdealistaService(apify_token, apify_config, cache, raw_store)
 
 
 if __name__ == "__main__":
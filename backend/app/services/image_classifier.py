@@ -7,19 +7,42 @@ ensures we generate exactly one estimate per room, not one per photo.
 
 ## Classification strategy
 
-Two-phase approach, ordered cheapest-first:
+With an ImageDeduplicator, near-duplicate photos (same shot re-cropped,
+resized or re-uploaded) are collapsed first: only the first photo of each
+shot is classified, and the others inherit its classification with
+duplicate_of set. Grouping then clusters representatives only, so a
+duplicate never becomes an extra bedroom or bathroom.
+
+With a LocalRoomClusterer, bedroom and bathroom buckets are first clustered
+offline from colour histograms and thumbnails; the GPT clustering call is
+only made when the local result's confidence is below the configured
+threshold (or the photos' bytes are not available locally).
+
+The remaining photos go through three phases, ordered cheapest-first:
 
 1. **Tag phase (free):** Idealista listings scraped via Apify include a "tag"
    field on each image (e.g. "kitchen", "bedroom"). When a tag maps to a known
    RoomType we produce an ImageClassification instantly without any API call.
    A typical listing saves 60–80 % of classification costs this way.
 
-2. **GPT phase (paid):** Images with no tag or an unrecognised tag are sent
+2. **Cache phase (free):** When a ClassificationCache is configured, the
+   remaining images are looked up by content hash. Photos reused across
+   relistings or re-analyses are served from the cache.
+
+3. **GPT phase (paid):** Images with no tag or an unrecognised tag are sent
    to GPT-4o-mini with `detail="low"` for cost efficiency.  Up to
-   `max_concurrent` calls run in parallel, rate-limited by a semaphore.
+   `max_concurrent` calls run in parallel, bounded by a semaphore (the
+   process-wide OpenAIRateLimiter enforces RPM/TPM across all services).
+   With `OpenAIConfig.classification_batch_size` > 1, images are sent N per
+   request (one prompt, a JSON array of answers by index); any index that is
+   missing or invalid in the reply is retried with a single-image call.
+
+classify_image_stream() applies the same routing per image as images arrive
+from the downloader, so classification starts before the slowest download ends.
 
 Flow:
     tagged images    →  classify_from_tag()       →  ImageClassification (confidence=0.9)
+    cached images    →  ClassificationCache.get() →  ImageClassification (stored result)
     untagged images  →  classify_single_image()   →  ImageClassification (GPT-scored confidence)
 
 Usage:
@@ -30,13 +53,20 @@ Usage:
     )
     grouped = classifier.group_by_room(classifications)
 
+    # Or in batches as each room type's grouping is final (kitchen first,
+    # bedrooms once their clustering call returns):
+    async for batch in classifier.iter_room_groups(classifications):
+        ...
+
     # Standalone label helper usable anywhere without a service instance:
     label = get_room_label(RoomType.BEDROOM, 2)  # -> "Quarto 2"
 """
 
 import asyncio
 import json
+import time
 from collections import defaultdict
+from collections.abc import AsyncIterable, AsyncIterator
 
 import structlog
 
@@ -51,7 +81,15 @@ from app.constants import (
     TAG_CLASSIFICATION_CONFIDENCE,
 )
 from app.models.property import ImageClassification, RoomCluster, RoomType
-from app.prompts.renovation import IMAGE_CLASSIFICATION_PROMPT, ROOM_CLUSTERING_PROMPT
+from app.prompts.renovation import (
+    IMAGE_BATCH_CLASSIFICATION_PROMPT,
+    IMAGE_CLASSIFICATION_PROMPT,
+    ROOM_CLUSTERING_PROMPT,
+)
+from app.services.classification_cache import ClassificationCache
+from app.services.image_dedup import ImageDeduplicator
+from app.services.image_preparer import ImageResolver, image_content_parts
+from app.services.local_clustering import LocalRoomClusterer
 from app.services.openai_client import get_openai_client
 
 logger = structlog.get_logger(__name__)
@@ -109,6 +147,15 @@ def classify_from_tag(image_url: str, tag: str) -> ImageClassification | None:
     )
 
 
+def inherit_classification(
+    representative: ImageClassification, image_url: str
+) -> ImageClassification:
+    """Classification of a near-duplicate: its representative's, pointing back to it."""
+    return representative.model_copy(
+        update={"image_url": image_url, "duplicate_of": representative.image_url}
+    )
+
+
 class ImageClassifierService:
     """Service for classifying property images using GPT-4 Vision."""
 
@@ -118,6 +165,10 @@ class ImageClassifierService:
         model: str = "gpt-4o-mini",
         max_concurrent: int = 5,
         openai_config: OpenAIConfig | None = None,
+        cache: ClassificationCache | None = None,
+        image_resolver: ImageResolver | None = None,
+        deduplicator: ImageDeduplicator | None = None,
+        local_clusterer: LocalRoomClusterer | None = None,
     ):
         """
         Initialize the image classifier.
@@ -127,11 +178,27 @@ class ImageClassifierService:
             model: Model to use for classification
             max_concurrent: Maximum concurrent API calls to prevent rate limiting
             openai_config: OpenAI call parameters (max_tokens, detail levels)
+            cache: Optional content-addressed classification cache consulted
+                   before any GPT call
+            image_resolver: Optional ImageResolver (ImageStore/ImagePreparer) that
+                            turns image references into sized data URIs
+                            when payloads are built
+            deduplicator: Optional ImageDeduplicator; near-duplicate photos
+                          then inherit their representative's classification
+            local_clusterer: Optional LocalRoomClusterer tried before GPT
+                             room clustering; GPT is called only when it is unsure
         """
         self.client = get_openai_client(openai_api_key)
         self.model = model
         self.semaphore = asyncio.Semaphore(max_concurrent)
+        self.max_concurrent = max_concurrent
         self.openai_config = openai_config or OpenAIConfig()
+        # Images per classification request (a config built without validation may hold 0)
+        self.batch_size = max(1, self.openai_config.classification_batch_size)
+        self.cache = cache
+        self.image_resolver = image_resolver
+        self.deduplicator = deduplicator
+        self.local_clusterer = local_clusterer
 
     async def classify_single_image(self, image_url: str) -> ImageClassification:
         """
@@ -145,6 +212,9 @@ class ImageClassifierService:
         """
         async with self.semaphore:  # Rate limiting
             try:
+                image_parts = await image_content_parts(
+                    [image_url], self.openai_config.classification_detail, self.image_resolver
+                )
                 response = await self.client.chat.completions.create(
                     model=self.model,
                     messages=[
@@ -152,13 +222,7 @@ class ImageClassifierService:
                             "role": "user",
                             "content": [
                                 {"type": "text", "text": IMAGE_CLASSIFICATION_PROMPT},
-                                {
-                                    "type": "image_url",
-                                    "image_url": {
-                                        "url": image_url,
-                                        "detail": self.openai_config.classification_detail,
-                                    },
-                                },
+                                *image_parts,
                             ],
                         }
                     ],
@@ -225,6 +289,124 @@ class ImageClassifierService:
                     confidence=0.0,
                 )
 
+    async def classify_image_batch(
+        self, image_urls: list[str]
+    ) -> list[ImageClassification | None]:
+        """
+        Classify several images in a single GPT request.
+
+        The images are sent in one message, each preceded by its index, and the
+        model answers with a JSON array of classifications keyed by index.
+        Entries that are missing, duplicated or fail validation come back as
+        None so the caller can retry those images one at a time; a refusal,
+        an unparseable reply or an API error makes every entry None.
+
+        Args:
+            image_urls: Images to classify (one request, one semaphore slot).
+
+        Returns:
+            One ImageClassification or None per image, in input order.
+        """
+        results: list[ImageClassification | None] = [None] * len(image_urls)
+
+        async with self.semaphore:  # One request → one rate-limit slot
+            try:
+                image_parts = await image_content_parts(
+                    image_urls, self.openai_config.classification_detail, self.image_resolver
+                )
+                content: list[dict] = [
+                    {
+                        "type": "text",
+                        "text": IMAGE_BATCH_CLASSIFICATION_PROMPT.format(
+                            num_images=len(image_urls), last_index=len(image_urls) - 1
+                        ),
+                    }
+                ]
+                for index, part in enumerate(image_parts):
+                    content.append({"type": "text", "text": f"Fotografia {index}:"})
+                    content.append(part)
+
+                response = await self.client.chat.completions.create(
+                    model=self.model,
+                    messages=[{"role": "user", "content": content}],
+                    max_tokens=self.openai_config.classification_max_tokens * len(image_urls),
+                    response_format={"type": "json_object"},
+                )
+
+                msg = response.choices[0].message
+                if msg.refusal or msg.content is None:
+                    logger.warning(
+                        "batch_classification_no_content",
+                        batch_size=len(image_urls),
+                        refusal=msg.refusal,
+                        finish_reason=response.choices[0].finish_reason,
+                    )
+                    return results
+
+                items = json.loads(msg.content).get("classifications")
+
+            except json.JSONDecodeError as e:
+                logger.warning(
+                    "batch_classification_json_parse_error",
+                    batch_size=len(image_urls),
+                    error=str(e),
+                )
+                return results
+            except Exception as e:
+                logger.error(
+                    "batch_classification_api_error", batch_size=len(image_urls), error=str(e)
+                )
+                return results
+
+        if not isinstance(items, list):
+            logger.warning("batch_classification_missing_array", batch_size=len(image_urls))
+            return results
+
+        seen: set[int] = set()
+        for item in items:
+            index = item.get("index") if isinstance(item, dict) else None
+            if not isinstance(index, int) or not 0 <= index < len(image_urls):
+                continue
+            if index in seen:
+                # Two answers for one photo — trust neither
+                results[index] = None
+                continue
+            seen.add(index)
+            results[index] = self._validated_batch_item(image_urls[index], item)
+
+        return results
+
+    def _validated_batch_item(
+        self, image_url: str, item: dict
+    ) -> ImageClassification | None:
+        """
+        Build an ImageClassification from one batched reply entry.
+
+        Returns:
+            The classification, or None if room_type, room_number or
+            confidence is missing or out of range.
+        """
+        room_type_str = item.get("room_type")
+        confidence = item.get("confidence")
+        room_number = item.get("room_number", 1)
+        if not isinstance(room_type_str, str):
+            return None
+        if isinstance(confidence, bool) or not isinstance(confidence, int | float):
+            return None
+        if not 0.0 <= confidence <= 1.0:
+            return None
+        try:
+            room_number = max(1, int(room_number or 1))
+        except (TypeError, ValueError):
+            return None
+
+        return ImageClassification(
+            image_url=image_url,
+            room_type=self._map_room_type(room_type_str),
+            room_number=room_number,
+            confidence=float(confidence),
+        )
+
     def _map_room_type(self, room_type_str: str) -> RoomType:
         """
         Map a room type string to the RoomType enum.
@@ -255,11 +437,15 @@ class ImageClassifierService:
         """
         Classify multiple images, using Apify tags to skip GPT where possible.
 
-        Two-phase strategy:
+        Three-phase strategy, after near-duplicates are set aside (when a
+        deduplicator is configured; they inherit their representative's
+        classification at the end):
         1. Tag phase (free): for each URL that has a known Apify tag, call
            classify_from_tag(). These complete instantly with TAG_CLASSIFICATION_CONFIDENCE.
-        2. GPT phase (paid): URLs with no tag or an unknown tag are sent to
-           classify_single_image() concurrently, respecting the semaphore.
+        2. Cache phase (free): remaining URLs are looked up in the classification
+           cache by content hash, when a cache is configured.
+        3. GPT phase (paid): cache misses are sent to classify_single_image()
+           concurrently, respecting the semaphore. Confident results are cached.
 
         Progress callbacks are fired for EVERY image regardless of which phase
         classified it, so the frontend counter is always accurate.
@@ -278,6 +464,11 @@ class ImageClassifierService:
         total = len(image_urls)
         completed = 0
 
+        duplicates: dict[str, str] = {}
+        if self.deduplicator is not None and len(image_urls) > 1:
+            duplicates = await self.deduplicator.find_duplicates(image_urls)
+            image_urls = [url for url in image_urls if url not in duplicates]
+
         # --- Phase 1: Tag-based classification (no API cost) ---
         tagged: list[ImageClassification] = []
         untagged_urls: list[str] = []
@@ -309,11 +500,51 @@ class ImageClassifierService:
             if progress_callback:
                 await progress_callback(completed, total, classification)
 
-        # --- Phase 2: GPT-based classification (concurrent, rate-limited) ---
+        # --- Phase 2: Cache lookup by content hash (no API cost) ---
+        if self.cache is not None and untagged_urls:
+            uncached_urls: list[str] = []
+            for url in untagged_urls:
+                cached = await self.cache.get(url, self.model)
+                if cached is None:
+                    uncached_urls.append(url)
+                    continue
+                classifications.append(cached)
+                completed += 1
+                if progress_callback:
+                    await progress_callback(completed, total, cached)
+
+            logger.info(
+                "classification_cache_lookup",
+                hits=len(untagged_urls) - len(uncached_urls),
+                misses=len(uncached_urls),
+            )
+            untagged_urls = uncached_urls
+
+        # --- Phase 3: GPT-based classification (concurrent, rate-limited) ---
         if untagged_urls:
-            tasks = [self.classify_single_image(url) for url in untagged_urls]
-            for task in asyncio.as_completed(tasks):
-                classification = await task
+            batches = [
+                untagged_urls[i : i + self.batch_size]
+                for i in range(0, len(untagged_urls), self.batch_size)
+            ]
+            tasks = [
+                asyncio.create_task(self._classify_batch_and_cache(batch)) for batch in batches
+            ]
+            try:
+                for task in asyncio.as_completed(tasks):
+                    for classification in await task:
+                        classifications.append(classification)
+                        completed += 1
+                        if progress_callback:
+                            await progress_callback(completed, total, classification)
+            finally:
+                # On cancellation (client gone) stop the GPT calls still pending
+                for task in tasks:
+                    task.cancel()
+
+        if duplicates:
+            by_url = {c.image_url: c for c in classifications}
+            for url, representative in duplicates.items():
+                classification = inherit_classification(by_url[representative], url)
                 classifications.append(classification)
                 completed += 1
                 if progress_callback:
@@ -321,6 +552,158 @@ class ImageClassifierService:
 
         return classifications
 
+    async def classify_image_stream(
+        self,
+        images: AsyncIterable[tuple[str, str | None]],
+        total: int,
+        progress_callback=None,
+    ) -> list[ImageClassification]:
+        """
+        Classify images as they arrive (e.g. straight off the downloader).
+
+        Each (image_url, tag) pair is routed the moment it is received: known
+        tags and cache hits are reported immediately, everything else starts a
+        GPT classification (collected into batches of
+        ``classification_batch_size`` first, when batching is on). At most
+        2 x max_concurrent GPT requests are in flight or queued; beyond that the
+        consumer stops pulling from ``images``, which backs pressure up to the
+        producer.
+
+        With a deduplicator, each arriving image is hashed and matched against
+        the shots seen so far; near-duplicates skip classification and inherit
+        their representative's result once all images are in.
+
+        Args:
+            images:            Async iterable of (image_url, Apify tag or None).
+            total:             Number of images the iterable will yield (for progress).
+            progress_callback: Optional async callback(current, total, classification),
+                               same semantics as classify_images().
+
+        Returns:
+            List of ImageClassification objects in completion order.
+        """
+        classifications: list[ImageClassification] = []
+        completed = 0
+
+        async def _report(classification: ImageClassification) -> None:
+            nonlocal completed
+            classifications.append(classification)
+            completed += 1
+            if progress_callback:
+                await progress_callback(completed, total, classification)
+
+        in_flight = asyncio.Semaphore(2 * self.max_concurrent)
+        pending: list[str] = []
+
+        async def _classify_gpt(batch: list[str]) -> None:
+            try:
+                for classification in await self._classify_batch_and_cache(batch):
+                    await _report(classification)
+            finally:
+                in_flight.release()
+
+        gpt_tasks: list[asyncio.Task] = []
+
+        async def _flush() -> None:
+            await in_flight.acquire()
+            gpt_tasks.append(asyncio.create_task(_classify_gpt(pending[:])))
+            pending.clear()
+
+        index = self.deduplicator.index() if self.deduplicator is not None else None
+        duplicates: dict[str, str] = {}
+        gpt_count = 0
+        try:
+            async for image_url, tag in images:
+                if index is not None:
+                    representative = await index.match(image_url)
+                    if representative is not None:
+                        duplicates[image_url] = representative
+                        continue
+                if tag:
+                    classification = classify_from_tag(image_url, tag)
+                    if classification is not None:
+                        await _report(classification)
+                        continue
+                if self.cache is not None:
+                    cached = await self.cache.get(image_url, self.model)
+                    if cached is not None:
+                        await _report(cached)
+                        continue
+                pending.append(image_url)
+                gpt_count += 1
+                if len(pending) >= self.batch_size:
+                    await _flush()
+            if pending:
+                await _flush()
+
+            await asyncio.gather(*gpt_tasks)
+        finally:
+            for task in gpt_tasks:
+                task.cancel()
+
+        by_url = {c.image_url: c for c in classifications}
+        for image_url, representative in duplicates.items():
+            await _report(inherit_classification(by_url[representative], image_url))
+
+        logger.info(
+            "classification_stream_complete",
+            total=completed,
+            gpt_count=gpt_count,
+            gpt_requests=len(gpt_tasks),
+            duplicates=len(duplicates),
+        )
+        return classifications
+
+    async def _classify_batch_and_cache(
+        self, image_urls: list[str]
+    ) -> list[ImageClassification]:
+        """
+        Classify a batch via one GPT request, falling back to single-image calls.
+
+        Images whose batched answer is missing or invalid are re-sent through
+        _classify_and_cache() one by one. Batch results are cached like single ones.
+        """
+        if len(image_urls) == 1:
+            return [await self._classify_and_cache(image_urls[0])]
+
+        started = time.perf_counter()
+        results = await self.classify_image_batch(image_urls)
+        elapsed = time.perf_counter() - started
+
+        classifications: list[ImageClassification] = []
+        retry_urls: list[str] = []
+        for url, result in zip(image_urls, results):
+            if result is None:
+                retry_urls.append(url)
+                continue
+            classifications.append(result)
+            if self.cache is not None:
+                # Per-image share of the request, so savings estimates stay comparable
+                self.cache.record_gpt_call(elapsed / len(image_urls))
+                await self.cache.set(result, self.model)
+
+        if retry_urls:
+            logger.info(
+                "batch_classification_fallback",
+                batch_size=len(image_urls),
+                retried=len(retry_urls),
+            )
+            classifications.extend(
+                await asyncio.gather(*(self._classify_and_cache(url) for url in retry_urls))
+            )
+        return classifications
+
+    async def _classify_and_cache(self, image_url: str) -> ImageClassification:
+        """Classify via GPT and store the result in the cache, if one is configured."""
+        if self.cache is None:
+            return await self.classify_single_image(image_url)
+
+        started = time.perf_counter()
+        classification = await self.classify_single_image(image_url)
+        self.cache.record_gpt_call(time.perf_counter() - started)
+        await self.cache.set(classification, self.model)
+        return classification
+
     def group_by_room_simple(
         self, classifications: list[ImageClassification]
     ) -> dict[str, list[ImageClassification]]:
@@ -402,15 +785,9 @@ class ImageClassifierService:
         )
 
         content: list[dict] = [{"type": "text", "text": prompt_text}]
-        for url in image_urls:
-            content.append(
-                {
-                    "type": "image_url",
-                    "image_url": {"url": url, "detail": image_detail},
-                }
-            )
 
         try:
+            content += await image_content_parts(image_urls, image_detail, self.image_resolver)
             async with self.semaphore:
                 response = await self.client.chat.completions.create(
                     model=self.model,
@@ -661,7 +1038,9 @@ class ImageClassifierService:
         Algorithm:
         1. Pass 1 — bucket by room_type (ignore existing room_number).
         2. Pass 2 — for BEDROOM and BATHROOM buckets with >1 image:
-             - Send up to MAX_CLUSTERING_IMAGES to cluster_room_images().
+             - With a local clusterer, cluster offline; keep the result when
+               its confidence reaches the threshold.
+             - Otherwise send up to MAX_CLUSTERING_IMAGES to cluster_room_images().
              - For larger buckets: cluster the first batch, then handle overflow.
              - On failure: fall back to _metadata_fallback().
            Singleton-type buckets (KITCHEN, etc.) keep room_number=1.
@@ -680,17 +1059,108 @@ class ImageClassifierService:
         if not classifications:
             return {}
 
-        # Pass 1: bucket by room_type only
+        non_multi_buckets, cluster_plan = self._plan_grouping(
+            classifications, num_rooms, num_bathrooms
+        )
+
+        # Pass 2: run clustering concurrently
+        clustering_results: list[list[RoomCluster]] = []
+        if cluster_plan:
+            clustering_results = await asyncio.gather(
+                *[
+                    self._cluster_bucket(rt, items, exp, image_detail)
+                    for rt, items, exp in cluster_plan
+                ]
+            )
+
+        # Pass 3: build the final grouped dict
+        # Non-multi types: all images into room_number=1
+        grouped = self._single_room_groups(non_multi_buckets)
+
+        # Multi types: map each ImageClassification to its cluster
+        for (room_type, items, _), clusters in zip(cluster_plan, clustering_results):
+            grouped.update(self._room_groups(room_type, items, clusters))
+
+        return grouped
+
+    async def iter_room_groups(
+        self,
+        classifications: list[ImageClassification],
+        num_rooms: int | None = None,
+        num_bathrooms: int | None = None,
+        image_detail: str = "low",
+    ) -> AsyncIterator[dict[str, list[ImageClassification]]]:
+        """
+        Yield room groups in batches as soon as each one is final.
+
+        Same grouping as group_by_room(), but without the barrier on the
+        slowest clustering call: the first batch holds every room that needs
+        no clustering (kitchen, living room, a single-bedroom flat's bedroom),
+        then each multi-room type is yielded the moment its clustering
+        finishes. Merging the batches gives exactly group_by_room()'s result.
+
+        Closing the iterator early cancels clustering still in flight.
+
+        Args:
+            classifications: List of image classifications from classify_images().
+            num_rooms: Number of bedrooms from property metadata (for fallback).
+            num_bathrooms: Number of bathrooms from property metadata (for fallback).
+            image_detail: GPT image detail level passed to cluster_room_images().
+
+        Yields:
+            Dicts mapping room keys to ImageClassification lists, one per batch.
+        """
+        if not classifications:
+            return
+
+        non_multi_buckets, cluster_plan = self._plan_grouping(
+            classifications, num_rooms, num_bathrooms
+        )
+        tasks = {
+            asyncio.create_task(self._cluster_bucket(rt, items, exp, image_detail)): (rt, items)
+            for rt, items, exp in cluster_plan
+        }
+        try:
+            if non_multi_buckets:
+                yield self._single_room_groups(non_multi_buckets)
+
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    room_type, items = tasks[task]
+                    yield self._room_groups(room_type, items, task.result())
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def _plan_grouping(
+        self,
+        classifications: list[ImageClassification],
+        num_rooms: int | None,
+        num_bathrooms: int | None,
+    ) -> tuple[
+        dict[RoomType, list[ImageClassification]],
+        list[tuple[RoomType, list[ImageClassification], int | None]],
+    ]:
+        """
+        Pass 1 of grouping: bucket by room_type (ignoring existing room_number).
+
+        Returns:
+            (buckets that are a single room each,
+             [(room_type, items, expected_rooms)] buckets that need clustering)
+        """
         type_buckets: dict[RoomType, list[ImageClassification]] = defaultdict(list)
         for c in classifications:
             type_buckets[c.room_type].append(c)
 
         # Separate types that need clustering from singletons
-        cluster_tasks: list[tuple[RoomType, list[ImageClassification], int | None]] = []
+        cluster_plan: list[tuple[RoomType, list[ImageClassification], int | None]] = []
         non_multi_buckets: dict[RoomType, list[ImageClassification]] = {}
 
         for room_type, items in type_buckets.items():
-            if room_type in MULTI_ROOM_TYPES and len(items) > 1:
+            distinct = sum(1 for c in items if c.duplicate_of is None)
+            if room_type in MULTI_ROOM_TYPES and distinct > 1:
                 expected = num_rooms if room_type == RoomType.BEDROOM else num_bathrooms
                 if expected is not None and expected == 1:
                     # Single room — all images belong to it. Skip clustering.
@@ -701,93 +1171,162 @@ class ImageClassifierService:
                     )
                     non_multi_buckets[room_type] = items
                 else:
-                    cluster_tasks.append((room_type, items, expected))
+                    cluster_plan.append((room_type, items, expected))
             else:
                 non_multi_buckets[room_type] = items
 
-        # Pass 2: run clustering concurrently
-        async def _cluster_one(
-            room_type: RoomType,
-            items: list[ImageClassification],
-            expected_rooms: int | None,
-        ) -> tuple[RoomType, list[RoomCluster]]:
-            urls = [c.image_url for c in items]
-
-            if len(urls) <= MAX_CLUSTERING_IMAGES:
-                clusters = await self.cluster_room_images(
-                    room_type, urls, image_detail, expected_rooms
-                )
-            else:
-                first_batch = urls[:MAX_CLUSTERING_IMAGES]
-                first_clusters = await self.cluster_room_images(
-                    room_type, first_batch, image_detail, expected_rooms
-                )
-
-                overflow_urls = urls[MAX_CLUSTERING_IMAGES:]
-                overflow_start = MAX_CLUSTERING_IMAGES
+        return non_multi_buckets, cluster_plan
 
-                if expected_rooms is not None and len(first_clusters) >= expected_rooms:
-                    # Distribute overflow sequentially across existing clusters
-                    for overflow_offset, _ in enumerate(overflow_urls):
-                        target = first_clusters[overflow_offset % len(first_clusters)]
-                        target.image_indices.append(overflow_start + overflow_offset)
-                    clusters = first_clusters
-                else:
-                    # Run a second pass on the overflow to find additional rooms
-                    second_clusters = await self.cluster_room_images(
-                        room_type, overflow_urls, image_detail, expected_rooms
-                    )
-                    room_num_offset = len(first_clusters)
-                    offset_second = [
-                        RoomCluster(
-                            room_number=sc.room_number + room_num_offset,
-                            image_indices=[
-                                idx + overflow_start for idx in sc.image_indices
-                            ],
-                            confidence=sc.confidence,
-                            visual_cues=sc.visual_cues,
-                        )
-                        for sc in second_clusters
-                    ]
-                    clusters = first_clusters + offset_second
-
-            validated = self._validate_clusters(clusters, len(items))
-            if validated is None:
-                validated = self._metadata_fallback(len(items), expected_rooms)
-            elif expected_rooms is not None and expected_rooms > 0 and len(validated) > expected_rooms:
-                # Never produce more distinct rooms than the property metadata says exist.
-                # GPT sometimes over-clusters when photos of the same room look slightly
-                # different (angle, lighting, staging). Cap and merge the excess.
-                validated = self._cap_to_expected_rooms(validated, expected_rooms, room_type)
-
-            return room_type, validated
-
-        clustering_results: dict[RoomType, list[RoomCluster]] = {}
-        if cluster_tasks:
-            results = await asyncio.gather(
-                *[_cluster_one(rt, items, exp) for rt, items, exp in cluster_tasks]
+    async def _cluster_bucket(
+        self,
+        room_type: RoomType,
+        items: list[ImageClassification],
+        expected_rooms: int | None,
+        image_detail: str,
+    ) -> list[RoomCluster]:
+        """Pass 2 of grouping: cluster one multi-room bucket into validated rooms."""
+        urls = [c.image_url for c in items]
+
+        # Near-duplicates are clustered through their representative
+        representatives = [
+            i for i, c in enumerate(items) if c.duplicate_of is None or c.duplicate_of not in urls
+        ]
+        if len(representatives) < len(items):
+            clusters = await self._cluster_bucket(
+                room_type, [items[i] for i in representatives], expected_rooms, image_detail
             )
-            for room_type, clusters in results:
-                clustering_results[room_type] = clusters
+            return self._with_duplicates(items, representatives, clusters)
 
-        # Pass 3: build the final grouped dict
-        grouped: dict[str, list[ImageClassification]] = {}
+        clusters = await self._local_clusters(room_type, urls, expected_rooms)
+        if clusters is None:
+            clusters = await self._gpt_clusters(room_type, urls, expected_rooms, image_detail)
 
-        # Non-multi types: all images into room_number=1
-        for room_type, items in non_multi_buckets.items():
-            room_key = f"{room_type.value}_1"
-            grouped[room_key] = items
+        validated = self._validate_clusters(clusters, len(items))
+        if validated is None:
+            validated = self._metadata_fallback(len(items), expected_rooms)
+        elif expected_rooms is not None and expected_rooms > 0 and len(validated) > expected_rooms:
+            # Never produce more distinct rooms than the property metadata says exist.
+            # GPT sometimes over-clusters when photos of the same room look slightly
+            # different (angle, lighting, staging). Cap and merge the excess.
+            validated = self._cap_to_expected_rooms(validated, expected_rooms, room_type)
 
-        # Multi types: map each ImageClassification to its cluster
-        for room_type, items, _ in cluster_tasks:
-            clusters = clustering_results.get(room_type, [])
-            if not clusters:
-                clusters = self._metadata_fallback(len(items), None)
-            for cluster in clusters:
-                room_key = f"{room_type.value}_{cluster.room_number}"
-                grouped[room_key] = [items[i] for i in cluster.image_indices]
+        return validated
 
-        return grouped
+    async def _local_clusters(
+        self, room_type: RoomType, urls: list[str], expected_rooms: int | None
+    ) -> list[RoomCluster] | None:
+        """Offline clustering of a bucket; None when absent, unsure or unavailable."""
+        if self.local_clusterer is None:
+            return None
+        try:
+            result = await self.local_clusterer.cluster(urls, expected_rooms)
+        except Exception as e:
+            logger.warning("local_clustering_error", room_type=room_type.value, error=str(e))
+            result = None
+
+        accepted = (
+            result is not None
+            and result.confidence >= self.local_clusterer.config.min_confidence
+        )
+        gpt_calls = 1 if len(urls) <= MAX_CLUSTERING_IMAGES else 2
+        self.local_clusterer.record(accepted, gpt_calls)
+        logger.info(
+            "local_clustering",
+            room_type=room_type.value,
+            num_images=len(urls),
+            confidence=result.confidence if result is not None else None,
+            accepted=accepted,
+        )
+        return result.clusters if accepted else None
+
+    async def _gpt_clusters(
+        self,
+        room_type: RoomType,
+        urls: list[str],
+        expected_rooms: int | None,
+        image_detail: str,
+    ) -> list[RoomCluster]:
+        """GPT clustering of a bucket, in two calls when it exceeds MAX_CLUSTERING_IMAGES."""
+        if len(urls) <= MAX_CLUSTERING_IMAGES:
+            return await self.cluster_room_images(room_type, urls, image_detail, expected_rooms)
+
+        first_batch = urls[:MAX_CLUSTERING_IMAGES]
+        first_clusters = await self.cluster_room_images(
+            room_type, first_batch, image_detail, expected_rooms
+        )
+
+        overflow_urls = urls[MAX_CLUSTERING_IMAGES:]
+        overflow_start = MAX_CLUSTERING_IMAGES
+
+        if expected_rooms is not None and len(first_clusters) >= expected_rooms:
+            # Distribute overflow sequentially across existing clusters
+            for overflow_offset, _ in enumerate(overflow_urls):
+                target = first_clusters[overflow_offset % len(first_clusters)]
+                target.image_indices.append(overflow_start + overflow_offset)
+            clusters = first_clusters
+        else:
+            # Run a second pass on the overflow to find additional rooms
+            second_clusters = await self.cluster_room_images(
+                room_type, overflow_urls, image_detail, expected_rooms
+            )
+            room_num_offset = len(first_clusters)
+            offset_second = [
+                RoomCluster(
+                    room_number=sc.room_number + room_num_offset,
+                    image_indices=[
+                        idx + overflow_start for idx in sc.image_indices
+                    ],
+                    confidence=sc.confidence,
+                    visual_cues=sc.visual_cues,
+                )
+                for sc in second_clusters
+            ]
+            clusters = first_clusters + offset_second
+        return clusters
+
+    @staticmethod
+    def _with_duplicates(
+        items: list[ImageClassification],
+        representatives: list[int],
+        clusters: list[RoomCluster],
+    ) -> list[RoomCluster]:
+        """Map clusters of representatives back onto items, each duplicate joining its own."""
+        cluster_of: dict[str, RoomCluster] = {}
+        expanded: list[RoomCluster] = []
+        for cluster in clusters:
+            indices = [representatives[i] for i in cluster.image_indices]
+            copy = cluster.model_copy(update={"image_indices": indices})
+            for i in indices:
+                cluster_of[items[i].image_url] = copy
+            expanded.append(copy)
+        for i, c in enumerate(items):
+            target = cluster_of.get(c.duplicate_of) if i not in representatives else None
+            if target is not None:
+                target.image_indices.append(i)
+        for cluster in expanded:
+            cluster.image_indices.sort()
+        return expanded
+
+    @staticmethod
+    def _single_room_groups(
+        buckets: dict[RoomType, list[ImageClassification]],
+    ) -> dict[str, list[ImageClassification]]:
+        """Pass 3 for unclustered buckets: every image belongs to room 1."""
+        return {f"{room_type.value}_1": items for room_type, items in buckets.items()}
+
+    def _room_groups(
+        self,
+        room_type: RoomType,
+        items: list[ImageClassification],
+        clusters: list[RoomCluster],
+    ) -> dict[str, list[ImageClassification]]:
+        """Pass 3 for a clustered bucket: map each image to its cluster's room key."""
+        if not clusters:
+            clusters = self._metadata_fallback(len(items), None)
+        return {
+            f"{room_type.value}_{cluster.room_number}": [items[i] for i in cluster.image_indices]
+            for cluster in clusters
+        }
 
 
 # Factory function for dependency injection
@@ -796,6 +1335,19 @@ def create_image_classifier(
     model: str = "gpt-4o-mini",
     max_concurrent: int = 5,
     openai_config: OpenAIConfig | None = None,
+    cache: ClassificationCache | None = None,
+    image_resolver: ImageResolver | None = None,
+    deduplicator: ImageDeduplicator | None = None,
+    local_clusterer: LocalRoomClusterer | None = None,
 ) -> ImageClassifierService:
     """Create an ImageClassifierService instance."""
-    return ImageClassifierService(openai_api_key, model, max_concurrent, openai_config)
+    return ImageClassifierService(
+        openai_api_key,
+        model,
+        max_concurrent,
+        openai_config,
+        cache,
+        image_resolver,
+        deduplicator,
+        local_clusterer,
+    )
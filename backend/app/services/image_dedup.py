@@ -0,0 +1,277 @@
+"""
+Near-duplicate photo detection by perceptual hash, ahead of classification.
+
+Idealista listings often carry the same shot twice — re-cropped, resized or
+uploaded at two resolutions. Byte-identical copies already share an
+ImageStore handle and a classification-cache key; near-duplicates do not, so
+each one cost a GPT classification call and could count as an extra room
+when bedrooms and bathrooms were clustered.
+
+ImageDeduplicator computes a 64-bit difference hash (dHash) of every
+downloaded image in a thread pool: the photo is decoded at reduced scale
+(JPEG draft mode) into a 32x32 thumbnail, converted to grayscale, shrunk to
+9x8 and each bit records whether a pixel is brighter than its right-hand
+neighbour. Resizing and re-encoding leave the hash (nearly) unchanged; two
+photos whose hashes differ in at most max_distance bits are the same shot.
+Signatures (hash, plus the thumbnail with keep_thumbnails) are cached by
+content digest, so a photo seen in an earlier analysis is not decoded again.
+
+This is the only place photos are decoded for local analysis:
+LocalRoomClusterer builds its descriptors from the signatures of the
+deduplicator it is given, so a photo is decoded once for both.
+
+Within a listing, the first photo of each shot is its representative; later
+near-duplicates are only classified through it. ImageClassifierService marks
+them with ImageClassification.duplicate_of, and grouping clusters only
+representatives, adding each duplicate to its representative's room.
+
+Low-contrast thumbnails (blank or line-drawing images such as floor plans)
+hash to near-constant values and are never collapsed; neither are plain
+http(s) URLs, whose bytes are not available locally.
+
+Usage:
+    deduplicator = ImageDeduplicator(settings.image_dedup, image_store)
+    duplicates = await deduplicator.find_duplicates(image_refs)  # {duplicate: representative}
+
+    index = deduplicator.index()                 # incremental, for streamed images
+    representative = await index.match(ref)      # None when ref is a new shot
+"""
+
+import asyncio
+import io
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any
+
+import structlog
+from PIL import Image, UnidentifiedImageError
+
+from app.config import ImageDedupConfig
+from app.services.classification_cache import image_fingerprint
+from app.services.image_preparer import decode_data_uri
+from app.services.image_store import ImageStore
+
+logger = structlog.get_logger(__name__)
+
+# Side of the RGB thumbnail every photo is decoded to (hash_size must be smaller)
+THUMBNAIL_SIDE = 32
+# Thumbnails whose brightest and darkest pixels differ by less are not hashed
+MIN_THUMBNAIL_CONTRAST = 24
+
+
+@dataclass(frozen=True)
+class ImageSignature:
+    """What one reduced-scale decode of a photo yields."""
+
+    dhash: int                # hash_size² gradient bits, first pixel row first
+    hash_size: int
+    flat: bool                # too little contrast for the hash to tell shots apart
+    thumbnail: bytes | None   # THUMBNAIL_SIDE² RGB pixels, when kept
+
+    @property
+    def hash(self) -> int | None:
+        """The dHash, or None for a flat thumbnail (never collapsed)."""
+        return None if self.flat else self.dhash
+
+
+def decode_thumbnail(data: bytes) -> Image.Image | None:
+    """THUMBNAIL_SIDE² RGB thumbnail of encoded image bytes, or None if undecodable."""
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            # JPEG: let the decoder downscale by up to 8x while decoding
+            image.draft("RGB", (THUMBNAIL_SIDE * 2, THUMBNAIL_SIDE * 2))
+            return image.convert("RGB").resize(
+                (THUMBNAIL_SIDE, THUMBNAIL_SIDE), Image.Resampling.BOX
+            )
+    except (UnidentifiedImageError, OSError, ValueError):
+        return None
+
+
+def image_signature(
+    data: bytes, hash_size: int = 8, keep_thumbnail: bool = False
+) -> ImageSignature | None:
+    """Decode encoded image bytes once into their signature; None if undecodable."""
+    thumbnail = decode_thumbnail(data)
+    if thumbnail is None:
+        return None
+    pixels = thumbnail.convert("L").resize(
+        (hash_size + 1, hash_size), Image.Resampling.BOX
+    ).tobytes()
+
+    bits = 0
+    width = hash_size + 1
+    for row in range(hash_size):
+        for col in range(hash_size):
+            offset = row * width + col
+            bits = (bits << 1) | (pixels[offset] > pixels[offset + 1])
+    return ImageSignature(
+        dhash=bits,
+        hash_size=hash_size,
+        flat=max(pixels) - min(pixels) < MIN_THUMBNAIL_CONTRAST,
+        thumbnail=thumbnail.tobytes() if keep_thumbnail else None,
+    )
+
+
+def difference_hash(data: bytes, hash_size: int = 8) -> int | None:
+    """
+    64-bit (for hash_size 8) dHash of encoded image bytes.
+
+    Returns:
+        The hash, or None if the bytes are not a decodable image or the
+        thumbnail is too flat to tell shots apart.
+    """
+    signature = image_signature(data, hash_size)
+    return signature.hash if signature is not None else None
+
+
+def hamming_distance(a: int, b: int) -> int:
+    """Number of differing bits between two hashes."""
+    return (a ^ b).bit_count()
+
+
+class DuplicateIndex:
+    """Representatives seen so far in one listing; match() adds new shots."""
+
+    def __init__(self, deduplicator: "ImageDeduplicator"):
+        self._deduplicator = deduplicator
+        self._representatives: list[tuple[str, int]] = []
+        self._seen: set[str] = set()
+
+    async def match(self, image_ref: str) -> str | None:
+        """
+        Representative that image_ref duplicates, or None (it becomes one).
+
+        Unhashable images are never duplicates and never representatives; a
+        reference seen before is not its own duplicate.
+        """
+        image_hash = await self._deduplicator.hash_image(image_ref)
+        return self.add(image_ref, image_hash)
+
+    def add(self, image_ref: str, image_hash: int | None) -> str | None:
+        """match() for an already computed hash."""
+        if image_hash is None or image_ref in self._seen:
+            return None
+        max_distance = self._deduplicator.config.max_distance
+        for representative, representative_hash in self._representatives:
+            if hamming_distance(image_hash, representative_hash) <= max_distance:
+                self._deduplicator.duplicates += 1
+                return representative
+        self._representatives.append((image_ref, image_hash))
+        self._seen.add(image_ref)
+        return None
+
+
+class ImageDeduplicator:
+    """Perceptual hashing in a thread pool, with signatures cached by content digest."""
+
+    def __init__(
+        self,
+        config: ImageDedupConfig | None = None,
+        store: ImageStore | None = None,
+        keep_thumbnails: bool = False,
+    ):
+        """
+        Args:
+            config:          Hash size, distance threshold, worker count and cache size.
+            store:           ImageStore that resolves handles to bytes; without
+                             one, only data URIs can be hashed.
+            keep_thumbnails: Also cache each photo's thumbnail, for a
+                             LocalRoomClusterer reading through this deduplicator.
+        """
+        self.config = config or ImageDedupConfig()
+        self.store = store
+        self.keep_thumbnails = keep_thumbnails
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.config.max_workers, thread_name_prefix="image-dedup"
+        )
+        # content fingerprint -> signature (None: not decodable)
+        self._signatures: OrderedDict[bytes, ImageSignature | None] = OrderedDict()
+        self.hashed = 0
+        self.hash_cache_hits = 0
+        self.unhashable = 0
+        self.duplicates = 0
+
+    def index(self) -> DuplicateIndex:
+        """A fresh per-listing index for incremental matching."""
+        return DuplicateIndex(self)
+
+    async def find_duplicates(self, image_refs: list[str]) -> dict[str, str]:
+        """
+        Collapse near-duplicates in a listing's photos.
+
+        Hashes every image concurrently; the earliest photo of each shot is
+        its representative.
+
+        Returns:
+            {duplicate ref: representative ref} for every duplicate.
+        """
+        hashes = await asyncio.gather(*(self.hash_image(ref) for ref in image_refs))
+        index = self.index()
+        duplicates: dict[str, str] = {}
+        for ref, image_hash in zip(image_refs, hashes):
+            representative = index.add(ref, image_hash)
+            if representative is not None:
+                duplicates[ref] = representative
+        if duplicates:
+            logger.info(
+                "near_duplicate_images_collapsed",
+                images=len(image_refs),
+                duplicates=len(duplicates),
+            )
+        return duplicates
+
+    async def hash_image(self, image_ref: str) -> int | None:
+        """dHash of a store handle or data URI; None for URLs and unhashable images."""
+        signature = await self.signature(image_ref)
+        return signature.hash if signature is not None else None
+
+    async def signature(self, image_ref: str) -> ImageSignature | None:
+        """
+        Signature of a store handle or data URI, decoded once per content digest.
+
+        Returns:
+            The signature, or None for plain URLs, evicted handles and
+            undecodable images.
+        """
+        fingerprint = image_fingerprint(image_ref)
+        if fingerprint in self._signatures:
+            self._signatures.move_to_end(fingerprint)
+            self.hash_cache_hits += 1
+            return self._signatures[fingerprint]
+
+        data = self._image_bytes(image_ref)
+        if data is None:
+            return None
+        loop = asyncio.get_running_loop()
+        signature = await loop.run_in_executor(
+            self._executor, image_signature, data, self.config.hash_size, self.keep_thumbnails
+        )
+        self.hashed += 1
+        self.unhashable += signature is None or signature.flat
+        self._signatures[fingerprint] = signature
+        while len(self._signatures) > self.config.max_cached_hashes:
+            self._signatures.popitem(last=False)
+        return signature
+
+    def _image_bytes(self, image_ref: str) -> bytes | None:
+        if self.store is not None:
+            entry = self.store.get(image_ref)
+            if entry is not None:
+                return entry[1]
+        decoded = decode_data_uri(image_ref)
+        return decoded[1] if decoded is not None else None
+
+    def stats(self) -> dict[str, Any]:
+        """Images hashed, hash-cache hits and near-duplicates collapsed."""
+        return {
+            "hashed": self.hashed,
+            "hash_cache_hits": self.hash_cache_hits,
+            "unhashable": self.unhashable,
+            "duplicates": self.duplicates,
+            "cached_hashes": len(self._signatures),
+        }
+
+    def close(self) -> None:
+        """Shut down the worker pool."""
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -5,21 +5,37 @@ Downloading images once at the start of the pipeline eliminates repeated CDN fet
 across the classify → cluster → estimate stages, preventing rate-limiting and
 anti-hotlinking blocks from the Idealista CDN.
 
+The service owns one long-lived httpx client for the whole process (created in
+the app lifespan, closed on shutdown). Connections to the CDN stay open between
+analyses, so only the first listing pays TCP+TLS handshakes; with HTTP/2 a
+handful of connections multiplex all concurrent image requests. A per-host
+semaphore caps in-flight requests to any one host across concurrent analyses.
+
+When an ImageStore is configured, bytes go into the store and the returned
+mapping holds short handles instead of data URIs (see image_store.py), so graph
+state never carries base64.
+
 Usage:
     downloader = ImageDownloaderService()
     image_data = await downloader.download_images(urls)
     # Returns: {"https://cdn.example.com/img.jpg": "data:image/jpeg;base64,/9j/..."}
+    # With image_store: {"https://cdn.example.com/img.jpg": "img:3f2a9c0d1b7e4a55:https://..."}
     # On download failure: URL is absent from the returned dict.
+    await downloader.close()   # on shutdown
 """
 
 import asyncio
 import base64
+from collections import defaultdict
+from collections.abc import AsyncIterator
+from contextlib import nullcontext
 
 import httpx
 import structlog
 
 from app.config import ImageProcessingConfig
 from app.constants import DEFAULT_IMAGE_CONTENT_TYPE, KNOWN_IMAGE_TYPES
+from app.services.image_store import ImageStore
 
 logger = structlog.get_logger(__name__)
 
@@ -32,19 +48,46 @@ class ImageDownloaderService:
     downstream OpenAI calls receive inline image data instead of external URLs.
     """
 
-    def __init__(self, config: ImageProcessingConfig | None = None):
+    def __init__(
+        self,
+        config: ImageProcessingConfig | None = None,
+        image_store: ImageStore | None = None,
+    ):
         """
         Initialize the image downloader.
 
         Args:
             config: Image processing configuration (limits, timeouts, concurrency).
                     Defaults to ImageProcessingConfig() with built-in defaults.
+            image_store: Optional store for downloaded bytes. When set,
+                    download_images() returns store handles instead of data URIs.
         """
         self.config = config or ImageProcessingConfig()
+        self.image_store = image_store
+        self._client = httpx.AsyncClient(
+            http2=self.config.download_http2,
+            timeout=httpx.Timeout(self.config.download_timeout_seconds),
+            limits=httpx.Limits(
+                max_connections=self.config.download_max_connections,
+                max_keepalive_connections=self.config.download_max_keepalive_connections,
+                keepalive_expiry=self.config.download_keepalive_expiry_seconds,
+            ),
+            follow_redirects=True,
+        )
+        self._host_semaphores: defaultdict[str, asyncio.Semaphore] = defaultdict(
+            lambda: asyncio.Semaphore(self.config.download_max_connections_per_host)
+        )
+
+    async def close(self):
+        """Close the pooled HTTP client."""
+        await self._client.aclose()
 
     async def download_images(self, urls: list[str]) -> dict[str, str]:
         """
-        Download images concurrently and return a mapping of URL → base64 data URI.
+        Download images concurrently and return a mapping of URL → image reference.
+
+        The reference is a store handle when an ImageStore is configured, and a
+        base64 data URI otherwise.
 
         Only the first config.max_images_in_memory URLs are processed. Failed
         downloads are omitted from the result — callers should fall back to the
@@ -54,33 +97,23 @@ class ImageDownloaderService:
             urls: List of image URLs to download.
 
         Returns:
-            Dict mapping each successfully downloaded URL to its base64 data URI,
+            Dict mapping each successfully downloaded URL to its reference,
             e.g. ``{"https://cdn.example.com/img.jpg": "data:image/jpeg;base64,..."}``
         """
         if not urls:
             return {}
 
-        max_images = self.config.max_images_in_memory
-        capped_urls = urls[:max_images]
-        if len(urls) > max_images:
-            logger.warning(
-                "image_downloader_cap_exceeded",
-                total=len(urls),
-                cap=max_images,
-            )
-
+        capped_urls = self._cap(urls)
         semaphore = asyncio.Semaphore(self.config.max_concurrent_downloads)
-        timeout = httpx.Timeout(self.config.download_timeout_seconds)
-
-        async with httpx.AsyncClient(timeout=timeout, follow_redirects=True) as client:
-            tasks = [self._fetch_one(client, semaphore, url) for url in capped_urls]
-            results = await asyncio.gather(*tasks, return_exceptions=True)
+        tasks = [self._fetch_one(self._client, semaphore, url) for url in capped_urls]
+        results = await asyncio.gather(*tasks, return_exceptions=True)
 
         image_data: dict[str, str] = {}
         for url, result in zip(capped_urls, results):
-            if isinstance(result, str):
-                image_data[url] = result
-            # Exceptions are already logged inside _fetch_one; just skip here.
+            # Exceptions are already logged inside _fetch_one; just skip them here.
+            if isinstance(result, BaseException):
+                continue
+            image_data[url] = self._to_reference(url, *result)
 
         logger.info(
             "image_downloader_complete",
@@ -90,27 +123,111 @@ class ImageDownloaderService:
         )
         return image_data
 
+    async def stream_images(
+        self, urls: list[str], queue_size: int | None = None
+    ) -> AsyncIterator[tuple[str, str | None]]:
+        """
+        Download images concurrently, yielding each one as soon as it completes.
+
+        Producer/consumer with backpressure: finished downloads go into a
+        bounded queue, and a download that finds the queue full holds its
+        concurrency slot until the consumer catches up. A slow consumer
+        therefore throttles downloading instead of buffering every image.
+
+        URLs beyond config.max_images_in_memory and failed downloads are
+        yielded with a None reference so the consumer can fall back to the
+        original URL, exactly as with download_images().
+
+        Args:
+            urls:       Image URLs to download.
+            queue_size: Bound on downloaded-but-unconsumed images. Defaults to
+                        config.stream_queue_size.
+
+        Yields:
+            (url, reference or None), in completion order.
+        """
+        capped_urls = self._cap(urls)
+        for url in urls[len(capped_urls) :]:
+            yield url, None
+        if not capped_urls:
+            return
+
+        queue: asyncio.Queue[tuple[str, str | None]] = asyncio.Queue(
+            maxsize=queue_size or self.config.stream_queue_size
+        )
+        semaphore = asyncio.Semaphore(self.config.max_concurrent_downloads)
+
+        async def _produce(url: str) -> None:
+            async with semaphore:
+                try:
+                    # Slot already held above, across the queue.put below
+                    mime_type, content = await self._fetch_one(self._client, None, url)
+                    reference: str | None = self._to_reference(url, mime_type, content)
+                except Exception:
+                    reference = None  # already logged in _fetch_one
+                # Blocks while the queue is full, keeping this download slot taken
+                await queue.put((url, reference))
+
+        producers = [asyncio.create_task(_produce(url)) for url in capped_urls]
+        succeeded = 0
+        try:
+            for _ in capped_urls:
+                url, reference = await queue.get()
+                succeeded += reference is not None
+                yield url, reference
+        finally:
+            for task in producers:
+                task.cancel()
+            await asyncio.gather(*producers, return_exceptions=True)
+
+        logger.info(
+            "image_downloader_stream_complete",
+            total=len(capped_urls),
+            succeeded=succeeded,
+            failed=len(capped_urls) - succeeded,
+        )
+
+    def _cap(self, urls: list[str]) -> list[str]:
+        """Limit urls to config.max_images_in_memory, logging when truncated."""
+        max_images = self.config.max_images_in_memory
+        if len(urls) > max_images:
+            logger.warning(
+                "image_downloader_cap_exceeded",
+                total=len(urls),
+                cap=max_images,
+            )
+        return urls[:max_images]
+
+    def _to_reference(self, url: str, mime_type: str, content: bytes) -> str:
+        """Store handle when an ImageStore is configured, else a base64 data URI."""
+        if self.image_store is not None:
+            return self.image_store.put(url, mime_type, content)
+        encoded = base64.b64encode(content).decode("ascii")
+        return f"data:{mime_type};base64,{encoded}"
+
     async def _fetch_one(
         self,
         client: httpx.AsyncClient,
-        semaphore: asyncio.Semaphore,
+        semaphore: asyncio.Semaphore | None,
         url: str,
-    ) -> str:
+    ) -> tuple[str, bytes]:
         """
-        Fetch a single image and return it as a base64 data URI.
+        Fetch a single image and return its MIME type and bytes.
 
         Args:
-            client:    Shared httpx client.
-            semaphore: Concurrency limiter.
+            client:    Pooled httpx client.
+            semaphore: Per-call concurrency limiter, or None when the caller already
+                       holds one (the per-host cap is applied on top).
             url:       Image URL to fetch.
 
         Returns:
-            Base64 data URI string, e.g. ``"data:image/jpeg;base64,/9j/..."``
+            (mime_type, content), e.g. ``("image/jpeg", b"\xff\xd8...")``
 
         Raises:
             Exception: On any network or HTTP error (caller handles via gather).
         """
-        async with semaphore:
+        host = httpx.URL(url).host
+        async with semaphore or nullcontext(), self._host_semaphores[host]:
             try:
                 response = await client.get(url)
                 response.raise_for_status()
@@ -121,10 +238,8 @@ class ImageDownloaderService:
                 if mime_type not in KNOWN_IMAGE_TYPES:
                     mime_type = DEFAULT_IMAGE_CONTENT_TYPE
 
-                encoded = base64.b64encode(response.content).decode("ascii")
-                data_uri = f"data:{mime_type};base64,{encoded}"
                 logger.debug("image_downloaded", url=url, mime_type=mime_type, bytes=len(response.content))
-                return data_uri
+                return mime_type, response.content
 
             except Exception as e:
                 logger.warning("image_download_failed", url=url, error=str(e))
@@ -0,0 +1,275 @@
+"""
+Image preparation — downscale and re-encode downloaded images per OpenAI detail level.
+
+CDN photos are often 1–4 MB at 1500–4000 px. OpenAI never looks at more than:
+
+    detail="low"   one thumbnail fitting 512x512
+    detail="high"  fit in 2048x2048, then shortest side 768 (tiled at 512)
+
+so anything bigger only costs upload bandwidth, request-body size and memory.
+ImagePreparer decodes each image once, resizes it to exactly that geometry
+(never upscaling), re-encodes it as JPEG/WebP and caches the variant, keyed by
+content hash and detail level. Decode/resize/encode runs in a thread pool so
+the event loop keeps streaming progress.
+
+Payloads are built at call time through an ImageResolver (ImageStore in the
+app, or a bare ImagePreparer), so the same stored image is sent small to
+classification and larger to feature extraction:
+
+    preparer = ImagePreparer(settings.image_preparation)
+    parts = await image_content_parts(urls, "low", preparer)
+    # [{"type": "image_url", "image_url": {"url": "data:image/jpeg;base64,...", "detail": "low"}}]
+
+Plain http(s) URLs pass through unchanged — OpenAI fetches those itself.
+"""
+
+import asyncio
+import base64
+import hashlib
+import io
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Protocol
+
+import structlog
+from PIL import Image, ImageOps
+
+from app.config import ImagePreparationConfig
+from app.constants import HIGH_DETAIL_MAX_SIDE, HIGH_DETAIL_SHORT_SIDE, LOW_DETAIL_MAX_SIDE
+
+logger = structlog.get_logger(__name__)
+
+_FORMATS = {"jpeg": ("JPEG", "image/jpeg"), "webp": ("WEBP", "image/webp")}
+
+
+def target_size(width: int, height: int, detail: str) -> tuple[int, int]:
+    """
+    Size OpenAI would downscale an image to for the given detail level.
+
+    "low" fits the image in 512x512. "high" and "auto" fit it in 2048x2048 and
+    then cap the shortest side at 768. Images are never upscaled.
+
+    Args:
+        width:  Original width in pixels.
+        height: Original height in pixels.
+        detail: OpenAI detail level ("low", "high" or "auto").
+
+    Returns:
+        (width, height) of the variant to send.
+    """
+    if detail == "low":
+        scale = min(1.0, LOW_DETAIL_MAX_SIDE / max(width, height))
+    else:
+        scale = min(1.0, HIGH_DETAIL_MAX_SIDE / max(width, height))
+        scale *= min(1.0, HIGH_DETAIL_SHORT_SIDE / (min(width, height) * scale))
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def decode_data_uri(image_url: str) -> tuple[str, bytes] | None:
+    """Split a base64 data URI into (mime_type, bytes), or None for anything else."""
+    if not image_url.startswith("data:") or ";base64," not in image_url:
+        return None
+    header, encoded = image_url.split(",", 1)
+    try:
+        return header[5:].split(";", 1)[0], base64.b64decode(encoded)
+    except (ValueError, TypeError):
+        return None
+
+
+def encode_variant(
+    raw: bytes, mime_type: str, detail: str, image_format: str, quality: int
+) -> tuple[str, bytes]:
+    """
+    Resize and re-encode one image (CPU-bound; runs in the worker pool).
+
+    Falls back to the original bytes when re-encoding would not make the image
+    smaller, e.g. an already-small, well-compressed JPEG.
+
+    Returns:
+        (mime_type, encoded bytes)
+    """
+    pil_format, out_mime = _FORMATS[image_format]
+    with Image.open(io.BytesIO(raw)) as img:
+        size = target_size(img.width, img.height, detail)
+        # JPEG draft mode decodes at 1/2, 1/4 or 1/8 scale — much cheaper than a full decode
+        img.draft("RGB", size)
+        prepared = ImageOps.exif_transpose(img).convert("RGB")
+        if prepared.size != size:
+            prepared = prepared.resize(size, Image.Resampling.LANCZOS)
+        out = io.BytesIO()
+        prepared.save(out, format=pil_format, quality=quality, optimize=True)
+
+    encoded = out.getvalue()
+    if len(encoded) >= len(raw):
+        return mime_type, raw
+    return out_mime, encoded
+
+
+class ImageResolver(Protocol):
+    """Turns an image reference from graph state into the URL sent to OpenAI."""
+
+    async def resolve(self, image_url: str, detail: str) -> str: ...
+
+
+class ImagePreparer:
+    """Per-detail image variants with a byte-bounded LRU and a thread pool."""
+
+    def __init__(self, config: ImagePreparationConfig | None = None):
+        """
+        Args:
+            config: Output format, quality, worker count and cache size.
+        """
+        self.config = config or ImagePreparationConfig()
+        if self.config.format not in _FORMATS:
+            raise ValueError(f"Unsupported image format: {self.config.format!r}")
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.config.max_workers, thread_name_prefix="image-prep"
+        )
+        self._max_cache_bytes = self.config.cache_max_mb * 1024 * 1024
+        self._cache: OrderedDict[tuple[str, str], str] = OrderedDict()
+        self._cache_bytes = 0
+        self._pending: dict[tuple[str, str], asyncio.Future[str]] = {}
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.cache_hits = 0
+
+    async def prepare(self, image_url: str, detail: str) -> str:
+        """
+        Return the image as a data URI sized for the given detail level.
+
+        Args:
+            image_url: Base64 data URI (anything else is returned unchanged).
+            detail:    OpenAI detail level the variant will be sent with.
+
+        Returns:
+            Data URI of the prepared variant, or image_url itself when it is not
+            a data URI or cannot be decoded.
+        """
+        decoded = decode_data_uri(image_url)
+        if decoded is None:
+            return image_url
+        mime_type, raw = decoded
+        return await self.prepare_bytes(mime_type, raw, detail, fallback=image_url)
+
+    async def prepare_bytes(
+        self,
+        mime_type: str,
+        raw: bytes,
+        detail: str,
+        digest: str | None = None,
+        fallback: str | None = None,
+    ) -> str:
+        """
+        Return raw image bytes as a data URI sized for the given detail level.
+
+        Args:
+            mime_type: MIME type of raw.
+            raw:       Original image bytes.
+            detail:    OpenAI detail level the variant will be sent with.
+            digest:    SHA-256 hex digest of raw, if the caller already has it.
+            fallback:  Returned when raw cannot be decoded; defaults to raw as a
+                       data URI.
+
+        Returns:
+            Data URI of the prepared variant.
+        """
+        key = (digest or hashlib.sha256(raw).hexdigest(), "low" if detail == "low" else "high")
+
+        cached = self._cache.get(key)
+        if cached is not None:
+            self._cache.move_to_end(key)
+            self.cache_hits += 1
+            return cached
+
+        if fallback is None:
+            fallback = f"data:{mime_type};base64,{base64.b64encode(raw).decode('ascii')}"
+
+        # Concurrent requests for the same variant share one encode
+        task = self._pending.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._encode(fallback, mime_type, raw, key))
+            self._pending[key] = task
+            task.add_done_callback(lambda _: self._pending.pop(key, None))
+        # Shield so one cancelled caller does not abort an encode others await
+        return await asyncio.shield(task)
+
+    async def resolve(self, image_url: str, detail: str) -> str:
+        """ImageResolver interface — same as prepare()."""
+        return await self.prepare(image_url, detail)
+
+    async def _encode(
+        self, fallback: str, mime_type: str, raw: bytes, key: tuple[str, str]
+    ) -> str:
+        detail = key[1]
+        loop = asyncio.get_running_loop()
+        try:
+            out_mime, encoded = await loop.run_in_executor(
+                self._executor,
+                encode_variant,
+                raw,
+                mime_type,
+                detail,
+                self.config.format,
+                self.config.quality,
+            )
+        except Exception as e:
+            logger.warning("image_preparation_failed", detail=detail, error=str(e))
+            return fallback
+
+        variant = f"data:{out_mime};base64,{base64.b64encode(encoded).decode('ascii')}"
+        self.bytes_in += len(raw)
+        self.bytes_out += len(encoded)
+        self._store(key, variant)
+        logger.debug(
+            "image_prepared", detail=detail, bytes_in=len(raw), bytes_out=len(encoded)
+        )
+        return variant
+
+    def _store(self, key: tuple[str, str], variant: str) -> None:
+        self._cache[key] = variant
+        self._cache_bytes += len(variant)
+        while self._cache_bytes > self._max_cache_bytes and len(self._cache) > 1:
+            _, evicted = self._cache.popitem(last=False)
+            self._cache_bytes -= len(evicted)
+
+    def stats(self) -> dict[str, Any]:
+        """Bytes before/after preparation and variant-cache usage."""
+        return {
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "cache_hits": self.cache_hits,
+            "cached_variants": len(self._cache),
+            "cache_bytes": self._cache_bytes,
+        }
+
+    def close(self) -> None:
+        """Shut down the worker pool."""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+async def image_content_parts(
+    image_urls: list[str],
+    detail: str,
+    resolver: ImageResolver | None = None,
+) -> list[dict]:
+    """
+    Build OpenAI ``image_url`` content parts, resolving each image for detail.
+
+    Args:
+        image_urls: Image references (store handles, data URIs or http(s) URLs),
+                    in prompt order.
+        detail:     OpenAI detail level for every part.
+        resolver:   Optional ImageResolver (ImageStore or ImagePreparer); without
+                    one, references are sent as-is.
+
+    Returns:
+        List of content-part dicts in the same order as image_urls.
+    """
+    if resolver is not None:
+        image_urls = list(
+            await asyncio.gather(*(resolver.resolve(url, detail) for url in image_urls))
+        )
+    return [
+        {"type": "image_url", "image_url": {"url": url, "detail": detail}}
+        for url in image_urls
+    ]
@@ -0,0 +1,147 @@
+"""
+Content-addressed image store — graph state carries handles, not base64.
+
+With base64 downloading on, every stage used to copy multi-hundred-KB data URIs
+around: image_urls, image_tags keys, classifications, grouped_images,
+RoomAnalysis.images — all the way into the SSE result event and the rows
+persisted to Supabase. Instead, the downloader puts each image's bytes here and
+the pipeline passes a short handle:
+
+    img:<sha256 prefix>:<original URL>
+    e.g. "img:3f2a9c0d1b7e4a55:https://img3.idealista.pt/blur/WEB_DETAIL/0/id.jpg"
+
+Bytes become a data URI only when an OpenAI payload is built
+(image_content_parts → ImageStore.resolve), sized for the call's detail level
+by the ImagePreparer. Handles embed the original URL, so outputs can be mapped
+back with original_url(), and an evicted image degrades to the CDN URL instead
+of failing.
+
+The store is shared by all runs and bounded by total bytes (LRU), so a photo
+reused across relistings is held once and memory stays flat under load.
+
+Usage:
+    store = ImageStore(max_bytes=256 * 1024 * 1024, preparer=preparer)
+    handle = store.put(url, "image/jpeg", raw_bytes)
+    data_uri = await store.resolve(handle, "low")
+    original_url(handle)  # -> url
+"""
+
+import base64
+import hashlib
+from collections import OrderedDict
+from typing import Any
+
+import structlog
+
+from app.services.image_preparer import ImagePreparer
+
+logger = structlog.get_logger(__name__)
+
+HANDLE_PREFIX = "img:"
+IMAGE_DIGEST_CHARS = 16
+
+
+def is_image_handle(ref: str) -> bool:
+    """True if ref is an ImageStore handle."""
+    return ref.startswith(HANDLE_PREFIX)
+
+
+def handle_digest(ref: str) -> str:
+    """Content digest part of a handle."""
+    return ref[len(HANDLE_PREFIX) : len(HANDLE_PREFIX) + IMAGE_DIGEST_CHARS]
+
+
+def original_url(ref: str) -> str:
+    """Original image URL for a handle; any other reference is returned unchanged."""
+    if not is_image_handle(ref):
+        return ref
+    return ref[len(HANDLE_PREFIX) + IMAGE_DIGEST_CHARS + 1 :]
+
+
+class ImageStore:
+    """Byte-bounded LRU of downloaded images, addressed by content hash."""
+
+    def __init__(self, max_bytes: int, preparer: ImagePreparer | None = None):
+        """
+        Args:
+            max_bytes: Total image bytes kept before least-recently-used
+                       images are evicted.
+            preparer:  Optional ImagePreparer for per-detail variants. Without
+                       one, resolve() returns the original bytes as a data URI.
+        """
+        self.max_bytes = max_bytes
+        self.preparer = preparer
+        # digest prefix → (mime type, bytes, full digest)
+        self._images: OrderedDict[str, tuple[str, bytes, str]] = OrderedDict()
+        self._bytes = 0
+        self.evictions = 0
+        self.misses = 0
+
+    def put(self, url: str, mime_type: str, data: bytes) -> str:
+        """
+        Store image bytes and return their handle.
+
+        Args:
+            url:       Original image URL (embedded in the handle).
+            mime_type: Image MIME type.
+            data:      Raw image bytes.
+
+        Returns:
+            Handle string, e.g. ``"img:3f2a9c0d1b7e4a55:https://..."``.
+        """
+        digest = hashlib.sha256(data).hexdigest()
+        key = digest[:IMAGE_DIGEST_CHARS]
+        if key in self._images:
+            self._images.move_to_end(key)
+        else:
+            self._images[key] = (mime_type, data, digest)
+            self._bytes += len(data)
+            while self._bytes > self.max_bytes and len(self._images) > 1:
+                _, (_, evicted, _) = self._images.popitem(last=False)
+                self._bytes -= len(evicted)
+                self.evictions += 1
+        return f"{HANDLE_PREFIX}{key}:{url}"
+
+    def get(self, ref: str) -> tuple[str, bytes] | None:
+        """Return (mime type, bytes) for a handle, or None if unknown/evicted."""
+        if not is_image_handle(ref):
+            return None
+        entry = self._images.get(handle_digest(ref))
+        if entry is None:
+            return None
+        self._images.move_to_end(handle_digest(ref))
+        return entry[0], entry[1]
+
+    async def resolve(self, image_url: str, detail: str) -> str:
+        """
+        ImageResolver interface: turn a state reference into an OpenAI image URL.
+
+        Handles become data URIs (prepared for detail when a preparer is set);
+        evicted handles fall back to the original URL; anything else is passed
+        to the preparer or returned unchanged.
+        """
+        if not is_image_handle(image_url):
+            if self.preparer is not None:
+                return await self.preparer.resolve(image_url, detail)
+            return image_url
+
+        entry = self._images.get(handle_digest(image_url))
+        if entry is None:
+            self.misses += 1
+            logger.warning("image_store_miss", url=original_url(image_url))
+            return original_url(image_url)
+        self._images.move_to_end(handle_digest(image_url))
+
+        mime_type, data, digest = entry
+        if self.preparer is not None:
+            return await self.preparer.prepare_bytes(mime_type, data, detail, digest=digest)
+        return f"data:{mime_type};base64,{base64.b64encode(data).decode('ascii')}"
+
+    def stats(self) -> dict[str, Any]:
+        """Stored image count/bytes, evictions and resolve misses."""
+        return {
+            "images": len(self._images),
+            "bytes": self._bytes,
+            "evictions": self.evictions,
+            "misses": self.misses,
+        }
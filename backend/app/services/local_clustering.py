@@ -0,0 +1,304 @@
+"""
+Local visual clustering of same-type room photos — GPT only when unsure.
+
+ImageClassifierService.group_by_room sends every bedroom and bathroom bucket
+to cluster_room_images, a GPT vision call per bucket (two, sequentially, when
+a bucket holds more than MAX_CLUSTERING_IMAGES photos). Most buckets are easy:
+two bedrooms painted differently, or three shots of one bathroom. This module
+clusters them offline from cheap descriptors and only defers to GPT when its
+own answer is uncertain.
+
+## Descriptors
+
+Descriptors are built from the 32x32 thumbnail and dHash that the
+ImageDeduplicator decoded (once, at reduced scale, in its thread pool) and
+cached by content digest — photos it already hashed are not decoded again.
+Each is reduced to three NumPy vectors:
+
+    colour histogram  HSV, 16x4x2 bins, saturation-weighted  (bedding, curtains, furniture)
+    thumbnail         16x16 grayscale, zero-mean, unit norm   (coarse layout)
+    dHash bits        64 bits of horizontal gradients          (near-identical framing)
+
+Histogram pixels are weighted by their saturation: the near-white walls and
+grey floors that every room of a flat shares say little about which room a
+photo shows, the coloured objects in it do.
+
+The pairwise distance is a weighted sum of histogram-intersection distance,
+thumbnail cosine distance and normalised Hamming distance, each in [0, 1].
+
+## Clustering
+
+Average-linkage agglomerative clustering merges the closest clusters while
+their linkage stays under distance_threshold, then keeps merging until at
+most expected_rooms clusters remain (the listing's num_rooms /
+num_bathrooms) — photos never produce more rooms than the listing has.
+
+Confidence is the mean silhouette of the result (a photo alone in its
+cluster counts as fully separated; a single cluster scores how far its mean
+pairwise distance sits below the threshold). Below min_confidence the caller
+falls back to GPT.
+
+Usage:
+    deduplicator = ImageDeduplicator(settings.image_dedup, image_store, keep_thumbnails=True)
+    clusterer = LocalRoomClusterer(settings.local_clustering, deduplicator)
+    result = await clusterer.cluster(image_refs, expected_rooms=2)
+    if result is not None and result.confidence >= clusterer.config.min_confidence:
+        clusters = result.clusters
+"""
+
+import asyncio
+from dataclasses import dataclass
+from typing import Any
+
+import numpy as np
+import structlog
+from PIL import Image
+
+from app.config import LocalClusteringConfig
+from app.models.property import RoomCluster
+from app.services.image_dedup import (
+    THUMBNAIL_SIDE,
+    ImageDeduplicator,
+    ImageSignature,
+    image_signature,
+)
+
+logger = structlog.get_logger(__name__)
+
+HISTOGRAM_BINS = (16, 4, 2)
+# Histogram weight of a fully unsaturated pixel (1 + this for a saturated one)
+GREY_PIXEL_WEIGHT = 0.1
+LAYOUT_SIDE = 16
+
+# Distance weights: colour palette, coarse layout, near-identical framing
+HISTOGRAM_WEIGHT = 0.6
+THUMBNAIL_WEIGHT = 0.25
+HASH_WEIGHT = 0.15
+
+
+@dataclass(frozen=True)
+class ImageDescriptor:
+    """Cheap visual summary of one photo."""
+
+    histogram: np.ndarray
+    thumbnail: np.ndarray
+    hash_bits: np.ndarray
+
+
+@dataclass(frozen=True)
+class LocalClustering:
+    """Clusters of one bucket and how sure the engine is about them (0-1)."""
+
+    clusters: list[RoomCluster]
+    confidence: float
+
+
+def image_descriptor(data: bytes) -> ImageDescriptor | None:
+    """Descriptor of encoded image bytes, or None if they cannot be decoded."""
+    signature = image_signature(data, keep_thumbnail=True)
+    return signature_descriptor(signature) if signature is not None else None
+
+
+def signature_descriptor(signature: ImageSignature) -> ImageDescriptor:
+    """Descriptor of a decoded photo (its signature must carry the thumbnail)."""
+    small = Image.frombytes("RGB", (THUMBNAIL_SIDE, THUMBNAIL_SIDE), signature.thumbnail)
+    hsv = np.asarray(small.convert("HSV")).reshape(-1, 3)
+    weights = hsv[:, 1] / 255 + GREY_PIXEL_WEIGHT
+    histogram, _ = np.histogramdd(
+        hsv, bins=HISTOGRAM_BINS, range=((0, 256),) * 3, weights=weights
+    )
+    histogram = histogram.ravel() / histogram.sum()
+
+    gray = small.convert("L")
+    thumbnail = np.asarray(
+        gray.resize((LAYOUT_SIDE, LAYOUT_SIDE), Image.Resampling.BOX), dtype=np.float64
+    ).ravel()
+    thumbnail -= thumbnail.mean()
+    norm = np.linalg.norm(thumbnail)
+    if norm > 0:
+        thumbnail /= norm
+
+    bits = f"{signature.dhash:0{signature.hash_size**2}b}"
+    hash_bits = np.frombuffer(bits.encode(), dtype=np.uint8) == ord("1")
+    return ImageDescriptor(histogram, thumbnail, hash_bits)
+
+
+def distance_matrix(descriptors: list[ImageDescriptor]) -> np.ndarray:
+    """Pairwise weighted distances in [0, 1] (symmetric, zero diagonal)."""
+    histograms = np.stack([d.histogram for d in descriptors])
+    thumbnails = np.stack([d.thumbnail for d in descriptors])
+    hashes = np.stack([d.hash_bits for d in descriptors])
+
+    intersection = np.minimum(histograms[:, None, :], histograms[None, :, :]).sum(axis=2)
+    histogram_distance = 1.0 - intersection
+    thumbnail_distance = (1.0 - thumbnails @ thumbnails.T) / 2
+    hash_distance = (hashes[:, None, :] != hashes[None, :, :]).mean(axis=2)
+
+    distances = (
+        HISTOGRAM_WEIGHT * histogram_distance
+        + THUMBNAIL_WEIGHT * thumbnail_distance
+        + HASH_WEIGHT * hash_distance
+    )
+    distances = np.clip((distances + distances.T) / 2, 0.0, 1.0)
+    np.fill_diagonal(distances, 0.0)
+    return distances
+
+
+def agglomerate(
+    distances: np.ndarray, threshold: float, max_clusters: int | None = None
+) -> list[list[int]]:
+    """
+    Average-linkage agglomerative clustering.
+
+    Merges the closest pair of clusters while their linkage is at most
+    threshold, then further while more than max_clusters remain.
+
+    Returns:
+        Clusters as sorted index lists, ordered by their first image.
+    """
+    clusters = [[i] for i in range(len(distances))]
+    while len(clusters) > 1:
+        linkage, a, b = min(
+            (distances[np.ix_(clusters[i], clusters[j])].mean(), i, j)
+            for i in range(len(clusters))
+            for j in range(i + 1, len(clusters))
+        )
+        over_limit = max_clusters is not None and len(clusters) > max_clusters
+        if linkage > threshold and not over_limit:
+            break
+        clusters[a] = sorted(clusters[a] + clusters[b])
+        del clusters[b]
+    return sorted(clusters)
+
+
+def silhouettes(distances: np.ndarray, clusters: list[list[int]]) -> np.ndarray:
+    """
+    Per-image silhouette in [-1, 1]; an image alone in its cluster scores 1.
+
+    Needs at least two clusters.
+    """
+    labels = np.empty(len(distances), dtype=int)
+    for label, members in enumerate(clusters):
+        labels[members] = label
+
+    scores = np.ones(len(distances))
+    for i in range(len(distances)):
+        own = [j for j in clusters[labels[i]] if j != i]
+        if not own:
+            continue
+        intra = distances[i, own].mean()
+        inter = min(
+            distances[i, members].mean()
+            for label, members in enumerate(clusters)
+            if label != labels[i]
+        )
+        scores[i] = (inter - intra) / max(intra, inter) if max(intra, inter) > 0 else 0.0
+    return scores
+
+
+def _unit(value: float) -> float:
+    return round(min(max(float(value), 0.0), 1.0), 3)
+
+
+class LocalRoomClusterer:
+    """Offline room clustering from the photo signatures an ImageDeduplicator decoded."""
+
+    def __init__(
+        self,
+        config: LocalClusteringConfig | None = None,
+        deduplicator: ImageDeduplicator | None = None,
+    ):
+        """
+        Args:
+            config:       Linkage threshold and confidence cut-off.
+            deduplicator: ImageDeduplicator (with keep_thumbnails) that decodes
+                          photos and caches their signatures; by default a
+                          private one that can only read data URIs.
+        """
+        self.config = config or LocalClusteringConfig()
+        self._owns_deduplicator = deduplicator is None
+        self.deduplicator = deduplicator or ImageDeduplicator(keep_thumbnails=True)
+        self.buckets = 0
+        self.accepted = 0
+        self.deferred = 0
+        self.undescribed = 0
+        self.gpt_calls_avoided = 0
+
+    async def cluster(
+        self, image_refs: list[str], expected_rooms: int | None = None
+    ) -> LocalClustering | None:
+        """
+        Cluster one bucket of same-type photos into rooms.
+
+        Args:
+            image_refs:     Store handles or data URIs of the bucket's photos.
+            expected_rooms: Rooms of this type in the listing (upper bound), if known.
+
+        Returns:
+            LocalClustering, or None when some photo's bytes are unavailable
+            (plain URL, evicted handle, undecodable image).
+        """
+        self.buckets += 1
+        descriptors = await asyncio.gather(*(self.describe(ref) for ref in image_refs))
+        if any(d is None for d in descriptors):
+            self.undescribed += 1
+            return None
+
+        distances = distance_matrix(descriptors)
+        max_clusters = expected_rooms if expected_rooms and expected_rooms > 0 else None
+        groups = agglomerate(distances, self.config.distance_threshold, max_clusters)
+
+        if len(groups) == 1:
+            mean_distance = distances[np.triu_indices(len(distances), k=1)].mean()
+            scores = np.full(len(distances), 1.0 - mean_distance / self.config.distance_threshold)
+        else:
+            scores = silhouettes(distances, groups)
+        confidence = _unit(scores.mean())
+
+        clusters = [
+            RoomCluster(
+                room_number=number,
+                image_indices=members,
+                confidence=_unit(scores[members].mean()),
+                visual_cues="agrupamento local",
+            )
+            for number, members in enumerate(groups, start=1)
+        ]
+        return LocalClustering(clusters, confidence)
+
+    def record(self, accepted: bool, gpt_calls: int = 1) -> None:
+        """Count a bucket the caller kept (saving gpt_calls) or sent to GPT instead."""
+        if accepted:
+            self.accepted += 1
+            self.gpt_calls_avoided += gpt_calls
+        else:
+            self.deferred += 1
+
+    async def describe(self, image_ref: str) -> ImageDescriptor | None:
+        """
+        Descriptor of a store handle or data URI.
+
+        The photo is decoded by the deduplicator unless it already holds its
+        signature; the descriptor itself is cheap numpy work on the 32x32
+        thumbnail.
+        """
+        signature = await self.deduplicator.signature(image_ref)
+        if signature is None or signature.thumbnail is None:
+            return None
+        return signature_descriptor(signature)
+
+    def stats(self) -> dict[str, Any]:
+        """Buckets clustered locally vs deferred to GPT."""
+        return {
+            "buckets": self.buckets,
+            "accepted": self.accepted,
+            "deferred_to_gpt": self.deferred,
+            "undescribed": self.undescribed,
+            "gpt_calls_avoided": self.gpt_calls_avoided,
+            "acceptance_rate": round(self.accepted / self.buckets, 4) if self.buckets else 0.0,
+        }
+
+    def close(self) -> None:
+        """Shut down the private deduplicator's worker pool (a shared one is closed by its owner)."""
+        if self._owns_deduplicator:
+            self.deduplicator.close()
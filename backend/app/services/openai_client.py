@@ -1,33 +1,169 @@
-"""Centralized OpenAI client factory with LangSmith tracing."""
+"""
+Shared OpenAI clients — one pooled HTTP transport per (API key, base URL).
+
+Every service used to build its own AsyncOpenAI, and the orchestrator built a
+fresh ChatOpenAI on every agent step, so each kept (or rebuilt) a separate
+connection pool and paid its own TCP+TLS handshakes to the same API host.
+This registry hands out:
+
+    get_openai_http_client(key, base_url)  one httpx.AsyncClient per (key, base URL),
+                                           tuned keep-alive limits, rate limited
+    get_openai_client(key, base_url)       a per-service AsyncOpenAI on that pool
+                                           (LangSmith-wrapped when tracing is on)
+    get_chat_model(model, key, base_url)   one ChatOpenAI per model on that pool
+
+All OpenAI traffic in the process therefore shares warm connections and the
+process-wide OpenAIRateLimiter. close_openai_clients() runs at shutdown.
+
+Usage:
+    client = get_openai_client(settings.openai_api_key)
+    llm = get_chat_model("gpt-4o", settings.openai_api_key).bind_tools(tools)
+"""
 
 import os
 
+import httpx
+import structlog
+from langchain_openai import ChatOpenAI
 from openai import AsyncOpenAI
 
 from app.config import get_settings
+from app.services.openai_rate_limiter import RateLimitedTransport, get_rate_limiter
+
+logger = structlog.get_logger(__name__)
 
+# Same as the OpenAI SDK's defaults (long reads for slow completions)
+OPENAI_TIMEOUT = httpx.Timeout(600.0, connect=5.0)
 
-def get_openai_client(api_key: str | None = None) -> AsyncOpenAI:
+_http_clients: dict[tuple[str, str], httpx.AsyncClient] = {}
+_chat_models: dict[tuple[str, str, str, bool, float], ChatOpenAI] = {}
+
+
+def _tracing_enabled() -> bool:
+    # Checked directly since LangSmith itself reads it from the environment
+    return os.getenv("LANGCHAIN_TRACING_V2", "").lower() == "true"
+
+
+def _resolve(api_key: str | None, base_url: str | None) -> tuple[str, str]:
+    settings = get_settings()
+    return api_key or settings.openai_api_key, base_url or settings.openai_base_url
+
+
+def get_openai_http_client(
+    api_key: str | None = None, base_url: str | None = None
+) -> httpx.AsyncClient:
     """
-    Create an AsyncOpenAI client, optionally wrapped with LangSmith tracing.
+    Pooled httpx client shared by every OpenAI client for (api_key, base_url).
 
-    Uses wrap_openai when LANGCHAIN_TRACING_V2 is enabled (checks env var
-    directly since LangSmith itself reads it from the environment).
+    Uses settings.openai_http pool limits and, when enabled, routes requests
+    through the process-wide OpenAIRateLimiter. Keeps the SDK's default
+    timeouts and redirect handling.
 
     Args:
-        api_key: OpenAI API key. Defaults to settings.openai_api_key.
+        api_key:  OpenAI API key. Defaults to settings.openai_api_key.
+        base_url: API base URL. Defaults to settings.openai_base_url (empty =
+                  the SDK default).
 
     Returns:
-        AsyncOpenAI client (wrapped if tracing is enabled).
+        Shared httpx.AsyncClient.
     """
+    key = _resolve(api_key, base_url)
+    client = _http_clients.get(key)
+    if client is not None and not client.is_closed:
+        return client
+
     settings = get_settings()
-    key = api_key or settings.openai_api_key
+    config = settings.openai_http
+    transport: httpx.AsyncBaseTransport = httpx.AsyncHTTPTransport(
+        http2=config.http2,
+        limits=httpx.Limits(
+            max_connections=config.max_connections,
+            max_keepalive_connections=config.max_keepalive_connections,
+            keepalive_expiry=config.keepalive_expiry_seconds,
+        ),
+    )
+    if settings.openai_rate_limit.enabled:
+        transport = RateLimitedTransport(get_rate_limiter(), transport)
+
+    client = httpx.AsyncClient(
+        transport=transport, timeout=OPENAI_TIMEOUT, follow_redirects=True
+    )
+    _http_clients[key] = client
+    logger.info("openai_http_client_created", base_url=key[1] or "default", http2=config.http2)
+    return client
+
+
+def get_openai_client(api_key: str | None = None, base_url: str | None = None) -> AsyncOpenAI:
+    """
+    Create an AsyncOpenAI client on the shared pool, optionally LangSmith-wrapped.
 
-    client = AsyncOpenAI(api_key=key)
+    Uses wrap_openai when LANGCHAIN_TRACING_V2 is enabled. The client object
+    itself is a cheap per-service wrapper; connections come from the pooled,
+    rate-limited transport for (api_key, base_url).
 
-    if os.getenv("LANGCHAIN_TRACING_V2", "").lower() == "true":
+    Args:
+        api_key:  OpenAI API key. Defaults to settings.openai_api_key.
+        base_url: API base URL. Defaults to settings.openai_base_url.
+
+    Returns:
+        AsyncOpenAI client (wrapped if tracing is enabled).
+    """
+    key, url = _resolve(api_key, base_url)
+    client = AsyncOpenAI(
+        api_key=key, base_url=url or None, http_client=get_openai_http_client(key, url)
+    )
+    if _tracing_enabled():
         from langsmith.wrappers import wrap_openai
 
         client = wrap_openai(client)
-
     return client
+
+
+def get_chat_model(
+    model: str,
+    api_key: str | None = None,
+    base_url: str | None = None,
+    *,
+    streaming: bool = True,
+    temperature: float = 0.0,
+) -> ChatOpenAI:
+    """
+    Shared LangChain ChatOpenAI for a model, on the pooled transport.
+
+    Args:
+        model:       Model name, e.g. "gpt-4o".
+        api_key:     OpenAI API key. Defaults to settings.openai_api_key.
+        base_url:    API base URL. Defaults to settings.openai_base_url.
+        streaming:   Stream tokens from the API.
+        temperature: Sampling temperature.
+
+    Returns:
+        ChatOpenAI reused across agent steps; bind tools per call as needed.
+    """
+    key, url = _resolve(api_key, base_url)
+    cache_key = (model, key, url, streaming, temperature)
+    llm = _chat_models.get(cache_key)
+    if llm is None:
+        llm = ChatOpenAI(
+            model=model,
+            api_key=key,
+            base_url=url or None,
+            streaming=streaming,
+            temperature=temperature,
+            http_async_client=get_openai_http_client(key, url),
+        )
+        _chat_models[cache_key] = llm
+    return llm
+
+
+async def close_openai_clients() -> None:
+    """Close every pooled transport and forget the shared clients (app shutdown)."""
+    for client in _http_clients.values():
+        await client.aclose()
+    reset_openai_clients()
+
+
+def reset_openai_clients() -> None:
+    """Forget the shared clients without closing them (tests)."""
+    _http_clients.clear()
+    _chat_models.clear()
@@ -0,0 +1,383 @@
+"""
+Process-wide adaptive rate limiter for OpenAI calls.
+
+Every service used to bound its own calls (a semaphore in the classifier, one
+in the estimator, none in feature extraction or the orchestrator), so under
+load from concurrent users the process as a whole had no idea how close it
+was to the account limits — and 429 storms followed. This module replaces
+that with one limiter per model, shared by every call site in the process:
+
+    requests-per-minute  token bucket, 1 per request
+    tokens-per-minute    token bucket, charged a pre-call estimate
+                         (prompt text + images at their detail cost + max_tokens)
+    concurrency          AIMD: +1/limit per success, x decrease_factor on a 429
+    retry-after          a 429's retry-after / retry-after-ms pauses the model
+
+Buckets use reservation: a caller takes its share immediately and sleeps until
+the bucket would have refilled, so waiters are served in arrival order without
+polling.
+
+## Integration
+
+The limiter sits in the HTTP transport (RateLimitedTransport) of the shared
+OpenAI connection pool (see openai_client), so the AsyncOpenAI clients and
+the orchestrator's ChatOpenAI are throttled without touching call sites. The SDK's own retries pass through
+the transport too, so each retry waits its turn and sees the retry-after pause.
+
+Usage:
+    limiter = get_rate_limiter()
+    transport = RateLimitedTransport(limiter, httpx.AsyncHTTPTransport())
+    limiter.stats()  # {"gpt-4o-mini": {"requests": 12, "throttle_events": 0, ...}}
+"""
+
+import asyncio
+import email.utils
+import json
+import time
+from collections import deque
+from functools import lru_cache
+from typing import Any
+
+import httpx
+import structlog
+
+from app.config import OpenAIRateLimitConfig, get_settings
+
+logger = structlog.get_logger(__name__)
+
+# Token cost of one image part per detail level. High/auto assumes the 768px
+# short side ImagePreparer sends: 85 base + 4 tiles x 170.
+LOW_DETAIL_IMAGE_TOKENS = 85
+HIGH_DETAIL_IMAGE_TOKENS = 765
+CHARS_PER_TOKEN = 4
+
+# Consecutive 429s within this window count as one congestion signal
+DECREASE_COOLDOWN_SECONDS = 1.0
+
+
+def estimate_request_tokens(payload: dict[str, Any]) -> int:
+    """
+    Estimate the tokens a chat completion request will count against TPM.
+
+    OpenAI charges the prompt plus max_tokens against the per-minute budget
+    when the request is admitted, so both are included. Text is estimated at
+    ~4 characters per token; image parts use their fixed per-detail cost and
+    are excluded from the character count (data URIs would dominate it).
+
+    Args:
+        payload: JSON body of the request.
+
+    Returns:
+        Estimated token count (at least 1).
+    """
+    chars = 0
+    image_tokens = 0
+    for message in payload.get("messages") or []:
+        content = message.get("content") if isinstance(message, dict) else None
+        if isinstance(content, str):
+            chars += len(content)
+            continue
+        for part in content or []:
+            if not isinstance(part, dict):
+                continue
+            if part.get("type") == "image_url":
+                detail = (part.get("image_url") or {}).get("detail", "auto")
+                image_tokens += (
+                    LOW_DETAIL_IMAGE_TOKENS if detail == "low" else HIGH_DETAIL_IMAGE_TOKENS
+                )
+            else:
+                chars += len(part.get("text") or "")
+    if payload.get("tools"):
+        chars += len(json.dumps(payload["tools"]))
+
+    output_tokens = payload.get("max_completion_tokens") or payload.get("max_tokens") or 0
+    return max(1, chars // CHARS_PER_TOKEN + image_tokens + int(output_tokens))
+
+
+def parse_retry_after(headers: httpx.Headers) -> float | None:
+    """
+    Seconds to wait from a 429 response's headers, or None if absent.
+
+    Reads OpenAI's ``retry-after-ms`` first, then ``retry-after`` as seconds or
+    an HTTP date.
+    """
+    retry_ms = headers.get("retry-after-ms")
+    if retry_ms:
+        try:
+            return float(retry_ms) / 1000
+        except ValueError:
+            pass
+
+    retry_after = headers.get("retry-after")
+    if not retry_after:
+        return None
+    try:
+        return float(retry_after)
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(retry_after)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+class TokenBucket:
+    """Reservation-style token bucket (balance may go negative)."""
+
+    def __init__(self, per_minute: float, burst_seconds: float):
+        """
+        Args:
+            per_minute:    Refill rate, in units per minute.
+            burst_seconds: Bucket capacity expressed as seconds of refill.
+        """
+        self.rate = per_minute / 60
+        self.capacity = max(1.0, self.rate * burst_seconds)
+        self._balance = self.capacity
+        self._updated = time.monotonic()
+
+    def reserve(self, amount: float) -> float:
+        """
+        Take amount from the bucket and return how long the caller must wait.
+
+        Returns:
+            Seconds until the balance is non-negative again (0 if available now).
+        """
+        now = time.monotonic()
+        self._balance = min(self.capacity, self._balance + (now - self._updated) * self.rate)
+        self._updated = now
+        self._balance -= amount
+        return 0.0 if self._balance >= 0 else -self._balance / self.rate
+
+
+class ModelRateLimiter:
+    """RPM/TPM buckets and an AIMD concurrency window for one model."""
+
+    def __init__(
+        self,
+        model: str,
+        requests_per_minute: int,
+        tokens_per_minute: int,
+        config: OpenAIRateLimitConfig,
+    ):
+        self.model = model
+        self.config = config
+        self.requests = TokenBucket(requests_per_minute, config.burst_seconds)
+        self.tokens = TokenBucket(tokens_per_minute, config.burst_seconds)
+        self.concurrency = float(config.max_concurrency)
+        self._in_flight = 0
+        self._waiters: deque[asyncio.Future[None]] = deque()
+        self._paused_until = 0.0
+        self._last_decrease = 0.0
+
+        # Metrics
+        self.request_count = 0
+        self.estimated_tokens = 0
+        self.throttle_events = 0
+        self.queue_wait_total = 0.0
+        self.queue_wait_max = 0.0
+
+    async def acquire(self, estimated_tokens: int) -> float:
+        """
+        Wait for a concurrency slot, bucket capacity and any retry-after pause.
+
+        The caller must call release() exactly once afterwards.
+
+        Returns:
+            Seconds spent waiting.
+        """
+        started = time.monotonic()
+        await self._acquire_slot()
+        try:
+            delay = max(self.requests.reserve(1), self.tokens.reserve(estimated_tokens))
+            if delay > 0:
+                await asyncio.sleep(delay)
+            while (pause := self._paused_until - time.monotonic()) > 0:
+                await asyncio.sleep(pause)
+        except BaseException:
+            self.release()
+            raise
+
+        waited = time.monotonic() - started
+        self.request_count += 1
+        self.estimated_tokens += estimated_tokens
+        self.queue_wait_total += waited
+        self.queue_wait_max = max(self.queue_wait_max, waited)
+        if waited > 1.0:
+            logger.info("openai_rate_limit_wait", model=self.model, seconds=round(waited, 3))
+        return waited
+
+    def release(self) -> None:
+        """Free the concurrency slot taken by acquire()."""
+        self._in_flight -= 1
+        self._wake()
+
+    def record_success(self) -> None:
+        """Additive increase: about +1 slot per window of successful requests."""
+        if self.concurrency < self.config.max_concurrency:
+            self.concurrency = min(
+                float(self.config.max_concurrency), self.concurrency + 1 / self.concurrency
+            )
+            self._wake()
+
+    def record_throttle(self, retry_after: float | None) -> None:
+        """Multiplicative decrease and a model-wide pause after a 429."""
+        now = time.monotonic()
+        self.throttle_events += 1
+        pause = retry_after if retry_after is not None else self.config.default_retry_after_seconds
+        self._paused_until = max(self._paused_until, now + pause)
+
+        if now - self._last_decrease >= DECREASE_COOLDOWN_SECONDS:
+            self._last_decrease = now
+            self.concurrency = max(
+                float(self.config.min_concurrency),
+                self.concurrency * self.config.decrease_factor,
+            )
+        logger.warning(
+            "openai_rate_limited",
+            model=self.model,
+            retry_after=pause,
+            concurrency=int(self.concurrency),
+        )
+
+    async def _acquire_slot(self) -> None:
+        while self._in_flight >= int(self.concurrency):
+            waiter = asyncio.get_running_loop().create_future()
+            self._waiters.append(waiter)
+            try:
+                await waiter
+            finally:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+        self._in_flight += 1
+
+    def _wake(self) -> None:
+        free = int(self.concurrency) - self._in_flight
+        while free > 0 and self._waiters:
+            waiter = self._waiters.popleft()
+            if waiter.done() or waiter.get_loop().is_closed():
+                continue
+            waiter.set_result(None)
+            free -= 1
+
+    def stats(self) -> dict[str, Any]:
+        """Request/token counts, throttle events, queue wait and current window."""
+        return {
+            "requests": self.request_count,
+            "estimated_tokens": self.estimated_tokens,
+            "throttle_events": self.throttle_events,
+            "queue_wait_seconds_total": round(self.queue_wait_total, 3),
+            "queue_wait_seconds_avg": round(
+                self.queue_wait_total / self.request_count if self.request_count else 0.0, 3
+            ),
+            "queue_wait_seconds_max": round(self.queue_wait_max, 3),
+            "concurrency_limit": int(self.concurrency),
+            "in_flight": self._in_flight,
+            "queued": len(self._waiters),
+        }
+
+
+class OpenAIRateLimiter:
+    """Registry of per-model limiters for the whole process."""
+
+    def __init__(self, config: OpenAIRateLimitConfig | None = None):
+        self.config = config or OpenAIRateLimitConfig()
+        self._models: dict[str, ModelRateLimiter] = {}
+
+    def for_model(self, model: str) -> ModelRateLimiter:
+        """Limiter for model, created from its override (or the defaults) on first use."""
+        limiter = self._models.get(model)
+        if limiter is None:
+            limits = self.config.model_overrides.get(model)
+            limiter = ModelRateLimiter(
+                model,
+                limits.requests_per_minute if limits else self.config.requests_per_minute,
+                limits.tokens_per_minute if limits else self.config.tokens_per_minute,
+                self.config,
+            )
+            self._models[model] = limiter
+        return limiter
+
+    def stats(self) -> dict[str, dict[str, Any]]:
+        """Per-model limiter metrics."""
+        return {model: limiter.stats() for model, limiter in self._models.items()}
+
+
+class _ReleasingStream(httpx.AsyncByteStream):
+    """Response body wrapper that frees the limiter slot when the body is closed."""
+
+    def __init__(self, stream: httpx.AsyncByteStream, release):
+        self._stream = stream
+        self._release = release
+        self._released = False
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self) -> None:
+        try:
+            await self._stream.aclose()
+        finally:
+            if not self._released:
+                self._released = True
+                self._release()
+
+
+class RateLimitedTransport(httpx.AsyncBaseTransport):
+    """httpx transport that admits OpenAI POSTs through an OpenAIRateLimiter."""
+
+    def __init__(self, limiter: OpenAIRateLimiter, transport: httpx.AsyncBaseTransport):
+        """
+        Args:
+            limiter:   Process-wide limiter.
+            transport: Transport that actually sends the requests.
+        """
+        self.limiter = limiter
+        self.transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        payload = self._json_payload(request)
+        if payload is None or not payload.get("model"):
+            return await self.transport.handle_async_request(request)
+
+        model_limiter = self.limiter.for_model(payload["model"])
+        await model_limiter.acquire(estimate_request_tokens(payload))
+        try:
+            response = await self.transport.handle_async_request(request)
+        except BaseException:
+            model_limiter.release()
+            raise
+
+        if response.status_code == 429:
+            model_limiter.record_throttle(parse_retry_after(response.headers))
+        elif response.status_code < 400:
+            model_limiter.record_success()
+
+        if response.is_closed:
+            # Body already read by the inner transport
+            model_limiter.release()
+        else:
+            # Hold the slot until the body is consumed (streamed completions keep
+            # generating after the headers arrive)
+            response.stream = _ReleasingStream(response.stream, model_limiter.release)
+        return response
+
+    async def aclose(self) -> None:
+        await self.transport.aclose()
+
+    @staticmethod
+    def _json_payload(request: httpx.Request) -> dict[str, Any] | None:
+        if request.method != "POST":
+            return None
+        try:
+            payload = json.loads(request.content)
+        except (ValueError, httpx.RequestNotRead):
+            return None
+        return payload if isinstance(payload, dict) else None
+
+
+@lru_cache
+def get_rate_limiter() -> OpenAIRateLimiter:
+    """Process-wide limiter built from settings.openai_rate_limit."""
+    return OpenAIRateLimiter(get_settings().openai_rate_limit)
@@ -0,0 +1,155 @@
+"""
+Compressed side store for raw Apify actor payloads.
+
+_parse_apify_result keeps the whole actor item in PropertyData.raw_data —
+often hundreds of KB of translated texts and multimedia metadata for a big
+listing. Carried inline, that payload rode along in every graph checkpoint,
+the scrape cache, the final "result" SSE event and both Supabase columns
+(result_data and raw_scraped_data), although no analysis step reads it.
+
+IdealistaService now detaches it right after parsing: the payload is stored
+once, zlib-compressed JSON keyed by Idealista property ID, and the in-flight
+PropertyData keeps only raw_data_ref. The rare code paths that need the raw
+item load it on demand (IdealistaService.load_raw_data / RawDataStore.load).
+
+## Backends
+
+    memory  — per-process LRU of compressed blobs (max_entries)
+    sqlite  — SQLiteKVStore table raw_listings, survives restarts
+
+A later scrape of the same listing replaces its payload.
+
+Usage:
+    store = build_raw_data_store(settings.raw_data_store)
+    service = IdealistaService(apify_token, settings.apify, raw_store=store)
+    raw = await service.load_raw_data(property_data)
+"""
+
+import asyncio
+import json
+import zlib
+from collections import OrderedDict
+from typing import Any
+
+import structlog
+
+from app.config import RawDataStoreConfig
+from app.models.property import PropertyData
+from app.services.sqlite_store import SQLiteKVStore
+
+logger = structlog.get_logger(__name__)
+
+
+def _compress(raw_data: dict[str, Any], level: int) -> tuple[bytes, int]:
+    encoded = json.dumps(raw_data, separators=(",", ":")).encode()
+    return zlib.compress(encoded, level), len(encoded)
+
+
+def _decompress(blob: bytes) -> dict[str, Any]:
+    return json.loads(zlib.decompress(blob))
+
+
+class RawDataStore:
+    """Raw actor payloads by property ID, compressed, in memory or SQLite."""
+
+    def __init__(
+        self,
+        store: SQLiteKVStore | None = None,
+        max_entries: int = 10_000,
+        compression_level: int = 6,
+    ):
+        """
+        Args:
+            store:             On-disk table, or None to keep blobs in memory.
+            max_entries:       LRU cap (either backend).
+            compression_level: zlib level, 1 (fast) to 9 (small).
+        """
+        self.store = store
+        self.max_entries = max_entries
+        self.compression_level = compression_level
+        self._memory: OrderedDict[str, bytes] = OrderedDict()
+        self.stored = 0
+        self.loads = 0
+        self.raw_bytes = 0
+        self.compressed_bytes = 0
+
+    async def put(self, property_id: str, raw_data: dict[str, Any]) -> None:
+        """Store (or replace) a listing's raw payload."""
+        blob, size = await asyncio.to_thread(_compress, raw_data, self.compression_level)
+        if self.store is not None:
+            await self.store.set(property_id, blob, max_entries=self.max_entries)
+        else:
+            self._memory[property_id] = blob
+            self._memory.move_to_end(property_id)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+        self.stored += 1
+        self.raw_bytes += size
+        self.compressed_bytes += len(blob)
+
+    async def get(self, property_id: str) -> dict[str, Any] | None:
+        """A listing's raw payload, or None if it was never stored (or evicted)."""
+        if self.store is not None:
+            blob = await self.store.get(property_id)
+        else:
+            blob = self._memory.get(property_id)
+        if blob is None:
+            return None
+        self.loads += 1
+        return await asyncio.to_thread(_decompress, blob)
+
+    async def detach(self, property_id: str, property_data: PropertyData) -> PropertyData:
+        """
+        Move property_data.raw_data into the store.
+
+        Returns:
+            A copy with empty raw_data and raw_data_ref set, or property_data
+            unchanged when it has no payload or the write failed.
+        """
+        if not property_data.raw_data:
+            return property_data
+        try:
+            await self.put(property_id, property_data.raw_data)
+        except Exception as e:
+            logger.warning("raw_data_store_write_error", property_id=property_id, error=str(e))
+            return property_data
+        return property_data.model_copy(update={"raw_data": {}, "raw_data_ref": property_id})
+
+    async def load(self, property_data: PropertyData) -> dict[str, Any]:
+        """raw_data of a listing: inline if present, else from the store ({} if gone)."""
+        if property_data.raw_data or not property_data.raw_data_ref:
+            return property_data.raw_data
+        return await self.get(property_data.raw_data_ref) or {}
+
+    def stats(self) -> dict[str, Any]:
+        """Payloads stored and loaded, and the bytes before/after compression."""
+        return {
+            "stored": self.stored,
+            "loads": self.loads,
+            "raw_bytes": self.raw_bytes,
+            "compressed_bytes": self.compressed_bytes,
+            "compression_ratio": (
+                round(self.raw_bytes / self.compressed_bytes, 2) if self.compressed_bytes else 0.0
+            ),
+        }
+
+    def close(self) -> None:
+        """Close the on-disk table."""
+        if self.store is not None:
+            self.store.close()
+
+
+def build_raw_data_store(config: RawDataStoreConfig) -> RawDataStore | None:
+    """Create the store described by config, or None to keep raw_data inline."""
+    if not config.enabled:
+        return None
+
+    if config.backend == "sqlite":
+        store = SQLiteKVStore(config.sqlite_path, table="raw_listings")
+    elif config.backend == "memory":
+        store = None
+    else:
+        raise ValueError(f"Unknown raw data store backend: {config.backend!r}")
+
+    logger.info("raw_data_store_enabled", backend=config.backend)
+    return RawDataStore(store, config.max_entries, config.compression_level)
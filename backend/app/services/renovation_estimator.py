@@ -11,13 +11,28 @@ min–max range to reflect inherent uncertainty from photo-only analysis.
 ## Concurrency model
 
 analyze_all_rooms() submits one async task per room and collects results
-with asyncio.as_completed(). A semaphore caps concurrent GPT-4o calls to
-stay within rate limits. Progress events fire as each room finishes, in
-whatever order — the frontend only cares about current/total counts.
+with asyncio.as_completed(). A semaphore caps this service's concurrent
+GPT-4o calls; account-wide RPM/TPM limits are enforced below it by the
+process-wide OpenAIRateLimiter. Progress events fire as each room finishes, in
+whatever order — the frontend only cares about current/total counts. If
+the caller is cancelled (the client disconnected), the room tasks still
+pending are cancelled with it, so no further GPT calls go out. A room that
+fails does not cancel the others; the error is raised once they finish, so
+a resumed run (see graph_checkpoints) only re-analyses the failed rooms.
 
 For a 5-room property this reduces wall-clock time from ~35 s (serial) to
 ~12 s (parallel), bounded by the slowest single call rather than the sum.
 
+analyze_rooms_as_ready() is the dataflow variant: it consumes room groups
+in batches as the classifier finalises them, so a kitchen's estimate does
+not wait for bedroom/bathroom clustering.
+
+Floor plans tagged by Apify are known right after scraping:
+prefetch_floor_plan() starts their analysis then, and the later
+analyze_floor_plan() call for the same images awaits that task. The task
+belongs to one run (a FloorPlanPrefetch passed by the graph) and is cancelled
+when that run fails, is cancelled, or finds a different set of plans.
+
 Usage:
     estimator = RenovationEstimatorService(openai_api_key="...")
     analyses = await estimator.analyze_all_rooms(grouped_images, progress_callback)
@@ -25,6 +40,7 @@ Usage:
 
 import asyncio
 import json
+from collections.abc import AsyncIterable
 
 import structlog
 
@@ -61,11 +77,41 @@ from app.services.cost_calculator import (
 )
 from app.services.feature_extractor import FeatureExtractorService, derive_property_context
 from app.services.image_classifier import get_room_label
+from app.services.image_preparer import ImageResolver, image_content_parts
+from app.services.image_store import original_url
 from app.services.openai_client import get_openai_client
 
 logger = structlog.get_logger(__name__)
 
 
+class FloorPlanPrefetch:
+    """One run's early floor plan analysis, keyed by the plans' original URLs."""
+
+    def __init__(self) -> None:
+        self.key: tuple[str, ...] = ()
+        self.task: asyncio.Task[FloorPlanAnalysis | None] | None = None
+
+    def claim(self, key: tuple[str, ...]) -> asyncio.Task[FloorPlanAnalysis | None] | None:
+        """Hand over the task if it covers exactly key; cancel it otherwise."""
+        task = self.task if self.key == key else None
+        if task is None:
+            self.cancel()
+        self.key, self.task = (), None
+        return task
+
+    def cancel(self) -> None:
+        """Cancel the analysis if it is still running (the run failed or ended)."""
+        if self.task is not None and not self.task.done():
+            self.task.cancel()
+            logger.info("floor_plan_prefetch_cancelled", num_images=len(self.key))
+        self.key, self.task = (), None
+
+
+def is_fallback_analysis(analysis: RoomAnalysis) -> bool:
+    """True for the conservative placeholder returned when GPT analysis failed."""
+    return analysis.features is None and analysis.confidence == FALLBACK_CONFIDENCE
+
+
 class RenovationEstimatorService:
     """Service for estimating renovation costs using GPT-4 Vision."""
 
@@ -78,6 +124,7 @@ class RenovationEstimatorService:
         image_processing: ImageProcessingConfig | None = None,
         user_preferences: UserPreferences | None = None,
         property_data: PropertyData | None = None,
+        image_resolver: ImageResolver | None = None,
     ):
         """
         Initialize the renovation estimator.
@@ -90,6 +137,9 @@ class RenovationEstimatorService:
             image_processing:  Image processing limits (images per room analysis).
             user_preferences:  User preferences for cost calculation (diy, finish_level).
             property_data:     Property data for deriving context (region, era, etc.).
+            image_resolver:    Optional ImageResolver (ImageStore/ImagePreparer) that
+                               turns image references into sized data URIs
+                               when payloads are built.
         """
         self.client = get_openai_client(openai_api_key)
         self.model = model
@@ -97,6 +147,7 @@ class RenovationEstimatorService:
         self.openai_config = openai_config or OpenAIConfig()
         self.image_processing = image_processing or ImageProcessingConfig()
         self.user_preferences = user_preferences or UserPreferences()
+        self.image_resolver = image_resolver
         self._property_context: PropertyContext | None = (
             derive_property_context(property_data) if property_data else None
         )
@@ -104,6 +155,7 @@ class RenovationEstimatorService:
             openai_api_key=openai_api_key,
             model=model,
             openai_config=self.openai_config,
+            image_resolver=image_resolver,
         )
 
     async def analyze_room(
@@ -236,11 +288,9 @@ class RenovationEstimatorService:
 
         content_payload = [{"type": "text", "text": prompt}]
         capped_urls = image_urls[:self.image_processing.images_per_room_analysis]
-        for url in capped_urls:
-            content_payload.append({
-                "type": "image_url",
-                "image_url": {"url": url, "detail": self.openai_config.estimation_detail},
-            })
+        content_payload += await image_content_parts(
+            capped_urls, self.openai_config.estimation_detail, self.image_resolver
+        )
 
         _refused = False
 
@@ -366,6 +416,9 @@ class RenovationEstimatorService:
 
         Submits one coroutine per room via asyncio.as_completed() so progress
         events fire as each room finishes. Semaphore is handled inside analyze_room.
+        A room that raises does not cancel the others: every room still runs to
+        completion (reported through progress_callback) before the first error
+        is re-raised, so the caller can checkpoint the rooms that succeeded.
 
         Args:
             grouped_images:    Dict mapping room key → list[ImageClassification].
@@ -376,55 +429,205 @@ class RenovationEstimatorService:
         Returns:
             List of RoomAnalysis objects (one per room, order may differ from input).
         """
-        context = (
-            derive_property_context(property_data)
-            if property_data
-            else self._property_context or PropertyContext()
-        )
+        context = self._context_for(property_data)
 
         total = len(grouped_images)
         room_analyses: list[RoomAnalysis] = []
         completed = 0
 
         tasks = [
-            self.analyze_room(
-                classifications[0].room_type,
-                classifications[0].room_number,
-                [c.image_url for c in classifications],
-                property_context=context,
-            )
+            asyncio.create_task(self._analyze_group(classifications, context))
             for classifications in grouped_images.values()
         ]
 
-        for coro in asyncio.as_completed(tasks):
-            analysis = await coro
-            room_analyses.append(analysis)
-            completed += 1
+        error: Exception | None = None
 
-            if progress_callback:
-                await progress_callback(completed, total, analysis)
+        try:
+            for coro in asyncio.as_completed(tasks):
+                try:
+                    analysis = await coro
+                except Exception as e:
+                    # Let the other rooms finish: a resumed run keeps their results
+                    logger.error("room_analysis_failed", error=str(e))
+                    error = error or e
+                    continue
+                room_analyses.append(analysis)
+                completed += 1
+
+                if progress_callback:
+                    await progress_callback(completed, total, analysis)
+        finally:
+            # On cancellation (client gone) stop the GPT calls still pending
+            for task in tasks:
+                task.cancel()
+
+        if error is not None:
+            raise error
+        return room_analyses
+
+    async def analyze_rooms_as_ready(
+        self,
+        room_batches: AsyncIterable[dict[str, list[ImageClassification]]],
+        progress_callback=None,
+        property_data: PropertyData | None = None,
+    ) -> list[RoomAnalysis]:
+        """
+        Analyze rooms as their photo groups become final (dataflow mode).
+
+        Like analyze_all_rooms(), but takes batches of room groups from an
+        async iterable — ImageClassifierService.iter_room_groups() — and
+        starts each room's analysis the moment its batch arrives, while later
+        batches (e.g. bedroom clustering) are still being produced. As there,
+        a failed room is re-raised only after the others finished; an error
+        producing batches cancels the rooms in flight.
+
+        Args:
+            room_batches:      Async iterable of {room key: classifications} dicts.
+            progress_callback: Optional async callback(current, total, room_analysis);
+                               total counts the rooms known so far, so it can
+                               grow while batches are still arriving.
+            property_data:     Optional property data to derive context for cost calc.
+
+        Returns:
+            List of RoomAnalysis objects in completion order.
+        """
+        context = self._context_for(property_data)
+        batches = aiter(room_batches)
 
+        async def _next_batch() -> dict[str, list[ImageClassification]]:
+            return await anext(batches)
+
+        next_batch: asyncio.Task | None = asyncio.create_task(_next_batch())
+        rooms: set[asyncio.Task[RoomAnalysis]] = set()
+        room_analyses: list[RoomAnalysis] = []
+        total = 0
+        error: Exception | None = None
+
+        try:
+            while next_batch is not None or rooms:
+                waiting = rooms | {next_batch} if next_batch is not None else rooms
+                done, _ = await asyncio.wait(waiting, return_when=asyncio.FIRST_COMPLETED)
+
+                if next_batch in done:
+                    done.discard(next_batch)
+                    try:
+                        batch = next_batch.result()
+                    except StopAsyncIteration:
+                        next_batch = None
+                    else:
+                        rooms.update(
+                            asyncio.create_task(self._analyze_group(classifications, context))
+                            for classifications in batch.values()
+                        )
+                        total += len(batch)
+                        next_batch = asyncio.create_task(_next_batch())
+
+                for task in done:
+                    rooms.discard(task)
+                    try:
+                        analysis = task.result()
+                    except Exception as e:
+                        # Keep going: a resumed run keeps the other rooms' results
+                        logger.error("room_analysis_failed", error=str(e))
+                        error = error or e
+                        continue
+                    room_analyses.append(analysis)
+                    if progress_callback:
+                        await progress_callback(len(room_analyses), total, analysis)
+        finally:
+            # On cancellation or failure stop pending room calls and batch production
+            for task in rooms:
+                task.cancel()
+            if next_batch is not None:
+                next_batch.cancel()
+
+        if error is not None:
+            raise error
         return room_analyses
 
+    def _context_for(self, property_data: PropertyData | None) -> PropertyContext:
+        """Cost-calculation context from property metadata, else the service default."""
+        if property_data:
+            return derive_property_context(property_data)
+        return self._property_context or PropertyContext()
+
+    async def _analyze_group(
+        self, classifications: list[ImageClassification], context: PropertyContext
+    ) -> RoomAnalysis:
+        """analyze_room() for one group produced by the classifier's grouping."""
+        return await self.analyze_room(
+            classifications[0].room_type,
+            classifications[0].room_number,
+            [c.image_url for c in classifications],
+            property_context=context,
+        )
+
+    def prefetch_floor_plan(
+        self,
+        image_urls: list[str],
+        prefetch: FloorPlanPrefetch,
+        property_data: PropertyData | None = None,
+    ) -> None:
+        """
+        Start analyze_floor_plan() in the background for plans known early.
+
+        Apify tags identify most floor plans right after scraping, long before
+        grouping. The run's next analyze_floor_plan() call with the same
+        prefetch awaits this task instead of making a new GPT call if it asks
+        for the same images (compared by original URL, so handles and CDN URLs
+        match), and cancels it otherwise. The caller cancels it when the run
+        fails or ends without asking.
+
+        Args:
+            image_urls:    Tag-identified floor plan image URLs.
+            prefetch:      The run's prefetch slot (one analysis per run).
+            property_data: Optional property metadata for context.
+        """
+        key = self._floor_plan_key(image_urls)
+        if not key or prefetch.task is not None:
+            return
+        prefetch.key = key
+        prefetch.task = asyncio.create_task(self._analyze_floor_plan(image_urls, property_data))
+        logger.info("floor_plan_prefetch_started", num_images=len(image_urls))
+
+    @staticmethod
+    def _floor_plan_key(image_urls: list[str]) -> tuple[str, ...]:
+        return tuple(original_url(url) for url in image_urls)
+
     async def analyze_floor_plan(
         self,
         image_urls: list[str],
         property_data: PropertyData | None = None,
+        prefetch: FloorPlanPrefetch | None = None,
     ) -> FloorPlanAnalysis | None:
         """
         Analyse floor plan image(s) and return layout optimisation ideas.
 
-        Sends the images to GPT-4o with FLOOR_PLAN_ANALYSIS_PROMPT. The result
-        is non-critical — callers should treat None as "no ideas available" and
-        continue normally without raising an error.
+        Sends the images to GPT-4o with FLOOR_PLAN_ANALYSIS_PROMPT, or joins
+        the run's prefetch_floor_plan() task for the same images (a prefetch
+        of other images is cancelled). The result is non-critical — callers
+        should treat None as "no ideas available" and continue normally
+        without raising an error.
 
         Args:
             image_urls:    URLs of floor plan images to analyse.
             property_data: Optional property metadata for context (typology, area, price).
+            prefetch:      The run's prefetch slot, if it may hold a started analysis.
 
         Returns:
             FloorPlanAnalysis with ideas, or None on any failure.
         """
+        prefetched = prefetch.claim(self._floor_plan_key(image_urls)) if prefetch else None
+        if prefetched is not None:
+            logger.info("floor_plan_prefetch_joined", done=prefetched.done())
+            return await prefetched
+        return await self._analyze_floor_plan(image_urls, property_data)
+
+    async def _analyze_floor_plan(
+        self,
+        image_urls: list[str],
+        property_data: PropertyData | None,
+    ) -> FloorPlanAnalysis | None:
         if not image_urls:
             return None
 
@@ -449,15 +652,11 @@ class RenovationEstimatorService:
         prompt = FLOOR_PLAN_ANALYSIS_PROMPT.format(property_context=property_context)
 
         content_payload: list[dict] = [{"type": "text", "text": prompt}]
-        for url in image_urls:
-            content_payload.append(
-                {
-                    "type": "image_url",
-                    "image_url": {"url": url, "detail": self.openai_config.estimation_detail},
-                }
-            )
 
         try:
+            content_payload += await image_content_parts(
+                image_urls, self.openai_config.estimation_detail, self.image_resolver
+            )
             async with self.semaphore:
                 response = await self.client.chat.completions.create(
                     model=self.model,
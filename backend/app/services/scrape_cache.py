@@ -0,0 +1,264 @@
+"""
+Scraped listing cache keyed by Idealista property ID.
+
+Every analysis, batch entry and orchestrator turn starts with an Apify
+request: one to several seconds of actor start-up and proxy time for listing
+data that rarely changes within a day. IdealistaService consults this cache
+before calling the actor and stores every listing it parses.
+
+## Freshness
+
+Each entry is stamped when it is stored and classified by age on lookup:
+
+    fresh    age <= ttl_seconds                   served as-is
+    stale    age <= ttl_seconds + stale_seconds   served at once while the
+                                                  caller refreshes it in the
+                                                  background (stale-while-
+                                                  revalidate)
+    expired  older                                a miss, but kept (LRU-capped)
+                                                  for fallback()
+
+A lookup with max_age serves only entries at most that old and never stale
+ones, so callers that need current data (e.g. max_age=0 for a forced
+refresh) get a synchronous scrape instead. fallback() serves an entry of any
+age when the actor cannot be reached at all (circuit breaker open).
+
+## Tiers
+
+An in-process LRU (PropertyData objects) sits in front of an optional SQLite
+table (PropertyData JSON, table scraped_listings) that survives restarts.
+SQLite hits are promoted into memory with their original timestamp.
+
+Usage:
+    cache = build_scrape_cache(settings.scrape_cache)
+    service = IdealistaService(apify_token, settings.apify, cache=cache)
+    await service.scrape_property(url, max_age=0)   # bypass cached data
+"""
+
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any
+
+import structlog
+
+from app.config import ScrapeCacheConfig
+from app.models.property import PropertyData
+from app.services.sqlite_store import SQLiteKVStore
+
+logger = structlog.get_logger(__name__)
+
+
+@dataclass(frozen=True)
+class CachedListing:
+    """A cache hit: the listing, its age in seconds and whether it needs a refresh."""
+
+    property_data: PropertyData
+    age_seconds: float
+    stale: bool
+
+
+class ScrapeCache:
+    """Two-tier PropertyData cache with TTL and a stale-while-revalidate window."""
+
+    def __init__(
+        self,
+        ttl_seconds: float,
+        stale_seconds: float = 0.0,
+        max_memory_entries: int = 500,
+        store: SQLiteKVStore | None = None,
+        max_entries: int = 10_000,
+    ):
+        """
+        Args:
+            ttl_seconds:        Age up to which an entry is served as-is.
+            stale_seconds:      Extra age during which an entry is still served,
+                                flagged stale so the caller refreshes it.
+            max_memory_entries: In-process LRU cap.
+            store:              On-disk tier, or None for memory only.
+            max_entries:        On-disk LRU cap.
+        """
+        self.ttl_seconds = ttl_seconds
+        self.stale_seconds = stale_seconds
+        self.max_memory_entries = max_memory_entries
+        self.store = store
+        self.max_entries = max_entries
+        # property_id -> (stored_at wall-clock time, listing)
+        self._memory: OrderedDict[str, tuple[float, PropertyData]] = OrderedDict()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.invalidations = 0
+        self.refreshes = 0
+        self.refresh_failures = 0
+        self.fallbacks = 0
+
+    @property
+    def max_servable_age(self) -> float:
+        """Oldest entry a lookup without max_age can return."""
+        return self.ttl_seconds + self.stale_seconds
+
+    async def get(self, property_id: str, max_age: float | None = None) -> CachedListing | None:
+        """
+        Look up a listing.
+
+        Args:
+            property_id: Idealista property ID.
+            max_age:     Serve only entries at most this many seconds old
+                         (never stale ones). None applies the configured TTL
+                         and stale window.
+
+        Returns:
+            CachedListing, or None on a miss (absent, expired or too old).
+        """
+        entry = await self._lookup(property_id)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        property_data, age = entry
+        if age > self.max_servable_age:
+            self.misses += 1
+            return None
+        if max_age is not None:
+            if age > max_age:
+                self.misses += 1
+                return None
+            stale = False
+        else:
+            stale = age > self.ttl_seconds
+
+        if stale:
+            self.stale_hits += 1
+        else:
+            self.hits += 1
+        logger.info(
+            "scrape_cache_hit", property_id=property_id, age_seconds=round(age, 1), stale=stale
+        )
+        return CachedListing(property_data, age, stale)
+
+    async def fallback(self, property_id: str) -> CachedListing | None:
+        """
+        Any stored entry for a listing, however old, for when Apify is unavailable.
+
+        Returns:
+            CachedListing (stale unless within the TTL), or None if never cached.
+        """
+        entry = await self._lookup(property_id)
+        if entry is None:
+            return None
+        property_data, age = entry
+        self.fallbacks += 1
+        logger.warning("scrape_cache_fallback", property_id=property_id, age_seconds=round(age))
+        return CachedListing(property_data, age, age > self.ttl_seconds)
+
+    async def set(self, property_id: str, property_data: PropertyData) -> None:
+        """Store a freshly scraped listing in every tier."""
+        self._remember(property_id, time.time(), property_data)
+        if self.store is not None:
+            try:
+                await self.store.set(
+                    property_id,
+                    property_data.model_dump_json().encode(),
+                    max_entries=self.max_entries,
+                )
+            except Exception as e:
+                logger.warning("scrape_cache_write_error", property_id=property_id, error=str(e))
+        self.stores += 1
+
+    async def invalidate(self, property_id: str) -> None:
+        """Drop a listing from every tier."""
+        await self._drop(property_id)
+        self.invalidations += 1
+        logger.info("scrape_cache_invalidated", property_id=property_id)
+
+    def record_refresh(self, failed: bool = False) -> None:
+        """Count a background refresh of a stale entry (called by the scraper)."""
+        self.refreshes += 1
+        self.refresh_failures += failed
+
+    def stats(self) -> dict[str, Any]:
+        """Hit/miss counters; stale_hits were served while being refreshed."""
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "stores": self.stores,
+            "invalidations": self.invalidations,
+            "refreshes": self.refreshes,
+            "refresh_failures": self.refresh_failures,
+            "fallbacks": self.fallbacks,
+            "hit_rate": (
+                round((self.hits + self.stale_hits) / lookups, 4) if lookups else 0.0
+            ),
+            "memory_entries": len(self._memory),
+        }
+
+    def close(self) -> None:
+        """Close the on-disk tier."""
+        if self.store is not None:
+            self.store.close()
+
+    async def _lookup(self, property_id: str) -> tuple[PropertyData, float] | None:
+        entry = self._memory.get(property_id)
+        if entry is not None:
+            self._memory.move_to_end(property_id)
+            stored_at, property_data = entry
+            return property_data, time.time() - stored_at
+        if self.store is None:
+            return None
+
+        try:
+            row = await self.store.get_with_age(property_id)
+            if row is None:
+                return None
+            raw, age = row
+            property_data = PropertyData.model_validate_json(raw)
+        except Exception as e:
+            logger.warning("scrape_cache_read_error", property_id=property_id, error=str(e))
+            return None
+        self._remember(property_id, time.time() - age, property_data)
+        return property_data, age
+
+    def _remember(self, property_id: str, stored_at: float, property_data: PropertyData) -> None:
+        self._memory[property_id] = (stored_at, property_data)
+        self._memory.move_to_end(property_id)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    async def _drop(self, property_id: str) -> None:
+        self._memory.pop(property_id, None)
+        if self.store is not None:
+            try:
+                await self.store.delete(property_id)
+            except Exception as e:
+                logger.warning("scrape_cache_delete_error", property_id=property_id, error=str(e))
+
+
+def build_scrape_cache(config: ScrapeCacheConfig) -> ScrapeCache | None:
+    """Create the cache described by config, or None when caching is disabled."""
+    if not config.enabled:
+        return None
+
+    if config.backend == "sqlite":
+        store = SQLiteKVStore(config.sqlite_path, table="scraped_listings")
+    elif config.backend == "memory":
+        store = None
+    else:
+        raise ValueError(f"Unknown scrape cache backend: {config.backend!r}")
+
+    logger.info(
+        "scrape_cache_enabled",
+        backend=config.backend,
+        ttl_seconds=config.ttl_seconds,
+        stale_seconds=config.stale_seconds,
+    )
+    return ScrapeCache(
+        config.ttl_seconds,
+        config.stale_seconds,
+        config.max_memory_entries,
+        store,
+        config.max_entries,
+    )
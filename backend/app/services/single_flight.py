@@ -0,0 +1,365 @@
+"""
+In-process single-flight primitives: one execution per key, many waiters.
+
+Two users (or one user in two tabs) analysing the same listing at the same
+moment used to start two independent pipelines and pay Apify and OpenAI
+twice. These helpers let concurrent callers with the same key share one
+execution instead:
+
+    SingleFlight        — coalesces awaitable calls (e.g. scrape_property):
+                          callers arriving while a call for the key is in
+                          flight await the same result or exception.
+    StreamSingleFlight  — coalesces event-producing runs (the analysis graph):
+                          late subscribers first replay every event already
+                          emitted from the run's buffer, then follow live.
+
+Both run the shared work in its own task, so one waiter being cancelled does
+not cancel the work for the others; a SingleFlight call is cancelled once
+every waiter has been. A StreamSingleFlight run is cancelled
+once its last subscriber leaves, as a direct run would be — or, with a
+grace period, only if nobody comes back within it.
+
+Resumable streams: every event a run publishes gets a sequence number, and
+SharedRun.event_id(seq) ("<run id>:<seq>") is sent as the SSE id. The
+buffer is a bounded ring, and with grace_seconds > 0 a run stays findable by
+id for that long after its last subscriber drops (or after it finishes), so
+a client reconnecting with Last-Event-ID calls resume() and follow(after=seq)
+to receive only the events it missed, then continues live.
+
+Usage:
+    flights = SingleFlight()
+    data = await flights.do(property_id, lambda: scrape(url))
+
+    streams = StreamSingleFlight()
+    run = streams.join(listing_key, produce)     # produce(run) publishes events
+    async for event in run.subscribe():
+        ...
+    final_state = run.result                     # run.error if it failed
+
+    run_id, seq = parse_event_id(last_event_id)  # on reconnect
+    run = streams.resume(run_id, listing_key)
+    async for seq, event in run.follow(after=seq):
+        ...
+"""
+
+import asyncio
+import uuid
+from collections import deque
+from collections.abc import AsyncIterator, Awaitable, Callable
+from typing import Any, Generic, TypeVar
+
+import structlog
+
+logger = structlog.get_logger(__name__)
+
+T = TypeVar("T")
+
+
+class SingleFlight(Generic[T]):
+    """Deduplicate concurrent awaitable calls that share a key."""
+
+    def __init__(self) -> None:
+        self._calls: dict[str, asyncio.Task[T]] = {}
+        self._waiters: dict[asyncio.Task[T], int] = {}
+        self.executions = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        """
+        Run fn() once for all concurrent callers with the same key.
+
+        Args:
+            key: Deduplication key (e.g. Idealista property ID).
+            fn:  Zero-argument coroutine factory; only called by the first caller.
+
+        Returns:
+            fn()'s result, shared by every caller that joined while it ran.
+        """
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda _: self._forget(key, task))
+            self.executions += 1
+        else:
+            self.coalesced += 1
+            logger.debug("single_flight_coalesced", key=key)
+        self._waiters[task] = self._waiters.get(task, 0) + 1
+        try:
+            # Shield: a cancelled caller must not cancel the call for the others
+            return await asyncio.shield(task)
+        finally:
+            self._waiters[task] -= 1
+            if not self._waiters[task]:
+                del self._waiters[task]
+                if not task.done():
+                    # Every caller was cancelled: nobody wants the result
+                    logger.info("single_flight_call_cancelled", key=key)
+                    task.cancel()
+
+    def _forget(self, key: str, task: asyncio.Task[T]) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            # Mark the exception retrieved even if every waiter was cancelled
+            task.exception()
+
+    def in_flight(self) -> int:
+        """Number of keys currently executing."""
+        return len(self._calls)
+
+    def stats(self) -> dict[str, int]:
+        """Calls executed, calls that joined one in flight, and keys in flight."""
+        return {
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "in_flight": self.in_flight(),
+        }
+
+
+def parse_event_id(value: str | None) -> tuple[str, int] | None:
+    """
+    Split an SSE Last-Event-ID produced by SharedRun.event_id().
+
+    Returns:
+        (run id, sequence number), or None when value is missing or malformed.
+    """
+    run_id, _, seq = (value or "").strip().rpartition(":")
+    if not run_id or not seq.isdigit():
+        return None
+    return run_id, int(seq)
+
+
+class SharedRun:
+    """One in-flight event-producing run and its replay buffer."""
+
+    def __init__(self, key: str, max_events: int | None = None, run_id: str | None = None):
+        """
+        Args:
+            key:        Deduplication key the run was started under.
+            max_events: Ring-buffer size; None keeps every event. Subscribers
+                        that fall further behind skip the evicted events.
+            run_id:     Run id; a fresh one by default. A run continuing an
+                        earlier one (graph resume) reuses its id.
+        """
+        self.key = key
+        self.id = run_id or uuid.uuid4().hex
+        self.events: deque[Any] = deque(maxlen=max_events)
+        self.last_seq = 0
+        self.result: Any = None
+        self.error: BaseException | None = None
+        self.done = False
+        self.subscribers = 0
+        self.task: asyncio.Task[None] | None = None
+        self._wakeup = asyncio.Event()
+        self._abandon_timer: asyncio.TimerHandle | None = None
+
+    @property
+    def first_seq(self) -> int:
+        """Sequence number of the oldest event still buffered."""
+        return self.last_seq - len(self.events) + 1
+
+    def event_id(self, seq: int) -> str:
+        """SSE id for the event with sequence number seq."""
+        return f"{self.id}:{seq}"
+
+    def publish(self, event: Any) -> None:
+        """Append an event to the buffer and wake every subscriber."""
+        self.events.append(event)
+        self.last_seq += 1
+        self._notify()
+
+    def finish(self, result: Any = None, error: BaseException | None = None) -> None:
+        """Mark the run complete; subscribers drain the buffer and stop."""
+        self.result = result
+        self.error = error
+        self.done = True
+        self._notify()
+
+    def _notify(self) -> None:
+        self._wakeup.set()
+        self._wakeup = asyncio.Event()
+
+    async def subscribe(self) -> AsyncIterator[Any]:
+        """Yield every buffered event, then live events until the run finishes."""
+        async for _, event in self.follow():
+            yield event
+
+    async def follow(self, after: int = 0) -> AsyncIterator[tuple[int, Any]]:
+        """
+        Yield (seq, event) for buffered events after seq `after`, then live ones.
+
+        Args:
+            after: Last sequence number the caller already has (0 = none).
+        """
+        seq = after + 1
+        while True:
+            while seq <= self.last_seq:
+                seq = max(seq, self.first_seq)
+                yield seq, self.events[seq - self.first_seq]
+                seq += 1
+            if self.done:
+                return
+            await self._wakeup.wait()
+
+    async def wait(self) -> Any:
+        """Wait for the run to finish and return its result (raises its error)."""
+        async for _ in self.subscribe():
+            pass
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class StreamSingleFlight:
+    """Registry of in-flight SharedRuns keyed by deduplication key."""
+
+    def __init__(self, grace_seconds: float = 0.0, max_events: int | None = None) -> None:
+        """
+        Args:
+            grace_seconds: How long a run outlives its last subscriber (and
+                           stays resumable after finishing); 0 cancels it
+                           as soon as the last subscriber leaves.
+            max_events:    Per-run ring-buffer size (None = unbounded).
+        """
+        self.grace_seconds = grace_seconds
+        self.max_events = max_events
+        self._runs: dict[str, SharedRun] = {}
+        self._by_id: dict[str, SharedRun] = {}
+        self.executions = 0
+        self.coalesced = 0
+        self.resumed = 0
+
+    def join(
+        self,
+        key: str,
+        produce: Callable[[SharedRun], Awaitable[Any]],
+        run_id: str | None = None,
+    ) -> SharedRun:
+        """
+        Subscribe to the in-flight run for key, starting it if there is none.
+
+        Every join() must be paired with leave(run) once the caller stops
+        listening (use a try/finally around the subscription).
+
+        Args:
+            key:     Deduplication key.
+            produce: Coroutine function that publishes events on the run and
+                     returns its result. Only called when a new run starts.
+            run_id:  Id for a new run (default: a fresh one).
+
+        Returns:
+            The shared run; iterate run.subscribe() for its events.
+        """
+        run = self._runs.get(key)
+        if run is None:
+            run = self.start(key, produce, run_id)
+            self._runs[key] = run
+            return run
+        self.coalesced += 1
+        logger.info("single_flight_joined_run", key=key, buffered=len(run.events))
+        self._attach(run)
+        return run
+
+    def start(
+        self,
+        key: str,
+        produce: Callable[[SharedRun], Awaitable[Any]],
+        run_id: str | None = None,
+    ) -> SharedRun:
+        """
+        Start a run that later join() calls do not coalesce into.
+
+        For streams that are unique per request (e.g. a chat turn) but should
+        still be resumable by id. Pair with leave(run) like join(). A run_id
+        already retained replaces that run in resume() lookups.
+        """
+        run = SharedRun(key, self.max_events, run_id)
+        self._by_id[run.id] = run
+        run.task = asyncio.create_task(self._drive(run, produce))
+        self.executions += 1
+        self._attach(run)
+        return run
+
+    def resume(self, run_id: str, key: str) -> SharedRun | None:
+        """
+        Re-attach to a run by id after a dropped connection.
+
+        Args:
+            run_id: Run id from the client's Last-Event-ID.
+            key:    Key the caller would have started the run under; a run
+                    with a different key is not returned.
+
+        Returns:
+            The run (in flight, or finished within the grace period), or None
+            when it is unknown, expired, belongs to another key or was
+            cancelled. Pair with leave(run) like join().
+        """
+        run = self._by_id.get(run_id)
+        if run is None or run.key != key or isinstance(run.error, asyncio.CancelledError):
+            return None
+        self.resumed += 1
+        logger.info("shared_run_resumed", key=key, run_id=run_id)
+        self._attach(run)
+        return run
+
+    def _attach(self, run: SharedRun) -> None:
+        run.subscribers += 1
+        if run._abandon_timer is not None:
+            run._abandon_timer.cancel()
+            run._abandon_timer = None
+
+    def leave(self, run: SharedRun) -> None:
+        """Drop a subscriber; the run is cancelled when nobody is listening."""
+        run.subscribers -= 1
+        if run.subscribers > 0 or run.done or run.task is None:
+            return
+        if self.grace_seconds > 0:
+            # Keep running for a client that reconnects with Last-Event-ID
+            run._abandon_timer = asyncio.get_running_loop().call_later(
+                self.grace_seconds, self._cancel_abandoned, run
+            )
+        else:
+            self._cancel_abandoned(run)
+
+    def _cancel_abandoned(self, run: SharedRun) -> None:
+        run._abandon_timer = None
+        if run.subscribers <= 0 and not run.done and run.task is not None:
+            logger.info("shared_run_cancelled_no_subscribers", key=run.key)
+            run.task.cancel()
+
+    async def _drive(self, run: SharedRun, produce: Callable[[SharedRun], Awaitable[Any]]) -> None:
+        try:
+            result = await produce(run)
+        except asyncio.CancelledError:
+            run.finish(error=asyncio.CancelledError())
+        except Exception as e:
+            run.finish(error=e)
+        else:
+            run.finish(result=result)
+        finally:
+            if self._runs.get(run.key) is run:
+                del self._runs[run.key]
+            if self.grace_seconds > 0:
+                # Finished runs stay resumable for clients that missed the tail
+                asyncio.get_running_loop().call_later(self.grace_seconds, self._forget_id, run)
+            else:
+                self._forget_id(run)
+
+    def _forget_id(self, run: SharedRun) -> None:
+        # A later run may have taken over the id (resumed analysis)
+        if self._by_id.get(run.id) is run:
+            del self._by_id[run.id]
+
+    def in_flight(self) -> int:
+        """Number of runs currently executing."""
+        return sum(1 for run in self._by_id.values() if not run.done)
+
+    def stats(self) -> dict[str, int]:
+        """Runs started, subscribers that joined or resumed a run, and runs in flight."""
+        return {
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "resumed": self.resumed,
+            "in_flight": self.in_flight(),
+        }
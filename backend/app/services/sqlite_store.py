@@ -0,0 +1,164 @@
+"""
+Small SQLite key-value store used as the on-disk tier of local caches.
+
+Each store owns one table of ``key → value BLOB`` rows with creation and
+last-access timestamps, which is all a cache needs for TTL expiry and
+least-recently-used eviction. sqlite3 is synchronous, so the async methods
+run the queries in a worker thread; a lock serialises access to the shared
+connection.
+
+Usage:
+    store = SQLiteKVStore("data/cache.sqlite3", table="classifications")
+    await store.set("abc", b"...")
+    value = await store.get("abc", ttl_seconds=3600)   # None if missing/expired
+"""
+
+import asyncio
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+_TABLE_NAME_RE = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+class SQLiteKVStore:
+    """Thread-safe SQLite table of BLOB values with TTL and LRU eviction."""
+
+    def __init__(self, path: str, table: str):
+        """
+        Open (or create) the database file and table.
+
+        Args:
+            path:  Path to the SQLite file. Parent directories are created.
+                   ":memory:" gives a private in-memory database (tests).
+            table: Table name — must be a plain identifier.
+        """
+        if not _TABLE_NAME_RE.match(table):
+            raise ValueError(f"Invalid table name: {table!r}")
+
+        if path != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+
+        self.path = path
+        self.table = table
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} ("
+                "key TEXT PRIMARY KEY, value BLOB NOT NULL, "
+                "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self._conn.execute(
+                f"CREATE INDEX IF NOT EXISTS {table}_accessed_at ON {table} (accessed_at)"
+            )
+            self._conn.commit()
+
+    # --- sync primitives (run in a worker thread by the async wrappers) ---
+
+    def _get(self, key: str, ttl_seconds: float | None) -> tuple[bytes, float] | None:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT value, created_at FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            value, created_at = row
+            if ttl_seconds is not None and now - created_at > ttl_seconds:
+                self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                self._conn.commit()
+                return None
+            self._conn.execute(
+                f"UPDATE {self.table} SET accessed_at = ? WHERE key = ?", (now, key)
+            )
+            self._conn.commit()
+            return value, now - created_at
+
+    def _set(self, key: str, value: bytes, max_entries: int | None, age: float) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?)",
+                (key, value, now - age, now),
+            )
+            if max_entries is not None:
+                self._conn.execute(
+                    f"DELETE FROM {self.table} WHERE key IN ("
+                    f"SELECT key FROM {self.table} ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                    (max_entries,),
+                )
+            self._conn.commit()
+
+    def _delete(self, key: str) -> None:
+        with self._lock:
+            self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def _purge_expired(self, ttl_seconds: float) -> int:
+        cutoff = time.time() - ttl_seconds
+        with self._lock:
+            cursor = self._conn.execute(
+                f"DELETE FROM {self.table} WHERE created_at < ?", (cutoff,)
+            )
+            self._conn.commit()
+            return cursor.rowcount
+
+    def _items(self) -> list[tuple[str, bytes]]:
+        with self._lock:
+            return self._conn.execute(
+                f"SELECT key, value FROM {self.table} ORDER BY created_at"
+            ).fetchall()
+
+    def _count(self) -> int:
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+    # --- async API ---
+
+    async def get(self, key: str, ttl_seconds: float | None = None) -> bytes | None:
+        """Return the value for key, or None if missing or older than ttl_seconds."""
+        entry = await asyncio.to_thread(self._get, key, ttl_seconds)
+        return entry[0] if entry is not None else None
+
+    async def get_with_age(
+        self, key: str, ttl_seconds: float | None = None
+    ) -> tuple[bytes, float] | None:
+        """Return (value, age_seconds), or None if missing or older than ttl_seconds."""
+        return await asyncio.to_thread(self._get, key, ttl_seconds)
+
+    async def set(
+        self, key: str, value: bytes, max_entries: int | None = None, age: float = 0.0
+    ) -> None:
+        """
+        Insert or replace a value, evicting least-recently-used rows over max_entries.
+
+        age backdates the row's creation time, so a value copied from another
+        tier keeps its remaining TTL.
+        """
+        await asyncio.to_thread(self._set, key, value, max_entries, age)
+
+    async def delete(self, key: str) -> None:
+        """Remove a key (no-op if missing)."""
+        await asyncio.to_thread(self._delete, key)
+
+    async def purge_expired(self, ttl_seconds: float) -> int:
+        """Delete every row older than ttl_seconds. Returns the number removed."""
+        return await asyncio.to_thread(self._purge_expired, ttl_seconds)
+
+    async def items(self) -> list[tuple[str, bytes]]:
+        """Every (key, value) row, oldest first."""
+        return await asyncio.to_thread(self._items)
+
+    async def count(self) -> int:
+        """Number of rows currently stored."""
+        return await asyncio.to_thread(self._count)
+
+    def close(self) -> None:
+        """Close the underlying connection."""
+        with self._lock:
+            self._conn.close()
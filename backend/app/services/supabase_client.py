@@ -3,7 +3,8 @@ Async Supabase client for orchestrator DB operations.
 
 Provides typed wrappers around the Supabase async client for all tables
 used by the orchestrator agent: user_profiles, properties, portfolio_items,
-room_features, analyses, conversations, messages, action_log.
+room_features, analyses, conversations, messages, action_log, and the
+analysis_cache tier of the whole-analysis result cache.
 """
 
 import uuid
@@ -416,6 +417,45 @@ async def save_room_features(
     return response.data or []
 
 
+# ---------------------------------------------------------------------------
+# analysis_cache
+# ---------------------------------------------------------------------------
+
+
+async def get_analysis_cache_entry(
+    client: AsyncSupabaseClient, cache_key: str
+) -> dict | None:
+    """Fetch a cached analysis row (value + created_at). Returns None if not found."""
+    response = (
+        await client.table("analysis_cache")
+        .select("value, created_at")
+        .eq("cache_key", cache_key)
+        .maybe_single()
+        .execute()
+    )
+    return response.data if response else None
+
+
+async def upsert_analysis_cache_entry(
+    client: AsyncSupabaseClient,
+    cache_key: str,
+    value: dict,
+    created_at: datetime | None = None,
+) -> None:
+    """Insert or replace a cached analysis; created_at defaults to now."""
+    row = {
+        "cache_key": cache_key,
+        "value": value,
+        "created_at": (created_at or datetime.now(timezone.utc)).isoformat(),
+    }
+    await client.table("analysis_cache").upsert(row, on_conflict="cache_key").execute()
+
+
+async def delete_analysis_cache_entry(client: AsyncSupabaseClient, cache_key: str) -> None:
+    """Remove a cached analysis (no-op if missing)."""
+    await client.table("analysis_cache").delete().eq("cache_key", cache_key).execute()
+
+
 def generate_uuid() -> str:
     """Generate a new UUID string."""
     return str(uuid.uuid4())
@@ -0,0 +1,20 @@
+"""
+Offline micro-benchmarks for the analysis pipeline.
+
+Each module is runnable on its own and uses local stand-ins (fake services,
+stub servers) — no API keys or network access needed:
+
+    cd backend
+    uv run python -m benchmarks.bench_event_log
+"""
+
+import logging
+import os
+
+import structlog
+
+# Keep per-image debug/info logs out of benchmark output
+structlog.configure(wrapper_class=structlog.make_filtering_bound_logger(logging.WARNING))
+
+# Services build Settings on construction; benchmarks never reach OpenAI
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
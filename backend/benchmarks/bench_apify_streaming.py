@@ -0,0 +1,93 @@
+"""
+Apify scraping benchmark: buffered vs incremental NDJSON parsing.
+
+Scrapes LISTINGS listings with one multi-URL request to the local stub actor
+(benchmarks.stub_apify), which streams a listing's line as soon as it has
+scraped it: ACTOR_START_LATENCY per request, then ACTOR_LISTING_LATENCY per
+listing, ACTOR_CONCURRENCY at a time. Measures the time until the first
+PropertyData is available and until the last one for:
+
+  buffered  — the previous implementation: POST, wait for the whole body,
+              then parse every line (response.text)
+  streamed  — IdealistaService.scrape_properties: lines parsed as they
+              arrive (aiter_lines), each listing yielded at once
+
+Run:
+    uv run python -m benchmarks.bench_apify_streaming
+"""
+
+import asyncio
+import statistics
+import time
+
+import httpx
+
+from app.config import ApifyConfig
+from app.services.idealista import IdealistaService
+from benchmarks.stub_apify import StubApifyActor
+
+LISTINGS = 20
+ACTOR_START_LATENCY = 0.5
+ACTOR_LISTING_LATENCY = 0.2
+ACTOR_CONCURRENCY = 5
+RUNS = 3
+
+
+def _urls() -> list[str]:
+    return [f"https://www.idealista.pt/imovel/{n}/" for n in range(1, LISTINGS + 1)]
+
+
+async def _buffered(service: IdealistaService) -> tuple[float, float]:
+    urls = _urls()
+    start = time.perf_counter()
+    async with httpx.AsyncClient() as client:
+        response = await client.post(
+            service.apify_config.standby_url,
+            json={"Property_urls": [{"url": url} for url in urls]},
+        )
+    parsed = []
+    for line in response.text.splitlines():
+        item = service._parse_ndjson_line(line)
+        if item is not None and item.get("type") == "property":
+            parsed.append(service._property_from_item(item["data"]["originalUrl"], item))
+    elapsed = time.perf_counter() - start
+    assert len(parsed) == LISTINGS
+    return elapsed, elapsed
+
+
+async def _streamed(service: IdealistaService) -> tuple[float, float]:
+    start = time.perf_counter()
+    arrivals = [time.perf_counter() async for _ in service.scrape_properties(_urls())]
+    assert len(arrivals) == LISTINGS
+    return arrivals[0] - start, arrivals[-1] - start
+
+
+async def run() -> dict[str, list[tuple[float, float]]]:
+    samples: dict[str, list[tuple[float, float]]] = {"buffered": [], "streamed": []}
+    async with StubApifyActor(
+        ACTOR_START_LATENCY, ACTOR_LISTING_LATENCY, ACTOR_CONCURRENCY
+    ) as actor:
+        service = IdealistaService("bench", ApifyConfig(standby_url=actor.url))
+        for _ in range(RUNS):
+            samples["buffered"].append(await _buffered(service))
+            samples["streamed"].append(await _streamed(service))
+        await service.close()
+    return samples
+
+
+def main() -> None:
+    samples = asyncio.run(run())
+    print(
+        f"{LISTINGS} listings in one request; stub actor {ACTOR_START_LATENCY * 1000:.0f} ms "
+        f"start + {ACTOR_LISTING_LATENCY * 1000:.0f} ms/listing x {ACTOR_CONCURRENCY} "
+        f"parallel, median of {RUNS}"
+    )
+    print(f"{'mode':10}{'first property ms':>19}{'all properties ms':>19}")
+    for label, rows in samples.items():
+        first = statistics.median(r[0] for r in rows)
+        last = statistics.median(r[1] for r in rows)
+        print(f"{label:10}{first * 1000:>19.1f}{last * 1000:>19.1f}")
+
+
+if __name__ == "__main__":
+    main()
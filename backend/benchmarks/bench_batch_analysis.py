@@ -0,0 +1,172 @@
+"""
+Batch analysis benchmark: one request per listing vs POST /analyze/batch.
+
+Analyses LISTINGS listings (4 untagged photos each: kitchen, living room,
+bathroom, bedroom) through the real renovation graph, IdealistaService,
+ImageClassifierService and RenovationEstimatorService. Apify is the local stub
+actor (benchmarks.stub_apify): a fixed start-up latency per request plus a
+per-listing scrape time (ACTOR_CONCURRENCY listings in parallel), each listing
+streamed as soon as it is scraped. OpenAI is a fake that sleeps per call type.
+Both modes share the services' process-wide classification/estimation
+semaphores, as in production:
+
+  per-listing — the client keeps CLIENT_CONCURRENCY /analyze/sync-style
+                requests open; every listing pays its own Apify request.
+  batch       — analyze_batch: one Apify request for every listing; each
+                listing's graph run starts as soon as its NDJSON line
+                arrives, max_concurrent_listings at a time.
+
+Reports wall time, listings/minute, time to the first finished listing and
+the number of Apify requests.
+
+Run:
+    uv run python -m benchmarks.bench_batch_analysis
+"""
+
+import asyncio
+import json
+import statistics
+import time
+from types import SimpleNamespace
+
+from app.config import ApifyConfig, BatchAnalysisConfig, Settings
+from app.graphs.main_graph import build_renovation_graph
+from app.services.analysis_runs import join_analysis
+from app.services.batch_analysis import analyze_batch
+from app.services.idealista import IdealistaService
+from app.services.image_classifier import ImageClassifierService
+from app.services.renovation_estimator import RenovationEstimatorService
+from app.services.single_flight import StreamSingleFlight
+from benchmarks.stub_apify import PHOTOS, StubApifyActor
+
+LISTINGS = 40
+ACTOR_REQUEST_LATENCY = 1.0   # Standby actor start-up + proxy, per request
+ACTOR_LISTING_LATENCY = 0.3   # Scraping one listing
+ACTOR_CONCURRENCY = 10        # Listings the actor scrapes in parallel per request
+CLASSIFY_LATENCY = 0.02
+ESTIMATE_LATENCY = 0.04
+SUMMARY_LATENCY = 0.02
+CLIENT_CONCURRENCY = 8
+RUNS = 3
+
+
+class LatencyOpenAI:
+    """chat.completions.create stand-in: classification, room estimate or summary."""
+
+    def __init__(self) -> None:
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    async def _create(self, messages, model, **_):
+        content = messages[0]["content"]
+        images = [p["image_url"]["url"] for p in content if isinstance(p, dict)
+                  and p.get("type") == "image_url"]
+        if model == "gpt-4o-mini":
+            await asyncio.sleep(CLASSIFY_LATENCY)
+            room = next(room for room in PHOTOS if f"/{room}." in images[0])
+            answer = json.dumps({"room_type": room, "room_number": 1, "confidence": 0.9})
+        elif images:
+            await asyncio.sleep(ESTIMATE_LATENCY)
+            answer = "{}"  # every feature field is optional
+        else:
+            await asyncio.sleep(SUMMARY_LATENCY)
+            answer = "Resumo"
+        message = SimpleNamespace(refusal=None, content=answer)
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=message, finish_reason="stop")], usage=None
+        )
+
+
+def _pipeline(standby_url: str) -> tuple[object, IdealistaService]:
+    settings = Settings(openai_api_key="sk-bench", use_base64_images=False)
+    fake = LatencyOpenAI()
+    classifier = ImageClassifierService(
+        openai_api_key="sk-bench",
+        model="gpt-4o-mini",
+        max_concurrent=settings.image_processing.max_concurrent_classifications,
+    )
+    estimator = RenovationEstimatorService(
+        openai_api_key="sk-bench",
+        model="gpt-4o",
+        max_concurrent=settings.image_processing.max_concurrent_estimations,
+    )
+    classifier.client = fake
+    estimator.client = fake
+    estimator._feature_extractor.client = fake
+    idealista = IdealistaService("bench", ApifyConfig(standby_url=standby_url))
+    graph = build_renovation_graph(settings, idealista, classifier, estimator)
+    return graph, idealista
+
+
+async def _per_listing(graph, idealista, urls: list[str]) -> list[float]:
+    flights = StreamSingleFlight()
+    client_slots = asyncio.Semaphore(CLIENT_CONCURRENCY)
+    finished: list[float] = []
+
+    async def _analyze(url: str) -> None:
+        async with client_slots:
+            run = join_analysis(flights, graph, url)
+            try:
+                final_state = await run.wait()
+            finally:
+                flights.leave(run)
+            assert final_state.get("estimate") is not None, final_state.get("error")
+            finished.append(time.perf_counter())
+
+    await asyncio.gather(*(_analyze(url) for url in urls))
+    return finished
+
+
+async def _batch(graph, idealista, urls: list[str]) -> list[float]:
+    finished: list[float] = []
+    config = BatchAnalysisConfig(max_concurrent_listings=CLIENT_CONCURRENCY)
+    async for event in analyze_batch(urls, "", graph, idealista, StreamSingleFlight(), config):
+        assert event["type"] != "error", event["message"]
+        if event["type"] == "result":
+            finished.append(time.perf_counter())
+    return finished
+
+
+async def run() -> dict[str, list[tuple[float, float, int]]]:
+    samples: dict[str, list[tuple[float, float, int]]] = {"per-listing": [], "batch": []}
+    async with StubApifyActor(
+        ACTOR_REQUEST_LATENCY, ACTOR_LISTING_LATENCY, ACTOR_CONCURRENCY
+    ) as actor:
+        for run_index in range(RUNS):
+            for label, mode in (("per-listing", _per_listing), ("batch", _batch)):
+                graph, idealista = _pipeline(actor.url)
+                urls = [
+                    f"https://www.idealista.pt/imovel/{run_index}{n:04d}/"
+                    for n in range(LISTINGS)
+                ]
+                actor.reset_counters()
+                start = time.perf_counter()
+                finished = await mode(graph, idealista, urls)
+                elapsed = time.perf_counter() - start
+                await idealista.close()
+                assert len(finished) == LISTINGS
+                samples[label].append((elapsed, min(finished) - start, actor.requests))
+    return samples
+
+
+def main() -> None:
+    samples = asyncio.run(run())
+    print(
+        f"{LISTINGS} listings x {len(PHOTOS)} photos; stub Apify "
+        f"{ACTOR_REQUEST_LATENCY * 1000:.0f} ms/request + "
+        f"{ACTOR_LISTING_LATENCY * 1000:.0f} ms/listing ({ACTOR_CONCURRENCY} parallel); "
+        f"fake GPT classify {CLASSIFY_LATENCY * 1000:.0f} ms, estimate "
+        f"{ESTIMATE_LATENCY * 1000:.0f} ms; {CLIENT_CONCURRENCY} listings at a time, "
+        f"median of {RUNS}"
+    )
+    print(f"{'mode':12}{'wall s':>8}{'listings/min':>14}{'first s':>9}{'apify reqs':>12}")
+    for label, rows in samples.items():
+        wall = statistics.median(r[0] for r in rows)
+        first = statistics.median(r[1] for r in rows)
+        requests = statistics.median(r[2] for r in rows)
+        print(
+            f"{label:12}{wall:>8.2f}{LISTINGS / wall * 60:>14.0f}{first:>9.2f}{requests:>12.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Classification benchmark: one image per request vs batched requests.
+
+Classifies a listing of 20 untagged photos through ImageClassifierService with
+a fake OpenAI client and reports, per listing:
+
+  requests       chat completions sent (including single-image fallbacks)
+  prompt tokens  text tokens (~4 chars/token) + 85 per low-detail image
+  wall ms        end-to-end time with max_concurrent=5
+
+The fake charges a fixed per-request latency plus a per-image cost, which is
+what makes batching pay off: each request repeats the classification prompt
+and pays the round trip. One photo is always left out of batched replies so the
+single-image fallback path is part of the measurement.
+
+Run:
+    uv run python -m benchmarks.bench_classification_batching
+"""
+
+import asyncio
+import json
+import statistics
+import time
+from types import SimpleNamespace
+
+from app.config import OpenAIConfig
+from app.services.image_classifier import ImageClassifierService
+
+NUM_IMAGES = 20
+BATCH_SIZES = [1, 4, 8]
+REQUEST_LATENCY = 0.35
+PER_IMAGE_LATENCY = 0.03
+LOW_DETAIL_IMAGE_TOKENS = 85
+HARD_IMAGE = "img13"  # Omitted from batched replies → retried on its own
+RUNS = 3
+
+
+class FakeCompletions:
+    """Stand-in for client.chat.completions with request/token counters."""
+
+    def __init__(self) -> None:
+        self.requests = 0
+        self.prompt_tokens = 0
+
+    async def create(self, **kwargs) -> SimpleNamespace:
+        content = kwargs["messages"][0]["content"]
+        images = [p["image_url"]["url"] for p in content if p["type"] == "image_url"]
+        text_chars = sum(len(p["text"]) for p in content if p["type"] == "text")
+        self.requests += 1
+        self.prompt_tokens += text_chars // 4 + LOW_DETAIL_IMAGE_TOKENS * len(images)
+
+        await asyncio.sleep(REQUEST_LATENCY + PER_IMAGE_LATENCY * len(images))
+
+        answer = {"room_type": "sala", "room_number": 1, "confidence": 0.8}
+        if len(images) == 1:
+            body = answer
+        else:
+            body = {
+                "classifications": [
+                    {"index": i, **answer}
+                    for i, url in enumerate(images)
+                    if HARD_IMAGE not in url
+                ]
+            }
+        message = SimpleNamespace(content=json.dumps(body), refusal=None)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message, finish_reason="stop")])
+
+
+async def _classify_listing(batch_size: int, listing: int) -> tuple[float, int, int]:
+    classifier = ImageClassifierService(
+        openai_api_key="sk-bench",
+        max_concurrent=5,
+        openai_config=OpenAIConfig(classification_batch_size=batch_size),
+    )
+    completions = FakeCompletions()
+    classifier.client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    urls = [f"https://cdn.example/{listing}/img{i}.jpg" for i in range(NUM_IMAGES)]
+
+    start = time.perf_counter()
+    results = await classifier.classify_images(urls)
+    elapsed = time.perf_counter() - start
+
+    assert len(results) == NUM_IMAGES
+    return elapsed, completions.requests, completions.prompt_tokens
+
+
+async def run() -> dict[int, list[tuple[float, int, int]]]:
+    samples: dict[int, list[tuple[float, int, int]]] = {size: [] for size in BATCH_SIZES}
+    for run_index in range(RUNS):
+        for size in BATCH_SIZES:
+            samples[size].append(await _classify_listing(size, run_index))
+    return samples
+
+
+def main() -> None:
+    samples = asyncio.run(run())
+    print(
+        f"{NUM_IMAGES} untagged images, fake GPT {REQUEST_LATENCY * 1000:.0f} ms/request + "
+        f"{PER_IMAGE_LATENCY * 1000:.0f} ms/image, 5 concurrent, median of {RUNS}"
+    )
+    print(f"{'batch':>5}{'requests':>10}{'prompt tok':>12}{'wall ms':>10}")
+    for size, rows in samples.items():
+        wall = statistics.median(t for t, _, _ in rows) * 1000
+        requests = statistics.median(r for _, r, _ in rows)
+        tokens = statistics.median(p for _, _, p in rows)
+        print(f"{size:>5}{requests:>10.0f}{tokens:>12.0f}{wall:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
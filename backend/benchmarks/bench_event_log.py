@@ -0,0 +1,161 @@
+"""
+Event-log benchmark: whole-state copying vs append-only deltas.
+
+Replays the stream-event volume of a synthetic 60-image listing through two
+5-node graphs with the same topology as the renovation pipeline:
+
+  before — the old node contract: every node copies the full event list,
+           returns {**state, ...}, and the SSE loop slices events[sent:] out
+           of the full list on every chunk.
+  after  — the current contract: nodes return only their new events, the
+           `stream_events` reducer in RenovationGraphState appends them, and
+           the SSE loop reads each update's delta.
+
+Reports event-list element copies, state-dict key copies, traced peak memory
+and wall time per run.
+
+Run:
+    uv run python -m benchmarks.bench_event_log
+"""
+
+import asyncio
+import time
+import tracemalloc
+from dataclasses import dataclass
+
+from langgraph.graph import END, StateGraph
+
+from app.graphs.state import RenovationGraphState, create_initial_state
+from app.models.property import StreamEvent
+
+NUM_IMAGES = 60
+NUM_ROOMS = 12
+RUNS = 20
+
+# (node name, events emitted) — mirrors what each node emits for NUM_IMAGES photos
+NODE_EVENTS: list[tuple[str, int]] = [
+    ("scrape", 3),
+    ("classify", NUM_IMAGES + 2),
+    ("group", 2),
+    ("estimate", NUM_ROOMS + 3),
+    ("summarize", 2),
+]
+
+
+@dataclass
+class Counters:
+    element_copies: int = 0
+    state_key_copies: int = 0
+    events_forwarded: int = 0
+
+
+def _event(node: str, i: int) -> StreamEvent:
+    return StreamEvent(
+        type="progress", message=f"{node} {i}", data={"current": i, "total": NUM_IMAGES}
+    )
+
+
+def _build(schema: type, nodes: dict) -> object:
+    graph = StateGraph(schema)
+    previous = None
+    for name, node in nodes.items():
+        graph.add_node(name, node)
+        if previous is None:
+            graph.set_entry_point(name)
+        else:
+            graph.add_edge(previous, name)
+        previous = name
+    graph.add_edge(previous, END)
+    return graph.compile()
+
+
+def build_before(counters: Counters) -> object:
+    nodes: dict = {}
+    for name, count in NODE_EVENTS:
+
+        async def node(state: dict, name: str = name, count: int = count) -> dict:
+            events = list(state.get("stream_events", []))
+            counters.element_copies += len(state.get("stream_events", []))
+            counters.state_key_copies += len(state)
+            events.extend(_event(name, i) for i in range(count))
+            return {**state, "stream_events": events, "current_step": name}
+
+        nodes[name] = node
+    return _build(dict, nodes)
+
+
+def build_after(counters: Counters) -> object:
+    nodes: dict = {}
+    for name, count in NODE_EVENTS:
+
+        async def node(state: dict, name: str = name, count: int = count) -> dict:
+            return {
+                "stream_events": [_event(name, i) for i in range(count)],
+                "current_step": name,
+            }
+
+        nodes[name] = node
+    return _build(RenovationGraphState, nodes)
+
+
+async def consume_before(graph: object, counters: Counters) -> None:
+    sent = 0
+    async for chunk in graph.astream(create_initial_state("https://example.test/")):
+        state = list(chunk.values())[0]
+        new_events = state["stream_events"][sent:]
+        counters.element_copies += len(new_events)
+        for _ in new_events:
+            counters.events_forwarded += 1
+            sent += 1
+
+
+async def consume_after(graph: object, counters: Counters) -> None:
+    log_length = 0
+    async for chunk in graph.astream(create_initial_state("https://example.test/")):
+        for delta in chunk.values():
+            new_events = delta.get("stream_events", [])
+            # operator.add materialises one list of the combined length per update
+            log_length += len(new_events)
+            counters.element_copies += log_length
+            counters.events_forwarded += len(new_events)
+
+
+def measure(label: str, build, consume) -> dict:
+    counters = Counters()
+    graph = build(counters)
+    asyncio.run(consume(graph, Counters()))  # warm-up (graph compile caches)
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    for _ in range(RUNS):
+        asyncio.run(consume(graph, counters))
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "label": label,
+        "element_copies": counters.element_copies // RUNS,
+        "state_key_copies": counters.state_key_copies // RUNS,
+        "events_forwarded": counters.events_forwarded // RUNS,
+        "peak_kib": peak / 1024,
+        "ms_per_run": elapsed / RUNS * 1000,
+    }
+
+
+def main() -> None:
+    total_events = sum(count for _, count in NODE_EVENTS)
+    print(f"Synthetic listing: {NUM_IMAGES} images, {NUM_ROOMS} rooms, {total_events} events/run")
+    print(f"{'':8}{'elem copies':>12}{'key copies':>12}{'forwarded':>11}{'peak KiB':>10}{'ms/run':>9}")
+    for row in (
+        measure("before", build_before, consume_before),
+        measure("after", build_after, consume_after),
+    ):
+        print(
+            f"{row['label']:8}{row['element_copies']:>12}{row['state_key_copies']:>12}"
+            f"{row['events_forwarded']:>11}{row['peak_kib']:>10.1f}{row['ms_per_run']:>9.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Image preparation benchmark: raw CDN bytes vs per-detail variants.
+
+Generates a synthetic 25-photo listing (3000x2000 JPEGs at CDN-like quality)
+and builds the OpenAI payloads one analysis sends — every image once at
+detail="low" (classification) and once at detail="high" (room analysis) —
+with and without ImagePreparer. Reports:
+
+  body MB      — total base64 bytes in request bodies
+  upload ms    — that body at a 20 Mbit/s uplink
+  tokens       — vision tokens per OpenAI's tile formula; identical by design,
+                 since variants match the geometry OpenAI would resize to
+  prep ms      — wall time spent preparing (thread pool, 1 vs 4 workers)
+  resident MB  — data-URI bytes held per analysis (originals + cached variants)
+
+Run:
+    uv run python -m benchmarks.bench_image_preparation
+"""
+
+import asyncio
+import base64
+import io
+import math
+import time
+
+from PIL import Image
+
+from app.config import ImagePreparationConfig
+from app.services.image_preparer import ImagePreparer, image_content_parts, target_size
+
+NUM_IMAGES = 25
+WIDTH, HEIGHT = 3000, 2000
+UPLINK_MBIT = 20
+
+
+def _photo(seed: int) -> str:
+    """Photo-like JPEG: smooth gradients plus sensor-ish noise."""
+    gradient = Image.linear_gradient("L").resize((WIDTH, HEIGHT))
+    noise = Image.effect_noise((WIDTH, HEIGHT), 4 + seed % 3)
+    img = Image.merge("RGB", (gradient, noise, gradient.rotate(180)))
+    buf = io.BytesIO()
+    img.save(buf, format="JPEG", quality=85)
+    return "data:image/jpeg;base64," + base64.b64encode(buf.getvalue()).decode()
+
+
+def _vision_tokens(width: int, height: int, detail: str) -> int:
+    if detail == "low":
+        return 85
+    w, h = target_size(width, height, "high")
+    return 85 + 170 * math.ceil(w / 512) * math.ceil(h / 512)
+
+
+async def _payload_bytes(images: list[str], preparer: ImagePreparer | None) -> int:
+    total = 0
+    for detail in ("low", "high"):
+        parts = await image_content_parts(images, detail, preparer)
+        total += sum(len(p["image_url"]["url"]) for p in parts)
+    return total
+
+
+async def run() -> None:
+    images = [_photo(i) for i in range(NUM_IMAGES)]
+    raw_resident = sum(len(u) for u in images)
+    tokens = NUM_IMAGES * sum(_vision_tokens(WIDTH, HEIGHT, d) for d in ("low", "high"))
+
+    rows = [("raw", await _payload_bytes(images, None), 0.0, raw_resident)]
+    for workers in (1, 4):
+        preparer = ImagePreparer(ImagePreparationConfig(max_workers=workers))
+        start = time.perf_counter()
+        body = await _payload_bytes(images, preparer)
+        elapsed = time.perf_counter() - start
+        rows.append(
+            (f"prep x{workers}", body, elapsed, raw_resident + preparer.stats()["cache_bytes"])
+        )
+        preparer.close()
+
+    print(f"{NUM_IMAGES} images at {WIDTH}x{HEIGHT}, low + high payload per image")
+    print(f"{'':10}{'body MB':>9}{'upload ms':>11}{'tokens':>8}{'prep ms':>9}{'resident MB':>13}")
+    for label, body, elapsed, resident in rows:
+        upload_ms = body * 8 / (UPLINK_MBIT * 1_000_000) * 1000
+        print(
+            f"{label:10}{body / 1e6:>9.2f}{upload_ms:>11.0f}{tokens:>8}"
+            f"{elapsed * 1000:>9.0f}{resident / 1e6:>13.2f}"
+        )
+
+
+def main() -> None:
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,313 @@
+"""
+Room clustering benchmark: local visual clustering vs GPT cluster_room_images.
+
+Scores LocalRoomClusterer per bucket (all bedroom or all bathroom photos of a
+listing, bounded by num_rooms / num_bathrooms) against a reference grouping:
+the adjusted Rand index (ARI, 1.0 = identical partition), how often the room
+count matches, local latency per bucket, and — for a sweep of min_confidence
+values — the share of buckets kept locally (GPT calls avoided) and the ARI
+of those kept.
+
+Two reference sets:
+
+  synthetic (default) — LISTINGS generated listings; each room is rendered
+                        from its own palette and furniture layout, then shot
+                        1-5 times (SHOTS_PER_ROOM) with random crops, exposure
+                        and JPEG quality. Walls are near-white and floors are
+                        often shared between rooms, as in real flats. The
+                        reference is the ground truth.
+  recorded            — buckets saved by --record: the downloaded photos and
+                        GPT's cluster_room_images answer with its latency.
+                        Local clusters are scored against GPT's.
+
+Recording needs OPENAI_API_KEY and APIFY_TOKEN and calls the real services;
+the repository ships no recordings.
+
+Run:
+    uv run python -m benchmarks.bench_local_clustering
+    uv run python -m benchmarks.bench_local_clustering --record recordings/ URL [URL ...]
+    uv run python -m benchmarks.bench_local_clustering --replay recordings/
+"""
+
+import argparse
+import asyncio
+import hashlib
+import io
+import json
+import random
+import statistics
+import time
+from pathlib import Path
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageEnhance
+
+from app.config import LocalClusteringConfig
+from app.services.image_dedup import ImageDeduplicator
+from app.services.image_store import ImageStore
+from app.services.local_clustering import LocalRoomClusterer
+
+LISTINGS = 60
+SHOTS_PER_ROOM = (1, 5)
+THRESHOLDS = (0.0, 0.45, 0.5, 0.55, 0.6, 0.7)
+
+WALLS = [(236, 233, 226), (242, 240, 236), (228, 226, 230), (238, 228, 212), (222, 230, 226)]
+FLOORS = [(150, 111, 74), (190, 160, 120), (112, 84, 60), (200, 196, 188), (96, 96, 100)]
+
+
+# --- Reference partitions -------------------------------------------------------
+
+
+def adjusted_rand_index(labels_a: list[int], labels_b: list[int]) -> float:
+    """ARI of two labelings of the same items (1.0 identical, ~0 random)."""
+    _, a = np.unique(labels_a, return_inverse=True)
+    _, b = np.unique(labels_b, return_inverse=True)
+    table = np.zeros((a.max() + 1, b.max() + 1))
+    np.add.at(table, (a, b), 1)
+
+    def pairs(x: np.ndarray) -> float:
+        return float((x * (x - 1) / 2).sum())
+
+    index = pairs(table)
+    rows, cols = pairs(table.sum(axis=1)), pairs(table.sum(axis=0))
+    expected = rows * cols / pairs(np.array([len(labels_a)]))
+    maximum = (rows + cols) / 2
+    if maximum == expected:
+        return 1.0
+    return (index - expected) / (maximum - expected)
+
+
+def labels_of(clusters: list[list[int]], size: int) -> list[int]:
+    labels = [-1] * size
+    for label, members in enumerate(clusters):
+        for i in members:
+            labels[i] = label
+    # Images a clustering left out count as rooms of their own
+    return [label if label >= 0 else len(clusters) + i for i, label in enumerate(labels)]
+
+
+# --- Synthetic listings ---------------------------------------------------------
+
+
+def _room(rnd: random.Random, floor: tuple[int, int, int]) -> dict:
+    wall = tuple(min(255, c + rnd.randint(-10, 10)) for c in rnd.choice(WALLS))
+    furniture = [
+        (
+            rnd.uniform(0.0, 0.8), rnd.uniform(0.35, 0.7),
+            rnd.uniform(0.12, 0.4), rnd.uniform(0.15, 0.35),
+            tuple(rnd.randrange(256) for _ in range(3)),
+        )
+        for _ in range(rnd.randint(2, 4))
+    ]
+    window = (rnd.uniform(0.05, 0.7), rnd.uniform(0.1, 0.2), rnd.uniform(0.15, 0.25))
+    return {"wall": wall, "floor": floor, "furniture": furniture, "window": window}
+
+
+def _shot(room: dict, rnd: random.Random) -> bytes:
+    width, height = 1200, 800
+    scene = Image.new("RGB", (width, height), room["wall"])
+    draw = ImageDraw.Draw(scene)
+    draw.rectangle([0, int(height * 0.68), width, height], fill=room["floor"])
+    x, y, w = room["window"]
+    draw.rectangle(
+        [x * width, y * height, (x + w) * width, (y + 0.3) * height], fill=(214, 232, 246)
+    )
+    for fx, fy, fw, fh, color in room["furniture"]:
+        draw.rectangle([fx * width, fy * height, (fx + fw) * width, (fy + fh) * height], fill=color)
+
+    # A different framing of the room each time
+    crop_width = int(width * rnd.uniform(0.55, 0.85))
+    crop_height = int(crop_width * 0.75)
+    left = rnd.randint(0, width - crop_width)
+    top = rnd.randint(0, height - crop_height)
+    shot = scene.crop((left, top, left + crop_width, top + crop_height)).resize((640, 480))
+    shot = ImageEnhance.Brightness(shot).enhance(rnd.uniform(0.85, 1.15))
+    buffer = io.BytesIO()
+    shot.save(buffer, format="JPEG", quality=rnd.randint(65, 90))
+    return buffer.getvalue()
+
+
+def synthetic_buckets(store: ImageStore, seed: int = 7) -> list[dict]:
+    """Buckets of one listing's same-type photos with ground-truth rooms."""
+    rnd = random.Random(seed)
+    buckets = []
+    for n in range(LISTINGS):
+        rooms = rnd.randint(2, 4)
+        shared_floor = rnd.choice(FLOORS)
+        palette = [
+            _room(rnd, shared_floor if rnd.random() < 0.6 else rnd.choice(FLOORS))
+            for _ in range(rooms)
+        ]
+        shots = [
+            (room, _shot(palette[room], rnd))
+            for room in range(rooms)
+            for _ in range(rnd.randint(*SHOTS_PER_ROOM))
+        ]
+        rnd.shuffle(shots)
+        refs = [
+            store.put(f"https://cdn.example/{n}/{i}.jpg", "image/jpeg", data)
+            for i, (_, data) in enumerate(shots)
+        ]
+        buckets.append(
+            {
+                "images": refs,
+                # Listings sometimes declare a room that has no photo
+                "expected_rooms": rooms + (rnd.random() < 0.2),
+                "reference": [room for room, _ in shots],
+                "gpt_latency_ms": None,
+            }
+        )
+    return buckets
+
+
+# --- Recordings -----------------------------------------------------------------
+
+
+async def record(directory: Path, urls: list[str]) -> None:
+    """Scrape, download, classify and GPT-cluster listings; save every bucket."""
+    from app.config import get_settings
+    from app.models.property import RoomType
+    from app.services.idealista import create_idealista_service
+    from app.services.image_classifier import create_image_classifier
+    from app.services.image_downloader import ImageDownloaderService
+
+    settings = get_settings()
+    store = ImageStore(512 * 1024 * 1024)
+    idealista = create_idealista_service(settings.apify_token, settings.apify)
+    downloader = ImageDownloaderService(settings.image_processing, image_store=store)
+    classifier = create_image_classifier(
+        settings.openai_api_key, settings.openai_classification_model,
+        openai_config=settings.openai_config, image_resolver=store,
+    )
+    directory.mkdir(parents=True, exist_ok=True)
+    try:
+        with open(directory / "recordings.jsonl", "a") as out:
+            for url in urls:
+                listing = await idealista.scrape_property(url)
+                refs = await downloader.download_images(listing.image_urls)
+                tags = {refs[u]: tag for u, tag in listing.image_tags.items() if u in refs}
+                classifications = await classifier.classify_images(
+                    list(refs.values()), image_tags=tags
+                )
+                for room_type, expected in (
+                    (RoomType.BEDROOM, listing.num_rooms),
+                    (RoomType.BATHROOM, listing.num_bathrooms),
+                ):
+                    bucket = [c.image_url for c in classifications if c.room_type == room_type]
+                    if len(bucket) < 2 or expected == 1:
+                        continue
+                    started = time.perf_counter()
+                    clusters = await classifier._gpt_clusters(
+                        room_type, bucket, expected or None, "low"
+                    )
+                    latency_ms = (time.perf_counter() - started) * 1000
+                    files = []
+                    for ref in bucket:
+                        _, data = store.get(ref)
+                        name = hashlib.sha256(data).hexdigest()[:16] + ".jpg"
+                        (directory / name).write_bytes(data)
+                        files.append(name)
+                    row = {
+                        "listing": url,
+                        "room_type": room_type.value,
+                        "expected_rooms": expected or None,
+                        "images": files,
+                        "clusters": [c.image_indices for c in clusters],
+                        "gpt_latency_ms": round(latency_ms, 1),
+                    }
+                    out.write(json.dumps(row) + "\n")
+                    print(f"{url} {room_type.value}: {len(bucket)} photos, {len(clusters)} rooms")
+    finally:
+        await idealista.close()
+        await downloader.close()
+
+
+def recorded_buckets(directory: Path, store: ImageStore) -> list[dict]:
+    """Buckets saved by --record, GPT's clusters as reference."""
+    buckets = []
+    for line in (directory / "recordings.jsonl").read_text().splitlines():
+        row = json.loads(line)
+        refs = [
+            store.put(f"file://{name}", "image/jpeg", (directory / name).read_bytes())
+            for name in row["images"]
+        ]
+        buckets.append(
+            {
+                "images": refs,
+                "expected_rooms": row["expected_rooms"],
+                "reference": labels_of(row["clusters"], len(refs)),
+                "gpt_latency_ms": row["gpt_latency_ms"],
+            }
+        )
+    return buckets
+
+
+# --- Scoring --------------------------------------------------------------------
+
+
+async def score(buckets: list[dict], store: ImageStore) -> list[dict]:
+    """Cluster every bucket locally and compare with its reference."""
+    deduplicator = ImageDeduplicator(store=store, keep_thumbnails=True)
+    clusterer = LocalRoomClusterer(LocalClusteringConfig(), deduplicator)
+    results = []
+    for bucket in buckets:
+        started = time.perf_counter()
+        result = await clusterer.cluster(bucket["images"], bucket["expected_rooms"])
+        latency_ms = (time.perf_counter() - started) * 1000
+        labels = labels_of([c.image_indices for c in result.clusters], len(bucket["images"]))
+        results.append(
+            {
+                "ari": adjusted_rand_index(labels, bucket["reference"]),
+                "rooms_match": len(set(labels)) == len(set(bucket["reference"])),
+                "confidence": result.confidence,
+                "latency_ms": latency_ms,
+                "gpt_latency_ms": bucket["gpt_latency_ms"],
+            }
+        )
+    deduplicator.close()
+    return results
+
+
+def report(label: str, results: list[dict]) -> None:
+    print(f"{label}: {len(results)} buckets, default LocalClusteringConfig")
+    print(
+        f"  ARI (all buckets)    {statistics.mean(r['ari'] for r in results):.3f}"
+        f"   room count matches {sum(r['rooms_match'] for r in results) / len(results):.0%}"
+    )
+    latencies = sorted(r["latency_ms"] for r in results)
+    print(
+        f"  local latency        median {statistics.median(latencies):.1f} ms"
+        f"   p95 {latencies[int(len(latencies) * 0.95) - 1]:.1f} ms  (cold descriptors)"
+    )
+    gpt = [r["gpt_latency_ms"] for r in results if r["gpt_latency_ms"] is not None]
+    if gpt:
+        print(f"  GPT latency          median {statistics.median(gpt):.0f} ms (recorded)")
+    print(f"  {'min_confidence':>16}{'kept local':>12}{'ARI kept':>10}{'ARI sent to GPT':>17}")
+    for threshold in THRESHOLDS:
+        kept = [r for r in results if r["confidence"] >= threshold]
+        sent = [r for r in results if r["confidence"] < threshold]
+        kept_ari = f"{statistics.mean(r['ari'] for r in kept):.3f}" if kept else "-"
+        sent_ari = f"{statistics.mean(r['ari'] for r in sent):.3f}" if sent else "-"
+        print(f"  {threshold:>16.2f}{len(kept) / len(results):>12.0%}{kept_ari:>10}{sent_ari:>17}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--record", type=Path, metavar="DIR")
+    parser.add_argument("--replay", type=Path, metavar="DIR")
+    parser.add_argument("urls", nargs="*")
+    args = parser.parse_args()
+
+    if args.record:
+        asyncio.run(record(args.record, args.urls))
+        return
+    store = ImageStore(512 * 1024 * 1024)
+    if args.replay:
+        label, buckets = "recorded GPT clusters", recorded_buckets(args.replay, store)
+    else:
+        label, buckets = "synthetic listings", synthetic_buckets(store)
+    report(label, asyncio.run(score(buckets, store)))
+
+
+if __name__ == "__main__":
+    main()
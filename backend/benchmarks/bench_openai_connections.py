@@ -0,0 +1,153 @@
+"""
+OpenAI connection benchmark: per-service clients vs the shared registry.
+
+Replays the OpenAI traffic of one analysis plus a short chat against a local
+OpenAI-compatible stub and counts the TCP connections the stub accepts:
+
+  classify     20 gpt-4o-mini calls, 5 concurrent   (classifier client)
+  features      5 gpt-4o calls, 3 concurrent        (feature-extractor client)
+  rooms         5 gpt-4o calls, 3 concurrent        (estimator client)
+  summary       1 gpt-4o call                       (estimator client)
+  agent steps   3 streamed ChatOpenAI calls
+
+  per-service — what the app did before: the classifier, estimator and
+                feature extractor each own an AsyncOpenAI (one pool each)
+                and agent_node builds a new ChatOpenAI every step.
+  registry    — get_openai_client() / get_chat_model(): one pooled transport
+                per (key, base URL) shared by all of them.
+
+Each mode runs 3 analyses with the clients kept alive (as the
+lifespan-managed services are) and a 6 s idle gap between them — longer than
+the SDK's default 5 s keep-alive expiry, shorter than the registry's tuned
+one. "first" is a cold start, "next" the analyses that follow. The stub
+charges a connect delay to model TCP+TLS setup.
+
+Run:
+    uv run python -m benchmarks.bench_openai_connections
+"""
+
+import asyncio
+import json
+import time
+
+from langchain_core.messages import HumanMessage
+from langchain_openai import ChatOpenAI
+from openai import AsyncOpenAI
+
+from app.services.openai_client import close_openai_clients, get_chat_model, get_openai_client
+from benchmarks.stub_server import StubServer
+
+API_KEY = "sk-bench"
+CONNECT_DELAY = 0.06
+REQUEST_DELAY = 0.05
+ANALYSES = 3
+IDLE_BETWEEN_ANALYSES = 6.0
+
+
+async def _openai_stub(method: str, path: str, body: bytes) -> tuple[int, dict[str, str], bytes]:
+    request = json.loads(body or b"{}")
+    if request.get("stream"):
+        chunk = {
+            "id": "c", "object": "chat.completion.chunk", "created": 0,
+            "model": request["model"],
+            "choices": [{"index": 0, "delta": {"role": "assistant", "content": "Olá"},
+                         "finish_reason": "stop"}],
+        }
+        payload = f"data: {json.dumps(chunk)}\n\ndata: [DONE]\n\n".encode()
+        return 200, {"Content-Type": "text/event-stream"}, payload
+    completion = {
+        "id": "c", "object": "chat.completion", "created": 0, "model": request["model"],
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": "{}"},
+                     "finish_reason": "stop"}],
+    }
+    return 200, {"Content-Type": "application/json"}, json.dumps(completion).encode()
+
+
+async def _calls(client: AsyncOpenAI, model: str, count: int, concurrency: int) -> None:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def _one() -> None:
+        async with semaphore:
+            await client.chat.completions.create(
+                model=model, messages=[{"role": "user", "content": "x"}]
+            )
+
+    await asyncio.gather(*(_one() for _ in range(count)))
+
+
+async def _analysis(clients: dict[str, AsyncOpenAI], chat_model) -> None:
+    await _calls(clients["classifier"], "gpt-4o-mini", 20, 5)
+    await asyncio.gather(
+        _calls(clients["features"], "gpt-4o", 5, 3),
+        _calls(clients["estimator"], "gpt-4o", 5, 3),
+    )
+    await _calls(clients["estimator"], "gpt-4o", 1, 1)
+    for _ in range(3):
+        await chat_model().ainvoke([HumanMessage("olá")])
+
+
+async def _run_mode(server: StubServer, mode: str) -> list[tuple[int, float]]:
+    base_url = server.url("/v1")
+    if mode == "per-service":
+        clients = {
+            name: AsyncOpenAI(api_key=API_KEY, base_url=base_url)
+            for name in ("classifier", "features", "estimator")
+        }
+
+        def chat_model():
+            return ChatOpenAI(model="gpt-4o", api_key=API_KEY, base_url=base_url, streaming=True)
+    else:
+        clients = {
+            name: get_openai_client(API_KEY, base_url)
+            for name in ("classifier", "features", "estimator")
+        }
+
+        def chat_model():
+            return get_chat_model("gpt-4o", API_KEY, base_url, streaming=True)
+
+    rows = []
+    for index in range(ANALYSES):
+        if index:
+            await asyncio.sleep(IDLE_BETWEEN_ANALYSES)
+        server.reset_counters()
+        started = time.perf_counter()
+        await _analysis(clients, chat_model)
+        rows.append((server.connections, time.perf_counter() - started))
+
+    if mode == "per-service":
+        for client in clients.values():
+            await client.close()
+    else:
+        await close_openai_clients()
+    return rows
+
+
+async def run() -> dict[str, list[tuple[int, float]]]:
+    results = {}
+    # Separate stubs so keep-alive connections never cross modes
+    for mode in ("per-service", "registry"):
+        async with StubServer(_openai_stub, CONNECT_DELAY, REQUEST_DELAY) as server:
+            results[mode] = await _run_mode(server, mode)
+    return results
+
+
+def main() -> None:
+    results = asyncio.run(run())
+    print(
+        f"39 OpenAI calls per analysis, {CONNECT_DELAY * 1000:.0f} ms connect, "
+        f"{REQUEST_DELAY * 1000:.0f} ms/request, {ANALYSES} analyses "
+        f"{IDLE_BETWEEN_ANALYSES:.0f} s apart"
+    )
+    print(f"{'mode':12}{'first conns':>12}{'next conns':>12}{'first ms':>10}{'next ms':>10}")
+    for mode, rows in results.items():
+        first_conns, first_s = rows[0]
+        next_conns = sum(c for c, _ in rows[1:]) / (len(rows) - 1)
+        next_s = sum(s for _, s in rows[1:]) / (len(rows) - 1)
+        print(
+            f"{mode:12}{first_conns:>12}{next_conns:>12.1f}"
+            f"{first_s * 1000:>10.1f}{next_s * 1000:>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
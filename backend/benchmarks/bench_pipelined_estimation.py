@@ -0,0 +1,160 @@
+"""
+Group → estimate benchmark: barrier vs pipelined (dataflow) estimation.
+
+A classified T3 listing — kitchen, living room, 2 bathrooms (4 photos) and 3
+bedrooms (6 photos) — goes through grouping and room estimation with the real
+ImageClassifierService and RenovationEstimatorService. Their OpenAI client
+is replaced by a fake that injects latency per call type: clustering takes
+longer the more photos it compares, and each room estimate has a fixed
+latency. Estimation runs through the default 3-call semaphore. Measures the
+wall time and the time until the first room estimate is ready for:
+
+  barrier   — group_node clusters every multi-room type, then estimate_node
+              starts (the slowest clustering call gates every room).
+  pipelined — group_estimate_node estimates the kitchen and living room at
+              once and each clustered type as soon as its call returns.
+
+Run:
+    uv run python -m benchmarks.bench_pipelined_estimation
+"""
+
+import asyncio
+import json
+import re
+import statistics
+import time
+from types import SimpleNamespace
+
+from app.config import ImageProcessingConfig
+from app.graphs.main_graph import estimate_node, group_estimate_node, group_node
+from app.models.property import ImageClassification, PropertyData, RoomType
+from app.services.image_classifier import ImageClassifierService
+from app.services.renovation_estimator import RenovationEstimatorService
+
+PHOTOS = {
+    RoomType.KITCHEN: 3,
+    RoomType.LIVING_ROOM: 2,
+    RoomType.BATHROOM: 4,
+    RoomType.BEDROOM: 6,
+}
+CLUSTER_BASE_LATENCY = 0.15
+CLUSTER_LATENCY_PER_IMAGE = 0.05
+ESTIMATE_LATENCY = 0.3
+RUNS = 3
+
+
+class LatencyOpenAI:
+    """chat.completions.create stand-in that sleeps per call type."""
+
+    def __init__(self) -> None:
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    async def _create(self, messages, **_):
+        prompt = messages[0]["content"][0]["text"]
+        clustering = re.match(r"Analisa estas (\d+) fotografias de ", prompt)
+        if clustering:
+            num_images = int(clustering.group(1))
+            await asyncio.sleep(CLUSTER_BASE_LATENCY + CLUSTER_LATENCY_PER_IMAGE * num_images)
+            # Two photos per room
+            content = json.dumps({
+                "clusters": [
+                    {
+                        "room_number": n + 1,
+                        "image_indices": [2 * n, 2 * n + 1],
+                        "confidence": 0.9,
+                        "visual_cues": "",
+                    }
+                    for n in range(num_images // 2)
+                ]
+            })
+        else:
+            await asyncio.sleep(ESTIMATE_LATENCY)
+            content = "{}"  # every feature field is optional
+        message = SimpleNamespace(refusal=None, content=content)
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=message, finish_reason="stop")], usage=None
+        )
+
+
+def _state() -> dict:
+    classifications = [
+        ImageClassification(
+            image_url=f"https://cdn.idealista.pt/{room_type.value}{i}.jpg",
+            room_type=room_type,
+            room_number=1,
+            confidence=0.9,
+        )
+        for room_type, count in PHOTOS.items()
+        for i in range(count)
+    ]
+    property_data = PropertyData(
+        url="https://www.idealista.pt/imovel/1/", num_rooms=3, num_bathrooms=2
+    )
+    return {
+        "url": property_data.url,
+        "property_data": property_data,
+        "classifications": classifications,
+    }
+
+
+async def _timed_run(pipelined: bool) -> tuple[float, float]:
+    fake = LatencyOpenAI()
+    classifier = ImageClassifierService(openai_api_key="sk-bench")
+    estimator = RenovationEstimatorService(
+        openai_api_key="sk-bench",
+        max_concurrent=ImageProcessingConfig().max_concurrent_estimations,
+    )
+    classifier.client = fake
+    estimator.client = fake
+    estimator._feature_extractor.client = fake
+
+    first_room: list[float] = []
+    analyze_room = estimator.analyze_room
+
+    async def _analyze_room(*args, **kwargs):
+        analysis = await analyze_room(*args, **kwargs)
+        first_room.append(time.perf_counter())
+        return analysis
+
+    estimator.analyze_room = _analyze_room  # type: ignore[method-assign]
+
+    state = _state()
+    start = time.perf_counter()
+    if pipelined:
+        result = await group_estimate_node(
+            state, classifier_service=classifier, estimator_service=estimator
+        )
+    else:
+        state |= await group_node(state, classifier_service=classifier)
+        result = await estimate_node(state, estimator_service=estimator)
+    elapsed = time.perf_counter() - start
+
+    assert len(result["room_analyses"]) == 7, result.get("error")
+    return elapsed, min(first_room) - start
+
+
+async def run() -> dict[str, list[tuple[float, float]]]:
+    samples: dict[str, list[tuple[float, float]]] = {"barrier": [], "pipelined": []}
+    for _ in range(RUNS):
+        samples["barrier"].append(await _timed_run(False))
+        samples["pipelined"].append(await _timed_run(True))
+    return samples
+
+
+def main() -> None:
+    samples = asyncio.run(run())
+    print(
+        f"{sum(PHOTOS.values())} photos, 7 rooms; fake clustering "
+        f"{CLUSTER_BASE_LATENCY * 1000:.0f} ms + {CLUSTER_LATENCY_PER_IMAGE * 1000:.0f} ms/photo, "
+        f"room estimate {ESTIMATE_LATENCY * 1000:.0f} ms x "
+        f"{ImageProcessingConfig().max_concurrent_estimations} concurrent, median of {RUNS}"
+    )
+    print(f"{'mode':10}{'wall ms':>10}{'first room ms':>16}")
+    for label, rows in samples.items():
+        wall = statistics.median(r[0] for r in rows)
+        first = statistics.median(r[1] for r in rows)
+        print(f"{label:10}{wall * 1000:>10.1f}{first * 1000:>16.1f}")
+
+
+if __name__ == "__main__":
+    main()
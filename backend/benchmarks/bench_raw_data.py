@@ -0,0 +1,150 @@
+"""
+Raw payload benchmark: PropertyData.raw_data inline vs in the side store.
+
+Analyses LISTINGS listings, one at a time, through the real renovation graph
+with a checkpointer, IdealistaService with a scrape cache, and the services
+of bench_batch_analysis (fake OpenAI). The stub actor pads every listing with
+PAYLOAD_BYTES of translated description text, as a large real Idealista item
+carries. Two modes:
+
+  inline     — raw_data rides in PropertyData (no RawDataStore)
+  side store — IdealistaService detaches raw_data into a RawDataStore
+               (memory backend, zlib level 6) and keeps raw_data_ref
+
+Reports per analysis the traced peak memory (tracemalloc), the bytes the
+checkpointer serialised, the size of the final "result" SSE event and the
+memory still held afterwards (scrape cache entries, plus the side store's
+blobs), and the side store's compressed bytes per listing.
+
+Run:
+    uv run python -m benchmarks.bench_raw_data
+"""
+
+import asyncio
+import json
+import statistics
+import tracemalloc
+from typing import Any
+
+from langgraph.checkpoint.memory import InMemorySaver
+
+from app.config import ApifyConfig, Settings
+from app.graphs.main_graph import build_renovation_graph
+from app.services.analysis_runs import join_analysis
+from app.services.graph_checkpoints import checkpoint_serializer
+from app.services.idealista import IdealistaService
+from app.services.image_classifier import ImageClassifierService
+from app.services.raw_data_store import RawDataStore
+from app.services.renovation_estimator import RenovationEstimatorService
+from app.services.scrape_cache import ScrapeCache
+from app.services.single_flight import StreamSingleFlight
+from benchmarks.bench_batch_analysis import LatencyOpenAI
+from benchmarks.stub_apify import StubApifyActor
+
+LISTINGS = 20
+PAYLOAD_BYTES = 300_000
+
+
+class CountingSerde:
+    """Checkpoint serializer wrapper that totals the bytes it produces."""
+
+    def __init__(self, serde: Any) -> None:
+        self._serde = serde
+        self.bytes = 0
+
+    def dumps_typed(self, obj: Any) -> tuple[str, bytes]:
+        kind, blob = self._serde.dumps_typed(obj)
+        self.bytes += len(blob or b"")
+        return kind, blob
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._serde, name)
+
+
+def _pipeline(standby_url: str, raw_store: RawDataStore | None):
+    settings = Settings(openai_api_key="sk-bench", use_base64_images=False)
+    fake = LatencyOpenAI()
+    classifier = ImageClassifierService(openai_api_key="sk-bench", model="gpt-4o-mini")
+    estimator = RenovationEstimatorService(openai_api_key="sk-bench", model="gpt-4o")
+    classifier.client = fake
+    estimator.client = fake
+    estimator._feature_extractor.client = fake
+    cache = ScrapeCache(ttl_seconds=3600)
+    idealista = IdealistaService(
+        "bench", ApifyConfig(standby_url=standby_url), cache=cache, raw_store=raw_store
+    )
+    checkpointer = InMemorySaver(serde=checkpoint_serializer())
+    serde = CountingSerde(checkpointer.serde)
+    checkpointer.serde = serde
+    graph = build_renovation_graph(
+        settings, idealista, classifier, estimator, checkpointer=checkpointer
+    )
+    return graph, idealista, cache, serde
+
+
+async def _run_mode(actor: StubApifyActor, raw_store: RawDataStore | None) -> dict[str, float]:
+    graph, idealista, cache, serde = _pipeline(actor.url, raw_store)
+    flights = StreamSingleFlight()
+    peaks: list[int] = []
+    checkpoint_bytes: list[int] = []
+    event_bytes: list[int] = []
+
+    tracemalloc.start()
+    before_cache = tracemalloc.get_traced_memory()[0]
+    for n in range(LISTINGS):
+        url = f"https://www.idealista.pt/imovel/{n + 1:08d}/"
+        serde.bytes = 0
+        baseline = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        run = join_analysis(flights, graph, url)
+        try:
+            final_state = await run.wait()
+        finally:
+            flights.leave(run)
+        peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+        checkpoint_bytes.append(serde.bytes)
+        result = next(event for event in run.events if event["type"] == "result")
+        event_bytes.append(len(json.dumps(result, ensure_ascii=False).encode()))
+        assert final_state.get("estimate") is not None, final_state.get("error")
+    retained = tracemalloc.get_traced_memory()[0] - before_cache
+    tracemalloc.stop()
+
+    await idealista.close()
+    assert cache.stats()["stores"] == LISTINGS
+    return {
+        "peak": statistics.median(peaks),
+        "checkpoints": statistics.median(checkpoint_bytes),
+        "event": statistics.median(event_bytes),
+        "retained": retained / LISTINGS,
+        "stored": (raw_store.stats()["compressed_bytes"] / LISTINGS) if raw_store else 0,
+    }
+
+
+async def run() -> dict[str, dict[str, float]]:
+    async with StubApifyActor(extra_bytes=PAYLOAD_BYTES) as actor:
+        return {
+            "inline": await _run_mode(actor, None),
+            "side store": await _run_mode(actor, RawDataStore()),
+        }
+
+
+def main() -> None:
+    results = asyncio.run(run())
+    print(
+        f"{LISTINGS} analyses, {PAYLOAD_BYTES // 1000} KB raw actor item each; "
+        f"median per analysis, KB"
+    )
+    print(
+        f"{'mode':12}{'peak mem':>10}{'checkpoints':>13}{'result event':>14}"
+        f"{'retained':>10}{'store kept':>12}"
+    )
+    for label, row in results.items():
+        print(
+            f"{label:12}{row['peak'] / 1000:>10.0f}{row['checkpoints'] / 1000:>13.0f}"
+            f"{row['event'] / 1000:>14.1f}{row['retained'] / 1000:>10.0f}"
+            f"{row['stored'] / 1000:>12.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Download → classify benchmark: barrier vs streaming.
+
+A 30-image listing is served from a local stub CDN with latency skew — most
+images come back in ~20 ms but a few take ~600 ms, as slow CDN edges do.
+GPT classification is faked with a fixed per-call latency. Measures the
+end-to-end scrape+classify wall time for:
+
+  barrier   — scrape_node downloads every image, then classify_node starts
+              (the slowest download gates all classification).
+  streaming — classify_node pulls from ImageDownloaderService.stream_images
+              and classifies each image as soon as its download completes.
+
+Run:
+    uv run python -m benchmarks.bench_stream_classify
+"""
+
+import asyncio
+import statistics
+import time
+from unittest.mock import AsyncMock
+
+from app.config import ImageProcessingConfig
+from app.graphs.main_graph import classify_node, scrape_node
+from app.models.property import ImageClassification, PropertyData, RoomType
+from app.services.image_classifier import ImageClassifierService
+from app.services.image_downloader import ImageDownloaderService
+from app.services.image_store import ImageStore
+from benchmarks.stub_server import StubServer
+
+NUM_IMAGES = 30
+SLOW_IMAGES = {7, 19, 28}
+FAST_DELAY = 0.02
+SLOW_DELAY = 0.6
+GPT_LATENCY = 0.15
+MAX_CONCURRENT_GPT = 5
+RUNS = 3
+
+
+async def _serve_image(method: str, path: str, body: bytes) -> tuple[int, dict[str, str], bytes]:
+    index = int(path.rsplit("img", 1)[1].split(".")[0])
+    await asyncio.sleep(SLOW_DELAY if index in SLOW_IMAGES else FAST_DELAY)
+    # Unique bytes per image so the store and cache don't collapse them
+    return 200, {"Content-Type": "image/jpeg"}, b"\xff\xd8" + path.encode() + b"\0" * 20_000
+
+
+def _fake_gpt(classifier: ImageClassifierService):
+    """Stand-in for classify_single_image with the same concurrency limit."""
+
+    async def _classify(image_url: str) -> ImageClassification:
+        async with classifier.semaphore:
+            await asyncio.sleep(GPT_LATENCY)
+        return ImageClassification(
+            image_url=image_url, room_type=RoomType.LIVING_ROOM, room_number=1, confidence=0.8
+        )
+
+    return _classify
+
+
+async def _timed_run(server: StubServer, listing: int, streaming: bool) -> float:
+    urls = [server.url(f"/listing{listing}/img{i}.jpg") for i in range(NUM_IMAGES)]
+    config = ImageProcessingConfig(max_images_in_memory=NUM_IMAGES)
+    downloader = ImageDownloaderService(config, image_store=ImageStore(64 * 1024 * 1024))
+    classifier = ImageClassifierService(
+        openai_api_key="sk-bench", max_concurrent=MAX_CONCURRENT_GPT
+    )
+    classifier.classify_single_image = _fake_gpt(classifier)  # type: ignore[method-assign]
+
+    idealista = AsyncMock()
+    idealista.scrape_property.return_value = PropertyData(
+        url="https://www.idealista.pt/imovel/1/", image_urls=urls
+    )
+
+    start = time.perf_counter()
+    state: dict = {"url": "https://www.idealista.pt/imovel/1/"}
+    state |= await scrape_node(
+        state,
+        idealista_service=idealista,
+        downloader=None if streaming else downloader,
+        use_base64_images=True,
+    )
+    result = await classify_node(
+        state, classifier_service=classifier, downloader=downloader if streaming else None
+    )
+    elapsed = time.perf_counter() - start
+
+    assert len(result["classifications"]) == NUM_IMAGES
+    await downloader.close()
+    return elapsed
+
+
+async def run() -> dict[str, list[float]]:
+    samples: dict[str, list[float]] = {"barrier": [], "streaming": []}
+    async with StubServer(_serve_image) as server:
+        for run_index in range(RUNS):
+            samples["barrier"].append(await _timed_run(server, 2 * run_index, False))
+            samples["streaming"].append(await _timed_run(server, 2 * run_index + 1, True))
+    return samples
+
+
+def main() -> None:
+    samples = asyncio.run(run())
+    print(
+        f"{NUM_IMAGES} images ({len(SLOW_IMAGES)} at {SLOW_DELAY * 1000:.0f} ms, rest at "
+        f"{FAST_DELAY * 1000:.0f} ms), fake GPT {GPT_LATENCY * 1000:.0f} ms x "
+        f"{MAX_CONCURRENT_GPT} concurrent, median of {RUNS}"
+    )
+    print(f"{'mode':10}{'wall ms':>10}")
+    for label, rows in samples.items():
+        print(f"{label:10}{statistics.median(rows) * 1000:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
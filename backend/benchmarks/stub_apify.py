@@ -0,0 +1,172 @@
+"""
+Local stand-in for the dz_omar/idealista-scraper-api standby actor.
+
+Answers POST {"Property_urls": [{"url": ...}, ...]} like the real actor: an
+NDJSON stream of a "started" line, one "property" line per listing as soon as
+that listing is scraped, then a "completed" line. Each request pays a start-up
+latency, then every listing a scrape latency, `concurrency` listings at a
+time. Listings can fail on the actor side or come back as a malformed line,
+and `status` makes every request answer with that HTTP error instead. For
+chaos testing, `error_rate` answers that fraction of requests (seeded) with
+a 503, optionally carrying a Retry-After header. `extra_bytes` pads each
+listing with about that much translated description text, the bulk of a
+real actor item.
+
+Used by the scraping benchmarks and the Idealista streaming and resilience
+tests.
+
+Usage:
+    async with StubApifyActor(start_latency=0.5, listing_latency=0.2) as actor:
+        service = IdealistaService("token", ApifyConfig(standby_url=actor.url))
+"""
+
+import asyncio
+import json
+import random
+from collections.abc import AsyncIterator
+
+from benchmarks.stub_server import StubServer
+
+PHOTOS = ["cozinha", "sala", "casa_de_banho", "quarto"]
+
+_WORDS = (
+    "apartamento remodelado luminoso cozinha equipada varanda suite roupeiros "
+    "estacionamento arrecadacao elevador metro escolas comercio vista rio jardim "
+    "apartment renovated bright kitchen balcony wardrobes parking storage lift view"
+).split()
+_LANGUAGES = ["pt", "en", "es", "fr", "de", "it"]
+
+
+def listing_id(url: str) -> str:
+    """Property ID of a stub listing URL (…/imovel/<id>/)."""
+    return url.rstrip("/").rsplit("/", 1)[1]
+
+
+class StubApifyActor:
+    """Streaming NDJSON actor on 127.0.0.1 with simulated scrape latency."""
+
+    def __init__(
+        self,
+        start_latency: float = 0.0,
+        listing_latency: float = 0.0,
+        concurrency: int = 10,
+        failing_ids: frozenset[str] = frozenset(),
+        malformed_ids: frozenset[str] = frozenset(),
+        status: int = 200,
+        error_rate: float = 0.0,
+        retry_after: float | None = None,
+        seed: int = 0,
+        extra_bytes: int = 0,
+    ):
+        self.start_latency = start_latency
+        self.listing_latency = listing_latency
+        self.concurrency = concurrency
+        self.failing_ids = failing_ids
+        self.malformed_ids = malformed_ids
+        self.status = status
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.extra_bytes = extra_bytes
+        self._random = random.Random(seed)
+        self.errors = 0
+        self.payloads: list[list[str]] = []
+        self._server = StubServer(self._handle)
+
+    @property
+    def url(self) -> str:
+        return self._server.url("/")
+
+    @property
+    def requests(self) -> int:
+        return self._server.requests
+
+    def reset_counters(self) -> None:
+        self._server.reset_counters()
+        self.payloads.clear()
+        self.errors = 0
+
+    async def __aenter__(self) -> "StubApifyActor":
+        await self._server.__aenter__()
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self._server.__aexit__(*exc)
+
+    async def _handle(self, method: str, path: str, body: bytes):
+        status = self.status
+        if status == 200 and self._random.random() < self.error_rate:
+            status = 503
+        if status != 200:
+            self.errors += 1
+            headers = {}
+            if self.retry_after is not None:
+                headers["Retry-After"] = f"{self.retry_after:g}"
+            return status, headers, b'{"error": "stub actor error"}'
+        urls = [entry["url"] for entry in json.loads(body)["Property_urls"]]
+        self.payloads.append(urls)
+        return 200, {"Content-Type": "application/x-ndjson"}, self._stream(urls)
+
+    async def _stream(self, urls: list[str]) -> AsyncIterator[bytes]:
+        yield self._line({"type": "started"})
+        await asyncio.sleep(self.start_latency)
+
+        slots = asyncio.Semaphore(self.concurrency)
+
+        async def _scrape(url: str) -> str:
+            async with slots:
+                await asyncio.sleep(self.listing_latency)
+            return url
+
+        tasks = [asyncio.create_task(_scrape(url)) for url in urls]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                url = await next_done
+                if listing_id(url) in self.malformed_ids:
+                    yield b'{"type": "property", "data": {\n'
+                else:
+                    yield self._line(self._item(url))
+        finally:
+            for task in tasks:
+                task.cancel()
+        yield self._line({"type": "completed", "totalCount": len(urls)})
+
+    def _item(self, url: str) -> dict:
+        property_id = listing_id(url)
+        if property_id in self.failing_ids:
+            return {
+                "type": "property",
+                "status": "failed",
+                "error": "Blocked by Idealista",
+                "data": {"originalUrl": url},
+            }
+        images = [{"url": f"https://cdn.example/{property_id}/{room}.jpg"} for room in PHOTOS]
+        data = {
+            "propertyId": property_id,
+            "originalUrl": url,
+            "title": f"Apartamento {property_id}",
+            "price": 150000,
+            "multimedia": {"images": images},
+            "moreCharacteristics": {"roomNumber": 1, "bathNumber": 1},
+            "status": "success",
+        }
+        if self.extra_bytes:
+            data["translations"] = self._translations(property_id)
+        return {"type": "property", "data": data}
+
+    def _translations(self, property_id: str) -> list[dict]:
+        """Per-listing description text totalling about extra_bytes."""
+        words = random.Random(property_id)
+        per_language = self.extra_bytes // len(_LANGUAGES)
+        translations = []
+        for language in _LANGUAGES:
+            text: list[str] = []
+            size = 0
+            while size < per_language:
+                text.append(words.choice(_WORDS))
+                size += len(text[-1]) + 1
+            translations.append({"language": language, "comment": " ".join(text)})
+        return translations
+
+    @staticmethod
+    def _line(item: dict) -> bytes:
+        return json.dumps(item).encode() + b"\n"
@@ -0,0 +1,103 @@
+"""
+Minimal asyncio HTTP/1.1 server used as a local stand-in for remote services.
+
+Supports keep-alive, an artificial per-connection setup delay (to model the
+TCP+TLS handshakes a real CDN or API would cost) and a per-request delay.
+Counts connections and requests so benchmarks can show connection reuse.
+A handler may return an async iterator of chunks instead of bytes; the body
+is then streamed with chunked transfer encoding, each chunk sent as soon as
+it is produced.
+
+Usage:
+    async def handler(method, path, body) -> tuple[int, dict[str, str], bytes]: ...
+
+    async with StubServer(handler, connect_delay=0.04) as server:
+        url = server.url("/img/1.jpg")
+"""
+
+import asyncio
+from collections.abc import AsyncIterator, Awaitable, Callable
+
+Body = bytes | AsyncIterator[bytes]
+Handler = Callable[[str, str, bytes], Awaitable[tuple[int, dict[str, str], Body]]]
+
+_REASONS = {200: "OK", 404: "Not Found", 429: "Too Many Requests", 500: "Internal Server Error"}
+
+
+class StubServer:
+    """Keep-alive HTTP/1.1 server on 127.0.0.1 with simulated latency."""
+
+    def __init__(
+        self,
+        handler: Handler,
+        connect_delay: float = 0.0,
+        request_delay: float = 0.0,
+    ):
+        self.handler = handler
+        self.connect_delay = connect_delay
+        self.request_delay = request_delay
+        self.connections = 0
+        self.requests = 0
+        self._server: asyncio.Server | None = None
+        self._writers: set[asyncio.StreamWriter] = set()
+        self.port = 0
+
+    def url(self, path: str) -> str:
+        return f"http://127.0.0.1:{self.port}{path}"
+
+    def reset_counters(self) -> None:
+        self.connections = 0
+        self.requests = 0
+
+    async def __aenter__(self) -> "StubServer":
+        self._server = await asyncio.start_server(self._serve, "127.0.0.1", 0)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        self._server.close()
+        # wait_closed() waits for every connection; drop idle keep-alive ones
+        for writer in list(self._writers):
+            writer.close()
+        await self._server.wait_closed()
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connections += 1
+        self._writers.add(writer)
+        await asyncio.sleep(self.connect_delay)
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode().split(" ", 2)
+                headers: dict[str, str] = {}
+                while (line := await reader.readline()) not in (b"\r\n", b""):
+                    name, _, value = line.decode().partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+
+                self.requests += 1
+                await asyncio.sleep(self.request_delay)
+                status, response_headers, payload = await self.handler(method, path, body)
+
+                head = [f"HTTP/1.1 {status} {_REASONS.get(status, 'Status')}"]
+                head += [f"{k}: {v}" for k, v in response_headers.items()]
+                if isinstance(payload, bytes):
+                    head.append(f"Content-Length: {len(payload)}")
+                    writer.write(("\r\n".join(head) + "\r\n\r\n").encode() + payload)
+                    await writer.drain()
+                    continue
+
+                head.append("Transfer-Encoding: chunked")
+                writer.write(("\r\n".join(head) + "\r\n\r\n").encode())
+                async for chunk in payload:
+                    writer.write(f"{len(chunk):x}\r\n".encode() + chunk + b"\r\n")
+                    await writer.drain()
+                writer.write(b"0\r\n\r\n")
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
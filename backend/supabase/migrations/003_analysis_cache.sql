@@ -0,0 +1,17 @@
+-- Migration 003: Shared tier of the whole-analysis result cache
+--
+-- One row per Idealista listing (cache_key = Idealista property ID). value
+-- holds the listing fingerprint, the pipeline version and the serialized
+-- RenovationEstimate; the backend rejects rows whose fingerprint/version no
+-- longer match, and rows older than ANALYSIS_CACHE__TTL_SECONDS.
+
+CREATE TABLE IF NOT EXISTS analysis_cache (
+  cache_key TEXT PRIMARY KEY,
+  value JSONB NOT NULL,
+  created_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_analysis_cache_created ON analysis_cache(created_at);
+
+-- Only the backend (service role) reads or writes cached analyses
+ALTER TABLE analysis_cache ENABLE ROW LEVEL SECURITY;
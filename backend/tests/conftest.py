@@ -26,6 +26,24 @@ def _set_test_env(monkeypatch: pytest.MonkeyPatch) -> None:
     # Supabase (not configured in test environment)
     monkeypatch.setenv("SUPABASE_URL", "")
     monkeypatch.setenv("SUPABASE_SECRET_KEY", "")
+    # Keep caches in-process so tests never write SQLite files
+    monkeypatch.setenv("CLASSIFICATION_CACHE__BACKEND", "memory")
+    monkeypatch.setenv("ANALYSIS_CACHE__BACKEND", "memory")
+    monkeypatch.setenv("ANALYSIS_JOBS__BACKEND", "memory")
+    monkeypatch.setenv("GRAPH_CHECKPOINTS__BACKEND", "memory")
+
+
+@pytest.fixture(autouse=True)
+def _fresh_openai_clients():
+    """Give each test its own process-wide OpenAI limiter and shared clients."""
+    from app.services.openai_client import reset_openai_clients
+    from app.services.openai_rate_limiter import get_rate_limiter
+
+    get_rate_limiter.cache_clear()
+    reset_openai_clients()
+    yield
+    get_rate_limiter.cache_clear()
+    reset_openai_clients()
 
 
 @pytest.fixture(autouse=True)
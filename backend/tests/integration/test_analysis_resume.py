@@ -0,0 +1,257 @@
+"""
+Integration tests for resumable analyses (POST /analyze/{run_id}/resume).
+
+Builds the real renovation graph with the memory checkpointer
+and mocked services, fails a run on purpose and resumes it through the SSE
+generators. Verifies that a resume continues from the last successful node
+(no second scrape or classification), re-analyses only the rooms that failed
+or fell back, keeps the original run id, works in pipelined mode, re-attaches
+a dropped resume stream by Last-Event-ID (but never to the failed run being
+resumed), and that the endpoint hides unknown, completed and other users' runs.
+"""
+
+import json
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from fastapi import HTTPException
+from langgraph.checkpoint.memory import InMemorySaver
+
+from app.api.v1.analyze import resume_analysis_stream, stream_analysis, stream_resumed_analysis
+from app.auth import AuthenticatedUser
+from app.config import Settings
+from app.graphs.main_graph import build_renovation_graph
+from app.models.property import ImageClassification, PropertyData, RoomType
+from app.services.analysis_runs import run_state
+from app.services.graph_checkpoints import checkpoint_serializer
+from app.services.idealista import IdealistaService
+from app.services.image_classifier import ImageClassifierService
+from app.services.renovation_estimator import RenovationEstimatorService
+from app.services.single_flight import StreamSingleFlight
+
+URL = "https://www.idealista.pt/imovel/12345678/"
+PHOTOS = {
+    "http://img/kitchen.jpg": RoomType.KITCHEN,
+    "http://img/bath.jpg": RoomType.BATHROOM,
+    "http://img/bed.jpg": RoomType.BEDROOM,
+}
+
+
+class Pipeline:
+    """Renovation graph on mocked services whose failures can be switched off."""
+
+    def __init__(self, pipelined: bool = False):
+        self.scrape_fails = False
+        self.failing_rooms: set[RoomType] = set()
+        self.fallback_rooms: set[RoomType] = set()
+        self.analysed: list[RoomType] = []
+
+        self.idealista = AsyncMock(spec=IdealistaService)
+        self.idealista.scrape_property.side_effect = self._scrape
+        self.classifier = ImageClassifierService(openai_api_key="sk-fake-key")
+        self.classifier.classify_images = AsyncMock(
+            return_value=[
+                ImageClassification(
+                    image_url=url, room_type=room_type, room_number=1, confidence=0.9
+                )
+                for url, room_type in PHOTOS.items()
+            ]
+        )
+        self.estimator = RenovationEstimatorService(openai_api_key="sk-fake-key")
+        self.estimator.analyze_room = self._analyze_room
+        self.estimator.generate_summary = AsyncMock(return_value="Resumo")
+
+        settings = Settings(openai_api_key="sk-test", use_base64_images=False)
+        settings.image_processing.pipelined_estimation = pipelined
+        self.graph = build_renovation_graph(
+            settings,
+            self.idealista,
+            self.classifier,
+            self.estimator,
+            checkpointer=InMemorySaver(serde=checkpoint_serializer()),
+        )
+        self.flights = StreamSingleFlight(grace_seconds=10)
+
+    async def _scrape(self, url: str, max_age: float | None = None) -> PropertyData:
+        if self.scrape_fails:
+            raise RuntimeError("apify down")
+        return PropertyData(url=URL, image_urls=list(PHOTOS), num_rooms=1, num_bathrooms=1)
+
+    async def _analyze_room(self, room_type, room_number, images, property_context=None):
+        self.analysed.append(room_type)
+        if room_type in self.failing_rooms:
+            raise RuntimeError("openai 503")
+        analysis = self.estimator._get_fallback_analysis(room_type, room_number, "", images)
+        if room_type in self.fallback_rooms:
+            return analysis
+        return analysis.model_copy(update={"confidence": 0.8})
+
+    async def analyze(self) -> list[dict]:
+        return [raw async for raw in stream_analysis(URL, "user-1", self.graph, flights=self.flights)]
+
+    async def resume(self, run_id: str, last_event_id: str | None = None) -> list[dict]:
+        return [
+            raw
+            async for raw in stream_resumed_analysis(
+                run_id, URL, "user-1", self.graph, flights=self.flights,
+                last_event_id=last_event_id,
+            )
+        ]
+
+
+def _run_id(raw_events: list[dict]) -> str:
+    return raw_events[0]["id"].rsplit(":", 1)[0]
+
+
+def _data(raw_events: list[dict]) -> list[dict]:
+    return [json.loads(raw["data"]) for raw in raw_events]
+
+
+class TestResumeAfterEstimateFailure:
+    @pytest.mark.asyncio
+    async def test_only_failed_and_fallback_rooms_are_analysed_again(self):
+        pipeline = Pipeline()
+        pipeline.failing_rooms = {RoomType.BATHROOM}
+        pipeline.fallback_rooms = {RoomType.BEDROOM}
+        first = await pipeline.analyze()
+        run_id = _run_id(first)
+        assert _data(first)[-1]["type"] == "error"
+
+        checkpointed = await run_state(pipeline.graph, run_id)
+        assert checkpointed["error"] == "openai 503"
+        assert {a.room_type for a in checkpointed["room_analyses"]} == {
+            RoomType.KITCHEN,
+            RoomType.BEDROOM,
+        }
+
+        pipeline.failing_rooms = set()
+        pipeline.fallback_rooms = set()
+        pipeline.analysed.clear()
+        resumed = await pipeline.resume(run_id)
+        events = _data(resumed)
+
+        assert sorted(pipeline.analysed) == sorted([RoomType.BATHROOM, RoomType.BEDROOM])
+        assert pipeline.idealista.scrape_property.await_count == 1
+        assert pipeline.classifier.classify_images.await_count == 1
+        assert {_run_id([raw]) for raw in resumed} == {run_id}
+        # Events up to the last good node are replayed, without the failure
+        assert events[0]["message"] == "A obter dados do Idealista..."
+        assert not any(e["type"] == "error" for e in events)
+        assert any(e["message"] == "A retomar análise: 1 divisões já estimadas" for e in events)
+        assert [e["data"]["current"] for e in events if e["type"] == "progress" and e["step"] == 4]
+        assert events[-1]["type"] == "result"
+        assert len(events[-1]["data"]["estimate"]["room_analyses"]) == 3
+        # Completed runs drop their checkpoints
+        assert await run_state(pipeline.graph, run_id) is None
+
+    @pytest.mark.asyncio
+    async def test_run_failing_again_can_be_resumed_again(self):
+        pipeline = Pipeline()
+        pipeline.failing_rooms = {RoomType.BATHROOM}
+        run_id = _run_id(await pipeline.analyze())
+
+        again = _data(await pipeline.resume(run_id))
+        assert again[-1]["type"] == "error"
+
+        pipeline.failing_rooms = set()
+        final = _data(await pipeline.resume(run_id))
+        assert final[-1]["type"] == "result"
+        assert pipeline.analysed.count(RoomType.KITCHEN) == 1
+        assert pipeline.analysed.count(RoomType.BATHROOM) == 3
+
+    @pytest.mark.asyncio
+    async def test_last_event_id_of_the_failed_run_still_resumes(self):
+        pipeline = Pipeline()
+        pipeline.failing_rooms = {RoomType.BATHROOM}
+        first = await pipeline.analyze()
+        run_id = _run_id(first)
+
+        # The failed run is still retained under run_id for the grace period
+        pipeline.failing_rooms = set()
+        events = _data(await pipeline.resume(run_id, last_event_id=first[-2]["id"]))
+
+        assert events[0]["message"] == "A obter dados do Idealista..."
+        assert events[-1]["type"] == "result"
+        assert pipeline.analysed.count(RoomType.BATHROOM) == 2
+
+    @pytest.mark.asyncio
+    async def test_dropped_resume_stream_reattaches_to_the_resumed_run(self):
+        pipeline = Pipeline()
+        pipeline.failing_rooms = {RoomType.BATHROOM}
+        run_id = _run_id(await pipeline.analyze())
+
+        pipeline.failing_rooms = set()
+        resumed = await pipeline.resume(run_id)
+        analysed = len(pipeline.analysed)
+        tail = await pipeline.resume(run_id, last_event_id=resumed[-3]["id"])
+
+        assert tail == resumed[-2:]
+        assert len(pipeline.analysed) == analysed
+
+    @pytest.mark.asyncio
+    async def test_pipelined_mode_reuses_finished_rooms(self):
+        pipeline = Pipeline(pipelined=True)
+        pipeline.failing_rooms = {RoomType.KITCHEN}
+        run_id = _run_id(await pipeline.analyze())
+
+        pipeline.failing_rooms = set()
+        pipeline.analysed.clear()
+        events = _data(await pipeline.resume(run_id))
+
+        assert pipeline.analysed == [RoomType.KITCHEN]
+        assert events[-1]["type"] == "result"
+
+
+class TestResumeAfterScrapeFailure:
+    @pytest.mark.asyncio
+    async def test_reruns_from_the_first_node(self):
+        pipeline = Pipeline()
+        pipeline.scrape_fails = True
+        run_id = _run_id(await pipeline.analyze())
+
+        pipeline.scrape_fails = False
+        events = _data(await pipeline.resume(run_id))
+
+        assert pipeline.idealista.scrape_property.await_count == 2
+        assert [e["message"] for e in events].count("A obter dados do Idealista...") == 1
+        assert events[-1]["type"] == "result"
+
+
+class TestResumeEndpoint:
+    @staticmethod
+    def _request(graph) -> SimpleNamespace:
+        return SimpleNamespace(
+            app=SimpleNamespace(state=SimpleNamespace(graph=graph)), headers={}
+        )
+
+    @staticmethod
+    def _user(user_id: str) -> AuthenticatedUser:
+        return AuthenticatedUser(id=user_id, email=f"{user_id}@example.com")
+
+    @pytest.mark.asyncio
+    async def test_unknown_completed_or_foreign_runs_are_not_found(self):
+        pipeline = Pipeline()
+        completed_run = _run_id(await pipeline.analyze())
+        pipeline.scrape_fails = True
+        failed_run = _run_id(await pipeline.analyze())
+        request = self._request(pipeline.graph)
+
+        for run_id, user_id in (
+            ("unknown", "user-1"),
+            (completed_run, "user-1"),
+            (failed_run, "user-2"),
+        ):
+            with pytest.raises(HTTPException) as exc:
+                await resume_analysis_stream(run_id, request, self._user(user_id))
+            assert exc.value.status_code == 404
+
+        response = await resume_analysis_stream(failed_run, request, self._user("user-1"))
+        assert response.media_type == "text/event-stream"
+
+    @pytest.mark.asyncio
+    async def test_checkpointing_disabled_is_not_found(self):
+        graph = MagicMock(spec=["astream"])
+        with pytest.raises(HTTPException) as exc:
+            await resume_analysis_stream("abc", self._request(graph), self._user("user-1"))
+        assert exc.value.status_code == 404
@@ -0,0 +1,857 @@
+"""
+Integration tests for stream_analysis — live progress from inside graph nodes.
+
+Builds the real renovation graph with mocked services and drives the SSE
+generator directly. Also checks that downloaded image bytes stay in the
+ImageStore and never reach SSE events or persisted rows, that an unchanged
+listing replays its cached analysis without running the pipeline, and that
+concurrent identical requests share a single run, that floor plans tagged
+by Apify are analysed while classification runs (and that call is cancelled
+when the run fails, is cancelled or groups no such plan), that a client
+reconnecting with Last-Event-ID resumes the same run without duplicates, and
+that a disconnect cancels the run (no further OpenAI calls) once no
+subscriber is left, and that near-duplicate photos and the GPT calls
+they saved are reported in the classification summary and result. The
+classifier is gated on an asyncio.Event so the test can observe which events
+reach the client while classify_node is still running.
+"""
+
+import asyncio
+import json
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+from sse_starlette.sse import EventSourceResponse
+
+from app.api.v1.analyze import _wait_while_connected, stream_analysis
+from app.config import Settings
+from app.graphs.main_graph import build_renovation_graph, with_floor_plan_prefetch
+from app.graphs.state import create_initial_state
+from app.models.property import (
+    ImageClassification,
+    PropertyData,
+    RenovationEstimate,
+    RoomAnalysis,
+    RoomCondition,
+    RoomType,
+)
+from app.services.analysis_cache import AnalysisCache
+from app.services.analysis_runs import join_analysis, produce_analysis
+from app.services.classification_cache import InMemoryLRUBackend
+from app.services.idealista import IdealistaService
+from app.services.image_classifier import ImageClassifierService
+from app.services.image_downloader import ImageDownloaderService
+from app.services.image_store import ImageStore, is_image_handle
+from app.services.renovation_estimator import FloorPlanPrefetch, RenovationEstimatorService
+from app.services.single_flight import SharedRun, StreamSingleFlight
+
+URL = "https://www.idealista.pt/imovel/12345678/"
+IMAGE_URLS = [f"https://cdn.idealista.pt/img{i}.jpg" for i in range(3)]
+
+
+def _classification(url: str) -> ImageClassification:
+    return ImageClassification(
+        image_url=url, room_type=RoomType.KITCHEN, room_number=1, confidence=0.8
+    )
+
+
+@pytest.fixture
+def idealista() -> AsyncMock:
+    service = AsyncMock(spec=IdealistaService)
+    service.scrape_property.return_value = PropertyData(
+        url=URL, title="Test", price=100000, image_urls=IMAGE_URLS
+    )
+    return service
+
+
+@pytest.fixture
+def estimator() -> MagicMock:
+    service = MagicMock(spec=RenovationEstimatorService)
+    service.analyze_all_rooms = AsyncMock(return_value=[])
+    service.generate_summary = AsyncMock(return_value="Resumo")
+    service.create_estimate = MagicMock(
+        return_value=RenovationEstimate(
+            property_url=URL, total_cost_min=0, total_cost_max=0, overall_confidence=0.5
+        )
+    )
+    return service
+
+
+class TestLiveProgressStreaming:
+    @pytest.mark.asyncio
+    async def test_progress_events_arrive_before_node_finishes(
+        self, idealista: AsyncMock, estimator: MagicMock
+    ):
+        """The first progress event is yielded while classify_images is still blocked."""
+        release = asyncio.Event()
+        node_finished = asyncio.Event()
+
+        async def _classify_images(image_urls, image_tags=None, progress_callback=None):
+            first = _classification(image_urls[0])
+            await progress_callback(1, len(image_urls), first)
+            # Hold the node open until the test has seen the first progress event
+            await release.wait()
+            results = [first] + [_classification(u) for u in image_urls[1:]]
+            for i, c in enumerate(results[1:], start=2):
+                await progress_callback(i, len(image_urls), c)
+            node_finished.set()
+            return results
+
+        classifier = MagicMock(spec=ImageClassifierService)
+        classifier.classify_images = AsyncMock(side_effect=_classify_images)
+        classifier.group_by_room = AsyncMock(return_value={})
+
+        settings = Settings(openai_api_key="sk-test", use_base64_images=False)
+        graph = build_renovation_graph(settings, idealista, classifier, estimator)
+
+        stream = stream_analysis(URL, "user-1", graph)
+        received: list[dict] = []
+        seen_before_finish: list[dict] = []
+
+        async def _consume() -> None:
+            async for raw in stream:
+                event = json.loads(raw["data"])
+                received.append(event)
+                if event["type"] == "progress" and not release.is_set():
+                    assert not node_finished.is_set()
+                    seen_before_finish.append(event)
+                    release.set()
+
+        # If events were only flushed after the node returned, the gate would never
+        # open and the node would block forever — fail fast instead of hanging.
+        await asyncio.wait_for(_consume(), timeout=5)
+
+        assert len(seen_before_finish) == 1
+        assert seen_before_finish[0]["data"]["current"] == 1
+
+        progress = [e for e in received if e["type"] == "progress"]
+        assert [e["data"]["current"] for e in progress] == [1, 2, 3]
+
+    @pytest.mark.asyncio
+    async def test_events_are_not_duplicated(
+        self, idealista: AsyncMock, estimator: MagicMock
+    ):
+        """Each event is forwarded exactly once even though nodes also keep it in state."""
+        classifier = MagicMock(spec=ImageClassifierService)
+        classifier.classify_images = AsyncMock(
+            return_value=[_classification(u) for u in IMAGE_URLS]
+        )
+        classifier.group_by_room = AsyncMock(return_value={})
+
+        settings = Settings(openai_api_key="sk-test", use_base64_images=False)
+        graph = build_renovation_graph(settings, idealista, classifier, estimator)
+
+        messages = [json.loads(raw["data"])["message"] async for raw in stream_analysis(URL, "", graph)]
+
+        assert messages.count("A obter dados do Idealista...") == 1
+        assert messages.count("A calcular custos finais...") == 1
+        assert messages[-1].startswith("Estimativa completa")
+
+
+class TestAppendOnlyEventLog:
+    @pytest.mark.asyncio
+    async def test_node_updates_carry_only_new_events(
+        self, idealista: AsyncMock, estimator: MagicMock
+    ):
+        """Each node's update holds just its own events; the final state holds each once."""
+        classifier = MagicMock(spec=ImageClassifierService)
+        classifier.classify_images = AsyncMock(
+            return_value=[_classification(u) for u in IMAGE_URLS]
+        )
+        classifier.group_by_room = AsyncMock(return_value={})
+
+        settings = Settings(openai_api_key="sk-test", use_base64_images=False)
+        graph = build_renovation_graph(settings, idealista, classifier, estimator)
+
+        updates: dict[str, dict] = {}
+        async for chunk in graph.astream(create_initial_state(URL)):
+            updates.update(chunk)
+
+        assert {e.step for e in updates["scrape"]["stream_events"]} == {1}
+        assert {e.step for e in updates["summarize"]["stream_events"]} == {5}
+        assert "url" not in updates["classify"]
+
+        final_state = await graph.ainvoke(create_initial_state(URL))
+        total = sum(len(u["stream_events"]) for u in updates.values())
+        assert len(final_state["stream_events"]) == total
+
+
+class TestImageHandlesStayOutOfOutputs:
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("stream_classification", [False, True])
+    async def test_no_data_uri_in_result_event_or_persistence(
+        self, idealista: AsyncMock, stream_classification: bool
+    ):
+        """With base64 on, state carries handles and outputs carry CDN URLs only."""
+        store = ImageStore(max_bytes=10 * 1024 * 1024)
+        downloader = ImageDownloaderService(image_store=store)
+        downloader._client = MagicMock()
+        downloader._client.get = AsyncMock(
+            return_value=MagicMock(
+                content=b"\xff\xd8" + b"\0" * 50_000,
+                headers={"content-type": "image/jpeg"},
+                raise_for_status=MagicMock(),
+            )
+        )
+
+        seen_refs: list[str] = []
+
+        async def _classify_images(image_urls, image_tags=None, progress_callback=None):
+            seen_refs.extend(image_urls)
+            return [_classification(u) for u in image_urls]
+
+        async def _classify_image_stream(images, total, progress_callback=None):
+            return await _classify_images([ref async for ref, _ in images])
+
+        classifier = MagicMock(spec=ImageClassifierService)
+        classifier.classify_images = AsyncMock(side_effect=_classify_images)
+        classifier.classify_image_stream = AsyncMock(side_effect=_classify_image_stream)
+        classifier.group_by_room = AsyncMock(side_effect=lambda cs, **_: {"cozinha_1": cs})
+
+        estimator = RenovationEstimatorService(openai_api_key="sk-test")
+
+        async def _analyze_all_rooms(grouped, progress_callback=None, property_data=None):
+            return [
+                RoomAnalysis(
+                    room_type=RoomType.KITCHEN,
+                    room_label="Cozinha",
+                    images=[c.image_url for c in cs],
+                    condition=RoomCondition.FAIR,
+                    cost_min=1000,
+                    cost_max=2000,
+                    confidence=0.8,
+                    features={"notes": "ok"},
+                )
+                for cs in grouped.values()
+            ]
+
+        estimator.analyze_all_rooms = AsyncMock(side_effect=_analyze_all_rooms)
+        estimator.generate_summary = AsyncMock(return_value="Resumo")
+
+        settings = Settings(openai_api_key="sk-test", use_base64_images=True)
+        settings.image_processing.stream_classification = stream_classification
+        graph = build_renovation_graph(settings, idealista, classifier, estimator, downloader)
+
+        db = MagicMock()
+        db.upsert_property = AsyncMock(return_value={"id": "prop-1"})
+        db.create_portfolio_item = AsyncMock(return_value={"id": "item-1"})
+        db.update_portfolio_item = AsyncMock()
+        db.create_analysis = AsyncMock()
+        db.save_room_features = AsyncMock()
+        db.log_action = AsyncMock()
+
+        with patch("app.services.analysis_persistence.db", db):
+            raw_events = [raw async for raw in stream_analysis(URL, "user-1", graph, object())]
+
+        # Nodes worked on short handles backed by the store
+        assert len(seen_refs) == len(IMAGE_URLS)
+        assert all(is_image_handle(ref) for ref in seen_refs)
+        assert store.stats()["images"] == 1  # identical bytes stored once
+
+        for raw in raw_events:
+            assert "data:image" not in raw["data"]
+            assert "img:" not in json.dumps(json.loads(raw["data"]).get("data"))
+
+        result = json.loads(raw_events[-1]["data"])
+        assert result["type"] == "result"
+        assert result["data"]["estimate"]["room_analyses"][0]["images"] == IMAGE_URLS
+
+        persisted = json.dumps([call.args for call in db.method_calls], default=str)
+        assert db.create_analysis.await_count == 1
+        assert db.save_room_features.await_count == 1
+        assert "data:image" not in persisted
+        room_features = db.save_room_features.call_args.args[2]
+        assert room_features[0]["images"] == IMAGE_URLS
+
+
+class TestFloorPlanPrefetch:
+    PLAN_URL = IMAGE_URLS[2]
+
+    @pytest.fixture
+    def tagged_listing(self, idealista: AsyncMock) -> AsyncMock:
+        idealista.scrape_property.return_value = PropertyData(
+            url=URL,
+            title="Test",
+            price=100000,
+            image_urls=IMAGE_URLS,
+            image_tags={IMAGE_URLS[0]: "kitchen", self.PLAN_URL: "plan"},
+        )
+        return idealista
+
+    def _classifier(self, classify_images, with_plan: bool = True) -> MagicMock:
+        classifier = MagicMock(spec=ImageClassifierService)
+        classifier.classify_images = AsyncMock(side_effect=classify_images)
+        classifier.group_by_room = AsyncMock(
+            side_effect=lambda cs, **_: {
+                "cozinha_1": [c for c in cs if c.room_type == RoomType.KITCHEN],
+                **(
+                    {"planta_1": [c for c in cs if c.room_type == RoomType.FLOOR_PLAN]}
+                    if with_plan
+                    else {}
+                ),
+            }
+        )
+        return classifier
+
+    def _classifications(self, image_urls) -> list[ImageClassification]:
+        return [
+            ImageClassification(
+                image_url=url,
+                room_type=RoomType.FLOOR_PLAN if url == self.PLAN_URL else RoomType.KITCHEN,
+                room_number=1,
+                confidence=0.9,
+            )
+            for url in image_urls
+        ]
+
+    @staticmethod
+    def _estimator() -> RenovationEstimatorService:
+        estimator = RenovationEstimatorService(openai_api_key="sk-test")
+        estimator.analyze_all_rooms = AsyncMock(return_value=[])
+        estimator.generate_summary = AsyncMock(return_value="Resumo")
+        return estimator
+
+    @staticmethod
+    def _graph(idealista, classifier, estimator):
+        settings = Settings(openai_api_key="sk-test", use_base64_images=False)
+        return build_renovation_graph(settings, idealista, classifier, estimator)
+
+    @staticmethod
+    def _blocked_floor_plan(started: asyncio.Event, cancelled: asyncio.Event):
+        async def _floor_plan(image_urls, property_data):
+            started.set()
+            try:
+                await asyncio.Event().wait()
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        return _floor_plan
+
+    @pytest.mark.asyncio
+    async def test_tagged_plan_analysed_during_classification(self, tagged_listing: AsyncMock):
+        """A plan tagged by Apify is analysed while classify runs; estimate joins that call."""
+        floor_plan_started = asyncio.Event()
+
+        async def _classify_images(image_urls, image_tags=None, progress_callback=None):
+            # Classification only finishes once the floor plan call is under way
+            await floor_plan_started.wait()
+            return self._classifications(image_urls)
+
+        estimator = self._estimator()
+
+        async def _floor_plan(image_urls, property_data):
+            floor_plan_started.set()
+            return None
+
+        graph = self._graph(tagged_listing, self._classifier(_classify_images), estimator)
+        prefetch = FloorPlanPrefetch()
+        with patch.object(
+            estimator, "_analyze_floor_plan", side_effect=_floor_plan
+        ) as mock_analyze:
+            final_state = await asyncio.wait_for(
+                graph.ainvoke(
+                    create_initial_state(URL), with_floor_plan_prefetch({}, prefetch)
+                ),
+                timeout=2,
+            )
+
+        mock_analyze.assert_awaited_once()
+        assert mock_analyze.call_args.args[0] == [self.PLAN_URL]
+        assert final_state["floor_plan_urls"] == [self.PLAN_URL]
+        assert prefetch.task is None
+
+    @pytest.mark.asyncio
+    async def test_failed_classification_cancels_the_prefetch(self, tagged_listing: AsyncMock):
+        started, cancelled = asyncio.Event(), asyncio.Event()
+
+        async def _classify_images(image_urls, image_tags=None, progress_callback=None):
+            await started.wait()
+            raise RuntimeError("OpenAI down")
+
+        estimator = self._estimator()
+        graph = self._graph(tagged_listing, self._classifier(_classify_images), estimator)
+        blocked = self._blocked_floor_plan(started, cancelled)
+        with patch.object(estimator, "_analyze_floor_plan", side_effect=blocked):
+            final_state = await asyncio.wait_for(
+                graph.ainvoke(
+                    create_initial_state(URL), with_floor_plan_prefetch({}, FloorPlanPrefetch())
+                ),
+                timeout=2,
+            )
+            await asyncio.wait_for(cancelled.wait(), timeout=1)
+
+        assert final_state["error"] == "OpenAI down"
+
+    @pytest.mark.asyncio
+    async def test_plan_not_confirmed_by_grouping_is_cancelled(self, tagged_listing: AsyncMock):
+        started, cancelled = asyncio.Event(), asyncio.Event()
+
+        async def _classify_images(image_urls, image_tags=None, progress_callback=None):
+            await started.wait()
+            return self._classifications(image_urls)
+
+        estimator = self._estimator()
+        classifier = self._classifier(_classify_images, with_plan=False)
+        graph = self._graph(tagged_listing, classifier, estimator)
+        blocked = self._blocked_floor_plan(started, cancelled)
+        with patch.object(estimator, "_analyze_floor_plan", side_effect=blocked):
+            final_state = await asyncio.wait_for(
+                graph.ainvoke(
+                    create_initial_state(URL), with_floor_plan_prefetch({}, FloorPlanPrefetch())
+                ),
+                timeout=2,
+            )
+            await asyncio.wait_for(cancelled.wait(), timeout=1)
+
+        assert final_state["floor_plan_urls"] == []
+        assert final_state.get("error") is None
+
+    @pytest.mark.asyncio
+    async def test_cancelled_run_cancels_the_prefetch(self, tagged_listing: AsyncMock):
+        """A client disconnect cancels the run; the early floor plan call goes with it."""
+        started, cancelled = asyncio.Event(), asyncio.Event()
+
+        async def _classify_images(image_urls, image_tags=None, progress_callback=None):
+            await asyncio.Event().wait()
+
+        estimator = self._estimator()
+        graph = self._graph(tagged_listing, self._classifier(_classify_images), estimator)
+        blocked = self._blocked_floor_plan(started, cancelled)
+        with patch.object(estimator, "_analyze_floor_plan", side_effect=blocked):
+            produce = asyncio.create_task(produce_analysis(graph, URL, "", SharedRun("k")))
+            await asyncio.wait_for(started.wait(), timeout=1)
+            produce.cancel()
+            await asyncio.wait_for(cancelled.wait(), timeout=1)
+
+        with pytest.raises(asyncio.CancelledError):
+            await produce
+
+
+class TestAnalysisCacheReplay:
+    @staticmethod
+    def _classifier() -> MagicMock:
+        classifier = MagicMock(spec=ImageClassifierService)
+        classifier.classify_images = AsyncMock(
+            return_value=[_classification(u) for u in IMAGE_URLS]
+        )
+        classifier.group_by_room = AsyncMock(return_value={})
+        return classifier
+
+    @pytest.mark.asyncio
+    async def test_unchanged_listing_replays_cached_result(
+        self, idealista: AsyncMock, estimator: MagicMock
+    ):
+        """The second run ends after scrape and streams the stored estimate."""
+        classifier = self._classifier()
+        cache = AnalysisCache([InMemoryLRUBackend()], version="v1")
+        settings = Settings(openai_api_key="sk-test", use_base64_images=False)
+        graph = build_renovation_graph(
+            settings, idealista, classifier, estimator, analysis_cache=cache
+        )
+
+        first = [json.loads(raw["data"]) async for raw in stream_analysis(URL, "", graph)]
+        second = [json.loads(raw["data"]) async for raw in stream_analysis(URL, "", graph)]
+
+        assert classifier.classify_images.await_count == 1
+        assert estimator.generate_summary.await_count == 1
+        assert idealista.scrape_property.await_count == 2
+        assert "cached" not in first[-1]["data"]
+        assert second[-1]["type"] == "result"
+        assert second[-1]["data"]["cached"] is True
+        replayed, original = second[-1]["data"]["estimate"], first[-1]["data"]["estimate"]
+        assert replayed["summary"] == original["summary"]
+        assert replayed["property_data"]["price"] == 100000  # from this run's scrape
+        assert not any(e["step"] in (2, 3, 4) for e in second)
+
+        # Non-streaming callers (sync endpoint, orchestrator tool) get the estimate too
+        final_state = await graph.ainvoke(create_initial_state(URL))
+        assert final_state["estimate"].property_url == URL
+        assert classifier.classify_images.await_count == 1
+
+    @pytest.mark.asyncio
+    async def test_changed_listing_reruns_pipeline(
+        self, idealista: AsyncMock, estimator: MagicMock
+    ):
+        classifier = self._classifier()
+        cache = AnalysisCache([InMemoryLRUBackend()], version="v1")
+        settings = Settings(openai_api_key="sk-test", use_base64_images=False)
+        graph = build_renovation_graph(
+            settings, idealista, classifier, estimator, analysis_cache=cache
+        )
+
+        await graph.ainvoke(create_initial_state(URL))
+        idealista.scrape_property.return_value = PropertyData(
+            url=URL, title="Test", price=90000, image_urls=IMAGE_URLS
+        )
+        final_state = await graph.ainvoke(create_initial_state(URL))
+
+        assert classifier.classify_images.await_count == 2
+        assert final_state["estimate"] is not None
+        assert cache.stats()["stale"] == 1
+
+
+class TestConcurrentIdenticalAnalyses:
+    @pytest.mark.asyncio
+    async def test_fifty_identical_requests_share_one_run(self, estimator: MagicMock):
+        """50 simultaneous requests: one Apify request, one set of GPT-backed calls."""
+        idealista = IdealistaService(apify_token="fake-token")
+        item = {
+            "type": "property",
+            "data": {
+                "propertyId": 12345678,
+                "price": 100000,
+                "multimedia": {"images": [{"url": u} for u in IMAGE_URLS]},
+            },
+        }
+
+        async def _apify(url, payload):
+            await asyncio.sleep(0.05)
+            yield item
+
+        classifier = MagicMock(spec=ImageClassifierService)
+        classifier.classify_images = AsyncMock(
+            side_effect=lambda urls, **_: [_classification(u) for u in urls]
+        )
+        classifier.group_by_room = AsyncMock(side_effect=lambda cs, **_: {"cozinha_1": cs})
+
+        settings = Settings(openai_api_key="sk-test", use_base64_images=False)
+        graph = build_renovation_graph(settings, idealista, classifier, estimator)
+        flights = StreamSingleFlight()
+
+        async def _request(user_id: str) -> list[dict]:
+            stream = stream_analysis(URL, user_id, graph, flights=flights)
+            return [json.loads(raw["data"]) async for raw in stream]
+
+        with patch.object(idealista, "_stream_with_retry", side_effect=_apify) as apify:
+            streams = await asyncio.gather(*(_request(f"user-{i}") for i in range(50)))
+
+        assert apify.call_count == 1
+        assert classifier.classify_images.await_count == 1
+        assert classifier.group_by_room.await_count == 1
+        assert estimator.analyze_all_rooms.await_count == 1
+        assert estimator.generate_summary.await_count == 1
+        assert flights.stats() == {
+            "executions": 1, "coalesced": 49, "resumed": 0, "in_flight": 0
+        }
+
+        # Every subscriber saw the complete event sequence, ending in the result
+        assert all(events == streams[0] for events in streams)
+        assert streams[0][0]["message"] == "A obter dados do Idealista..."
+        assert streams[0][-1]["type"] == "result"
+
+    @pytest.mark.asyncio
+    async def test_late_request_replays_events_already_sent(
+        self, idealista: AsyncMock, estimator: MagicMock
+    ):
+        release = asyncio.Event()
+
+        async def _classify_images(image_urls, image_tags=None, progress_callback=None):
+            await progress_callback(1, len(image_urls), _classification(image_urls[0]))
+            await release.wait()
+            return [_classification(u) for u in image_urls]
+
+        classifier = MagicMock(spec=ImageClassifierService)
+        classifier.classify_images = AsyncMock(side_effect=_classify_images)
+        classifier.group_by_room = AsyncMock(return_value={})
+
+        settings = Settings(openai_api_key="sk-test", use_base64_images=False)
+        graph = build_renovation_graph(settings, idealista, classifier, estimator)
+        flights = StreamSingleFlight()
+
+        first = stream_analysis(URL, "user-1", graph, flights=flights)
+        first_events = []
+        async for raw in first:
+            first_events.append(json.loads(raw["data"]))
+            if first_events[-1]["type"] == "progress":
+                break
+
+        # Joins mid-classify: the scrape/classify events are replayed first
+        late = stream_analysis(URL, "user-2", graph, flights=flights)
+        late_events = [json.loads((await late.__anext__())["data"]) for _ in range(len(first_events))]
+        assert late_events == first_events
+
+        release.set()
+        late_events += [json.loads(raw["data"]) async for raw in late]
+        first_events += [json.loads(raw["data"]) async for raw in first]
+
+        assert late_events == first_events
+        assert classifier.classify_images.await_count == 1
+        assert idealista.scrape_property.await_count == 1
+
+    @pytest.mark.asyncio
+    async def test_refresh_does_not_join_the_run_in_flight(
+        self, idealista: AsyncMock, estimator: MagicMock
+    ):
+        release = asyncio.Event()
+
+        async def _classify_images(image_urls, image_tags=None, progress_callback=None):
+            await release.wait()
+            return [_classification(u) for u in image_urls]
+
+        classifier = MagicMock(spec=ImageClassifierService)
+        classifier.classify_images = AsyncMock(side_effect=_classify_images)
+        classifier.group_by_room = AsyncMock(return_value={})
+
+        settings = Settings(openai_api_key="sk-test", use_base64_images=False)
+        graph = build_renovation_graph(settings, idealista, classifier, estimator)
+        flights = StreamSingleFlight()
+
+        running = join_analysis(flights, graph, URL, "user-1")
+        while not idealista.scrape_property.await_count:
+            await asyncio.sleep(0)
+        refreshed = join_analysis(flights, graph, URL, "user-2", scrape_max_age=0)
+        try:
+            assert refreshed is not running
+            release.set()
+            await asyncio.gather(running.wait(), refreshed.wait())
+        finally:
+            flights.leave(running)
+            flights.leave(refreshed)
+
+        max_ages = [call.kwargs.get("max_age") for call in idealista.scrape_property.await_args_list]
+        assert max_ages == [None, 0]
+        assert flights.stats()["coalesced"] == 0
+
+
+class TestStreamResume:
+    @pytest.mark.asyncio
+    async def test_reconnect_with_last_event_id_gets_only_missed_events(
+        self, idealista: AsyncMock, estimator: MagicMock
+    ):
+        release = asyncio.Event()
+
+        async def _classify_images(image_urls, image_tags=None, progress_callback=None):
+            await progress_callback(1, len(image_urls), _classification(image_urls[0]))
+            await release.wait()
+            return [_classification(u) for u in image_urls]
+
+        classifier = MagicMock(spec=ImageClassifierService)
+        classifier.classify_images = AsyncMock(side_effect=_classify_images)
+        classifier.group_by_room = AsyncMock(return_value={})
+
+        settings = Settings(openai_api_key="sk-test", use_base64_images=False)
+        graph = build_renovation_graph(settings, idealista, classifier, estimator)
+        flights = StreamSingleFlight(grace_seconds=10)
+
+        # Uninterrupted reference stream on a separate registry
+        reference_graph = build_renovation_graph(
+            settings, idealista, _instant_classifier(), estimator
+        )
+        reference = [
+            json.loads(raw["data"]) async for raw in stream_analysis(URL, "", reference_graph)
+        ]
+
+        first = stream_analysis(URL, "user-1", graph, flights=flights)
+        received = []
+        async for raw in first:
+            received.append(raw)
+            if json.loads(raw["data"])["type"] == "progress":
+                break
+        await first.aclose()  # connection dropped mid-classify
+
+        release.set()
+        resumed = stream_analysis(
+            URL, "user-1", graph, flights=flights, last_event_id=received[-1]["id"]
+        )
+        received += [raw async for raw in resumed]
+
+        seqs = [int(raw["id"].rsplit(":", 1)[1]) for raw in received]
+        assert seqs == list(range(1, len(received) + 1))
+        assert len({raw["id"].rsplit(":", 1)[0] for raw in received}) == 1
+        assert [json.loads(raw["data"]) for raw in received] == reference
+        assert idealista.scrape_property.await_count == 2  # reference + one resumed run
+        assert classifier.classify_images.await_count == 1
+        assert flights.stats()["resumed"] == 1
+
+    @pytest.mark.asyncio
+    async def test_unknown_last_event_id_starts_a_fresh_run(
+        self, idealista: AsyncMock, estimator: MagicMock
+    ):
+        settings = Settings(openai_api_key="sk-test", use_base64_images=False)
+        graph = build_renovation_graph(settings, idealista, _instant_classifier(), estimator)
+
+        events = [
+            json.loads(raw["data"])
+            async for raw in stream_analysis(URL, "", graph, last_event_id="expired:4")
+        ]
+
+        assert events[0]["message"] == "A obter dados do Idealista..."
+        assert events[-1]["type"] == "result"
+
+
+def _instant_classifier() -> MagicMock:
+    classifier = MagicMock(spec=ImageClassifierService)
+
+    async def _classify_images(image_urls, image_tags=None, progress_callback=None):
+        await progress_callback(1, len(image_urls), _classification(image_urls[0]))
+        return [_classification(u) for u in image_urls]
+
+    classifier.classify_images = AsyncMock(side_effect=_classify_images)
+    classifier.group_by_room = AsyncMock(return_value={})
+    return classifier
+
+
+class FakeOpenAI:
+    """chat.completions.create stand-in: slow, and records every call start."""
+
+    def __init__(self, latency: float = 0.02):
+        self.latency = latency
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    async def _create(self, **_):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        message = SimpleNamespace(
+            refusal=None, content='{"room_type": "quarto", "room_number": 1, "confidence": 0.9}'
+        )
+        return SimpleNamespace(choices=[SimpleNamespace(message=message, finish_reason="stop")])
+
+
+class TestCancelOnDisconnect:
+    """The graph task stops once the last client is gone — no more GPT calls."""
+
+    IMAGES = [f"https://cdn.idealista.pt/q{i}.jpg" for i in range(40)]
+
+    @pytest.fixture
+    def openai(self) -> FakeOpenAI:
+        return FakeOpenAI()
+
+    @pytest.fixture
+    def graph(self, openai: FakeOpenAI, estimator: MagicMock):
+        idealista = AsyncMock(spec=IdealistaService)
+        idealista.scrape_property.return_value = PropertyData(
+            url=URL, title="Test", price=100000, image_urls=self.IMAGES
+        )
+        classifier = ImageClassifierService(openai_api_key="sk-test", max_concurrent=2)
+        classifier.client = openai
+        settings = Settings(openai_api_key="sk-test", use_base64_images=False)
+        return build_renovation_graph(settings, idealista, classifier, estimator)
+
+    @staticmethod
+    async def _serve_until_first_progress(response: EventSourceResponse) -> None:
+        """Drive the SSE response over ASGI; the client hangs up after one progress event."""
+        hang_up = asyncio.Event()
+
+        async def _receive():
+            await hang_up.wait()
+            return {"type": "http.disconnect"}
+
+        async def _send(message):
+            if b'"progress"' in message.get("body", b""):
+                hang_up.set()
+
+        scope = {"type": "http", "method": "POST", "path": "/api/v1/analyze", "headers": []}
+        await asyncio.wait_for(response(scope, _receive, _send), timeout=5)
+
+    @pytest.mark.asyncio
+    async def test_disconnect_stops_openai_calls(
+        self, graph, openai: FakeOpenAI, estimator: MagicMock
+    ):
+        flights = StreamSingleFlight()
+        response = EventSourceResponse(stream_analysis(URL, "user-1", graph, flights=flights))
+
+        await self._serve_until_first_progress(response)
+        await asyncio.sleep(0)
+        calls_at_disconnect = openai.calls
+        await asyncio.sleep(0.2)  # ten fake-GPT latencies
+
+        assert openai.calls == calls_at_disconnect
+        assert openai.calls < len(self.IMAGES)
+        estimator.analyze_all_rooms.assert_not_awaited()
+        assert flights.in_flight() == 0
+
+    @pytest.mark.asyncio
+    async def test_run_continues_while_another_subscriber_listens(
+        self, graph, openai: FakeOpenAI, estimator: MagicMock
+    ):
+        flights = StreamSingleFlight()
+        other = stream_analysis(URL, "user-2", graph, flights=flights)
+        first_event = json.loads((await other.__anext__())["data"])
+
+        response = EventSourceResponse(stream_analysis(URL, "user-1", graph, flights=flights))
+        await self._serve_until_first_progress(response)
+        rest = [json.loads(raw["data"]) async for raw in other]
+
+        assert first_event["type"] == "status"
+        assert rest[-1]["type"] == "result"
+        assert openai.calls > len(self.IMAGES)  # every photo, plus bedroom clustering
+        estimator.analyze_all_rooms.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_abandoned_run_stops_after_resume_grace_period(
+        self, graph, openai: FakeOpenAI, estimator: MagicMock
+    ):
+        flights = StreamSingleFlight(grace_seconds=0.05)
+        response = EventSourceResponse(stream_analysis(URL, "user-1", graph, flights=flights))
+
+        await self._serve_until_first_progress(response)
+        await asyncio.sleep(0.1)
+        calls_after_grace = openai.calls
+        await asyncio.sleep(0.2)
+
+        assert openai.calls == calls_after_grace < len(self.IMAGES)
+        estimator.analyze_all_rooms.assert_not_awaited()
+
+    @pytest.mark.asyncio
+    async def test_sync_request_gives_up_when_client_disconnects(
+        self, graph, openai: FakeOpenAI, monkeypatch
+    ):
+        monkeypatch.setattr("app.api.v1.analyze.DISCONNECT_POLL_SECONDS", 0.01)
+        request = MagicMock()
+        request.is_disconnected = AsyncMock(side_effect=lambda: openai.calls > 0)
+        flights = StreamSingleFlight()
+
+        run = join_analysis(flights, graph, URL)
+        try:
+            assert await _wait_while_connected(request, run) is None
+        finally:
+            flights.leave(run)
+        await asyncio.sleep(0)
+        calls_at_disconnect = openai.calls
+        await asyncio.sleep(0.2)
+
+        assert openai.calls == calls_at_disconnect < len(self.IMAGES)
+        assert isinstance(run.error, asyncio.CancelledError)
+
+
+class TestNearDuplicateReport:
+    @pytest.mark.asyncio
+    async def test_duplicates_and_gpt_calls_saved_are_reported(
+        self, idealista: AsyncMock, estimator: MagicMock
+    ):
+        # img2 duplicates img0 and has no tag: one GPT call saved; img1 duplicates
+        # img0 too but its own tag would have classified it for free
+        idealista.scrape_property.return_value = PropertyData(
+            url=URL,
+            title="Test",
+            price=100000,
+            image_urls=IMAGE_URLS,
+            image_tags={IMAGE_URLS[1]: "kitchen"},
+        )
+        representative = _classification(IMAGE_URLS[0])
+        classifier = MagicMock(spec=ImageClassifierService)
+        classifier.classify_images = AsyncMock(
+            return_value=[
+                representative,
+                *(
+                    representative.model_copy(
+                        update={"image_url": url, "duplicate_of": IMAGE_URLS[0]}
+                    )
+                    for url in IMAGE_URLS[1:]
+                ),
+            ]
+        )
+        classifier.group_by_room = AsyncMock(return_value={})
+
+        settings = Settings(openai_api_key="sk-test", use_base64_images=False)
+        graph = build_renovation_graph(settings, idealista, classifier, estimator)
+        events = [json.loads(raw["data"]) async for raw in stream_analysis(URL, "", graph)]
+
+        summary = next(e for e in events if e["message"].startswith("Divisões identificadas"))
+        expected = {"duplicates": 2, "gpt_calls_saved": 1}
+        assert summary["data"]["image_dedup"] == expected
+        assert "2 fotografias duplicadas, 1 chamadas GPT evitadas" in summary["message"]
+        assert events[-1]["data"]["image_dedup"] == expected
@@ -4,8 +4,16 @@ Integration tests for API endpoints using FastAPI TestClient.
 Tests basic endpoints (root, health) that don't require external services.
 """
 
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import pytest
 from fastapi.testclient import TestClient
 
+from app.auth import AuthenticatedUser, get_current_user
+from app.config import AnalysisJobsConfig
+from app.services.analysis_jobs import AnalysisJob
+
 
 class TestRootEndpoint:
     """Tests for GET /."""
@@ -79,7 +87,116 @@ class TestAuthProtection:
         )
         assert response.status_code == 401
 
+    def test_cache_invalidation_without_token_returns_401(self, client: TestClient):
+        """DELETE /api/v1/analyze/cache/{id} without a Bearer token returns 401."""
+        response = client.delete("/api/v1/analyze/cache/12345678")
+        assert response.status_code == 401
+
+    def test_analysis_jobs_without_token_returns_401(self, client: TestClient):
+        """The /api/v1/analyze/jobs endpoints require a Bearer token."""
+        submit = client.post(
+            "/api/v1/analyze/jobs",
+            json={"url": "https://www.idealista.pt/imovel/12345678/"},
+        )
+        assert submit.status_code == 401
+        assert client.get("/api/v1/analyze/jobs/abc").status_code == 401
+        assert client.get("/api/v1/analyze/jobs/abc/events").status_code == 401
+
+    def test_analysis_resume_without_token_returns_401(self, client: TestClient):
+        """POST /api/v1/analyze/{run_id}/resume without a Bearer token returns 401."""
+        assert client.post("/api/v1/analyze/abc/resume").status_code == 401
+
+    def test_batch_analysis_without_token_returns_401(self, client: TestClient):
+        """POST /api/v1/analyze/batch without a Bearer token returns 401."""
+        response = client.post(
+            "/api/v1/analyze/batch",
+            json={"urls": ["https://www.idealista.pt/imovel/12345678/"]},
+        )
+        assert response.status_code == 401
+
+    def test_metrics_without_token_returns_401(self, client: TestClient):
+        """GET /api/v1/analyze/metrics without a Bearer token returns 401."""
+        assert client.get("/api/v1/analyze/metrics").status_code == 401
+
     def test_health_endpoints_no_auth_required(self, client: TestClient):
         """Health check endpoints remain public (no auth required)."""
         assert client.get("/health").status_code == 200
         assert client.get("/api/v1/analyze/health").status_code == 200
+
+
+class TestAnalyzeMetricsEndpoint:
+    """Tests for GET /api/v1/analyze/metrics."""
+
+    @pytest.fixture(autouse=True)
+    def _signed_in(self, client: TestClient):
+        client.app.dependency_overrides[get_current_user] = lambda: AuthenticatedUser(id="u1")
+        yield
+        client.app.dependency_overrides.clear()
+
+    def test_returns_cache_section(self, client: TestClient):
+        response = client.get("/api/v1/analyze/metrics")
+        assert response.status_code == 200
+        assert "classification_cache" in response.json()
+
+    def test_returns_analysis_cache_section(self, client: TestClient):
+        response = client.get("/api/v1/analyze/metrics")
+        assert "analysis_cache" in response.json()
+
+    def test_returns_scrape_cache_section(self, client: TestClient):
+        response = client.get("/api/v1/analyze/metrics")
+        assert "scrape_cache" in response.json()
+
+    def test_returns_apify_section(self, client: TestClient):
+        response = client.get("/api/v1/analyze/metrics")
+        assert "apify" in response.json()
+
+    def test_returns_image_dedup_section(self, client: TestClient):
+        response = client.get("/api/v1/analyze/metrics")
+        assert "image_dedup" in response.json()
+
+    def test_returns_local_clustering_section(self, client: TestClient):
+        response = client.get("/api/v1/analyze/metrics")
+        assert "local_clustering" in response.json()
+
+    def test_returns_raw_data_store_section(self, client: TestClient):
+        response = client.get("/api/v1/analyze/metrics")
+        assert "raw_data_store" in response.json()
+
+    def test_returns_analysis_jobs_section(self, client: TestClient):
+        response = client.get("/api/v1/analyze/metrics")
+        assert "analysis_jobs" in response.json()
+
+    def test_returns_openai_rate_limit_section(self, client: TestClient):
+        response = client.get("/api/v1/analyze/metrics")
+        assert response.json()["openai_rate_limit"] == {}
+
+
+class TestAnalysisJobPriority:
+    """Tests for the priority clients may request on POST /api/v1/analyze/jobs."""
+
+    @pytest.fixture
+    def jobs(self, client: TestClient):
+        async def _submit(url, user_id, priority=None):
+            return AnalysisJob(url=url, user_id=user_id, priority=5 if priority is None else priority)
+
+        manager = SimpleNamespace(
+            config=AnalysisJobsConfig(default_priority=5), submit=AsyncMock(side_effect=_submit)
+        )
+        client.app.dependency_overrides[get_current_user] = lambda: AuthenticatedUser(id="u1")
+        client.app.state.analysis_jobs = manager
+        yield manager
+        del client.app.state.analysis_jobs
+        client.app.dependency_overrides.clear()
+
+    @pytest.mark.parametrize(("requested", "queued"), [(0, 5), (5, 5), (9, 9)])
+    def test_priority_is_never_above_the_default(self, client, jobs, requested, queued):
+        response = client.post(
+            "/api/v1/analyze/jobs",
+            json={"url": "https://www.idealista.pt/imovel/12345678/", "priority": requested},
+        )
+        assert response.status_code == 202
+        assert response.json()["priority"] == queued
+
+    def test_omitted_priority_uses_the_default(self, client, jobs):
+        client.post("/api/v1/analyze/jobs", json={"url": "https://www.idealista.pt/imovel/1/"})
+        assert jobs.submit.await_args.args[2] is None
@@ -0,0 +1,164 @@
+"""
+Chaos tests for the Apify client's circuit breaker and retry budget.
+
+Runs IdealistaService against the local stub actor (benchmarks.stub_apify)
+while it fails: a full outage, a seeded share of 503s, 429s with
+Retry-After. Verifies that an outage opens the circuit so later callers fail
+fast without reaching the actor, that cached listings are served instead
+while it is open, that a half-open probe closes it once the actor recovers,
+and that retries of a flaky actor stay within the shared retry budget.
+"""
+
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from app.config import ApifyConfig
+from app.services.circuit_breaker import CircuitOpenError
+from app.services.idealista import IdealistaService
+from app.services.scrape_cache import ScrapeCache
+from benchmarks.stub_apify import StubApifyActor
+
+
+def _url(n: int) -> str:
+    return f"https://www.idealista.pt/imovel/{n}/"
+
+
+def _service(actor: StubApifyActor, cache: ScrapeCache | None = None, **config) -> IdealistaService:
+    settings = {
+        "standby_url": actor.url,
+        "retry_base_delay_seconds": 0,
+        "breaker_failure_threshold": 3,
+        **config,
+    }
+    return IdealistaService("stub-token", ApifyConfig(**settings), cache=cache)
+
+
+async def _scrape_all(service: IdealistaService, urls: list[str]) -> list:
+    return await asyncio.gather(
+        *(service.scrape_property(url) for url in urls), return_exceptions=True
+    )
+
+
+class TestOutage:
+    @pytest.mark.asyncio
+    async def test_open_circuit_fails_fast_without_reaching_the_actor(self):
+        async with StubApifyActor(status=503) as actor:
+            service = _service(actor)
+            first_wave = await _scrape_all(service, [_url(n) for n in range(20)])
+            requests_after_outage = actor.requests
+
+            start = time.perf_counter()
+            second_wave = await _scrape_all(service, [_url(n) for n in range(20, 40)])
+            elapsed = time.perf_counter() - start
+            await service.close()
+
+        assert all(isinstance(r, (httpx.HTTPStatusError, CircuitOpenError)) for r in first_wave)
+        assert service.breaker.state == "open"
+        # Concurrent first attempts went out; retries were cut off by the breaker
+        assert requests_after_outage == 20
+        assert all(isinstance(r, CircuitOpenError) for r in second_wave)
+        assert actor.requests == requests_after_outage
+        assert elapsed < 0.5
+        assert service.upstream_stats()["circuit_breaker"]["rejected"] >= 20
+
+    @pytest.mark.asyncio
+    async def test_open_circuit_serves_cached_listings(self):
+        cache = ScrapeCache(ttl_seconds=0, stale_seconds=0)
+        async with StubApifyActor() as actor:
+            service = _service(actor, cache=cache)
+            await service.scrape_property(_url(1))
+
+            actor.status = 503
+            await _scrape_all(service, [_url(n) for n in range(10, 15)])
+            assert service.breaker.state == "open"
+
+            single = await service.scrape_property(_url(1))
+            batch = {url: r async for url, r in service.scrape_properties([_url(1), _url(2)])}
+            await service.close()
+
+        assert single.title == "Apartamento 1"
+        assert batch[_url(1)].title == "Apartamento 1"
+        assert isinstance(batch[_url(2)], CircuitOpenError)
+        assert cache.stats()["fallbacks"] == 2
+
+    @pytest.mark.asyncio
+    async def test_half_open_probe_closes_the_circuit_after_recovery(self):
+        async with StubApifyActor(status=503) as actor:
+            service = _service(actor, breaker_reset_seconds=0.1)
+            await _scrape_all(service, [_url(n) for n in range(5)])
+            assert service.breaker.state == "open"
+
+            actor.status = 200
+            await asyncio.sleep(0.15)
+            assert service.breaker.state == "half_open"
+            probe = await service.scrape_property(_url(1))
+            after = await _scrape_all(service, [_url(n) for n in range(2, 6)])
+            await service.close()
+
+        assert probe.title == "Apartamento 1"
+        assert service.breaker.state == "closed"
+        assert all(r.title.startswith("Apartamento") for r in after)
+
+
+class TestFlakyActor:
+    @staticmethod
+    async def _scrape_sequentially(service: IdealistaService, count: int) -> list:
+        results = []
+        for n in range(1, count + 1):
+            try:
+                results.append(await service.scrape_property(_url(n)))
+            except Exception as exc:
+                results.append(exc)
+        return results
+
+    @pytest.mark.asyncio
+    async def test_retries_absorb_errors_within_a_generous_budget(self):
+        async with StubApifyActor(error_rate=0.3, seed=7) as actor:
+            service = _service(
+                actor, max_retries=10, breaker_failure_threshold=10, retry_budget_ratio=1.0
+            )
+            results = await self._scrape_sequentially(service, 30)
+            await service.close()
+
+        budget = service.upstream_stats()["retry_budget"]
+        assert all(r.title.startswith("Apartamento") for r in results)
+        assert budget["retries"] == actor.errors > 0
+        assert actor.requests == 30 + budget["retries"]
+
+    @pytest.mark.asyncio
+    async def test_tight_budget_caps_load_on_the_actor(self):
+        async with StubApifyActor(error_rate=0.3, seed=7) as actor:
+            service = _service(
+                actor,
+                max_retries=10,
+                breaker_failure_threshold=10,
+                retry_budget_ratio=0.1,
+                retry_budget_min_retries=2,
+                retry_budget_window_seconds=60,
+            )
+            results = await self._scrape_sequentially(service, 30)
+            await service.close()
+
+        failed = [r for r in results if isinstance(r, Exception)]
+        budget = service.upstream_stats()["retry_budget"]
+        # 30 first attempts allow 2 + 0.1 x 30 retries; each refusal fails one call
+        assert budget["retries"] <= 5
+        assert actor.requests == 30 + budget["retries"]
+        assert failed and all(isinstance(r, httpx.HTTPStatusError) for r in failed)
+        assert len(failed) == budget["exhausted"]
+
+    @pytest.mark.asyncio
+    async def test_429_waits_for_retry_after(self):
+        async with StubApifyActor(status=429, retry_after=0.1) as actor:
+            service = _service(actor, max_retries=3)
+            start = time.perf_counter()
+            with pytest.raises(httpx.HTTPStatusError):
+                await service.scrape_property(_url(1))
+            elapsed = time.perf_counter() - start
+            await service.close()
+
+        assert actor.requests == 3
+        assert elapsed >= 0.2
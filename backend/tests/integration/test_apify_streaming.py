@@ -0,0 +1,99 @@
+"""
+Integration tests for incremental Apify NDJSON parsing.
+
+Runs IdealistaService against the local stub actor (benchmarks.stub_apify),
+which streams one chunked NDJSON line per listing as it is scraped. Verifies
+that scrape_properties yields listings before the reply is complete, that
+actor-side failures and malformed lines only affect their own listing, that
+the single-URL path works over the stream, and the retry rules (5xx retried,
+4xx not).
+"""
+
+import asyncio
+
+import httpx
+import pytest
+
+from app.config import ApifyConfig
+from app.services.idealista import IdealistaService
+from benchmarks.stub_apify import StubApifyActor
+
+
+def _url(n: int) -> str:
+    return f"https://www.idealista.pt/imovel/{n}/"
+
+
+def _service(actor: StubApifyActor, **config) -> IdealistaService:
+    return IdealistaService(
+        "stub-token",
+        ApifyConfig(standby_url=actor.url, retry_base_delay_seconds=0, **config),
+    )
+
+
+class TestScrapePropertiesStreaming:
+    @pytest.mark.asyncio
+    async def test_first_listing_arrives_before_the_reply_completes(self):
+        urls = [_url(n) for n in range(1, 6)]
+        async with StubApifyActor(listing_latency=0.1, concurrency=1) as actor:
+            service = _service(actor)
+            loop_time = asyncio.get_running_loop().time
+            start = loop_time()
+            arrivals = []
+            async for url, result in service.scrape_properties(urls):
+                arrivals.append((url, result, loop_time() - start))
+            await service.close()
+
+        assert actor.requests == 1
+        assert actor.payloads == [urls]
+        assert [url for url, _, _ in arrivals] == urls
+        assert arrivals[0][1].title == "Apartamento 1"
+        first, last = arrivals[0][2], arrivals[-1][2]
+        assert first < 0.25
+        assert last >= 0.45
+
+    @pytest.mark.asyncio
+    async def test_failures_are_isolated_per_listing(self):
+        urls = [_url(n) for n in range(1, 5)]
+        async with StubApifyActor(
+            failing_ids=frozenset({"2"}), malformed_ids=frozenset({"3"})
+        ) as actor:
+            service = _service(actor)
+            results = {url: result async for url, result in service.scrape_properties(urls)}
+            await service.close()
+
+        assert results[_url(1)].url == _url(1)
+        assert "Blocked by Idealista" in str(results[_url(2)])
+        assert "3" in str(results[_url(3)])
+        assert results[_url(4)].url == _url(4)
+
+    @pytest.mark.asyncio
+    async def test_single_url_path_streams(self):
+        async with StubApifyActor() as actor:
+            service = _service(actor)
+            property_data = await service.scrape_property(_url(7))
+            await service.close()
+
+        assert property_data.title == "Apartamento 7"
+        assert len(property_data.image_urls) == 4
+
+
+class TestStreamRetries:
+    @pytest.mark.asyncio
+    async def test_server_errors_are_retried(self):
+        async with StubApifyActor(status=500) as actor:
+            service = _service(actor, max_retries=2)
+            with pytest.raises(httpx.HTTPStatusError):
+                await service.scrape_property(_url(1))
+            await service.close()
+
+        assert actor.requests == 2
+
+    @pytest.mark.asyncio
+    async def test_client_errors_are_not_retried(self):
+        async with StubApifyActor(status=404) as actor:
+            service = _service(actor, max_retries=3)
+            with pytest.raises(httpx.HTTPStatusError):
+                await service.scrape_property(_url(1))
+            await service.close()
+
+        assert actor.requests == 1
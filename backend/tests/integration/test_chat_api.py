@@ -3,14 +3,21 @@ Integration tests for POST /api/v1/chat.
 
 Tests the chat endpoint at the HTTP level using FastAPI TestClient.
 External services (Supabase, OpenAI) are not called — the tests verify
-auth protection, request validation, and endpoint availability.
+auth protection, request validation, and endpoint availability, plus
+resuming a turn's event stream with Last-Event-ID (fake orchestrator graph).
 """
 
+import asyncio
+import json
+from types import SimpleNamespace
 from unittest.mock import MagicMock, patch
 
 import pytest
 from fastapi.testclient import TestClient
 
+from app.api.v1.chat import stream_chat
+from app.services.single_flight import StreamSingleFlight
+
 
 class TestChatHealthEndpoint:
     def test_chat_health_returns_healthy(self, client: TestClient):
@@ -86,3 +93,62 @@ class TestChatRouterRegistered:
         response = client.get("/openapi.json")
         chat_post = response.json()["paths"]["/api/v1/chat"]["post"]
         assert "chat" in chat_post.get("tags", [])
+
+
+class _FakeOrchestrator:
+    """Orchestrator graph stand-in: two node updates, the second gated."""
+
+    def __init__(self):
+        self.release = asyncio.Event()
+        self.calls = 0
+
+    async def astream(self, initial_state, config=None):
+        self.calls += 1
+        token = {"type": "message", "content": "Olá", "done": False}
+        yield {"agent": {"stream_events": [token]}}
+        await self.release.wait()
+        # stream_events accumulates; only the new entry is sent
+        yield {"agent": {"stream_events": [token, {"type": "message", "content": "", "done": True}]}}
+
+
+class TestChatStreamResume:
+    @staticmethod
+    def _request(graph, runs):
+        state = SimpleNamespace(orchestrator_graph=graph, chat_runs=runs, supabase=None)
+        return SimpleNamespace(app=SimpleNamespace(state=state))
+
+    @pytest.mark.asyncio
+    async def test_reconnect_resumes_the_same_turn(self):
+        graph = _FakeOrchestrator()
+        request = self._request(graph, StreamSingleFlight(grace_seconds=10))
+
+        first = stream_chat("olá", "user-1", None, request)
+        received = [await first.__anext__(), await first.__anext__()]
+        await first.aclose()  # dropped after "thinking" + the first token
+
+        graph.release.set()
+        resumed = stream_chat("olá", "user-1", None, request, last_event_id=received[-1]["id"])
+        received += [raw async for raw in resumed]
+
+        events = [json.loads(raw["data"]) for raw in received]
+        assert [e["type"] for e in events] == ["thinking", "message", "message"]
+        assert events[-1]["done"] is True
+        assert [raw["id"].rsplit(":", 1)[1] for raw in received] == ["1", "2", "3"]
+        assert graph.calls == 1
+
+    @pytest.mark.asyncio
+    async def test_other_users_event_id_starts_a_new_turn(self):
+        graph = _FakeOrchestrator()
+        graph.release.set()
+        request = self._request(graph, StreamSingleFlight(grace_seconds=10))
+
+        first = [raw async for raw in stream_chat("olá", "user-1", None, request)]
+        second = [
+            raw
+            async for raw in stream_chat(
+                "olá", "user-2", None, request, last_event_id=first[-1]["id"]
+            )
+        ]
+
+        assert json.loads(second[0]["data"])["type"] == "thinking"
+        assert graph.calls == 2
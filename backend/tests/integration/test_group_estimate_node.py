@@ -0,0 +1,197 @@
+"""
+Integration tests for group_estimate_node (pipelined grouping + estimation).
+
+Uses the real ImageClassifierService.iter_room_groups() and
+RenovationEstimatorService.analyze_rooms_as_ready() with cluster_room_images,
+analyze_room and analyze_floor_plan patched. Verifies that rooms needing no
+clustering are estimated while bedroom clustering is still running, that the
+node's update matches group_node + estimate_node, and that the graph routes
+through it when image_processing.pipelined_estimation is on.
+"""
+
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from app.config import Settings
+from app.graphs.main_graph import build_renovation_graph, group_estimate_node
+from app.graphs.state import create_initial_state
+from app.models.property import (
+    ImageClassification,
+    PropertyData,
+    RenovationEstimate,
+    RoomCluster,
+    RoomType,
+)
+from app.services.idealista import IdealistaService
+from app.services.image_classifier import ImageClassifierService
+from app.services.renovation_estimator import RenovationEstimatorService
+
+
+def _c(url: str, room_type: RoomType) -> ImageClassification:
+    return ImageClassification(image_url=url, room_type=room_type, room_number=1, confidence=0.9)
+
+
+@pytest.fixture
+def classifier() -> ImageClassifierService:
+    return ImageClassifierService(openai_api_key="sk-fake-key")
+
+
+@pytest.fixture
+def estimator() -> RenovationEstimatorService:
+    return RenovationEstimatorService(openai_api_key="sk-fake-key")
+
+
+@pytest.fixture
+def base_state(sample_property_data: PropertyData) -> dict:
+    """Graph state after classify_node: kitchen, two bedrooms, exterior, floor plan."""
+    return {
+        "url": sample_property_data.url,
+        "property_data": sample_property_data,
+        "classifications": [
+            _c("http://img/kitchen.jpg", RoomType.KITCHEN),
+            _c("http://img/bed1.jpg", RoomType.BEDROOM),
+            _c("http://img/bed2.jpg", RoomType.BEDROOM),
+            _c("http://img/exterior.jpg", RoomType.EXTERIOR),
+            _c("http://img/plan.jpg", RoomType.FLOOR_PLAN),
+        ],
+        "stream_events": [],
+        "current_step": "classified",
+    }
+
+
+def _fallback_analysis(estimator: RenovationEstimatorService):
+    async def _analyze_room(room_type, room_number, images, property_context=None):
+        return estimator._get_fallback_analysis(room_type, room_number, "", images)
+
+    return _analyze_room
+
+
+@pytest.mark.asyncio
+async def test_kitchen_estimated_while_bedrooms_are_clustering(
+    classifier: ImageClassifierService, estimator: RenovationEstimatorService, base_state: dict
+):
+    """Bedroom clustering only returns after the kitchen and floor plan analyses started."""
+    kitchen_started = asyncio.Event()
+    floor_plan_started = asyncio.Event()
+
+    async def _cluster(room_type, urls, image_detail, expected_rooms):
+        await kitchen_started.wait()
+        await floor_plan_started.wait()
+        return [
+            RoomCluster(room_number=1, image_indices=[0], confidence=0.8, visual_cues=""),
+            RoomCluster(room_number=2, image_indices=[1], confidence=0.8, visual_cues=""),
+        ]
+
+    analyze_room = _fallback_analysis(estimator)
+
+    async def _analyze_room(room_type, room_number, images, property_context=None):
+        if room_type == RoomType.KITCHEN:
+            kitchen_started.set()
+        return await analyze_room(room_type, room_number, images, property_context)
+
+    async def _floor_plan(urls, property_data, prefetch=None):
+        floor_plan_started.set()
+        return None
+
+    with (
+        patch.object(classifier, "cluster_room_images", side_effect=_cluster),
+        patch.object(estimator, "analyze_room", side_effect=_analyze_room),
+        patch.object(estimator, "analyze_floor_plan", side_effect=_floor_plan),
+    ):
+        # A group -> estimate barrier would deadlock here
+        result = await asyncio.wait_for(
+            group_estimate_node(
+                base_state, classifier_service=classifier, estimator_service=estimator
+            ),
+            timeout=2,
+        )
+
+    assert set(result["grouped_images"]) == {"cozinha_1", "quarto_1", "quarto_2"}
+    assert result["floor_plan_urls"] == ["http://img/plan.jpg"]
+    assert len(result["room_analyses"]) == 3
+    assert result["current_step"] == "estimated"
+
+
+@pytest.mark.asyncio
+async def test_events_cover_grouping_and_estimation(
+    classifier: ImageClassifierService, estimator: RenovationEstimatorService, base_state: dict
+):
+    with (
+        patch.object(
+            classifier,
+            "cluster_room_images",
+            new_callable=AsyncMock,
+            return_value=[
+                RoomCluster(room_number=1, image_indices=[0, 1], confidence=0.8, visual_cues="")
+            ],
+        ),
+        patch.object(estimator, "analyze_room", side_effect=_fallback_analysis(estimator)),
+        patch.object(estimator, "analyze_floor_plan", new_callable=AsyncMock, return_value=None),
+    ):
+        result = await group_estimate_node(
+            base_state, classifier_service=classifier, estimator_service=estimator
+        )
+
+    events = result["stream_events"]
+    grouped = [e for e in events if e.step == 3 and e.data and "rooms" in e.data]
+    assert grouped[0].data == {"num_rooms": 2, "rooms": ["cozinha_1", "quarto_1"]}
+    progress = [e.data for e in events if e.type == "progress"]
+    assert [p["current"] for p in progress] == [1, 2]
+    assert progress[-1]["total"] == 2
+    assert events[-1].message == "Análise completa de 2 divisões"
+
+
+@pytest.mark.asyncio
+async def test_skips_on_error_state(
+    classifier: ImageClassifierService, estimator: RenovationEstimatorService, base_state: dict
+):
+    with patch.object(classifier, "iter_room_groups") as mock_iter:
+        result = await group_estimate_node(
+            {**base_state, "error": "previous step failed"},
+            classifier_service=classifier,
+            estimator_service=estimator,
+        )
+
+    mock_iter.assert_not_called()
+    assert result == {}
+
+
+@pytest.mark.asyncio
+async def test_graph_routes_through_group_estimate_when_enabled(
+    classifier: ImageClassifierService, estimator: RenovationEstimatorService, base_state: dict
+):
+    idealista = AsyncMock(spec=IdealistaService)
+    idealista.scrape_property.return_value = base_state["property_data"]
+    settings = Settings(openai_api_key="sk-test", use_base64_images=False)
+    settings.image_processing.pipelined_estimation = True
+
+    with (
+        patch.object(
+            classifier,
+            "classify_images",
+            new_callable=AsyncMock,
+            return_value=base_state["classifications"][:1],
+        ),
+        patch.object(estimator, "analyze_room", side_effect=_fallback_analysis(estimator)),
+        patch.object(estimator, "generate_summary", new_callable=AsyncMock, return_value="ok"),
+        patch.object(
+            estimator,
+            "create_estimate",
+            MagicMock(
+                return_value=RenovationEstimate(
+                    property_url=base_state["url"],
+                    total_cost_min=0,
+                    total_cost_max=0,
+                    overall_confidence=0.5,
+                )
+            ),
+        ),
+    ):
+        graph = build_renovation_graph(settings, idealista, classifier, estimator)
+        nodes = []
+        async for chunk in graph.astream(create_initial_state(base_state["url"])):
+            nodes.extend(chunk)
+
+    assert nodes == ["scrape", "classify", "group_estimate", "summarize"]
@@ -152,3 +152,33 @@ class TestScrapeNodeTagRemapping:
         # image_tags should be the empty dict (falsy branch in the remap logic)
         assert result["image_tags"] == {}
         assert result["image_urls"] == [base64_uri]
+
+
+class TestScrapeNodePrefetched:
+    """A listing already in state (batch scrape) is not fetched again."""
+
+    @pytest.mark.asyncio
+    async def test_skips_apify_when_property_data_is_set(self, base_state: dict):
+        prop = _make_property(["https://cdn.idealista.pt/img1.jpg"], {})
+        mock_idealista = AsyncMock(spec=IdealistaService)
+
+        result = await scrape_node(
+            {**base_state, "property_data": prop}, idealista_service=mock_idealista
+        )
+
+        mock_idealista.scrape_property.assert_not_awaited()
+        assert result["property_data"] is prop
+        assert result["image_urls"] == prop.image_urls
+
+
+class TestScrapeNodeMaxAge:
+    """state["scrape_max_age"] reaches the scrape cache lookup."""
+
+    @pytest.mark.asyncio
+    async def test_passes_max_age_to_the_scraper(self, base_state: dict):
+        mock_idealista = AsyncMock(spec=IdealistaService)
+        mock_idealista.scrape_property.return_value = _make_property([], {})
+
+        await scrape_node({**base_state, "scrape_max_age": 0}, idealista_service=mock_idealista)
+
+        mock_idealista.scrape_property.assert_awaited_once_with(base_state["url"], max_age=0)
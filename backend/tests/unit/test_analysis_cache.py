@@ -0,0 +1,269 @@
+"""
+Tests for the whole-analysis result cache.
+
+Covers the listing fingerprint and pipeline version, hits re-bound to the
+fresh scrape, stale entries after a listing or pipeline change, skipping
+degraded estimates, invalidation across tiers, SQLite persistence and
+promotion (keeping the entry's age), closing, the Supabase tier's TTL and
+created_at, and the config factory.
+"""
+
+import sqlite3
+from datetime import datetime, timedelta, timezone
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from app.config import AnalysisCacheConfig, Settings
+from app.models.property import (
+    PropertyData,
+    RenovationEstimate,
+    RoomAnalysis,
+    RoomCondition,
+    RoomType,
+)
+from app.services.analysis_cache import (
+    AnalysisCache,
+    SupabaseBackend,
+    build_analysis_cache,
+    listing_fingerprint,
+    pipeline_version,
+)
+from app.services.classification_cache import InMemoryLRUBackend, SQLiteBackend
+
+URL = "https://www.idealista.pt/imovel/12345678/"
+IMAGES = [f"https://cdn.idealista.pt/img{i}.jpg" for i in range(3)]
+
+
+def _listing(**overrides) -> PropertyData:
+    fields = {
+        "url": URL,
+        "title": "T2 Arroios",
+        "price": 185000.0,
+        "description": "Apartamento T2",
+        "image_urls": IMAGES,
+    }
+    return PropertyData(**{**fields, **overrides})
+
+
+def _estimate(confidence: float = 0.8) -> RenovationEstimate:
+    room = RoomAnalysis(
+        room_type=RoomType.KITCHEN,
+        room_number=1,
+        room_label="Cozinha",
+        images=IMAGES[:1],
+        condition=RoomCondition.POOR,
+        cost_min=4000.0,
+        cost_max=8000.0,
+        confidence=confidence,
+    )
+    return RenovationEstimate(
+        property_url=URL,
+        property_data=_listing(),
+        room_analyses=[room],
+        total_cost_min=4000.0,
+        total_cost_max=8000.0,
+        overall_confidence=confidence,
+        summary="Cozinha a remodelar",
+    )
+
+
+class TestFingerprint:
+    def test_image_order_does_not_matter(self):
+        assert listing_fingerprint(_listing()) == listing_fingerprint(
+            _listing(image_urls=list(reversed(IMAGES)))
+        )
+
+    @pytest.mark.parametrize(
+        "change",
+        [
+            {"price": 175000.0},
+            {"image_urls": IMAGES + ["https://cdn.idealista.pt/new.jpg"]},
+            {"description": "Apartamento T2 remodelado"},
+        ],
+    )
+    def test_listing_changes_change_fingerprint(self, change):
+        assert listing_fingerprint(_listing()) != listing_fingerprint(_listing(**change))
+
+    def test_title_does_not_change_fingerprint(self):
+        assert listing_fingerprint(_listing()) == listing_fingerprint(_listing(title="Novo"))
+
+
+class TestPipelineVersion:
+    def test_stable_for_same_settings(self):
+        settings = Settings(openai_api_key="sk-test")
+        assert pipeline_version(settings) == pipeline_version(Settings(openai_api_key="sk-test"))
+
+    def test_model_change_changes_version(self):
+        base = Settings(openai_api_key="sk-test")
+        other = Settings(openai_api_key="sk-test", openai_vision_model="gpt-4.1")
+        assert pipeline_version(base) != pipeline_version(other)
+
+    def test_prompt_change_changes_version(self):
+        settings = Settings(openai_api_key="sk-test")
+        before = pipeline_version(settings)
+        with patch("app.prompts.renovation.SUMMARY_PROMPT", "outro prompt"):
+            assert pipeline_version(settings) != before
+
+
+class TestAnalysisCache:
+    @pytest.mark.asyncio
+    async def test_hit_rebinds_url_and_fresh_listing(self):
+        cache = AnalysisCache([InMemoryLRUBackend()], version="v1")
+        await cache.set(_listing(), _estimate())
+
+        other_url = URL + "?utm_source=share"
+        fresh = _listing(title="Título atualizado")
+        hit = await cache.get(other_url, fresh)
+
+        assert hit is not None
+        assert hit.property_url == other_url
+        assert hit.property_data == fresh
+        assert hit.total_cost_max == 8000.0
+        assert hit.room_analyses[0].room_label == "Cozinha"
+        assert cache.stats()["hits"] == 1
+
+    @pytest.mark.asyncio
+    async def test_changed_listing_is_stale(self):
+        cache = AnalysisCache([InMemoryLRUBackend()], version="v1")
+        await cache.set(_listing(), _estimate())
+
+        assert await cache.get(URL, _listing(price=150000.0)) is None
+        assert cache.stats()["stale"] == 1
+        assert cache.stats()["misses"] == 1
+
+    @pytest.mark.asyncio
+    async def test_pipeline_version_change_is_stale(self):
+        backend = InMemoryLRUBackend()
+        await AnalysisCache([backend], version="v1").set(_listing(), _estimate())
+
+        assert await AnalysisCache([backend], version="v2").get(URL, _listing()) is None
+
+    @pytest.mark.asyncio
+    async def test_degraded_estimate_not_stored(self):
+        cache = AnalysisCache([InMemoryLRUBackend()], version="v1")
+        await cache.set(_listing(), _estimate(confidence=0.3))
+
+        assert await cache.get(URL, _listing()) is None
+        assert cache.stats()["stores"] == 0
+
+    @pytest.mark.asyncio
+    async def test_invalidate_clears_every_tier(self, tmp_path):
+        memory = InMemoryLRUBackend()
+        disk = SQLiteBackend(str(tmp_path / "a.sqlite3"), table="analysis_cache")
+        cache = AnalysisCache([memory, disk], version="v1")
+        await cache.set(_listing(), _estimate())
+
+        await cache.invalidate("12345678")
+
+        assert await memory.get("12345678") is None
+        assert await disk.get("12345678") is None
+        assert await cache.get(URL, _listing()) is None
+
+    @pytest.mark.asyncio
+    async def test_sqlite_hit_survives_restart_and_is_promoted(self, tmp_path):
+        path = str(tmp_path / "a.sqlite3")
+        await AnalysisCache(
+            [SQLiteBackend(path, table="analysis_cache")], version="v1"
+        ).set(_listing(), _estimate())
+
+        memory = InMemoryLRUBackend()
+        cache = AnalysisCache([memory, SQLiteBackend(path, table="analysis_cache")], "v1")
+
+        assert await cache.get(URL, _listing()) is not None
+        assert len(memory) == 1
+
+    @pytest.mark.asyncio
+    async def test_promotion_keeps_the_original_age(self, tmp_path):
+        path = str(tmp_path / "a.sqlite3")
+        with patch("app.services.sqlite_store.time.time", return_value=1000.0):
+            await AnalysisCache(
+                [SQLiteBackend(path, ttl_seconds=60, table="analysis_cache")], version="v1"
+            ).set(_listing(), _estimate())
+
+        memory = InMemoryLRUBackend(ttl_seconds=60)
+        disk = SQLiteBackend(path, ttl_seconds=60, table="analysis_cache")
+        cache = AnalysisCache([memory, disk], version="v1")
+        with (
+            patch("app.services.sqlite_store.time.time", return_value=1050.0),
+            patch("app.services.classification_cache.time.monotonic", return_value=500.0),
+        ):
+            assert await cache.get(URL, _listing()) is not None
+        # Expires 60s after the disk write, not 60s after the promotion
+        with patch("app.services.classification_cache.time.monotonic", return_value=511.0):
+            assert await memory.get("12345678") is None
+
+    @pytest.mark.asyncio
+    async def test_backend_errors_degrade_to_miss(self):
+        broken = AsyncMock()
+        broken.get_with_age.side_effect = RuntimeError("db down")
+        broken.set.side_effect = RuntimeError("db down")
+        cache = AnalysisCache([broken], version="v1")
+
+        await cache.set(_listing(), _estimate())
+        assert await cache.get(URL, _listing()) is None
+
+    @pytest.mark.asyncio
+    async def test_failed_promotion_still_returns_the_hit(self):
+        disk = InMemoryLRUBackend()
+        await AnalysisCache([disk], version="v1").set(_listing(), _estimate())
+        broken = AsyncMock()
+        broken.get_with_age.return_value = None
+        broken.set.side_effect = RuntimeError("db down")
+        cache = AnalysisCache([broken, disk], version="v1")
+
+        assert await cache.get(URL, _listing()) is not None
+        assert cache.stats()["hits"] == 1
+
+    def test_close_releases_the_sqlite_connection(self, tmp_path):
+        disk = SQLiteBackend(str(tmp_path / "a.sqlite3"), table="analysis_cache")
+        AnalysisCache([InMemoryLRUBackend(), disk], version="v1").close()
+
+        with pytest.raises(sqlite3.ProgrammingError):
+            disk.store._conn.execute("SELECT 1")
+
+
+class TestSupabaseBackend:
+    @pytest.mark.asyncio
+    async def test_expired_row_is_a_miss(self):
+        old = (datetime.now(timezone.utc) - timedelta(hours=2)).isoformat()
+        row = {"value": {"fingerprint": "x"}, "created_at": old}
+        backend = SupabaseBackend(client=object(), ttl_seconds=3600)
+
+        with patch(
+            "app.services.analysis_cache.db.get_analysis_cache_entry",
+            AsyncMock(return_value=row),
+        ):
+            assert await backend.get("12345678") is None
+            backend.ttl_seconds = 3 * 3600
+            assert await backend.get("12345678") == {"fingerprint": "x"}
+
+    @pytest.mark.asyncio
+    async def test_set_backdates_created_at_by_age(self):
+        backend = SupabaseBackend(client=object(), ttl_seconds=3600)
+        upsert = AsyncMock()
+
+        with patch("app.services.analysis_cache.db.upsert_analysis_cache_entry", upsert):
+            await backend.set("12345678", {"fingerprint": "x"}, age=1800)
+
+        created_at = upsert.await_args.args[3]
+        age = (datetime.now(timezone.utc) - created_at).total_seconds()
+        assert 1800 <= age < 1810
+
+
+class TestBuildAnalysisCache:
+    def test_disabled_returns_none(self):
+        assert build_analysis_cache(AnalysisCacheConfig(enabled=False), "v1") is None
+
+    def test_sqlite_backend_layers_memory_in_front(self, tmp_path):
+        config = AnalysisCacheConfig(backend="sqlite", sqlite_path=str(tmp_path / "a.sqlite3"))
+        cache = build_analysis_cache(config, "v1")
+        assert [type(b) for b in cache.backends] == [InMemoryLRUBackend, SQLiteBackend]
+
+    def test_supabase_without_client_uses_memory_only(self):
+        cache = build_analysis_cache(AnalysisCacheConfig(backend="supabase"), "v1")
+        assert [type(b) for b in cache.backends] == [InMemoryLRUBackend]
+
+    def test_unknown_backend_raises(self):
+        with pytest.raises(ValueError):
+            build_analysis_cache(AnalysisCacheConfig(backend="redis"), "v1")
@@ -0,0 +1,207 @@
+"""
+Tests for background analysis jobs.
+
+Drives AnalysisJobManager with a fake compiled graph: event replay for
+attached clients, priority ordering, the worker-pool concurrency cap,
+admission control, failures (including job store errors), and SQLite
+persistence across a restart (finished jobs replayable, interrupted ones
+re-queued).
+"""
+
+import asyncio
+
+import pytest
+
+from app.config import AnalysisJobsConfig
+from app.models.property import RenovationEstimate
+from app.services.analysis_jobs import AnalysisJobManager, JobQueueFullError, JobStatus
+
+
+def _url(n: int) -> str:
+    return f"https://www.idealista.pt/imovel/{n}/"
+
+
+class FakeGraph:
+    """Stands in for the compiled renovation graph's astream()."""
+
+    def __init__(self, gate: asyncio.Event | None = None, fail_urls: frozenset[str] = frozenset()):
+        self.gate = gate
+        self.fail_urls = fail_urls
+        self.started: list[str] = []
+        self.running = 0
+        self.max_running = 0
+
+    async def astream(self, initial_state, config=None, stream_mode=None):
+        url = initial_state["url"]
+        self.started.append(url)
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        try:
+            yield "custom", {"type": "status", "message": "A obter dados do Idealista...", "step": 1}
+            if self.gate is not None:
+                await self.gate.wait()
+            await asyncio.sleep(0)
+            if url in self.fail_urls:
+                raise RuntimeError("apify down")
+            estimate = RenovationEstimate(
+                property_url=url, total_cost_min=1, total_cost_max=2, overall_confidence=0.8
+            )
+            yield "custom", {"type": "result", "message": "Estimativa completa", "step": 5}
+            yield "updates", {"summarize": {"estimate": estimate, "stream_events": []}}
+        finally:
+            self.running -= 1
+
+
+def _config(tmp_path=None, **overrides) -> AnalysisJobsConfig:
+    fields = {"workers": 2, "backend": "memory"}
+    if tmp_path is not None:
+        fields.update(backend="sqlite", sqlite_path=str(tmp_path / "jobs.sqlite3"))
+    return AnalysisJobsConfig(**{**fields, **overrides})
+
+
+async def _finished(manager: AnalysisJobManager, job_id: str):
+    job = await manager.get(job_id)
+    await asyncio.wait_for(job.log.wait(), timeout=5)
+    return await manager.get(job_id)
+
+
+class TestAnalysisJobManager:
+    @pytest.mark.asyncio
+    async def test_job_runs_and_log_replays_to_late_clients(self):
+        manager = AnalysisJobManager(_config(), FakeGraph())
+        await manager.start()
+        try:
+            job = await manager.submit(_url(1), "user-1")
+            assert job.status == JobStatus.QUEUED
+
+            done = await _finished(manager, job.id)
+            assert done.status == JobStatus.SUCCEEDED
+            assert done.estimate["total_cost_max"] == 2
+
+            # A client attaching after completion replays the whole log from the store
+            replay = [e async for e in (await manager.get(job.id)).log.subscribe()]
+            assert [e["type"] for e in replay] == ["status", "result"]
+            assert manager.stats()["completed"] == 1
+        finally:
+            await manager.stop()
+
+    @pytest.mark.asyncio
+    async def test_higher_priority_runs_first(self):
+        gate = asyncio.Event()
+        graph = FakeGraph(gate)
+        manager = AnalysisJobManager(_config(workers=1), graph)
+        await manager.start()
+        try:
+            blocker = await manager.submit(_url(1))
+            await asyncio.sleep(0.01)  # worker is now busy with the blocker
+            background = await manager.submit(_url(2), priority=9)
+            urgent = await manager.submit(_url(3), priority=0)
+            gate.set()
+
+            for job in (blocker, background, urgent):
+                await _finished(manager, job.id)
+            assert graph.started == [_url(1), _url(3), _url(2)]
+        finally:
+            await manager.stop()
+
+    @pytest.mark.asyncio
+    async def test_worker_pool_caps_concurrent_analyses(self):
+        gate = asyncio.Event()
+        graph = FakeGraph(gate)
+        manager = AnalysisJobManager(_config(workers=2), graph)
+        await manager.start()
+        try:
+            jobs = [await manager.submit(_url(n)) for n in range(1, 6)]
+            await asyncio.sleep(0.01)
+            assert graph.running == 2
+            assert manager.stats()["queued"] == 3
+
+            gate.set()
+            for job in jobs:
+                await _finished(manager, job.id)
+            assert graph.max_running == 2
+        finally:
+            await manager.stop()
+
+    @pytest.mark.asyncio
+    async def test_admission_control_rejects_when_queue_full(self):
+        manager = AnalysisJobManager(_config(max_queued=2), FakeGraph())
+        # Workers not started: everything stays queued
+        await manager.submit(_url(1))
+        await manager.submit(_url(2))
+
+        with pytest.raises(JobQueueFullError):
+            await manager.submit(_url(3))
+        assert manager.stats()["rejected"] == 1
+
+    @pytest.mark.asyncio
+    async def test_failed_run_is_recorded_with_error_event(self):
+        manager = AnalysisJobManager(_config(), FakeGraph(fail_urls=frozenset({_url(1)})))
+        await manager.start()
+        try:
+            job = await manager.submit(_url(1))
+            done = await _finished(manager, job.id)
+
+            assert done.status == JobStatus.FAILED
+            assert done.error == "apify down"
+            assert done.events[-1]["type"] == "error"
+        finally:
+            await manager.stop()
+
+    @pytest.mark.asyncio
+    async def test_store_error_fails_the_job_and_closes_its_log(self):
+        manager = AnalysisJobManager(_config(), FakeGraph())
+        save = manager._save
+
+        async def _flaky_save(job):
+            if job.status == JobStatus.RUNNING:
+                raise OSError("disk full")
+            await save(job)
+
+        manager._save = _flaky_save
+        await manager.start()
+        try:
+            job = await manager.submit(_url(1))
+            done = await _finished(manager, job.id)
+
+            assert done.status == JobStatus.FAILED
+            assert done.error == "disk full"
+            assert done.events[-1]["type"] == "error"
+            assert manager.stats()["failed"] == 1
+            assert manager.stats()["running"] == 0
+        finally:
+            await manager.stop()
+
+    @pytest.mark.asyncio
+    async def test_restart_requeues_interrupted_and_keeps_finished(self, tmp_path):
+        gate = asyncio.Event()
+        first = AnalysisJobManager(_config(tmp_path, workers=1), FakeGraph(gate))
+        await first.start()
+        finished_id = None
+        try:
+            gate.set()
+            finished_id = (await first.submit(_url(1))).id
+            await _finished(first, finished_id)
+            gate.clear()
+            running = await first.submit(_url(2))
+            queued = await first.submit(_url(3))
+            await asyncio.sleep(0.01)
+        finally:
+            await first.stop()  # "crash" with one running and one queued job
+
+        graph = FakeGraph()
+        second = AnalysisJobManager(_config(tmp_path, workers=1), graph)
+        await second.start()
+        try:
+            for job_id in (running.id, queued.id):
+                done = await _finished(second, job_id)
+                assert done.status == JobStatus.SUCCEEDED
+            assert done.attempts == 1
+            assert (await second.get(running.id)).attempts == 2
+            assert graph.started == [_url(2), _url(3)]
+
+            replay = await second.get(finished_id)
+            assert replay.status == JobStatus.SUCCEEDED
+            assert [e["type"] async for e in replay.log.subscribe()] == ["status", "result"]
+        finally:
+            await second.stop()
@@ -0,0 +1,196 @@
+"""
+Tests for multi-listing batch analyses.
+
+Drives analyze_batch with a fake compiled graph and a mocked Idealista
+service: duplicate listings, the single scrape request feeding every graph
+run, listings starting while the scrape still streams, completion-order
+streaming, the listing concurrency cap, per-listing failures and a broken
+scrape stream, and cancellation when the client leaves.
+"""
+
+import asyncio
+from unittest.mock import MagicMock
+
+import pytest
+
+from app.config import BatchAnalysisConfig
+from app.models.property import PropertyData, RenovationEstimate
+from app.services.batch_analysis import analyze_batch, dedupe_listings
+from app.services.idealista import IdealistaService
+from app.services.single_flight import StreamSingleFlight
+
+
+def _url(n: int) -> str:
+    return f"https://www.idealista.pt/imovel/{n}/"
+
+
+class FakeGraph:
+    """Stands in for the compiled renovation graph's astream()."""
+
+    def __init__(self, delays: dict[str, float] | None = None):
+        self.delays = delays or {}
+        self.started: list[str] = []
+        self.property_data: dict[str, PropertyData | None] = {}
+        self.running = 0
+        self.max_running = 0
+        self.cancelled = 0
+
+    async def astream(self, initial_state, config=None, stream_mode=None):
+        url = initial_state["url"]
+        self.started.append(url)
+        self.property_data[url] = initial_state["property_data"]
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        try:
+            await asyncio.sleep(self.delays.get(url, 0))
+            estimate = RenovationEstimate(
+                property_url=url, total_cost_min=1, total_cost_max=2, overall_confidence=0.8
+            )
+            yield "updates", {"summarize": {"estimate": estimate, "stream_events": []}}
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        finally:
+            self.running -= 1
+
+
+def _idealista(
+    failing: frozenset[str] = frozenset(), broken_after: int | None = None
+) -> MagicMock:
+    """Idealista stand-in whose scrape_properties streams one listing at a time."""
+
+    async def _scrape_properties(urls):
+        idealista.scraped.append(list(urls))
+        for n, url in enumerate(urls):
+            if n == broken_after:
+                raise RuntimeError("apify down")
+            await asyncio.sleep(0.01)
+            yield url, ValueError("bloqueado") if url in failing else PropertyData(url=url)
+
+    idealista = MagicMock(spec=IdealistaService)
+    idealista.scraped = []
+    idealista.scrape_properties = _scrape_properties
+    return idealista
+
+
+async def _collect(urls, graph, idealista, max_concurrent_listings=8) -> list[dict]:
+    return [
+        event
+        async for event in analyze_batch(
+            urls,
+            "user-1",
+            graph,
+            idealista,
+            StreamSingleFlight(),
+            BatchAnalysisConfig(max_concurrent_listings=max_concurrent_listings),
+        )
+    ]
+
+
+class TestDedupeListings:
+    def test_keeps_first_url_per_property(self):
+        urls = [_url(1), _url(2), _url(1) + "?utm=x", _url(2)]
+        assert dedupe_listings(urls) == ([_url(1), _url(2)], 2)
+
+
+class TestAnalyzeBatch:
+    @pytest.mark.asyncio
+    async def test_one_scrape_feeds_every_listing(self):
+        graph, idealista = FakeGraph(), _idealista()
+        urls = [_url(1), _url(2), _url(1) + "?utm=x", _url(3)]
+
+        events = await _collect(urls, graph, idealista)
+
+        assert idealista.scraped == [[_url(1), _url(2), _url(3)]]
+        assert sorted(graph.started) == [_url(1), _url(2), _url(3)]
+        assert all(data.url == url for url, data in graph.property_data.items())
+
+        assert events[0]["data"] == {"listings": 3, "duplicates": 1}
+        results = [e for e in events if e["type"] == "result"]
+        assert [e["data"]["current"] for e in results] == [1, 2, 3]
+        assert {e["data"]["property_id"] for e in results} == {"1", "2", "3"}
+        assert results[0]["data"]["estimate"]["total_cost_max"] == 2
+        summary = events[-1]["data"]
+        assert summary["completed"] == 3
+        assert summary["failed"] == 0
+        assert summary["listings_per_minute"] > 0
+
+    @pytest.mark.asyncio
+    async def test_results_stream_in_completion_order_under_the_cap(self):
+        urls = [_url(n) for n in range(1, 7)]
+        graph = FakeGraph(delays={_url(1): 0.1})
+
+        events = await _collect(urls, graph, _idealista(), max_concurrent_listings=2)
+
+        finished = [e["data"]["url"] for e in events if e["type"] == "result"]
+        assert finished[-1] == _url(1)
+        assert graph.max_running == 2
+        # Listings start in submission order
+        assert graph.started == urls
+
+    @pytest.mark.asyncio
+    async def test_scrape_failures_are_per_listing(self):
+        graph = FakeGraph()
+        events = await _collect(
+            [_url(1), _url(2)], graph, _idealista(failing=frozenset({_url(2)}))
+        )
+
+        assert graph.started == [_url(1)]
+        error = next(e for e in events if e["type"] == "error")
+        assert error["data"]["url"] == _url(2)
+        assert "bloqueado" in error["message"]
+        assert events[-1]["data"]["failed"] == 1
+
+    @pytest.mark.asyncio
+    async def test_listings_start_before_the_scrape_finishes(self):
+        urls = [_url(n) for n in range(1, 5)]
+        graph = FakeGraph()
+        first_result_at = None
+        scrape_done_at = None
+        idealista = _idealista()
+        scrape_properties = idealista.scrape_properties
+
+        async def _timed_scrape(listings):
+            nonlocal scrape_done_at
+            async for item in scrape_properties(listings):
+                yield item
+            scrape_done_at = asyncio.get_running_loop().time()
+
+        idealista.scrape_properties = _timed_scrape
+        async for event in analyze_batch(
+            urls, "user-1", graph, idealista, StreamSingleFlight(), BatchAnalysisConfig()
+        ):
+            if event["type"] == "result" and first_result_at is None:
+                first_result_at = asyncio.get_running_loop().time()
+
+        assert first_result_at < scrape_done_at
+
+    @pytest.mark.asyncio
+    async def test_broken_scrape_stream_fails_the_remaining_listings(self):
+        graph = FakeGraph()
+
+        events = await _collect(
+            [_url(1), _url(2), _url(3)], graph, _idealista(broken_after=1)
+        )
+
+        assert graph.started == [_url(1)]
+        errors = [e for e in events if e["type"] == "error"]
+        assert {e["data"]["url"] for e in errors} == {_url(2), _url(3)}
+        assert all("apify down" in e["message"] for e in errors)
+
+    @pytest.mark.asyncio
+    async def test_closing_the_stream_cancels_running_listings(self):
+        urls = [_url(1), _url(2), _url(3)]
+        graph = FakeGraph(delays={_url(1): 0.1, _url(2): 10, _url(3): 10})
+        stream = analyze_batch(
+            urls, "user-1", graph, _idealista(), StreamSingleFlight(), BatchAnalysisConfig()
+        )
+
+        async for event in stream:
+            if event["type"] == "result":
+                break
+        await stream.aclose()
+        await asyncio.sleep(0)
+
+        assert graph.cancelled == 2
+        assert graph.running == 0
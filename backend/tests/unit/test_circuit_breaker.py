@@ -0,0 +1,128 @@
+"""
+Tests for the circuit breaker, retry budget and decorrelated jitter.
+
+Covers the closed → open → half-open → closed/open transitions, probe slots
+and abandoned probes, the sliding-window retry budget and the jitter bounds.
+Open periods use reset_seconds of 0 or a few milliseconds instead of
+patching the clock.
+"""
+
+import time
+
+import pytest
+
+from app.services.circuit_breaker import (
+    CircuitBreaker,
+    CircuitOpenError,
+    RetryBudget,
+    decorrelated_jitter,
+)
+
+
+def _tripped(reset_seconds: float = 60.0) -> CircuitBreaker:
+    breaker = CircuitBreaker("Apify", failure_threshold=2, reset_seconds=reset_seconds)
+    breaker.record_failure()
+    breaker.record_failure()
+    return breaker
+
+
+class TestCircuitBreaker:
+    def test_opens_after_consecutive_failures(self):
+        breaker = CircuitBreaker("Apify", failure_threshold=3)
+        breaker.record_failure()
+        breaker.record_failure()
+        assert breaker.state == "closed"
+
+        breaker.record_failure()
+
+        assert breaker.state == "open"
+        assert breaker.stats()["opened"] == 1
+
+    def test_success_resets_the_failure_count(self):
+        breaker = CircuitBreaker("Apify", failure_threshold=2)
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+        assert breaker.state == "closed"
+
+    def test_open_circuit_fails_fast(self):
+        breaker = _tripped()
+
+        with pytest.raises(CircuitOpenError, match="Apify") as excinfo:
+            breaker.before_call()
+
+        assert 0 < excinfo.value.retry_in <= 60
+        assert breaker.stats()["rejected"] == 1
+
+    def test_half_open_admits_one_probe(self):
+        breaker = _tripped(reset_seconds=0)
+
+        assert breaker.state == "half_open"
+        breaker.before_call()
+        with pytest.raises(CircuitOpenError):
+            breaker.before_call()
+
+    def test_successful_probe_closes(self):
+        breaker = _tripped(reset_seconds=0)
+        breaker.before_call()
+
+        breaker.record_success()
+
+        assert breaker.state == "closed"
+        breaker.before_call()
+
+    def test_failed_probe_reopens(self):
+        breaker = _tripped(reset_seconds=0.05)
+        time.sleep(0.06)
+        breaker.before_call()
+
+        breaker.record_failure()
+
+        assert breaker.state == "open"
+        assert breaker.stats()["opened"] == 2
+
+    def test_abandoned_probe_frees_its_slot(self):
+        breaker = _tripped(reset_seconds=0)
+        breaker.before_call()
+
+        breaker.record_abandoned()
+
+        breaker.before_call()
+
+
+class TestRetryBudget:
+    def test_min_retries_without_traffic(self):
+        budget = RetryBudget(ratio=0.5, min_retries=2, window_seconds=60)
+        assert budget.try_retry()
+        assert budget.try_retry()
+        assert not budget.try_retry()
+        assert budget.stats()["exhausted"] == 1
+
+    def test_grows_with_first_attempts(self):
+        budget = RetryBudget(ratio=0.5, min_retries=0, window_seconds=60)
+        for _ in range(4):
+            budget.record_request()
+
+        granted = sum(budget.try_retry() for _ in range(10))
+
+        assert granted == 2
+
+    def test_old_retries_leave_the_window(self):
+        budget = RetryBudget(ratio=0, min_retries=1, window_seconds=0.05)
+        assert budget.try_retry()
+        assert not budget.try_retry()
+        time.sleep(0.06)
+        assert budget.try_retry()
+
+
+class TestDecorrelatedJitter:
+    def test_stays_within_base_and_three_times_previous(self):
+        delays = [decorrelated_jitter(1.0, 2.0, 100.0) for _ in range(200)]
+        assert all(1.0 <= d <= 6.0 for d in delays)
+        assert len(set(delays)) > 1
+
+    def test_capped(self):
+        assert all(decorrelated_jitter(1.0, 50.0, 5.0) <= 5.0 for _ in range(50))
+
+    def test_zero_base_means_no_wait(self):
+        assert decorrelated_jitter(0, 0, 10.0) == 0
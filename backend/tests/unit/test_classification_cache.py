@@ -0,0 +1,255 @@
+"""
+Tests for the content-addressed classification cache.
+
+Covers key derivation (content hash vs URL), the in-memory LRU and SQLite
+backends (TTL and size eviction), tier promotion keeping the entry's age,
+hit/miss statistics, closing, the config factory, and classify_images()
+skipping GPT for cached images.
+"""
+
+import base64
+import sqlite3
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from app.config import ClassificationCacheConfig
+from app.models.property import ImageClassification, RoomType
+from app.services.classification_cache import (
+    ClassificationCache,
+    InMemoryLRUBackend,
+    SQLiteBackend,
+    build_classification_cache,
+    classification_cache_key,
+)
+from app.services.image_classifier import ImageClassifierService
+
+MODEL = "gpt-4o-mini"
+
+
+def _data_uri(payload: bytes) -> str:
+    return "data:image/jpeg;base64," + base64.b64encode(payload).decode()
+
+
+def _classification(url: str, confidence: float = 0.8) -> ImageClassification:
+    return ImageClassification(
+        image_url=url, room_type=RoomType.KITCHEN, room_number=2, confidence=confidence
+    )
+
+
+class TestCacheKey:
+    def test_same_bytes_same_key(self):
+        """The same photo downloaded twice hashes identically."""
+        assert classification_cache_key(_data_uri(b"abc"), MODEL) == classification_cache_key(
+            _data_uri(b"abc"), MODEL
+        )
+
+    def test_different_bytes_different_key(self):
+        assert classification_cache_key(_data_uri(b"abc"), MODEL) != classification_cache_key(
+            _data_uri(b"abd"), MODEL
+        )
+
+    def test_url_key_when_not_base64(self):
+        url = "https://cdn.idealista.pt/img1.jpg"
+        assert classification_cache_key(url, MODEL) == classification_cache_key(url, MODEL)
+        assert classification_cache_key(url, MODEL) != classification_cache_key(
+            "https://cdn.idealista.pt/img2.jpg", MODEL
+        )
+
+    def test_model_is_part_of_key(self):
+        uri = _data_uri(b"abc")
+        assert classification_cache_key(uri, "gpt-4o-mini") != classification_cache_key(
+            uri, "gpt-4o"
+        )
+
+
+class TestInMemoryLRUBackend:
+    @pytest.mark.asyncio
+    async def test_evicts_least_recently_used(self):
+        backend = InMemoryLRUBackend(max_entries=2)
+        await backend.set("a", {"v": 1})
+        await backend.set("b", {"v": 2})
+        await backend.get("a")  # "b" is now least recently used
+        await backend.set("c", {"v": 3})
+
+        assert await backend.get("b") is None
+        assert await backend.get("a") == {"v": 1}
+        assert len(backend) == 2
+
+    @pytest.mark.asyncio
+    async def test_ttl_expiry(self):
+        backend = InMemoryLRUBackend(ttl_seconds=10)
+        with patch("app.services.classification_cache.time.monotonic", return_value=100.0):
+            await backend.set("a", {"v": 1})
+        with patch("app.services.classification_cache.time.monotonic", return_value=111.0):
+            assert await backend.get("a") is None
+
+
+class TestSQLiteBackend:
+    @pytest.mark.asyncio
+    async def test_persists_across_instances(self, tmp_path):
+        path = str(tmp_path / "cache.sqlite3")
+        await SQLiteBackend(path).set("a", {"room_type": "cozinha"})
+
+        assert await SQLiteBackend(path).get("a") == {"room_type": "cozinha"}
+
+    @pytest.mark.asyncio
+    async def test_size_eviction(self, tmp_path):
+        backend = SQLiteBackend(str(tmp_path / "cache.sqlite3"), max_entries=2)
+        for key in ("a", "b", "c"):
+            await backend.set(key, {"k": key})
+
+        assert await backend.store.count() == 2
+        assert await backend.get("a") is None
+
+    @pytest.mark.asyncio
+    async def test_ttl_expiry(self, tmp_path):
+        backend = SQLiteBackend(str(tmp_path / "cache.sqlite3"), ttl_seconds=10)
+        with patch("app.services.sqlite_store.time.time", return_value=1000.0):
+            await backend.set("a", {"k": "a"})
+        with patch("app.services.sqlite_store.time.time", return_value=1011.0):
+            assert await backend.get("a") is None
+
+
+class TestClassificationCache:
+    @pytest.mark.asyncio
+    async def test_roundtrip_rebinds_image_url(self):
+        cache = ClassificationCache([InMemoryLRUBackend()])
+        await cache.set(_classification(_data_uri(b"photo")), MODEL)
+
+        # Same bytes from a different download → hit with the new URL
+        other_uri = _data_uri(b"photo")
+        hit = await cache.get(other_uri, MODEL)
+
+        assert hit is not None
+        assert hit.image_url == other_uri
+        assert hit.room_type == RoomType.KITCHEN
+        assert hit.room_number == 2
+
+    @pytest.mark.asyncio
+    async def test_zero_confidence_not_cached(self):
+        """API errors and refusals must be retried on the next run."""
+        cache = ClassificationCache([InMemoryLRUBackend()])
+        await cache.set(_classification("http://img/a.jpg", confidence=0.0), MODEL)
+
+        assert await cache.get("http://img/a.jpg", MODEL) is None
+        assert cache.stores == 0
+
+    @pytest.mark.asyncio
+    async def test_lower_tier_hit_promoted(self, tmp_path):
+        memory = InMemoryLRUBackend()
+        disk = SQLiteBackend(str(tmp_path / "cache.sqlite3"))
+        await ClassificationCache([disk]).set(_classification("http://img/a.jpg"), MODEL)
+
+        cache = ClassificationCache([memory, disk])
+        assert await cache.get("http://img/a.jpg", MODEL) is not None
+        assert len(memory) == 1
+
+    @pytest.mark.asyncio
+    async def test_promotion_keeps_the_original_age(self, tmp_path):
+        memory = InMemoryLRUBackend(ttl_seconds=10)
+        disk = SQLiteBackend(str(tmp_path / "cache.sqlite3"), ttl_seconds=10)
+        with patch("app.services.sqlite_store.time.time", return_value=1000.0):
+            await ClassificationCache([disk]).set(_classification("http://img/a.jpg"), MODEL)
+
+        cache = ClassificationCache([memory, disk])
+        with (
+            patch("app.services.sqlite_store.time.time", return_value=1008.0),
+            patch("app.services.classification_cache.time.monotonic", return_value=100.0),
+        ):
+            assert await cache.get("http://img/a.jpg", MODEL) is not None
+        # Expires 10s after the disk write, not 10s after the promotion
+        with patch("app.services.classification_cache.time.monotonic", return_value=103.0):
+            assert await memory.get(classification_cache_key("http://img/a.jpg", MODEL)) is None
+
+    @pytest.mark.asyncio
+    async def test_failed_promotion_still_returns_the_hit(self):
+        disk = InMemoryLRUBackend()
+        await ClassificationCache([disk]).set(_classification("http://img/a.jpg"), MODEL)
+        broken = AsyncMock()
+        broken.get_with_age.return_value = None
+        broken.set.side_effect = RuntimeError("db down")
+
+        cache = ClassificationCache([broken, disk])
+        assert await cache.get("http://img/a.jpg", MODEL) is not None
+
+    def test_close_releases_the_sqlite_connection(self, tmp_path):
+        disk = SQLiteBackend(str(tmp_path / "cache.sqlite3"))
+        ClassificationCache([InMemoryLRUBackend(), disk]).close()
+
+        with pytest.raises(sqlite3.ProgrammingError):
+            disk.store._conn.execute("SELECT 1")
+
+    @pytest.mark.asyncio
+    async def test_stats(self):
+        cache = ClassificationCache([InMemoryLRUBackend()])
+        await cache.set(_classification("http://img/a.jpg"), MODEL)
+        cache.record_gpt_call(2.0)
+
+        await cache.get("http://img/a.jpg", MODEL)
+        await cache.get("http://img/a.jpg", MODEL)
+        await cache.get("http://img/b.jpg", MODEL)
+
+        stats = cache.stats()
+        assert stats["hits"] == 2
+        assert stats["misses"] == 1
+        assert stats["hit_rate"] == pytest.approx(2 / 3, abs=1e-3)
+        assert stats["gpt_calls_saved"] == 2
+        assert stats["estimated_seconds_saved"] == pytest.approx(4.0)
+
+
+class TestBuildClassificationCache:
+    def test_disabled_returns_none(self):
+        assert build_classification_cache(ClassificationCacheConfig(enabled=False)) is None
+
+    def test_memory_backend(self):
+        cache = build_classification_cache(ClassificationCacheConfig(backend="memory"))
+        assert [type(b) for b in cache.backends] == [InMemoryLRUBackend]
+
+    def test_sqlite_backend_layers_memory_in_front(self, tmp_path):
+        config = ClassificationCacheConfig(
+            backend="sqlite", sqlite_path=str(tmp_path / "c.sqlite3")
+        )
+        cache = build_classification_cache(config)
+        assert [type(b) for b in cache.backends] == [InMemoryLRUBackend, SQLiteBackend]
+
+    def test_unknown_backend_raises(self):
+        with pytest.raises(ValueError):
+            build_classification_cache(ClassificationCacheConfig(backend="redis"))
+
+
+class TestClassifyImagesWithCache:
+    @pytest.mark.asyncio
+    async def test_second_run_skips_gpt(self):
+        """Images classified once are served from the cache on the next run."""
+        cache = ClassificationCache([InMemoryLRUBackend()])
+        classifier = ImageClassifierService(openai_api_key="sk-fake-key", cache=cache)
+        urls = [_data_uri(b"kitchen"), _data_uri(b"bedroom")]
+
+        async def _fake_gpt(url: str) -> ImageClassification:
+            return _classification(url)
+
+        with patch.object(
+            classifier, "classify_single_image", new=AsyncMock(side_effect=_fake_gpt)
+        ) as mock_gpt:
+            await classifier.classify_images(urls)
+            assert mock_gpt.call_count == 2
+
+            progress = AsyncMock()
+            results = await classifier.classify_images(urls, progress_callback=progress)
+
+        assert mock_gpt.call_count == 2
+        assert {r.image_url for r in results} == set(urls)
+        assert progress.await_count == 2
+        assert cache.stats()["hits"] == 2
+
+    @pytest.mark.asyncio
+    async def test_tagged_images_bypass_cache(self):
+        cache = ClassificationCache([InMemoryLRUBackend()])
+        classifier = ImageClassifierService(openai_api_key="sk-fake-key", cache=cache)
+
+        await classifier.classify_images(
+            ["http://img/k.jpg"], image_tags={"http://img/k.jpg": "kitchen"}
+        )
+
+        assert cache.hits == 0 and cache.misses == 0
@@ -0,0 +1,151 @@
+"""
+Tests for the renovation graph's checkpointers.
+
+Runs a small LangGraph graph whose state holds app models against the
+savers build_graph_checkpointer() returns, and checks that state (models
+included) survives reopening the SQLite file, that history can be forked,
+that completed runs are discarded and expired ones purged, and that the
+connection is closed.
+"""
+
+import operator
+from datetime import UTC, datetime, timedelta
+from typing import Annotated, TypedDict
+
+import pytest
+from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+from langgraph.graph import END, StateGraph
+
+from app.config import GraphCheckpointsConfig
+from app.models.property import PropertyData, RoomType
+from app.services.graph_checkpoints import (
+    build_graph_checkpointer,
+    close_checkpointer,
+    discard_run,
+    purge_expired,
+    run_config,
+    state_model_types,
+)
+
+
+class _State(TypedDict, total=False):
+    property_data: PropertyData | None
+    room_type: RoomType | None
+    log: Annotated[list[str], operator.add]
+
+
+def _graph(saver):
+    async def scrape(state: _State) -> _State:
+        return {"property_data": PropertyData(url="https://x/1/", num_rooms=2), "log": ["scrape"]}
+
+    async def classify(state: _State) -> _State:
+        return {"room_type": RoomType.KITCHEN, "log": ["classify"]}
+
+    graph = StateGraph(_State)
+    graph.add_node("scrape", scrape)
+    graph.add_node("classify", classify)
+    graph.set_entry_point("scrape")
+    graph.add_edge("scrape", "classify")
+    graph.add_edge("classify", END)
+    return graph.compile(checkpointer=saver)
+
+
+async def _sqlite(path) -> AsyncSqliteSaver:
+    return await build_graph_checkpointer(GraphCheckpointsConfig(sqlite_path=str(path)))
+
+
+async def _threads(saver) -> set[str]:
+    return {t.config["configurable"]["thread_id"] async for t in saver.alist(None)}
+
+
+class TestCheckpointers:
+    @pytest.mark.asyncio
+    async def test_state_survives_reopening_the_file(self, tmp_path):
+        path = tmp_path / "checkpoints.sqlite3"
+        saver = await _sqlite(path)
+        await _graph(saver).ainvoke({"log": []}, run_config("run-1"))
+        await close_checkpointer(saver)
+
+        saver = await _sqlite(path)
+        snapshot = await _graph(saver).aget_state(run_config("run-1"))
+        await close_checkpointer(saver)
+
+        assert isinstance(snapshot.values["property_data"], PropertyData)
+        assert snapshot.values["property_data"].num_rooms == 2
+        assert snapshot.values["room_type"] is RoomType.KITCHEN
+        assert snapshot.values["log"] == ["scrape", "classify"]
+        assert snapshot.next == ()
+
+    @pytest.mark.asyncio
+    async def test_history_can_be_forked(self, tmp_path):
+        saver = await _sqlite(tmp_path / "checkpoints.sqlite3")
+        graph = _graph(saver)
+        await graph.ainvoke({"log": []}, run_config("run-1"))
+
+        history = [s async for s in graph.aget_state_history(run_config("run-1"))]
+        after_scrape = next(s for s in history if s.next == ("classify",))
+
+        # Re-running from a past checkpoint only runs the nodes after it
+        fork = await graph.aupdate_state(after_scrape.config, {"log": ["edited"]})
+        final = await graph.ainvoke(None, fork)
+        assert final["log"] == ["scrape", "edited", "classify"]
+        await close_checkpointer(saver)
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("backend", ["memory", "sqlite"])
+    async def test_discard_run_and_purge_expired(self, backend, tmp_path):
+        saver = await build_graph_checkpointer(
+            GraphCheckpointsConfig(backend=backend, sqlite_path=str(tmp_path / "c.sqlite3"))
+        )
+        graph = _graph(saver)
+        for run_id in ("run-1", "run-2", "run-3"):
+            await graph.ainvoke({"log": []}, run_config(run_id))
+
+        await discard_run(graph, "run-1")
+        assert await saver.aget_tuple(run_config("run-1")) is None
+        assert await _threads(saver) == {"run-2", "run-3"}
+
+        assert await purge_expired(saver, 3600) == 0
+        assert await purge_expired(saver, 0) == 2
+        assert await _threads(saver) == set()
+        await close_checkpointer(saver)
+
+    @pytest.mark.asyncio
+    async def test_purge_keeps_runs_with_a_recent_checkpoint(self):
+        saver = await build_graph_checkpointer(GraphCheckpointsConfig(backend="memory"))
+        await _graph(saver).ainvoke({"log": []}, run_config("run-1"))
+        newest = await saver.aget_tuple(run_config("run-1"))
+        age = datetime.now(UTC) - datetime.fromisoformat(newest.checkpoint["ts"])
+
+        assert await purge_expired(saver, (age + timedelta(minutes=1)).total_seconds()) == 0
+
+    def test_allowlist_covers_state_models(self):
+        allowed = state_model_types()
+        assert ("app.models.property", "PropertyData") in allowed
+        assert ("app.models.property", "RoomAnalysis") in allowed
+        assert ("app.models.features.enums", "WorkScope") in allowed
+
+
+class TestBuildGraphCheckpointer:
+    @pytest.mark.asyncio
+    async def test_disabled_returns_none(self):
+        assert await build_graph_checkpointer(GraphCheckpointsConfig(enabled=False)) is None
+
+    @pytest.mark.asyncio
+    async def test_memory_backend(self):
+        saver = await build_graph_checkpointer(GraphCheckpointsConfig(backend="memory"))
+        assert isinstance(saver, InMemorySaver)
+
+    @pytest.mark.asyncio
+    async def test_sqlite_backend_creates_parent_dirs(self, tmp_path):
+        path = tmp_path / "nested" / "checkpoints.sqlite3"
+        saver = await _sqlite(path)
+        assert isinstance(saver, AsyncSqliteSaver)
+        assert path.exists()
+        await close_checkpointer(saver)
+
+    @pytest.mark.asyncio
+    async def test_unknown_backend_raises(self):
+        with pytest.raises(ValueError, match="redis"):
+            await build_graph_checkpointer(GraphCheckpointsConfig(backend="redis"))
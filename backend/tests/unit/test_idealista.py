@@ -1,13 +1,24 @@
 """
 Tests for the Idealista service — pure logic only (no API calls).
 
-Tests _validate_url(), _extract_property_id(), _parse_ndjson_response(),
-and _parse_apify_result() methods.
+Tests _validate_url(), _extract_property_id(), _parse_ndjson_line(),
+and _parse_apify_result() methods, plus scrape_property() deduplicating
+concurrent calls, scrape_properties() batching listings into one request,
+both serving cached listings (stale ones refreshed in the background), and
+raw_data moved to a RawDataStore
+(with the Apify NDJSON stream mocked; see tests/integration/test_apify_streaming.py
+for the HTTP side).
 """
 
+import asyncio
+from unittest.mock import patch
+
 import pytest
 
+from app.models.property import PropertyData
 from app.services.idealista import IdealistaService
+from app.services.raw_data_store import RawDataStore
+from app.services.scrape_cache import ScrapeCache
 
 
 @pytest.fixture
@@ -70,32 +81,24 @@ class TestExtractPropertyId:
         assert result == "12345678"
 
 
-class TestParseNdjsonResponse:
-    """Tests for IdealistaService._parse_ndjson_response()."""
+class TestParseNdjsonLine:
+    """Tests for IdealistaService._parse_ndjson_line()."""
 
     def test_single_line(self):
-        text = '{"id": 1, "title": "Flat"}\n'
-        result = IdealistaService._parse_ndjson_response(text)
-        assert result == [{"id": 1, "title": "Flat"}]
+        result = IdealistaService._parse_ndjson_line('{"id": 1, "title": "Flat"}\n')
+        assert result == {"id": 1, "title": "Flat"}
 
-    def test_multiple_lines(self):
-        text = '{"id": 1}\n{"id": 2}\n{"id": 3}\n'
-        result = IdealistaService._parse_ndjson_response(text)
-        assert len(result) == 3
-        assert result[1] == {"id": 2}
+    def test_empty_line(self):
+        assert IdealistaService._parse_ndjson_line("") is None
 
-    def test_skips_empty_lines(self):
-        text = '{"id": 1}\n\n\n{"id": 2}\n'
-        result = IdealistaService._parse_ndjson_response(text)
-        assert len(result) == 2
+    def test_whitespace_only(self):
+        assert IdealistaService._parse_ndjson_line("   \t  ") is None
 
-    def test_empty_string(self):
-        result = IdealistaService._parse_ndjson_response("")
-        assert result == []
+    def test_malformed_line_is_skipped(self):
+        assert IdealistaService._parse_ndjson_line('{"type": "property", "da') is None
 
-    def test_whitespace_only(self):
-        result = IdealistaService._parse_ndjson_response("   \n  \n   ")
-        assert result == []
+    def test_non_object_line_is_skipped(self):
+        assert IdealistaService._parse_ndjson_line("[1, 2]") is None
 
 
 class TestParseApifyResult:
@@ -228,3 +231,303 @@ class TestParseApifyResult:
         assert result.has_elevator is None
         assert result.condition_status == ""
         assert result.location == ""
+
+
+class TestScrapePropertySingleFlight:
+    """Concurrent scrape_property() calls for one listing share an Apify request."""
+
+    @staticmethod
+    async def _items(url, payload):
+        yield {"type": "started"}
+        yield {"type": "property", "data": {"propertyId": 12345678}}
+
+    @pytest.mark.asyncio
+    async def test_concurrent_calls_share_one_request(self, service: IdealistaService):
+        async def _slow_items(url, payload):
+            await asyncio.sleep(0.02)
+            async for item in self._items(url, payload):
+                yield item
+
+        with patch.object(service, "_stream_with_retry", side_effect=_slow_items) as request:
+            results = await asyncio.gather(
+                *(service.scrape_property("https://www.idealista.pt/imovel/12345678/")
+                  for _ in range(10)),
+                service.scrape_property("https://www.idealista.pt/imovel/87654321/"),
+            )
+
+        assert request.call_count == 2
+        assert all(r is results[0] for r in results[:10])
+        assert service.scrapes.stats() == {"executions": 2, "coalesced": 9, "in_flight": 0}
+
+    @pytest.mark.asyncio
+    async def test_failure_reaches_every_caller_and_is_not_cached(
+        self, service: IdealistaService
+    ):
+        url = "https://www.idealista.pt/imovel/12345678/"
+        attempts = 0
+
+        async def _items(url, payload):
+            nonlocal attempts
+            attempts += 1
+            if attempts == 1:
+                raise RuntimeError("apify down")
+            async for item in self._items(url, payload):
+                yield item
+
+        with patch.object(service, "_stream_with_retry", side_effect=_items) as request:
+            results = await asyncio.gather(
+                service.scrape_property(url), service.scrape_property(url),
+                return_exceptions=True,
+            )
+            assert all(isinstance(r, RuntimeError) for r in results)
+
+            # The next call after the failure makes a fresh request
+            await service.scrape_property(url)
+            assert request.call_count == 2
+
+
+class TestScrapeProperties:
+    """scrape_properties() streams many listings from one Apify request."""
+
+    @staticmethod
+    def _stream(*items: dict):
+        async def _items(url, payload):
+            for item in [{"type": "started"}, *items, {"type": "completed"}]:
+                yield item
+
+        return _items
+
+    @staticmethod
+    def _property(property_id: str, title: str = "") -> dict:
+        return {"type": "property", "data": {"propertyId": property_id, "title": title}}
+
+    @staticmethod
+    async def _collect(service: IdealistaService, urls: list[str]) -> dict:
+        return {url: result async for url, result in service.scrape_properties(urls)}
+
+    @pytest.mark.asyncio
+    async def test_one_request_for_all_listings(self, service: IdealistaService):
+        urls = [
+            "https://www.idealista.pt/imovel/111/",
+            "https://www.idealista.pt/imovel/222/",
+            "https://www.idealista.pt/imovel/111/?utm=x",
+        ]
+        # Replies may come in any order; adid / originalUrl also identify a listing
+        stream = self._stream(
+            {"type": "property", "data": {"adid": 222, "title": "Dois"}},
+            self._property("111", "Um"),
+        )
+        with patch.object(service, "_stream_with_retry", side_effect=stream) as request:
+            arrivals = [url async for url, _ in service.scrape_properties(urls)]
+            results = await self._collect(service, urls)
+
+        assert request.call_args.args[1] == {
+            "Property_urls": [{"url": urls[0]}, {"url": urls[1]}]
+        }
+        # Yielded in arrival order; duplicates follow their listing
+        assert arrivals == [urls[1], urls[0], urls[2]]
+        assert results[urls[0]].title == "Um"
+        assert results[urls[0]].url == urls[0]
+        assert results[urls[1]].title == "Dois"
+        assert results[urls[2]] is results[urls[0]]
+
+    @pytest.mark.asyncio
+    async def test_failed_missing_and_invalid_listings_map_to_errors(
+        self, service: IdealistaService
+    ):
+        ok, failed, broken, missing = (
+            "https://www.idealista.pt/imovel/111/",
+            "https://www.idealista.pt/imovel/222/",
+            "https://www.idealista.pt/imovel/333/",
+            "https://www.idealista.pt/imovel/444/",
+        )
+        stream = self._stream(
+            self._property("111"),
+            {"type": "property", "status": "failed", "error": "blocked",
+             "data": {"originalUrl": failed}},
+            {"type": "property", "data": {"propertyId": "333", "multimedia": "not-a-dict"}},
+        )
+        with patch.object(service, "_stream_with_retry", side_effect=stream):
+            results = await self._collect(service, [ok, failed, broken, missing, "https://x.pt/"])
+
+        assert results[ok].url == ok
+        assert "blocked" in str(results[failed])
+        assert "333" in str(results[broken])
+        assert "444" in str(results[missing])
+        assert isinstance(results["https://x.pt/"], ValueError)
+
+    @pytest.mark.asyncio
+    async def test_request_failure_raises(self, service: IdealistaService):
+        async def _down(url, payload):
+            raise RuntimeError("apify down")
+            yield  # pragma: no cover
+
+        with patch.object(service, "_stream_with_retry", side_effect=_down):
+            with pytest.raises(RuntimeError):
+                await self._collect(service, ["https://www.idealista.pt/imovel/111/"])
+
+    @pytest.mark.asyncio
+    async def test_without_token_returns_mock_data(self):
+        service = IdealistaService(apify_token="")
+        url = "https://www.idealista.pt/imovel/111/"
+        results = await self._collect(service, [url])
+        assert results[url].raw_data["property_id"] == "111"
+
+
+class TestScrapeCaching:
+    """scrape_property() / scrape_properties() with a ScrapeCache."""
+
+    URL = "https://www.idealista.pt/imovel/111/"
+
+    @staticmethod
+    def _titled(*titles: str):
+        """_stream_with_retry stand-in answering each request with the next title."""
+        remaining = list(titles)
+
+        async def _items(url, payload):
+            title = remaining.pop(0)
+            for entry in payload["Property_urls"]:
+                property_id = entry["url"].rstrip("/").rsplit("/", 1)[1]
+                yield {"type": "property", "data": {"propertyId": property_id, "title": title}}
+
+        return _items
+
+    @staticmethod
+    async def _settle(service: IdealistaService) -> None:
+        await asyncio.gather(*set(service._revalidating.values()))
+
+    @pytest.mark.asyncio
+    async def test_fresh_entry_skips_the_actor(self):
+        service = IdealistaService("fake-token", cache=ScrapeCache(3600))
+        with patch.object(service, "_stream_with_retry", side_effect=self._titled("Um")) as req:
+            first = await service.scrape_property(self.URL)
+            second = await service.scrape_property(self.URL + "?utm=x")
+
+        assert req.call_count == 1
+        assert second.title == first.title == "Um"
+        assert second.url == self.URL + "?utm=x"
+
+    @pytest.mark.asyncio
+    async def test_stale_entry_is_served_then_refreshed_in_background(self):
+        cache = ScrapeCache(ttl_seconds=0, stale_seconds=3600)
+        service = IdealistaService("fake-token", cache=cache)
+        stream = self._titled("Antigo", "Novo")
+        with patch.object(service, "_stream_with_retry", side_effect=stream) as request:
+            await service.scrape_property(self.URL)
+            served = await service.scrape_property(self.URL)
+            await self._settle(service)
+            refreshed = await service.scrape_property(self.URL)
+
+        assert served.title == "Antigo"
+        assert refreshed.title == "Novo"
+        assert request.call_count == 2
+        assert cache.stats()["refreshes"] == 1
+
+    @pytest.mark.asyncio
+    async def test_failed_refresh_keeps_the_stale_entry(self):
+        cache = ScrapeCache(ttl_seconds=0, stale_seconds=3600)
+        service = IdealistaService("fake-token", cache=cache)
+        await cache.set("111", PropertyData(url=self.URL, title="Antigo"))
+
+        async def _down(url, payload):
+            raise RuntimeError("apify down")
+            yield  # pragma: no cover
+
+        with patch.object(service, "_stream_with_retry", side_effect=_down):
+            assert (await service.scrape_property(self.URL)).title == "Antigo"
+            await self._settle(service)
+
+        assert (await cache.get("111")).property_data.title == "Antigo"
+        assert cache.stats()["refresh_failures"] == 1
+
+    @pytest.mark.asyncio
+    async def test_max_age_forces_a_fresh_scrape(self):
+        cache = ScrapeCache(3600)
+        service = IdealistaService("fake-token", cache=cache)
+        await cache.set("111", PropertyData(url=self.URL, title="Antigo"))
+
+        with patch.object(service, "_stream_with_retry", side_effect=self._titled("Novo")):
+            fresh = await service.scrape_property(self.URL, max_age=0)
+
+        assert fresh.title == "Novo"
+        assert (await cache.get("111")).property_data.title == "Novo"
+
+    @pytest.mark.asyncio
+    async def test_batch_fetches_only_uncached_listings(self):
+        cache = ScrapeCache(3600)
+        service = IdealistaService("fake-token", cache=cache)
+        await cache.set("111", PropertyData(url=self.URL, title="Em cache"))
+        urls = [self.URL, "https://www.idealista.pt/imovel/222/"]
+
+        with patch.object(service, "_stream_with_retry", side_effect=self._titled("Novo")) as req:
+            results = [(url, r) async for url, r in service.scrape_properties(urls)]
+
+        assert req.call_args.args[1] == {"Property_urls": [{"url": urls[1]}]}
+        # Cached listings come first
+        assert [(url, r.title) for url, r in results] == [(urls[0], "Em cache"), (urls[1], "Novo")]
+        assert (await cache.get("222")).property_data.title == "Novo"
+
+    @pytest.mark.asyncio
+    async def test_close_cancels_pending_refreshes(self):
+        cache = ScrapeCache(ttl_seconds=0, stale_seconds=3600)
+        service = IdealistaService("fake-token", cache=cache)
+        await cache.set("111", PropertyData(url=self.URL, title="Antigo"))
+
+        async def _hang(url, payload):
+            await asyncio.Event().wait()
+            yield {}  # pragma: no cover
+
+        with patch.object(service, "_stream_with_retry", side_effect=_hang):
+            await service.scrape_property(self.URL)
+            refresh = next(iter(service._revalidating.values()))
+            await service.close()
+
+        assert refresh.cancelled()
+        assert service._revalidating == {}
+
+
+class TestRawDataStore:
+    """Parsed listings with a RawDataStore: raw_data detached, loadable on demand."""
+
+    URL = "https://www.idealista.pt/imovel/111/"
+
+    @staticmethod
+    async def _items(url, payload):
+        for entry in payload["Property_urls"]:
+            property_id = entry["url"].rstrip("/").rsplit("/", 1)[1]
+            yield {
+                "type": "property",
+                "data": {"propertyId": property_id, "title": "T1", "translations": ["x" * 500]},
+            }
+
+    @pytest.mark.asyncio
+    async def test_scrape_detaches_raw_data(self):
+        cache = ScrapeCache(3600)
+        service = IdealistaService("fake-token", cache=cache, raw_store=RawDataStore())
+        with patch.object(service, "_stream_with_retry", side_effect=self._items):
+            property_data = await service.scrape_property(self.URL)
+
+        assert property_data.raw_data == {}
+        assert property_data.raw_data_ref == "111"
+        assert (await cache.get("111")).property_data.raw_data == {}
+        raw = await service.load_raw_data(property_data)
+        assert raw["translations"] == ["x" * 500]
+
+    @pytest.mark.asyncio
+    async def test_batch_detaches_raw_data(self):
+        service = IdealistaService("fake-token", raw_store=RawDataStore())
+        urls = [self.URL, "https://www.idealista.pt/imovel/222/"]
+        with patch.object(service, "_stream_with_retry", side_effect=self._items):
+            results = [r async for _, r in service.scrape_properties(urls)]
+
+        assert [r.raw_data_ref for r in results] == ["111", "222"]
+        assert service.raw_store.stats()["stored"] == 2
+
+    @pytest.mark.asyncio
+    async def test_without_a_store_raw_data_stays_inline(self):
+        service = IdealistaService("fake-token")
+        with patch.object(service, "_stream_with_retry", side_effect=self._items):
+            property_data = await service.scrape_property(self.URL)
+
+        assert property_data.raw_data_ref is None
+        assert (await service.load_raw_data(property_data))["title"] == "T1"
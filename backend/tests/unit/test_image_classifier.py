@@ -2,23 +2,35 @@
 Tests for the ImageClassifier service — pure logic only (no OpenAI calls).
 
 Covers _map_room_type(), group_by_room_simple(), group_by_room() (async),
+iter_room_groups() (batches as each room type is final),
 cluster_room_images(), _validate_clusters(), _metadata_fallback(),
 the standalone get_room_label() function, classify_from_tag(), and
-classify_images() tag/GPT routing.
+classify_images() tag/GPT routing, plus batched classification with
+single-image fallback, near-duplicate photos inheriting their
+representative's classification and room, and local room clustering
+replacing the GPT clustering call when it is confident.
 """
 
+import asyncio
+import json
 from unittest.mock import AsyncMock, patch
 
 import pytest
+from pydantic import ValidationError
 
+from app.config import LocalClusteringConfig, OpenAIConfig
 from app.constants import GPT_ROOM_TYPE_MAP
 from app.models.property import ImageClassification, RoomCluster, RoomType
-from app.prompts.renovation import IMAGE_CLASSIFICATION_PROMPT
+from app.prompts.renovation import (
+    IMAGE_BATCH_CLASSIFICATION_PROMPT,
+    IMAGE_CLASSIFICATION_PROMPT,
+)
 from app.services.image_classifier import (
     ImageClassifierService,
     classify_from_tag,
     get_room_label,
 )
+from app.services.local_clustering import LocalClustering
 
 
 @pytest.fixture
@@ -101,11 +113,11 @@ class TestGPTMapPromptCoverage:
     a new room type cannot silently break the classification pipeline.
     """
 
-    def _parse_prompt_room_types(self) -> list[str]:
+    def _parse_prompt_room_types(self, prompt: str = IMAGE_CLASSIFICATION_PROMPT) -> list[str]:
         """Extract the leading keys from the prompt's TIPOS DE DIVISÃO VÁLIDOS block."""
         room_types: list[str] = []
         in_block = False
-        for line in IMAGE_CLASSIFICATION_PROMPT.splitlines():
+        for line in prompt.splitlines():
             if "TIPOS DE DIVISÃO VÁLIDOS" in line:
                 in_block = True
                 continue
@@ -133,6 +145,12 @@ class TestGPTMapPromptCoverage:
             "Add entries to backend/app/constants.py → GPT_ROOM_TYPE_MAP."
         )
 
+    def test_batch_prompt_lists_same_room_types(self):
+        """The batched prompt offers exactly the single-image prompt's room types."""
+        assert self._parse_prompt_room_types(
+            IMAGE_BATCH_CLASSIFICATION_PROMPT
+        ) == self._parse_prompt_room_types()
+
 
 class TestGroupByRoom:
     """Tests for ImageClassifierService.group_by_room_simple() (naive key-based grouping)."""
@@ -1142,3 +1160,565 @@ class TestGroupByRoomAsync:
             await classifier.group_by_room(classifications, num_rooms=None)
 
         mock_cluster.assert_called_once()
+
+
+class TestIterRoomGroups:
+    """Tests for ImageClassifierService.iter_room_groups() (dataflow grouping)."""
+
+    @staticmethod
+    def _classifications() -> list[ImageClassification]:
+        def _c(url: str, room_type: RoomType) -> ImageClassification:
+            return ImageClassification(
+                image_url=url, room_type=room_type, room_number=1, confidence=0.9
+            )
+
+        return [
+            _c("k1.jpg", RoomType.KITCHEN),
+            _c("b1.jpg", RoomType.BEDROOM),
+            _c("b2.jpg", RoomType.BEDROOM),
+            _c("w1.jpg", RoomType.BATHROOM),
+            _c("w2.jpg", RoomType.BATHROOM),
+        ]
+
+    @staticmethod
+    async def _cluster(room_type, urls, image_detail, expected_rooms):
+        # Bathrooms cluster faster than bedrooms
+        await asyncio.sleep(0.02 if room_type == RoomType.BEDROOM else 0.01)
+        return [
+            RoomCluster(room_number=i + 1, image_indices=[i], confidence=0.8, visual_cues="")
+            for i in range(len(urls))
+        ]
+
+    @pytest.mark.asyncio
+    async def test_unclustered_rooms_first_then_each_type_as_it_finishes(
+        self, classifier: ImageClassifierService
+    ):
+        with patch.object(classifier, "cluster_room_images", side_effect=self._cluster):
+            batches = [
+                list(batch)
+                async for batch in classifier.iter_room_groups(self._classifications())
+            ]
+
+        assert batches == [
+            ["cozinha_1"],
+            ["casa_de_banho_1", "casa_de_banho_2"],
+            ["quarto_1", "quarto_2"],
+        ]
+
+    @pytest.mark.asyncio
+    async def test_batches_merge_to_group_by_room(self, classifier: ImageClassifierService):
+        classifications = self._classifications()
+        with patch.object(classifier, "cluster_room_images", side_effect=self._cluster):
+            merged = {}
+            async for batch in classifier.iter_room_groups(classifications, num_rooms=2):
+                merged.update(batch)
+            grouped = await classifier.group_by_room(classifications, num_rooms=2)
+
+        assert merged == grouped
+
+    @pytest.mark.asyncio
+    async def test_closing_early_cancels_clustering(self, classifier: ImageClassifierService):
+        cancelled = asyncio.Event()
+
+        async def _slow_cluster(*args):
+            try:
+                await asyncio.Event().wait()
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        with patch.object(classifier, "cluster_room_images", side_effect=_slow_cluster):
+            batches = classifier.iter_room_groups(self._classifications())
+            assert list(await anext(batches)) == ["cozinha_1"]
+            await asyncio.sleep(0)  # clustering calls are now in flight
+            await batches.aclose()
+
+        await asyncio.wait_for(cancelled.wait(), timeout=1)
+
+
+class TestImageResolverIntegration:
+    """classify_single_image() sends the resolver's variant, not the state reference."""
+
+    @pytest.mark.asyncio
+    async def test_payload_uses_prepared_variant(self):
+        resolver = AsyncMock()
+        resolver.resolve = AsyncMock(return_value="data:image/jpeg;base64,c21hbGw=")
+        classifier = ImageClassifierService(openai_api_key="sk-fake-key", image_resolver=resolver)
+
+        mock_response = AsyncMock()
+        mock_response.choices = [AsyncMock()]
+        mock_response.choices[0].message.content = '{"room_type": "cozinha", "confidence": 0.9}'
+        mock_response.choices[0].message.refusal = None
+
+        with patch.object(
+            classifier.client.chat.completions,
+            "create",
+            new_callable=AsyncMock,
+            return_value=mock_response,
+        ) as mock_create:
+            result = await classifier.classify_single_image("data:image/png;base64,YmlnIGltYWdl")
+
+        resolver.resolve.assert_awaited_once_with("data:image/png;base64,YmlnIGltYWdl", "low")
+        image_part = mock_create.call_args.kwargs["messages"][0]["content"][1]
+        assert image_part["image_url"] == {"url": "data:image/jpeg;base64,c21hbGw=", "detail": "low"}
+        # The classification is still keyed by the original image
+        assert result.image_url == "data:image/png;base64,YmlnIGltYWdl"
+
+
+class TestClassifyImageStream:
+    """classify_image_stream() routes each image as it arrives."""
+
+    @pytest.mark.asyncio
+    async def test_routes_tags_and_gpt_with_progress(self, classifier: ImageClassifierService):
+        async def _images():
+            yield "http://img/kitchen.jpg", "kitchen"
+            yield "http://img/mystery.jpg", None
+
+        gpt_result = ImageClassification(
+            image_url="http://img/mystery.jpg", room_type=RoomType.BEDROOM, room_number=1, confidence=0.7
+        )
+        progress = AsyncMock()
+
+        with patch.object(
+            classifier, "classify_single_image", new_callable=AsyncMock, return_value=gpt_result
+        ) as mock_gpt:
+            results = await classifier.classify_image_stream(
+                _images(), total=2, progress_callback=progress
+            )
+
+        mock_gpt.assert_awaited_once_with("http://img/mystery.jpg")
+        assert {r.room_type for r in results} == {RoomType.KITCHEN, RoomType.BEDROOM}
+        assert [c.args[:2] for c in progress.await_args_list] == [(1, 2), (2, 2)]
+
+    @pytest.mark.asyncio
+    async def test_classification_starts_before_stream_ends(
+        self, classifier: ImageClassifierService
+    ):
+        """The first image is classified while the producer is still blocked."""
+        release = asyncio.Event()
+        classified_early: list[str] = []
+
+        async def _images():
+            yield "http://img/first.jpg", "kitchen"
+            await release.wait()
+            yield "http://img/second.jpg", "bedroom"
+
+        async def _progress(current, total, classification):
+            if not release.is_set():
+                classified_early.append(classification.image_url)
+                release.set()
+
+        results = await asyncio.wait_for(
+            classifier.classify_image_stream(_images(), total=2, progress_callback=_progress),
+            timeout=2,
+        )
+
+        assert classified_early == ["http://img/first.jpg"]
+        assert len(results) == 2
+
+    @pytest.mark.asyncio
+    async def test_in_flight_gpt_calls_bounded(self):
+        """The consumer stops pulling once 2 x max_concurrent GPT calls are pending."""
+        classifier = ImageClassifierService(openai_api_key="sk-fake-key", max_concurrent=1)
+        pulled = 0
+        gate = asyncio.Event()
+
+        async def _images():
+            nonlocal pulled
+            for i in range(6):
+                pulled += 1
+                yield f"http://img/{i}.jpg", None
+
+        async def _slow_gpt(url: str) -> ImageClassification:
+            await gate.wait()
+            return ImageClassification(
+                image_url=url, room_type=RoomType.OTHER, room_number=1, confidence=0.5
+            )
+
+        with patch.object(classifier, "classify_single_image", side_effect=_slow_gpt):
+            task = asyncio.create_task(classifier.classify_image_stream(_images(), total=6))
+            await asyncio.sleep(0.05)
+            assert pulled == 3  # 2 admitted + 1 waiting for a slot
+            gate.set()
+            results = await task
+
+        assert len(results) == 6
+
+
+def _completion(content: str | None, refusal: str | None = None) -> AsyncMock:
+    response = AsyncMock()
+    response.choices = [AsyncMock()]
+    response.choices[0].message.content = content
+    response.choices[0].message.refusal = refusal
+    return response
+
+
+def _batch_reply(*items: dict) -> AsyncMock:
+    return _completion(json.dumps({"classifications": list(items)}))
+
+
+@pytest.fixture
+def batch_classifier() -> ImageClassifierService:
+    """Classifier in batched mode (4 images per request)."""
+    return ImageClassifierService(
+        openai_api_key="sk-fake-key",
+        openai_config=OpenAIConfig(classification_batch_size=4),
+    )
+
+
+class TestClassifyImageBatch:
+    """classify_image_batch() — one request, per-index validation."""
+
+    @pytest.mark.asyncio
+    async def test_parses_answers_by_index(self, batch_classifier: ImageClassifierService):
+        urls = ["http://img/0.jpg", "http://img/1.jpg"]
+        reply = _batch_reply(
+            {"index": 1, "room_type": "quarto", "room_number": 2, "confidence": 0.7},
+            {"index": 0, "room_type": "cozinha", "room_number": 1, "confidence": 0.9},
+        )
+        with patch.object(
+            batch_classifier.client.chat.completions, "create",
+            new_callable=AsyncMock, return_value=reply,
+        ) as mock_create:
+            results = await batch_classifier.classify_image_batch(urls)
+
+        mock_create.assert_awaited_once()
+        content = mock_create.call_args.kwargs["messages"][0]["content"]
+        assert sum(part["type"] == "image_url" for part in content) == 2
+        assert content[1] == {"type": "text", "text": "Fotografia 0:"}
+        assert results[0].room_type == RoomType.KITCHEN
+        assert results[1].room_type == RoomType.BEDROOM
+        assert results[1].room_number == 2
+
+    @pytest.mark.asyncio
+    async def test_invalid_entries_become_none(self, batch_classifier: ImageClassifierService):
+        urls = [f"http://img/{i}.jpg" for i in range(4)]
+        reply = _batch_reply(
+            {"index": 0, "room_type": "sala", "room_number": 1, "confidence": 0.8},
+            {"index": 1, "room_type": "sala", "confidence": 1.7},      # out of range
+            {"index": 2, "room_type": "sala", "confidence": 0.6},
+            {"index": 2, "room_type": "quarto", "confidence": 0.6},    # duplicate index
+            {"index": 9, "room_type": "sala", "confidence": 0.6},      # unknown index
+        )
+        with patch.object(
+            batch_classifier.client.chat.completions, "create",
+            new_callable=AsyncMock, return_value=reply,
+        ):
+            results = await batch_classifier.classify_image_batch(urls)
+
+        assert results[0] is not None
+        assert results[1:] == [None, None, None]
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize(
+        "reply",
+        [_completion("not json"), _completion(None), _completion(None, refusal="no"),
+         _completion('{"rooms": []}')],
+    )
+    async def test_unusable_reply_fails_every_index(
+        self, batch_classifier: ImageClassifierService, reply: AsyncMock
+    ):
+        with patch.object(
+            batch_classifier.client.chat.completions, "create",
+            new_callable=AsyncMock, return_value=reply,
+        ):
+            results = await batch_classifier.classify_image_batch(["http://img/0.jpg"] * 2)
+
+        assert results == [None, None]
+
+
+class TestBatchedClassifyImages:
+    """classify_images() in batched mode — request count and single-image fallback."""
+
+    @pytest.mark.asyncio
+    async def test_groups_untagged_images_into_batches(
+        self, batch_classifier: ImageClassifierService
+    ):
+        urls = [f"http://img/{i}.jpg" for i in range(10)]
+
+        async def _reply(**kwargs):
+            n = sum(p["type"] == "image_url" for p in kwargs["messages"][0]["content"])
+            return _batch_reply(*(
+                {"index": i, "room_type": "sala", "room_number": 1, "confidence": 0.8}
+                for i in range(n)
+            ))
+
+        with (
+            patch.object(
+                batch_classifier.client.chat.completions, "create",
+                new_callable=AsyncMock, side_effect=_reply,
+            ) as mock_create,
+            patch.object(batch_classifier, "classify_single_image", new_callable=AsyncMock)
+            as mock_single,
+        ):
+            results = await batch_classifier.classify_images(urls)
+
+        assert mock_create.await_count == 3  # 4 + 4 + 2
+        mock_single.assert_not_awaited()
+        assert sorted(r.image_url for r in results) == sorted(urls)
+
+    @pytest.mark.asyncio
+    async def test_unvalidated_zero_batch_size_classifies_one_by_one(self):
+        classifier = ImageClassifierService(
+            openai_api_key="sk-fake-key",
+            openai_config=OpenAIConfig.model_construct(classification_batch_size=0),
+        )
+        urls = [f"http://img/{i}.jpg" for i in range(3)]
+
+        with patch.object(
+            classifier, "_classify_batch_and_cache", new_callable=AsyncMock,
+            side_effect=lambda batch: [
+                ImageClassification(
+                    image_url=u, room_type=RoomType.OTHER, room_number=1, confidence=0.5
+                )
+                for u in batch
+            ],
+        ) as mock_batch:
+            results = await classifier.classify_images(urls)
+
+        assert [c.args[0] for c in mock_batch.await_args_list] == [[u] for u in urls]
+        assert len(results) == 3
+
+    def test_config_rejects_zero_batch_size(self):
+        with pytest.raises(ValidationError):
+            OpenAIConfig(classification_batch_size=0)
+
+    @pytest.mark.asyncio
+    async def test_failed_indices_fall_back_to_single_calls(
+        self, batch_classifier: ImageClassifierService
+    ):
+        urls = [f"http://img/{i}.jpg" for i in range(4)]
+        reply = _batch_reply(
+            {"index": 0, "room_type": "cozinha", "room_number": 1, "confidence": 0.9},
+            {"index": 2, "room_type": "sala", "room_number": 1, "confidence": 0.8},
+        )
+        progress = AsyncMock()
+
+        async def _single(url: str) -> ImageClassification:
+            return ImageClassification(
+                image_url=url, room_type=RoomType.BEDROOM, room_number=1, confidence=0.6
+            )
+
+        with (
+            patch.object(
+                batch_classifier.client.chat.completions, "create",
+                new_callable=AsyncMock, return_value=reply,
+            ),
+            patch.object(batch_classifier, "classify_single_image", side_effect=_single)
+            as mock_single,
+        ):
+            results = await batch_classifier.classify_images(urls, progress_callback=progress)
+
+        assert sorted(c.args[0] for c in mock_single.await_args_list) == [
+            "http://img/1.jpg", "http://img/3.jpg"
+        ]
+        by_url = {r.image_url: r.room_type for r in results}
+        assert by_url["http://img/0.jpg"] == RoomType.KITCHEN
+        assert by_url["http://img/3.jpg"] == RoomType.BEDROOM
+        assert progress.await_count == 4
+
+    @pytest.mark.asyncio
+    async def test_stream_flushes_partial_batch(
+        self, batch_classifier: ImageClassifierService
+    ):
+        """A trailing batch smaller than batch_size is still sent when the stream ends."""
+        async def _images():
+            for i in range(6):
+                yield f"http://img/{i}.jpg", None
+
+        with patch.object(
+            batch_classifier, "_classify_batch_and_cache", new_callable=AsyncMock,
+            side_effect=lambda batch: [
+                ImageClassification(
+                    image_url=u, room_type=RoomType.OTHER, room_number=1, confidence=0.5
+                )
+                for u in batch
+            ],
+        ) as mock_batch:
+            results = await batch_classifier.classify_image_stream(_images(), total=6)
+
+        assert [len(c.args[0]) for c in mock_batch.await_args_list] == [4, 2]
+        assert len(results) == 6
+
+
+class _FakeDeduplicator:
+    """ImageDeduplicator stand-in with a fixed {duplicate: representative} map."""
+
+    def __init__(self, duplicates: dict[str, str]):
+        self.duplicates = duplicates
+
+    async def find_duplicates(self, image_refs: list[str]) -> dict[str, str]:
+        return {ref: rep for ref, rep in self.duplicates.items() if ref in image_refs}
+
+    def index(self):
+        duplicates = self.duplicates
+
+        class _Index:
+            async def match(self, image_ref: str) -> str | None:
+                return duplicates.get(image_ref)
+
+        return _Index()
+
+
+class TestNearDuplicates:
+    """Near-duplicates skip classification and are clustered through their representative."""
+
+    DUPLICATES = {"http://img/b1-small.jpg": "http://img/b1.jpg"}
+
+    @staticmethod
+    def _gpt(url: str) -> ImageClassification:
+        return ImageClassification(
+            image_url=url, room_type=RoomType.BEDROOM, room_number=1, confidence=0.8
+        )
+
+    @pytest.mark.asyncio
+    async def test_classify_images_inherits_the_representatives_result(self):
+        classifier = ImageClassifierService(
+            openai_api_key="sk-fake-key", deduplicator=_FakeDeduplicator(self.DUPLICATES)
+        )
+        urls = ["http://img/b1.jpg", "http://img/b2.jpg", "http://img/b1-small.jpg"]
+        progress = AsyncMock()
+
+        with patch.object(classifier, "classify_single_image", side_effect=self._gpt) as gpt:
+            results = await classifier.classify_images(urls, progress_callback=progress)
+
+        assert sorted(c.args[0] for c in gpt.await_args_list) == urls[:2]
+        duplicate = next(r for r in results if r.image_url == urls[2])
+        assert duplicate.duplicate_of == urls[0]
+        assert duplicate.room_type == RoomType.BEDROOM
+        assert progress.await_count == 3
+
+    @pytest.mark.asyncio
+    async def test_stream_inherits_the_representatives_result(self):
+        classifier = ImageClassifierService(
+            openai_api_key="sk-fake-key", deduplicator=_FakeDeduplicator(self.DUPLICATES)
+        )
+
+        async def _images():
+            yield "http://img/b1.jpg", None
+            yield "http://img/b1-small.jpg", None
+
+        with patch.object(classifier, "classify_single_image", side_effect=self._gpt) as gpt:
+            results = await classifier.classify_image_stream(_images(), total=2)
+
+        gpt.assert_awaited_once_with("http://img/b1.jpg")
+        assert [r.duplicate_of for r in results] == [None, "http://img/b1.jpg"]
+
+    @pytest.mark.asyncio
+    async def test_duplicates_join_their_representatives_room(
+        self, classifier: ImageClassifierService
+    ):
+        classifications = [
+            self._gpt("http://img/b1.jpg"),
+            self._gpt("http://img/b2.jpg"),
+            self._gpt("http://img/b1-small.jpg").model_copy(
+                update={"duplicate_of": "http://img/b1.jpg"}
+            ),
+        ]
+        clusters = [
+            RoomCluster(room_number=1, image_indices=[0], confidence=0.9),
+            RoomCluster(room_number=2, image_indices=[1], confidence=0.9),
+        ]
+
+        with patch.object(
+            classifier, "cluster_room_images", new_callable=AsyncMock, return_value=clusters
+        ) as cluster:
+            grouped = await classifier.group_by_room(classifications, num_rooms=2)
+
+        assert cluster.await_args.args[1] == ["http://img/b1.jpg", "http://img/b2.jpg"]
+        assert [c.image_url for c in grouped["quarto_1"]] == [
+            "http://img/b1.jpg", "http://img/b1-small.jpg"
+        ]
+        assert [c.image_url for c in grouped["quarto_2"]] == ["http://img/b2.jpg"]
+
+    @pytest.mark.asyncio
+    async def test_one_shot_and_its_duplicates_skip_clustering(
+        self, classifier: ImageClassifierService
+    ):
+        classifications = [
+            self._gpt("http://img/b1.jpg"),
+            self._gpt("http://img/b1-small.jpg").model_copy(
+                update={"duplicate_of": "http://img/b1.jpg"}
+            ),
+        ]
+
+        with patch.object(classifier, "cluster_room_images", new_callable=AsyncMock) as cluster:
+            grouped = await classifier.group_by_room(classifications)
+
+        cluster.assert_not_called()
+        assert len(grouped["quarto_1"]) == 2
+
+
+class _FakeLocalClusterer:
+    """LocalRoomClusterer stand-in returning a fixed result (or raising)."""
+
+    def __init__(self, result: LocalClustering | None | Exception):
+        self.result = result
+        self.config = LocalClusteringConfig(min_confidence=0.5)
+        self.recorded: list[tuple[bool, int]] = []
+
+    async def cluster(self, image_refs, expected_rooms=None):
+        if isinstance(self.result, Exception):
+            raise self.result
+        return self.result
+
+    def record(self, accepted: bool, gpt_calls: int = 1) -> None:
+        self.recorded.append((accepted, gpt_calls))
+
+
+class TestLocalClustering:
+    """A confident local clustering replaces the GPT call; otherwise GPT clusters."""
+
+    URLS = ["http://img/q1.jpg", "http://img/q2.jpg", "http://img/q3.jpg"]
+    LOCAL = [
+        RoomCluster(room_number=1, image_indices=[0, 2], confidence=0.8),
+        RoomCluster(room_number=2, image_indices=[1], confidence=1.0),
+    ]
+    GPT = [RoomCluster(room_number=1, image_indices=[0, 1, 2], confidence=0.9)]
+
+    def _bedrooms(self) -> list[ImageClassification]:
+        return [
+            ImageClassification(
+                image_url=url, room_type=RoomType.BEDROOM, room_number=1, confidence=0.9
+            )
+            for url in self.URLS
+        ]
+
+    async def _group(self, local_result) -> tuple[dict, AsyncMock, _FakeLocalClusterer]:
+        local = _FakeLocalClusterer(local_result)
+        classifier = ImageClassifierService(openai_api_key="sk-fake-key", local_clusterer=local)
+        with patch.object(
+            classifier, "cluster_room_images", new_callable=AsyncMock, return_value=self.GPT
+        ) as gpt:
+            grouped = await classifier.group_by_room(self._bedrooms(), num_rooms=2)
+        return grouped, gpt, local
+
+    @pytest.mark.asyncio
+    async def test_confident_local_result_skips_gpt(self):
+        grouped, gpt, local = await self._group(LocalClustering(self.LOCAL, confidence=0.7))
+
+        gpt.assert_not_called()
+        assert [c.image_url for c in grouped["quarto_1"]] == [self.URLS[0], self.URLS[2]]
+        assert [c.image_url for c in grouped["quarto_2"]] == [self.URLS[1]]
+        assert local.recorded == [(True, 1)]
+
+    @pytest.mark.asyncio
+    async def test_unsure_local_result_falls_back_to_gpt(self):
+        grouped, gpt, local = await self._group(LocalClustering(self.LOCAL, confidence=0.3))
+
+        gpt.assert_awaited_once()
+        assert len(grouped["quarto_1"]) == 3
+        assert local.recorded == [(False, 1)]
+
+    @pytest.mark.asyncio
+    async def test_unavailable_bytes_fall_back_to_gpt(self):
+        _, gpt, local = await self._group(None)
+
+        gpt.assert_awaited_once()
+        assert local.recorded == [(False, 1)]
+
+    @pytest.mark.asyncio
+    async def test_local_error_falls_back_to_gpt(self):
+        _, gpt, _ = await self._group(RuntimeError("decoder crashed"))
+
+        gpt.assert_awaited_once()
@@ -0,0 +1,146 @@
+"""
+Tests for near-duplicate photo detection (dHash).
+
+Photos are generated in memory with Pillow: random coloured rectangles, then
+resized, re-encoded or slightly cropped to make near-duplicates. Covers the
+hash itself, flat and undecodable images, find_duplicates() over store handles
+and data URIs, incremental matching, the hash cache and stats.
+"""
+
+import base64
+import io
+import random
+
+import pytest
+from PIL import Image, ImageDraw
+
+from app.config import ImageDedupConfig
+from app.services.image_dedup import (
+    ImageDeduplicator,
+    difference_hash,
+    hamming_distance,
+)
+from app.services.image_store import ImageStore
+
+
+def _photo(seed: int, size: tuple[int, int] = (640, 480)) -> Image.Image:
+    rnd = random.Random(seed)
+    image = Image.new("RGB", size)
+    draw = ImageDraw.Draw(image)
+    width, height = size
+    for _ in range(12):
+        x, y = rnd.randrange(width), rnd.randrange(height)
+        box = [x, y, x + rnd.randrange(width // 2), y + rnd.randrange(height // 2)]
+        draw.rectangle(box, fill=tuple(rnd.randrange(256) for _ in range(3)))
+    return image
+
+
+def _encode(image: Image.Image, fmt: str = "JPEG", **options) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format=fmt, **options)
+    return buffer.getvalue()
+
+
+def _data_uri(data: bytes) -> str:
+    return f"data:image/jpeg;base64,{base64.b64encode(data).decode()}"
+
+
+@pytest.fixture
+def deduplicator():
+    dedup = ImageDeduplicator(ImageDedupConfig(max_workers=2))
+    yield dedup
+    dedup.close()
+
+
+class TestDifferenceHash:
+    def test_resized_and_recompressed_copy_hashes_the_same(self):
+        photo = _photo(1)
+        original = difference_hash(_encode(photo, quality=90))
+        smaller = difference_hash(_encode(photo.resize((320, 240)), quality=60))
+        assert hamming_distance(original, smaller) <= 2
+
+    def test_slight_crop_stays_within_threshold(self):
+        photo = _photo(1)
+        cropped = photo.crop((16, 12, 624, 468))
+        distance = hamming_distance(
+            difference_hash(_encode(photo)), difference_hash(_encode(cropped))
+        )
+        assert distance <= ImageDedupConfig().max_distance
+
+    def test_different_photos_are_far_apart(self):
+        first = difference_hash(_encode(_photo(1)))
+        for seed in range(2, 6):
+            distance = hamming_distance(first, difference_hash(_encode(_photo(seed))))
+            assert distance > ImageDedupConfig().max_distance
+
+    def test_flat_image_is_not_hashed(self):
+        assert difference_hash(_encode(Image.new("RGB", (200, 100), "white"))) is None
+
+    def test_undecodable_bytes_are_not_hashed(self):
+        assert difference_hash(b"not an image") is None
+
+
+class TestFindDuplicates:
+    @pytest.mark.asyncio
+    async def test_maps_duplicates_to_the_first_photo_of_each_shot(self, deduplicator):
+        photo, other = _photo(1), _photo(2)
+        refs = [
+            _data_uri(_encode(photo, quality=90)),
+            _data_uri(_encode(other)),
+            _data_uri(_encode(photo.resize((320, 240)), quality=60)),
+        ]
+
+        duplicates = await deduplicator.find_duplicates(refs)
+
+        assert duplicates == {refs[2]: refs[0]}
+        assert deduplicator.stats()["duplicates"] == 1
+
+    @pytest.mark.asyncio
+    async def test_reads_store_handles(self):
+        store = ImageStore(max_bytes=10_000_000)
+        photo = _photo(3)
+        first = store.put("https://cdn/a.jpg", "image/jpeg", _encode(photo, quality=95))
+        second = store.put("https://cdn/b.jpg", "image/jpeg", _encode(photo, quality=50))
+        dedup = ImageDeduplicator(store=store)
+
+        assert await dedup.find_duplicates([first, second]) == {second: first}
+        dedup.close()
+
+    @pytest.mark.asyncio
+    async def test_plain_urls_and_flat_images_are_never_collapsed(self, deduplicator):
+        white = _data_uri(_encode(Image.new("RGB", (200, 100), "white")))
+        refs = ["https://cdn/a.jpg", "https://cdn/a.jpg?w=2", white, white]
+
+        assert await deduplicator.find_duplicates(refs) == {}
+
+    @pytest.mark.asyncio
+    async def test_hashes_are_cached_by_content(self, deduplicator):
+        ref = _data_uri(_encode(_photo(4)))
+        await deduplicator.find_duplicates([ref])
+        await deduplicator.find_duplicates([ref])
+
+        stats = deduplicator.stats()
+        assert stats["hashed"] == 1
+        assert stats["hash_cache_hits"] == 1
+
+
+class TestDuplicateIndex:
+    @pytest.mark.asyncio
+    async def test_matches_incrementally(self, deduplicator):
+        photo = _photo(5)
+        first = _data_uri(_encode(photo))
+        second = _data_uri(_encode(_photo(6)))
+        third = _data_uri(_encode(photo.resize((400, 300))))
+        index = deduplicator.index()
+
+        assert await index.match(first) is None
+        assert await index.match(second) is None
+        assert await index.match(third) == first
+
+    @pytest.mark.asyncio
+    async def test_repeated_reference_is_not_its_own_duplicate(self, deduplicator):
+        ref = _data_uri(_encode(_photo(7)))
+        index = deduplicator.index()
+
+        assert await index.match(ref) is None
+        assert await index.match(ref) is None
@@ -1,15 +1,18 @@
 """
 Tests for the ImageDownloaderService.
 
-All HTTP calls are mocked via unittest.mock — no real network traffic.
+All HTTP calls are mocked via unittest.mock — the service's pooled client is
+patched per test, so there is no real network traffic.
 """
 
+import asyncio
 from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
 
 from app.config import ImageProcessingConfig
 from app.services.image_downloader import ImageDownloaderService
+from app.services.image_store import ImageStore, original_url
 
 MAX_IMAGES = ImageProcessingConfig().max_images_in_memory
 
@@ -42,9 +45,7 @@ class TestDownloadImages:
         urls = ["http://cdn.example.com/a.jpg", "http://cdn.example.com/b.jpg"]
         fake_resp = _make_mock_response(b"\xde\xad\xbe\xef", "image/jpeg")
 
-        with patch("app.services.image_downloader.httpx.AsyncClient") as mock_client_cls:
-            mock_client = AsyncMock()
-            mock_client_cls.return_value.__aenter__.return_value = mock_client
+        with patch.object(downloader, "_client") as mock_client:
             mock_client.get = AsyncMock(return_value=fake_resp)
 
             result = await downloader.download_images(urls)
@@ -67,9 +68,7 @@ class TestDownloadImages:
                 raise Exception("Connection refused")
             return good_resp
 
-        with patch("app.services.image_downloader.httpx.AsyncClient") as mock_client_cls:
-            mock_client = AsyncMock()
-            mock_client_cls.return_value.__aenter__.return_value = mock_client
+        with patch.object(downloader, "_client") as mock_client:
             mock_client.get = _get
 
             result = await downloader.download_images([good_url, bad_url])
@@ -81,10 +80,10 @@ class TestDownloadImages:
     @pytest.mark.asyncio
     async def test_empty_list_returns_empty(self, downloader: ImageDownloaderService):
         """Empty input should return an empty dict with no HTTP calls."""
-        with patch("app.services.image_downloader.httpx.AsyncClient") as mock_client_cls:
+        with patch.object(downloader, "_client") as mock_client:
             result = await downloader.download_images([])
 
-        mock_client_cls.assert_not_called()
+        mock_client.get.assert_not_called()
         assert result == {}
 
     @pytest.mark.asyncio
@@ -93,9 +92,7 @@ class TestDownloadImages:
         urls = [f"http://cdn.example.com/img{i}.jpg" for i in range(MAX_IMAGES + 5)]
         fake_resp = _make_mock_response(b"\x89PNG", "image/png")
 
-        with patch("app.services.image_downloader.httpx.AsyncClient") as mock_client_cls:
-            mock_client = AsyncMock()
-            mock_client_cls.return_value.__aenter__.return_value = mock_client
+        with patch.object(downloader, "_client") as mock_client:
             mock_client.get = AsyncMock(return_value=fake_resp)
 
             result = await downloader.download_images(urls)
@@ -108,9 +105,7 @@ class TestDownloadImages:
         url = "http://example.com/photo.jpg"
         fake_resp = _make_mock_response(b"\xff\xd8", "image/jpeg")
 
-        with patch("app.services.image_downloader.httpx.AsyncClient") as mock_client_cls:
-            mock_client = AsyncMock()
-            mock_client_cls.return_value.__aenter__.return_value = mock_client
+        with patch.object(downloader, "_client") as mock_client:
             mock_client.get = AsyncMock(return_value=fake_resp)
 
             result = await downloader.download_images([url])
@@ -123,9 +118,7 @@ class TestDownloadImages:
         url = "http://example.com/photo.png"
         fake_resp = _make_mock_response(b"\x89PNG\r\n", "image/png")
 
-        with patch("app.services.image_downloader.httpx.AsyncClient") as mock_client_cls:
-            mock_client = AsyncMock()
-            mock_client_cls.return_value.__aenter__.return_value = mock_client
+        with patch.object(downloader, "_client") as mock_client:
             mock_client.get = AsyncMock(return_value=fake_resp)
 
             result = await downloader.download_images([url])
@@ -138,9 +131,7 @@ class TestDownloadImages:
         url = "http://example.com/photo.webp"
         fake_resp = _make_mock_response(b"RIFF", "image/webp")
 
-        with patch("app.services.image_downloader.httpx.AsyncClient") as mock_client_cls:
-            mock_client = AsyncMock()
-            mock_client_cls.return_value.__aenter__.return_value = mock_client
+        with patch.object(downloader, "_client") as mock_client:
             mock_client.get = AsyncMock(return_value=fake_resp)
 
             result = await downloader.download_images([url])
@@ -153,9 +144,7 @@ class TestDownloadImages:
         url = "http://example.com/photo.xyz"
         fake_resp = _make_mock_response(b"\xde\xad", "application/octet-stream")
 
-        with patch("app.services.image_downloader.httpx.AsyncClient") as mock_client_cls:
-            mock_client = AsyncMock()
-            mock_client_cls.return_value.__aenter__.return_value = mock_client
+        with patch.object(downloader, "_client") as mock_client:
             mock_client.get = AsyncMock(return_value=fake_resp)
 
             result = await downloader.download_images([url])
@@ -168,9 +157,7 @@ class TestDownloadImages:
         url = "http://example.com/photo.jpg"
         fake_resp = _make_mock_response(b"\xff\xd8", "image/jpeg; charset=utf-8")
 
-        with patch("app.services.image_downloader.httpx.AsyncClient") as mock_client_cls:
-            mock_client = AsyncMock()
-            mock_client_cls.return_value.__aenter__.return_value = mock_client
+        with patch.object(downloader, "_client") as mock_client:
             mock_client.get = AsyncMock(return_value=fake_resp)
 
             result = await downloader.download_images([url])
@@ -186,9 +173,7 @@ class TestDownloadImages:
         url = "http://example.com/img.jpg"
         fake_resp = _make_mock_response(original_bytes, "image/jpeg")
 
-        with patch("app.services.image_downloader.httpx.AsyncClient") as mock_client_cls:
-            mock_client = AsyncMock()
-            mock_client_cls.return_value.__aenter__.return_value = mock_client
+        with patch.object(downloader, "_client") as mock_client:
             mock_client.get = AsyncMock(return_value=fake_resp)
 
             result = await downloader.download_images([url])
@@ -205,11 +190,144 @@ class TestDownloadImages:
         async def _get(url, **_):
             raise Exception("Timeout")
 
-        with patch("app.services.image_downloader.httpx.AsyncClient") as mock_client_cls:
-            mock_client = AsyncMock()
-            mock_client_cls.return_value.__aenter__.return_value = mock_client
+        with patch.object(downloader, "_client") as mock_client:
             mock_client.get = _get
 
             result = await downloader.download_images(urls)
 
         assert result == {}
+
+
+class TestPooledClient:
+    """Tests for the long-lived pooled client and per-host cap."""
+
+    @pytest.mark.asyncio
+    async def test_client_reused_across_calls(self, downloader: ImageDownloaderService):
+        """Consecutive downloads go through the same client instance."""
+        fake_resp = _make_mock_response()
+
+        with patch.object(downloader, "_client") as mock_client:
+            mock_client.get = AsyncMock(return_value=fake_resp)
+            await downloader.download_images(["http://cdn.example.com/a.jpg"])
+            await downloader.download_images(["http://cdn.example.com/b.jpg"])
+
+        assert mock_client.get.await_count == 2
+
+    @pytest.mark.asyncio
+    async def test_client_configured_from_settings(self):
+        config = ImageProcessingConfig(download_http2=False, download_max_connections=7)
+        downloader = ImageDownloaderService(config)
+        try:
+            pool = downloader._client._transport._pool
+            assert pool._http2 is False
+            assert pool._max_connections == 7
+        finally:
+            await downloader.close()
+
+        assert downloader._client.is_closed
+
+    @pytest.mark.asyncio
+    async def test_per_host_cap(self):
+        """No more than download_max_connections_per_host requests hit one host at once."""
+        config = ImageProcessingConfig(
+            max_concurrent_downloads=10, download_max_connections_per_host=2
+        )
+        downloader = ImageDownloaderService(config)
+        in_flight = 0
+        peak = 0
+
+        async def _get(url: str, **_):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            return _make_mock_response()
+
+        urls = [f"http://cdn.example.com/{i}.jpg" for i in range(8)]
+        with patch.object(downloader, "_client") as mock_client:
+            mock_client.get = _get
+            result = await downloader.download_images(urls)
+
+        assert len(result) == 8
+        assert peak == 2
+
+
+class TestImageStoreMode:
+    """download_images() returns store handles when an ImageStore is configured."""
+
+    @pytest.mark.asyncio
+    async def test_returns_handles_and_stores_bytes(self):
+        store = ImageStore(max_bytes=1024 * 1024)
+        downloader = ImageDownloaderService(image_store=store)
+        url = "http://cdn.example.com/a.jpg"
+
+        with patch.object(downloader, "_client") as mock_client:
+            mock_client.get = AsyncMock(return_value=_make_mock_response(b"\xff\xd8img", "image/jpeg"))
+            result = await downloader.download_images([url])
+
+        handle = result[url]
+        assert not handle.startswith("data:")
+        assert original_url(handle) == url
+        assert store.get(handle) == ("image/jpeg", b"\xff\xd8img")
+
+
+class TestStreamImages:
+    """stream_images() yields each image as its download completes."""
+
+    @pytest.mark.asyncio
+    async def test_yields_in_completion_order(self, downloader: ImageDownloaderService):
+        slow, fast = "http://cdn.example.com/slow.jpg", "http://cdn.example.com/fast.jpg"
+
+        async def _get(url: str, **_):
+            await asyncio.sleep(0.05 if url == slow else 0)
+            return _make_mock_response()
+
+        with patch.object(downloader, "_client") as mock_client:
+            mock_client.get = _get
+            order = [url async for url, _ in downloader.stream_images([slow, fast])]
+
+        assert order == [fast, slow]
+
+    @pytest.mark.asyncio
+    async def test_failures_and_capped_urls_yield_none(self):
+        downloader = ImageDownloaderService(ImageProcessingConfig(max_images_in_memory=2))
+        urls = ["http://a/ok.jpg", "http://a/bad.jpg", "http://a/over-cap.jpg"]
+
+        async def _get(url: str, **_):
+            if "bad" in url:
+                raise Exception("Connection refused")
+            return _make_mock_response()
+
+        with patch.object(downloader, "_client") as mock_client:
+            mock_client.get = _get
+            results = dict([item async for item in downloader.stream_images(urls)])
+
+        assert results["http://a/ok.jpg"].startswith("data:image/jpeg;base64,")
+        assert results["http://a/bad.jpg"] is None
+        assert results["http://a/over-cap.jpg"] is None
+
+    @pytest.mark.asyncio
+    async def test_backpressure_bounds_downloads_ahead_of_consumer(self):
+        """A stalled consumer stops new downloads once the queue and slots are full."""
+        config = ImageProcessingConfig(max_concurrent_downloads=2)
+        downloader = ImageDownloaderService(config)
+        urls = [f"http://cdn.example.com/{i}.jpg" for i in range(10)]
+        fetched = 0
+
+        async def _get(url: str, **_):
+            nonlocal fetched
+            fetched += 1
+            return _make_mock_response()
+
+        with patch.object(downloader, "_client") as mock_client:
+            mock_client.get = _get
+            stream = downloader.stream_images(urls, queue_size=1)
+            await anext(stream)
+            await asyncio.sleep(0.05)  # consumer stalls
+            # 1 consumed + 1 queued + 2 slots blocked on put
+            assert fetched <= 4
+            rest = [item async for item in stream]
+
+        assert len(rest) == 9
+        assert fetched == 10
@@ -0,0 +1,140 @@
+"""
+Tests for ImagePreparer — per-detail downscaling, re-encoding and variant caching.
+
+Images are generated in memory with Pillow; no network or OpenAI calls.
+"""
+
+import base64
+import io
+
+import pytest
+from PIL import Image
+
+from app.config import ImagePreparationConfig
+from app.services.image_preparer import (
+    ImagePreparer,
+    decode_data_uri,
+    image_content_parts,
+    target_size,
+)
+
+
+def _data_uri(width: int, height: int, fmt: str = "PNG") -> str:
+    img = Image.new("RGB", (width, height))
+    # Non-uniform pixels so encoders cannot compress to nothing
+    img.putdata([((x * 7) % 256, (y * 3) % 256, (x * y) % 256) for y in range(height) for x in range(width)])
+    buf = io.BytesIO()
+    img.save(buf, format=fmt)
+    mime = "image/png" if fmt == "PNG" else "image/jpeg"
+    return f"data:{mime};base64,{base64.b64encode(buf.getvalue()).decode()}"
+
+
+def _size_of(data_uri: str) -> tuple[int, int]:
+    _, raw = decode_data_uri(data_uri)
+    with Image.open(io.BytesIO(raw)) as img:
+        return img.size
+
+
+@pytest.fixture
+def preparer():
+    prep = ImagePreparer(ImagePreparationConfig(max_workers=2))
+    yield prep
+    prep.close()
+
+
+class TestTargetSize:
+    def test_low_fits_512(self):
+        assert target_size(4000, 3000, "low") == (512, 384)
+
+    def test_high_caps_short_side_768(self):
+        assert target_size(4000, 3000, "high") == (1024, 768)
+
+    def test_high_fits_2048_before_short_side(self):
+        # 8000x1000 → fit 2048 → 2048x256; short side already < 768
+        assert target_size(8000, 1000, "high") == (2048, 256)
+
+    def test_auto_treated_as_high(self):
+        assert target_size(4000, 3000, "auto") == target_size(4000, 3000, "high")
+
+    def test_never_upscales(self):
+        assert target_size(300, 200, "low") == (300, 200)
+        assert target_size(600, 400, "high") == (600, 400)
+
+
+class TestImagePreparer:
+    @pytest.mark.asyncio
+    async def test_low_variant_resized_and_reencoded(self, preparer: ImagePreparer):
+        original = _data_uri(1200, 900)
+        prepared = await preparer.prepare(original, "low")
+
+        assert prepared.startswith("data:image/jpeg;base64,")
+        assert _size_of(prepared) == (512, 384)
+        assert len(prepared) < len(original)
+
+    @pytest.mark.asyncio
+    async def test_high_variant_geometry(self, preparer: ImagePreparer):
+        prepared = await preparer.prepare(_data_uri(1600, 1200), "high")
+        assert _size_of(prepared) == (1024, 768)
+
+    @pytest.mark.asyncio
+    async def test_variants_cached_per_detail(self, preparer: ImagePreparer):
+        original = _data_uri(1200, 900)
+        low = await preparer.prepare(original, "low")
+        high = await preparer.prepare(original, "high")
+
+        assert low != high
+        assert await preparer.prepare(original, "low") == low
+        assert preparer.stats()["cache_hits"] == 1
+        assert preparer.stats()["cached_variants"] == 2
+
+    @pytest.mark.asyncio
+    async def test_http_url_passes_through(self, preparer: ImagePreparer):
+        url = "https://cdn.idealista.pt/img.jpg"
+        assert await preparer.prepare(url, "low") == url
+
+    @pytest.mark.asyncio
+    async def test_undecodable_image_returns_original(self, preparer: ImagePreparer):
+        bogus = "data:image/jpeg;base64," + base64.b64encode(b"not an image").decode()
+        assert await preparer.prepare(bogus, "low") == bogus
+
+    @pytest.mark.asyncio
+    async def test_small_jpeg_kept_when_reencode_is_larger(self):
+        preparer = ImagePreparer(ImagePreparationConfig(quality=100))
+        original = _data_uri(64, 48, fmt="JPEG")
+        try:
+            assert await preparer.prepare(original, "low") == original
+        finally:
+            preparer.close()
+
+    @pytest.mark.asyncio
+    async def test_cache_byte_cap_evicts(self):
+        preparer = ImagePreparer(ImagePreparationConfig(cache_max_mb=0))
+        try:
+            await preparer.prepare(_data_uri(800, 600), "low")
+            await preparer.prepare(_data_uri(800, 601), "low")
+            assert preparer.stats()["cached_variants"] == 1
+        finally:
+            preparer.close()
+
+    def test_unknown_format_rejected(self):
+        with pytest.raises(ValueError):
+            ImagePreparer(ImagePreparationConfig(format="gif"))
+
+
+class TestImageContentParts:
+    @pytest.mark.asyncio
+    async def test_without_preparer_urls_unchanged(self):
+        parts = await image_content_parts(["http://a/1.jpg", "http://a/2.jpg"], "high")
+        assert parts == [
+            {"type": "image_url", "image_url": {"url": "http://a/1.jpg", "detail": "high"}},
+            {"type": "image_url", "image_url": {"url": "http://a/2.jpg", "detail": "high"}},
+        ]
+
+    @pytest.mark.asyncio
+    async def test_with_preparer_keeps_order(self, preparer: ImagePreparer):
+        urls = [_data_uri(1000, 800), "http://a/2.jpg"]
+        parts = await image_content_parts(urls, "low", preparer)
+
+        assert _size_of(parts[0]["image_url"]["url"]) == (512, 410)
+        assert parts[1]["image_url"]["url"] == "http://a/2.jpg"
+        assert all(p["image_url"]["detail"] == "low" for p in parts)
@@ -0,0 +1,93 @@
+"""
+Tests for ImageStore — content-addressed handles, LRU byte bound and resolution.
+"""
+
+import base64
+from unittest.mock import AsyncMock
+
+import pytest
+
+from app.services.image_store import (
+    ImageStore,
+    handle_digest,
+    is_image_handle,
+    original_url,
+)
+
+URL = "https://img3.idealista.pt/blur/WEB_DETAIL/0/img1.jpg"
+
+
+class TestHandles:
+    def test_handle_embeds_original_url(self):
+        handle = ImageStore(max_bytes=1024).put(URL, "image/jpeg", b"\xff\xd8abc")
+
+        assert is_image_handle(handle)
+        assert original_url(handle) == URL
+        assert len(handle) < len(URL) + 25
+
+    def test_same_bytes_same_digest(self):
+        store = ImageStore(max_bytes=1024)
+        a = store.put("https://cdn/a.jpg", "image/jpeg", b"same")
+        b = store.put("https://cdn/b.jpg", "image/jpeg", b"same")
+
+        assert handle_digest(a) == handle_digest(b)
+        assert store.stats()["images"] == 1
+        assert store.stats()["bytes"] == 4
+
+    def test_original_url_passthrough(self):
+        assert original_url(URL) == URL
+        assert original_url("data:image/jpeg;base64,AAAA") == "data:image/jpeg;base64,AAAA"
+        assert not is_image_handle(URL)
+
+
+class TestImageStore:
+    def test_get_roundtrip(self):
+        store = ImageStore(max_bytes=1024)
+        handle = store.put(URL, "image/png", b"png-bytes")
+        assert store.get(handle) == ("image/png", b"png-bytes")
+        assert store.get(URL) is None
+
+    def test_evicts_least_recently_used_by_bytes(self):
+        store = ImageStore(max_bytes=10)
+        first = store.put("https://cdn/1.jpg", "image/jpeg", b"aaaa")
+        second = store.put("https://cdn/2.jpg", "image/jpeg", b"bbbb")
+        store.get(first)  # second is now least recently used
+        store.put("https://cdn/3.jpg", "image/jpeg", b"cccc")
+
+        assert store.get(second) is None
+        assert store.get(first) is not None
+        assert store.stats()["bytes"] == 8
+        assert store.stats()["evictions"] == 1
+
+    @pytest.mark.asyncio
+    async def test_resolve_without_preparer_returns_data_uri(self):
+        store = ImageStore(max_bytes=1024)
+        handle = store.put(URL, "image/jpeg", b"raw")
+
+        resolved = await store.resolve(handle, "low")
+        assert resolved == "data:image/jpeg;base64," + base64.b64encode(b"raw").decode()
+
+    @pytest.mark.asyncio
+    async def test_resolve_uses_preparer_with_digest(self):
+        preparer = AsyncMock()
+        preparer.prepare_bytes = AsyncMock(return_value="data:image/jpeg;base64,c21hbGw=")
+        store = ImageStore(max_bytes=1024, preparer=preparer)
+        handle = store.put(URL, "image/png", b"raw")
+
+        assert await store.resolve(handle, "high") == "data:image/jpeg;base64,c21hbGw="
+        mime, raw, detail = preparer.prepare_bytes.call_args.args
+        assert (mime, raw, detail) == ("image/png", b"raw", "high")
+        assert preparer.prepare_bytes.call_args.kwargs["digest"].startswith(handle_digest(handle))
+
+    @pytest.mark.asyncio
+    async def test_evicted_handle_falls_back_to_original_url(self):
+        store = ImageStore(max_bytes=4)
+        handle = store.put(URL, "image/jpeg", b"aaaa")
+        store.put("https://cdn/2.jpg", "image/jpeg", b"bbbb")
+
+        assert await store.resolve(handle, "low") == URL
+        assert store.stats()["misses"] == 1
+
+    @pytest.mark.asyncio
+    async def test_plain_url_passes_through(self):
+        assert await ImageStore(max_bytes=4).resolve(URL, "low") == URL
@@ -0,0 +1,183 @@
+"""
+Tests for local visual room clustering.
+
+Rooms are rendered in memory with Pillow (near-white walls, a floor, coloured
+furniture) and photographed with different crops and exposure. Covers the
+descriptors, the distance matrix, agglomeration with and without a room cap,
+silhouettes, LocalRoomClusterer over store handles and data URIs, missing
+bytes, reuse of the deduplicator's decoded photos and stats.
+"""
+
+import base64
+import io
+import random
+from dataclasses import replace
+
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw, ImageEnhance
+
+from app.config import ImageDedupConfig, LocalClusteringConfig
+from app.services.image_dedup import ImageDeduplicator, difference_hash, image_signature
+from app.services.image_store import ImageStore
+from app.services.local_clustering import (
+    LocalRoomClusterer,
+    agglomerate,
+    distance_matrix,
+    image_descriptor,
+    signature_descriptor,
+    silhouettes,
+)
+
+ROOMS = {
+    "blue": [(30, 60, 170), (200, 180, 40)],
+    "red": [(180, 30, 40), (40, 140, 60)],
+}
+
+
+def _shot(room: str, seed: int) -> bytes:
+    rnd = random.Random(seed)
+    scene = Image.new("RGB", (1200, 800), (236, 233, 226))
+    draw = ImageDraw.Draw(scene)
+    draw.rectangle([0, 540, 1200, 800], fill=(150, 111, 74))
+    for n, color in enumerate(ROOMS[room]):
+        draw.rectangle([150 + n * 500, 300, 550 + n * 500, 620], fill=color)
+    left, top = rnd.randint(0, 300), rnd.randint(0, 100)
+    shot = scene.crop((left, top, left + 900, top + 675)).resize((640, 480))
+    shot = ImageEnhance.Brightness(shot).enhance(rnd.uniform(0.9, 1.1))
+    buffer = io.BytesIO()
+    shot.save(buffer, format="JPEG", quality=80)
+    return buffer.getvalue()
+
+
+def _data_uri(data: bytes) -> str:
+    return f"data:image/jpeg;base64,{base64.b64encode(data).decode()}"
+
+
+@pytest.fixture
+def clusterer():
+    local = LocalRoomClusterer(LocalClusteringConfig())
+    yield local
+    local.close()
+
+
+class TestDescriptors:
+    def test_histogram_is_normalised(self):
+        descriptor = image_descriptor(_shot("blue", 1))
+        assert descriptor.histogram.sum() == pytest.approx(1.0)
+        assert np.linalg.norm(descriptor.thumbnail) == pytest.approx(1.0)
+        assert descriptor.hash_bits.shape == (64,)
+
+    def test_hash_bits_are_the_dedup_hash(self):
+        data = _shot("blue", 1)
+        bits = image_descriptor(data).hash_bits
+        assert int("".join("1" if bit else "0" for bit in bits), 2) == difference_hash(data)
+
+    def test_hash_with_the_top_bit_set(self):
+        signature = image_signature(_shot("blue", 1), keep_thumbnail=True)
+        descriptor = signature_descriptor(replace(signature, dhash=2**64 - 1))
+        assert descriptor.hash_bits.all()
+
+    def test_undecodable_bytes_have_no_descriptor(self):
+        assert image_descriptor(b"not an image") is None
+
+    def test_same_room_is_closer_than_another_room(self):
+        shots = [("blue", 1), ("blue", 2), ("red", 3)]
+        distances = distance_matrix([image_descriptor(_shot(room, seed)) for room, seed in shots])
+        assert distances[0, 1] < distances[0, 2]
+        assert np.allclose(distances, distances.T)
+        assert np.all(np.diag(distances) == 0)
+
+
+class TestAgglomerate:
+    DISTANCES = np.array(
+        [
+            [0.0, 0.1, 0.8, 0.9],
+            [0.1, 0.0, 0.85, 0.8],
+            [0.8, 0.85, 0.0, 0.2],
+            [0.9, 0.8, 0.2, 0.0],
+        ]
+    )
+
+    def test_merges_below_threshold(self):
+        assert agglomerate(self.DISTANCES, threshold=0.4) == [[0, 1], [2, 3]]
+
+    def test_room_cap_forces_further_merges(self):
+        assert agglomerate(self.DISTANCES, threshold=0.05, max_clusters=2) == [[0, 1], [2, 3]]
+        assert agglomerate(self.DISTANCES, threshold=0.4, max_clusters=1) == [[0, 1, 2, 3]]
+
+    def test_silhouettes_of_well_separated_clusters(self):
+        scores = silhouettes(self.DISTANCES, [[0, 1], [2, 3]])
+        assert np.all(scores > 0.7)
+
+    def test_singleton_scores_one(self):
+        scores = silhouettes(self.DISTANCES, [[0, 1, 2], [3]])
+        assert scores[3] == 1.0
+
+
+class TestLocalRoomClusterer:
+    @pytest.mark.asyncio
+    async def test_separates_two_rooms(self, clusterer):
+        refs = [
+            _data_uri(_shot(room, seed))
+            for room, seed in [("blue", 1), ("red", 2), ("blue", 3), ("red", 4)]
+        ]
+
+        result = await clusterer.cluster(refs, expected_rooms=2)
+
+        assert [c.image_indices for c in result.clusters] == [[0, 2], [1, 3]]
+        assert [c.room_number for c in result.clusters] == [1, 2]
+        assert result.confidence >= clusterer.config.min_confidence
+
+    @pytest.mark.asyncio
+    async def test_never_exceeds_expected_rooms(self, clusterer):
+        refs = [_data_uri(_shot(room, seed)) for room, seed in [("blue", 1), ("red", 2)]]
+
+        result = await clusterer.cluster(refs, expected_rooms=1)
+
+        assert [c.image_indices for c in result.clusters] == [[0, 1]]
+        assert result.confidence < clusterer.config.min_confidence
+
+    @pytest.mark.asyncio
+    async def test_reads_store_handles(self):
+        store = ImageStore(max_bytes=10_000_000)
+        refs = [
+            store.put(f"https://cdn/{seed}.jpg", "image/jpeg", _shot(room, seed))
+            for room, seed in [("blue", 1), ("blue", 2)]
+        ]
+        deduplicator = ImageDeduplicator(store=store, keep_thumbnails=True)
+        local = LocalRoomClusterer(deduplicator=deduplicator)
+
+        result = await local.cluster(refs)
+
+        assert [c.image_indices for c in result.clusters] == [[0, 1]]
+        deduplicator.close()
+
+    @pytest.mark.asyncio
+    async def test_plain_urls_cannot_be_clustered(self, clusterer):
+        refs = ["https://cdn/a.jpg", _data_uri(_shot("blue", 1))]
+
+        assert await clusterer.cluster(refs) is None
+        assert clusterer.stats()["undescribed"] == 1
+
+    @pytest.mark.asyncio
+    async def test_photos_hashed_by_the_deduplicator_are_not_decoded_again(self):
+        deduplicator = ImageDeduplicator(ImageDedupConfig(max_workers=2), keep_thumbnails=True)
+        local = LocalRoomClusterer(deduplicator=deduplicator)
+        refs = [_data_uri(_shot("blue", 1)), _data_uri(_shot("red", 2))]
+
+        await deduplicator.find_duplicates(refs)
+        result = await local.cluster(refs)
+
+        assert len(result.clusters) == 2
+        assert deduplicator.stats()["hashed"] == 2
+        deduplicator.close()
+
+    def test_stats_count_avoided_gpt_calls(self, clusterer):
+        clusterer.record(True, gpt_calls=2)
+        clusterer.record(False)
+
+        stats = clusterer.stats()
+        assert stats["accepted"] == 1
+        assert stats["deferred_to_gpt"] == 1
+        assert stats["gpt_calls_avoided"] == 2
@@ -1,9 +1,15 @@
-"""Unit tests for the centralized OpenAI client factory."""
+"""Unit tests for the centralized OpenAI client factory and shared connection pool."""
 
 import pytest
 from openai import AsyncOpenAI
 
-from app.services.openai_client import get_openai_client
+from app.services.openai_client import (
+    close_openai_clients,
+    get_chat_model,
+    get_openai_client,
+    get_openai_http_client,
+)
+from app.services.openai_rate_limiter import RateLimitedTransport
 
 
 class TestGetOpenAIClient:
@@ -32,3 +38,38 @@ class TestGetOpenAIClient:
         # When tracing is disabled the client should be a plain AsyncOpenAI,
         # not wrapped by LangSmith (which produces a different type).
         assert type(client).__name__ == "AsyncOpenAI"
+
+
+class TestSharedConnectionPool:
+    def test_clients_share_one_transport_per_key_and_base_url(self):
+        a = get_openai_client("sk-a")
+        b = get_openai_client("sk-a")
+        other_key = get_openai_client("sk-b")
+        other_url = get_openai_client("sk-a", base_url="http://127.0.0.1:9/v1")
+
+        assert a is not b  # cheap per-service wrappers...
+        assert a._client is b._client  # ...on one pooled httpx client
+        assert other_key._client is not a._client
+        assert other_url._client is not a._client
+        assert str(other_url.base_url) == "http://127.0.0.1:9/v1/"
+
+    def test_chat_model_cached_per_model_on_shared_pool(self):
+        llm = get_chat_model("gpt-4o", "sk-a")
+
+        assert get_chat_model("gpt-4o", "sk-a") is llm
+        assert get_chat_model("gpt-4o-mini", "sk-a") is not llm
+        assert llm.http_async_client is get_openai_http_client("sk-a")
+
+    def test_pool_uses_rate_limited_transport(self):
+        transport = get_openai_http_client("sk-a")._transport
+        assert isinstance(transport, RateLimitedTransport)
+
+    @pytest.mark.asyncio
+    async def test_close_releases_pools(self):
+        http_client = get_openai_http_client("sk-a")
+        get_chat_model("gpt-4o", "sk-a")
+
+        await close_openai_clients()
+
+        assert http_client.is_closed
+        assert get_openai_http_client("sk-a") is not http_client
@@ -0,0 +1,238 @@
+"""
+Tests for the process-wide OpenAI rate limiter.
+
+Covers token estimation, retry-after parsing, token-bucket reservation, the
+AIMD concurrency window, and RateLimitedTransport against httpx.MockTransport —
+including the OpenAI SDK retrying a 429 through the limiter.
+"""
+
+import asyncio
+import json
+import time
+
+import httpx
+import pytest
+from openai import AsyncOpenAI
+
+from app.config import ModelRateLimits, OpenAIRateLimitConfig
+from app.services.openai_rate_limiter import (
+    HIGH_DETAIL_IMAGE_TOKENS,
+    LOW_DETAIL_IMAGE_TOKENS,
+    ModelRateLimiter,
+    OpenAIRateLimiter,
+    RateLimitedTransport,
+    TokenBucket,
+    estimate_request_tokens,
+    parse_retry_after,
+)
+
+CHAT_URL = "https://api.openai.com/v1/chat/completions"
+
+
+def _completion_body() -> dict:
+    return {
+        "id": "chatcmpl-1",
+        "object": "chat.completion",
+        "created": 0,
+        "model": "gpt-4o-mini",
+        "choices": [
+            {
+                "index": 0,
+                "message": {"role": "assistant", "content": "{}"},
+                "finish_reason": "stop",
+            }
+        ],
+    }
+
+
+class TestEstimateRequestTokens:
+    def test_counts_text_images_and_output_budget(self):
+        payload = {
+            "model": "gpt-4o-mini",
+            "messages": [
+                {"role": "system", "content": "x" * 400},
+                {
+                    "role": "user",
+                    "content": [
+                        {"type": "text", "text": "y" * 80},
+                        {"type": "image_url", "image_url": {"url": "data:...", "detail": "low"}},
+                        {"type": "image_url", "image_url": {"url": "https://a", "detail": "high"}},
+                    ],
+                },
+            ],
+            "max_tokens": 200,
+        }
+        expected = 120 + LOW_DETAIL_IMAGE_TOKENS + HIGH_DETAIL_IMAGE_TOKENS + 200
+        assert estimate_request_tokens(payload) == expected
+
+    def test_data_uri_size_is_not_counted_as_text(self):
+        small = {"messages": [{"role": "user", "content": [
+            {"type": "image_url", "image_url": {"url": "data:a", "detail": "low"}}
+        ]}]}
+        large = {"messages": [{"role": "user", "content": [
+            {"type": "image_url", "image_url": {"url": "data:" + "a" * 100_000, "detail": "low"}}
+        ]}]}
+        assert estimate_request_tokens(small) == estimate_request_tokens(large)
+
+    def test_empty_payload_is_at_least_one(self):
+        assert estimate_request_tokens({}) == 1
+
+
+class TestParseRetryAfter:
+    def test_prefers_milliseconds(self):
+        headers = httpx.Headers({"retry-after-ms": "250", "retry-after": "9"})
+        assert parse_retry_after(headers) == 0.25
+
+    def test_seconds(self):
+        assert parse_retry_after(httpx.Headers({"retry-after": "3"})) == 3.0
+
+    def test_http_date(self):
+        date = time.strftime("%a, %d %b %Y %H:%M:%S GMT", time.gmtime(time.time() + 30))
+        assert 25 < parse_retry_after(httpx.Headers({"retry-after": date})) <= 30
+
+    def test_missing_or_garbage(self):
+        assert parse_retry_after(httpx.Headers({})) is None
+        assert parse_retry_after(httpx.Headers({"retry-after": "soon"})) is None
+
+
+class TestTokenBucket:
+    def test_burst_then_wait_proportional_to_deficit(self):
+        bucket = TokenBucket(per_minute=600, burst_seconds=1)  # 10/s, capacity 10
+        assert bucket.reserve(10) == 0.0
+        assert bucket.reserve(5) == pytest.approx(0.5, abs=0.01)
+        # Reservations queue up behind each other
+        assert bucket.reserve(5) == pytest.approx(1.0, abs=0.01)
+
+
+class TestModelRateLimiter:
+    def _limiter(self, **overrides) -> ModelRateLimiter:
+        config = OpenAIRateLimitConfig(**overrides)
+        return ModelRateLimiter("m", 60_000, 10_000_000, config)
+
+    @pytest.mark.asyncio
+    async def test_concurrency_window_blocks_until_release(self):
+        limiter = self._limiter(max_concurrency=2)
+        await limiter.acquire(1)
+        await limiter.acquire(1)
+        third = asyncio.create_task(limiter.acquire(1))
+        await asyncio.sleep(0.01)
+        assert not third.done()
+        assert limiter.stats()["queued"] == 1
+
+        limiter.release()
+        await asyncio.wait_for(third, timeout=1)
+        assert limiter.stats()["in_flight"] == 2
+
+    @pytest.mark.asyncio
+    async def test_throttle_halves_window_and_pauses(self):
+        limiter = self._limiter(max_concurrency=8)
+        limiter.record_throttle(retry_after=0.1)
+        limiter.record_throttle(retry_after=0.1)  # same congestion event → one decrease
+
+        assert limiter.concurrency == 4
+        assert limiter.throttle_events == 2
+
+        waited = await limiter.acquire(1)
+        assert waited >= 0.09
+        assert limiter.stats()["queue_wait_seconds_max"] >= 0.09
+
+    def test_window_never_below_min(self):
+        limiter = self._limiter(max_concurrency=2, min_concurrency=1)
+        for _ in range(3):
+            limiter._last_decrease = 0.0
+            limiter.record_throttle(retry_after=0)
+        assert limiter.concurrency == 1
+
+    def test_success_grows_window_additively(self):
+        limiter = self._limiter(max_concurrency=8)
+        limiter.concurrency = 4.0
+        for _ in range(4):
+            limiter.record_success()
+        assert 4.9 < limiter.concurrency < 5.1
+
+    @pytest.mark.asyncio
+    async def test_cancelled_waiter_frees_its_slot(self):
+        limiter = self._limiter(max_concurrency=1)
+        limiter._paused_until = time.monotonic() + 10
+        waiter = asyncio.create_task(limiter.acquire(1))
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert limiter.stats()["in_flight"] == 0
+
+
+class TestOpenAIRateLimiter:
+    def test_per_model_overrides(self):
+        limiter = OpenAIRateLimiter(
+            OpenAIRateLimitConfig(
+                requests_per_minute=100,
+                model_overrides={
+                    "gpt-4o": ModelRateLimits(requests_per_minute=10, tokens_per_minute=600)
+                },
+            )
+        )
+        assert limiter.for_model("gpt-4o").requests.rate == pytest.approx(10 / 60)
+        assert limiter.for_model("gpt-4o-mini").requests.rate == pytest.approx(100 / 60)
+        assert limiter.for_model("gpt-4o") is limiter.for_model("gpt-4o")
+        assert set(limiter.stats()) == {"gpt-4o", "gpt-4o-mini"}
+
+
+class TestRateLimitedTransport:
+    @pytest.mark.asyncio
+    async def test_429_is_recorded_and_retried_by_sdk(self):
+        """The SDK's retry of a 429 waits out retry-after-ms inside the limiter."""
+        statuses = iter([429, 200])
+        seen_at: list[float] = []
+
+        def _handler(request: httpx.Request) -> httpx.Response:
+            seen_at.append(time.monotonic())
+            status = next(statuses)
+            if status == 429:
+                return httpx.Response(429, headers={"retry-after-ms": "200"}, json={})
+            return httpx.Response(200, json=_completion_body())
+
+        limiter = OpenAIRateLimiter(OpenAIRateLimitConfig(max_concurrency=4))
+        transport = RateLimitedTransport(limiter, httpx.MockTransport(_handler))
+        client = AsyncOpenAI(api_key="sk-test", http_client=httpx.AsyncClient(transport=transport))
+
+        await client.chat.completions.create(
+            model="gpt-4o-mini", messages=[{"role": "user", "content": "hi"}]
+        )
+
+        stats = limiter.stats()["gpt-4o-mini"]
+        assert stats["requests"] == 2
+        assert stats["throttle_events"] == 1
+        assert stats["concurrency_limit"] == 2
+        assert stats["in_flight"] == 0
+        assert seen_at[1] - seen_at[0] >= 0.19
+
+    @pytest.mark.asyncio
+    async def test_slot_held_until_body_closed(self):
+        """A streamed completion keeps its slot until the body is consumed."""
+
+        class _Chunks(httpx.AsyncByteStream):
+            async def __aiter__(self):
+                yield b"data: {}\n\n"
+
+        limiter = OpenAIRateLimiter()
+        transport = RateLimitedTransport(
+            limiter, httpx.MockTransport(lambda r: httpx.Response(200, stream=_Chunks()))
+        )
+        async with httpx.AsyncClient(transport=transport) as client:
+            body = json.dumps({"model": "m", "messages": []})
+            async with client.stream("POST", CHAT_URL, content=body) as response:
+                assert limiter.for_model("m").stats()["in_flight"] == 1
+                await response.aread()
+        assert limiter.for_model("m").stats()["in_flight"] == 0
+
+    @pytest.mark.asyncio
+    async def test_requests_without_model_bypass_limiter(self):
+        limiter = OpenAIRateLimiter()
+        transport = RateLimitedTransport(
+            limiter, httpx.MockTransport(lambda r: httpx.Response(200, json={}))
+        )
+        async with httpx.AsyncClient(transport=transport) as client:
+            await client.get("https://api.openai.com/v1/models")
+            await client.post("https://api.openai.com/v1/files", content=b"not json")
+        assert limiter.stats() == {}
@@ -0,0 +1,181 @@
+"""
+Tests for the raw actor payload side store.
+
+Covers compressed round trips on both backends, detach/load of
+PropertyData.raw_data (including listings without a payload and failed
+writes), LRU eviction, SQLite persistence, stats, the config factory, and
+the raw payload being put back into the persisted properties row.
+"""
+
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from app.config import RawDataStoreConfig
+from app.models.property import PropertyData, RenovationEstimate
+from app.services.analysis_persistence import persist_analysis_to_db
+from app.services.idealista import IdealistaService
+from app.services.raw_data_store import RawDataStore, build_raw_data_store
+from app.services.sqlite_store import SQLiteKVStore
+
+URL = "https://www.idealista.pt/imovel/12345678/"
+RAW = {"propertyId": "12345678", "propertyComment": "Apartamento renovado " * 200}
+
+
+def _listing(**overrides) -> PropertyData:
+    fields = {"url": URL, "title": "T2 Arroios", "price": 185000.0, "raw_data": RAW}
+    return PropertyData(**{**fields, **overrides})
+
+
+class TestPutGet:
+    @pytest.mark.asyncio
+    async def test_round_trip_in_memory(self):
+        store = RawDataStore()
+        await store.put("12345678", RAW)
+        assert await store.get("12345678") == RAW
+
+    @pytest.mark.asyncio
+    async def test_missing_listing_is_none(self):
+        assert await RawDataStore().get("12345678") is None
+
+    @pytest.mark.asyncio
+    async def test_sqlite_payload_survives_restart(self, tmp_path):
+        path = str(tmp_path / "raw.sqlite3")
+        first = RawDataStore(SQLiteKVStore(path, table="raw_listings"))
+        await first.put("12345678", RAW)
+        first.close()
+
+        second = RawDataStore(SQLiteKVStore(path, table="raw_listings"))
+        assert await second.get("12345678") == RAW
+        second.close()
+
+    @pytest.mark.asyncio
+    async def test_evicts_least_recently_stored(self):
+        store = RawDataStore(max_entries=2)
+        for property_id in ("1", "2", "3"):
+            await store.put(property_id, RAW)
+
+        assert await store.get("1") is None
+        assert await store.get("3") == RAW
+
+
+class TestDetachLoad:
+    @pytest.mark.asyncio
+    async def test_detach_leaves_a_reference(self):
+        store = RawDataStore()
+        listing = _listing()
+
+        detached = await store.detach("12345678", listing)
+
+        assert detached.raw_data == {}
+        assert detached.raw_data_ref == "12345678"
+        assert detached.title == "T2 Arroios"
+        assert listing.raw_data == RAW  # the original is untouched
+        assert await store.load(detached) == RAW
+
+    @pytest.mark.asyncio
+    async def test_listing_without_payload_is_unchanged(self):
+        store = RawDataStore()
+        listing = _listing(raw_data={})
+
+        assert await store.detach("12345678", listing) is listing
+        assert store.stats()["stored"] == 0
+
+    @pytest.mark.asyncio
+    async def test_failed_write_keeps_raw_data_inline(self):
+        store = RawDataStore()
+        with patch.object(store, "put", side_effect=OSError("disk full")):
+            kept = await store.detach("12345678", _listing())
+
+        assert kept.raw_data == RAW
+        assert kept.raw_data_ref is None
+
+    @pytest.mark.asyncio
+    async def test_load_prefers_inline_data(self):
+        assert await RawDataStore().load(_listing()) == RAW
+
+    @pytest.mark.asyncio
+    async def test_load_of_an_evicted_payload_is_empty(self):
+        assert await RawDataStore().load(_listing(raw_data={}, raw_data_ref="12345678")) == {}
+
+
+class TestStats:
+    @pytest.mark.asyncio
+    async def test_reports_compression(self):
+        store = RawDataStore()
+        await store.detach("12345678", _listing())
+        await store.get("12345678")
+
+        stats = store.stats()
+
+        assert stats["stored"] == 1
+        assert stats["loads"] == 1
+        assert stats["compressed_bytes"] < stats["raw_bytes"]
+        assert stats["compression_ratio"] > 1
+
+
+class TestBuildRawDataStore:
+    def test_disabled_returns_none(self):
+        assert build_raw_data_store(RawDataStoreConfig(enabled=False)) is None
+
+    def test_memory_backend_has_no_store(self):
+        store = build_raw_data_store(RawDataStoreConfig(backend="memory", compression_level=9))
+        assert store.store is None
+        assert store.compression_level == 9
+
+    def test_sqlite_backend(self, tmp_path):
+        path = str(tmp_path / "raw.sqlite3")
+        store = build_raw_data_store(RawDataStoreConfig(sqlite_path=path))
+        assert store.store.table == "raw_listings"
+        store.close()
+
+    def test_unknown_backend_raises(self):
+        with pytest.raises(ValueError, match="redis"):
+            build_raw_data_store(RawDataStoreConfig(backend="redis"))
+
+
+class TestPersistedRow:
+    @staticmethod
+    def _db() -> MagicMock:
+        db = MagicMock()
+        db.upsert_property = AsyncMock(return_value={"id": "prop-1"})
+        db.create_portfolio_item = AsyncMock(return_value={"id": "item-1"})
+        db.update_portfolio_item = AsyncMock()
+        db.create_analysis = AsyncMock()
+        db.save_room_features = AsyncMock()
+        db.log_action = AsyncMock()
+        return db
+
+    @staticmethod
+    async def _persist(store: RawDataStore, db: MagicMock) -> dict:
+        detached = await store.detach("12345678", _listing())
+        estimate = RenovationEstimate(
+            property_url=URL,
+            property_data=detached,
+            total_cost_min=0,
+            total_cost_max=0,
+            overall_confidence=0.5,
+        )
+        idealista = IdealistaService("stub-token", raw_store=store)
+        with patch("app.services.analysis_persistence.db", db):
+            await persist_analysis_to_db(
+                object(), URL, "user-1", estimate.model_dump(), idealista=idealista
+            )
+        return db.upsert_property.call_args.args[1]
+
+    @pytest.mark.asyncio
+    async def test_raw_payload_is_loaded_back(self):
+        row = await self._persist(RawDataStore(), self._db())
+
+        assert row["raw_scraped_data"]["raw_data"] == RAW
+        assert row["raw_scraped_data"]["raw_data_ref"] is None
+
+    @pytest.mark.asyncio
+    async def test_evicted_payload_still_persists_the_listing(self):
+        store = RawDataStore()
+        store.put = AsyncMock()  # nothing kept: as if evicted before the save
+        db = self._db()
+        row = await self._persist(store, db)
+
+        assert row["raw_scraped_data"]["raw_data_ref"] == "12345678"
+        assert db.create_analysis.await_count == 1
@@ -4,13 +4,18 @@ Tests for the RenovationEstimatorService.
 All OpenAI API calls are mocked. No real HTTP traffic.
 """
 
+import asyncio
 import json
 from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
 
-from app.models.property import FloorPlanAnalysis, RoomCondition, RoomType
-from app.services.renovation_estimator import RenovationEstimatorService  # noqa: E402
+from app.models.property import FloorPlanAnalysis, ImageClassification, RoomCondition, RoomType
+from app.services.renovation_estimator import (  # noqa: E402
+    FloorPlanPrefetch,
+    RenovationEstimatorService,
+    is_fallback_analysis,
+)
 
 # ---------------------------------------------------------------------------
 # Helpers
@@ -205,6 +210,193 @@ class TestAnalyzeRoom:
         assert len(image_entries) == 4
 
 
+class TestAnalyzeAllRoomsCancellation:
+    """Cancelling analyze_all_rooms() must stop the room calls still pending."""
+
+    @pytest.mark.asyncio
+    async def test_no_gpt_calls_after_cancel(self):
+        estimator = RenovationEstimatorService(openai_api_key="sk-fake-key", max_concurrent=2)
+        grouped = {
+            f"quarto_{n}": [
+                ImageClassification(
+                    image_url=f"http://img/q{n}.jpg",
+                    room_type=RoomType.BEDROOM,
+                    room_number=n,
+                    confidence=0.9,
+                )
+            ]
+            for n in range(1, 7)
+        }
+        release = asyncio.Event()
+        started: list[int] = []
+
+        async def _extract(**_):
+            started.append(1)
+            await release.wait()
+            return None  # would fall back to the legacy GPT call
+
+        legacy = AsyncMock(return_value=_make_mock_response(content=_room_response_json()))
+        with (
+            patch.object(
+                estimator._feature_extractor, "extract_room_features", side_effect=_extract
+            ),
+            patch.object(estimator.client.chat.completions, "create", legacy),
+        ):
+            task = asyncio.create_task(estimator.analyze_all_rooms(grouped))
+            while len(started) < 2:
+                await asyncio.sleep(0.01)
+            assert len(started) == 2  # semaphore-bound; four rooms still waiting
+
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+            release.set()
+            await asyncio.sleep(0.05)
+
+        legacy.assert_not_called()
+        assert len(started) == 2
+
+
+# ---------------------------------------------------------------------------
+# TestAnalyzeRoomsAsReady
+# ---------------------------------------------------------------------------
+
+
+def _group(room_type: RoomType, n: int) -> list[ImageClassification]:
+    return [
+        ImageClassification(
+            image_url=f"http://img/{room_type.value}{n}.jpg",
+            room_type=room_type,
+            room_number=n,
+            confidence=0.9,
+        )
+    ]
+
+
+class TestAnalyzeRoomsAsReady:
+    """analyze_rooms_as_ready() starts each room as soon as its batch arrives."""
+
+    @pytest.mark.asyncio
+    async def test_rooms_start_before_later_batches_are_produced(
+        self, estimator: RenovationEstimatorService
+    ):
+        kitchen_done = asyncio.Event()
+
+        async def _analyze_room(room_type, room_number, images, property_context=None):
+            return estimator._get_fallback_analysis(room_type, room_number, "", images)
+
+        async def _batches():
+            yield {"cozinha_1": _group(RoomType.KITCHEN, 1)}
+            # Bedroom clustering only "finishes" once the kitchen has been estimated
+            await kitchen_done.wait()
+            yield {"quarto_1": _group(RoomType.BEDROOM, 1), "quarto_2": _group(RoomType.BEDROOM, 2)}
+
+        progress = []
+
+        async def _progress(current, total, analysis):
+            progress.append((current, total))
+            kitchen_done.set()
+
+        with patch.object(estimator, "analyze_room", side_effect=_analyze_room):
+            results = await asyncio.wait_for(
+                estimator.analyze_rooms_as_ready(_batches(), progress_callback=_progress),
+                timeout=1,
+            )
+
+        assert sorted(r.room_type.value for r in results) == ["cozinha", "quarto", "quarto"]
+        assert progress[0] == (1, 1)  # total counts rooms known so far
+        assert progress[-1] == (3, 3)
+
+    @pytest.mark.asyncio
+    async def test_batch_error_cancels_rooms_in_flight(
+        self, estimator: RenovationEstimatorService
+    ):
+        cancelled = asyncio.Event()
+
+        async def _analyze_room(*args, **kwargs):
+            try:
+                await asyncio.Event().wait()
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        async def _batches():
+            yield {"cozinha_1": _group(RoomType.KITCHEN, 1)}
+            await asyncio.sleep(0.01)
+            raise RuntimeError("clustering failed")
+
+        with (
+            patch.object(estimator, "analyze_room", side_effect=_analyze_room),
+            pytest.raises(RuntimeError, match="clustering failed"),
+        ):
+            await estimator.analyze_rooms_as_ready(_batches())
+
+        await asyncio.wait_for(cancelled.wait(), timeout=1)
+
+
+class TestRoomFailures:
+    """A failing room is re-raised only after the other rooms finished."""
+
+    @staticmethod
+    def _analyze_room(estimator: RenovationEstimatorService):
+        async def _analyze_room(room_type, room_number, images, property_context=None):
+            if room_type == RoomType.KITCHEN:
+                raise RuntimeError("openai 503")
+            await asyncio.sleep(0.01)
+            return estimator._get_fallback_analysis(room_type, room_number, "", images)
+
+        return _analyze_room
+
+    @pytest.mark.asyncio
+    async def test_analyze_all_rooms_finishes_other_rooms(
+        self, estimator: RenovationEstimatorService
+    ):
+        grouped = {
+            "cozinha_1": _group(RoomType.KITCHEN, 1),
+            "quarto_1": _group(RoomType.BEDROOM, 1),
+            "quarto_2": _group(RoomType.BEDROOM, 2),
+        }
+        progress = []
+
+        async def _progress(current, total, analysis):
+            progress.append((current, total, analysis.room_number))
+
+        with (
+            patch.object(estimator, "analyze_room", side_effect=self._analyze_room(estimator)),
+            pytest.raises(RuntimeError, match="openai 503"),
+        ):
+            await estimator.analyze_all_rooms(grouped, progress_callback=_progress)
+
+        assert [p[:2] for p in progress] == [(1, 3), (2, 3)]
+        assert {p[2] for p in progress} == {1, 2}
+
+    @pytest.mark.asyncio
+    async def test_analyze_rooms_as_ready_finishes_other_rooms(
+        self, estimator: RenovationEstimatorService
+    ):
+        async def _batches():
+            yield {"cozinha_1": _group(RoomType.KITCHEN, 1)}
+            yield {"quarto_1": _group(RoomType.BEDROOM, 1)}
+
+        finished = []
+
+        async def _progress(current, total, analysis):
+            finished.append(analysis.room_type)
+
+        with (
+            patch.object(estimator, "analyze_room", side_effect=self._analyze_room(estimator)),
+            pytest.raises(RuntimeError, match="openai 503"),
+        ):
+            await estimator.analyze_rooms_as_ready(_batches(), progress_callback=_progress)
+
+        assert finished == [RoomType.BEDROOM]
+
+    def test_is_fallback_analysis(self, estimator: RenovationEstimatorService):
+        fallback = estimator._get_fallback_analysis(RoomType.KITCHEN, 1, "Cozinha", [])
+        assert is_fallback_analysis(fallback)
+        assert not is_fallback_analysis(fallback.model_copy(update={"confidence": 0.8}))
+
+
 # ---------------------------------------------------------------------------
 # TestGetFallbackAnalysis
 # ---------------------------------------------------------------------------
@@ -483,3 +675,86 @@ class TestAnalyzeFloorPlan:
         text_block = next(b for b in content if b["type"] == "text")
         assert "T2" in text_block["text"]
         assert "75" in text_block["text"]
+
+
+# ---------------------------------------------------------------------------
+# TestPrefetchFloorPlan
+# ---------------------------------------------------------------------------
+
+
+class TestPrefetchFloorPlan:
+    """prefetch_floor_plan() starts the call early; analyze_floor_plan() joins it."""
+
+    PLAN = "http://img/planta.jpg"
+
+    @staticmethod
+    def _blocked_create(cancelled: asyncio.Event):
+        async def _create(**_):
+            try:
+                await asyncio.Event().wait()
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        return _create
+
+    @pytest.mark.asyncio
+    async def test_analyze_joins_prefetch_for_same_images(
+        self, estimator: RenovationEstimatorService
+    ):
+        mock_create = AsyncMock(
+            return_value=_make_mock_response(content=_floor_plan_response_json())
+        )
+        prefetch = FloorPlanPrefetch()
+        with patch.object(estimator.client.chat.completions, "create", mock_create):
+            estimator.prefetch_floor_plan([self.PLAN], prefetch)
+            await asyncio.sleep(0)
+            assert mock_create.await_count == 1  # in flight before anyone asks
+
+            # Grouping later refers to the same image by its store handle
+            result = await estimator.analyze_floor_plan(
+                [f"img:{'0' * 16}:{self.PLAN}"], prefetch=prefetch
+            )
+
+        assert mock_create.await_count == 1
+        assert result.images == [self.PLAN]
+        assert prefetch.task is None
+
+    @pytest.mark.asyncio
+    async def test_different_images_cancel_the_prefetch(
+        self, estimator: RenovationEstimatorService
+    ):
+        cancelled = asyncio.Event()
+        prefetch = FloorPlanPrefetch()
+        with patch.object(
+            estimator.client.chat.completions, "create", side_effect=self._blocked_create(cancelled)
+        ):
+            estimator.prefetch_floor_plan([self.PLAN], prefetch)
+            await asyncio.sleep(0)
+
+        mock_create = AsyncMock(
+            return_value=_make_mock_response(content=_floor_plan_response_json())
+        )
+        with patch.object(estimator.client.chat.completions, "create", mock_create):
+            # GPT found a second, untagged plan: the prefetched result doesn't cover it
+            result = await estimator.analyze_floor_plan(
+                [self.PLAN, "http://img/planta2.jpg"], prefetch=prefetch
+            )
+
+        await asyncio.wait_for(cancelled.wait(), timeout=1)
+        assert mock_create.await_count == 1
+        assert len(result.images) == 2
+
+    @pytest.mark.asyncio
+    async def test_cancel_stops_the_call(self, estimator: RenovationEstimatorService):
+        cancelled = asyncio.Event()
+        prefetch = FloorPlanPrefetch()
+        with patch.object(
+            estimator.client.chat.completions, "create", side_effect=self._blocked_create(cancelled)
+        ):
+            estimator.prefetch_floor_plan([self.PLAN], prefetch)
+            await asyncio.sleep(0)
+            prefetch.cancel()
+            await asyncio.wait_for(cancelled.wait(), timeout=1)
+
+        assert prefetch.task is None
@@ -0,0 +1,197 @@
+"""
+Tests for the scraped listing cache.
+
+Covers fresh, stale and expired lookups, the fallback for an unreachable
+actor, the per-call max_age override, invalidation across tiers, SQLite
+persistence and promotion with the original age, LRU eviction, unreadable
+rows, stats and the config factory.
+Ages are controlled through ttl_seconds / stale_seconds of 0 (any stored
+entry is then older than the TTL) rather than by patching the clock.
+"""
+
+import pytest
+
+from app.config import ScrapeCacheConfig
+from app.models.property import PropertyData
+from app.services.scrape_cache import ScrapeCache, build_scrape_cache
+from app.services.sqlite_store import SQLiteKVStore
+
+URL = "https://www.idealista.pt/imovel/12345678/"
+
+
+def _listing(**overrides) -> PropertyData:
+    fields = {"url": URL, "title": "T2 Arroios", "price": 185000.0, "raw_data": {"adid": 1}}
+    return PropertyData(**{**fields, **overrides})
+
+
+class TestFreshness:
+    @pytest.mark.asyncio
+    async def test_fresh_hit(self):
+        cache = ScrapeCache(ttl_seconds=3600)
+        await cache.set("12345678", _listing())
+
+        cached = await cache.get("12345678")
+
+        assert cached.property_data.title == "T2 Arroios"
+        assert cached.stale is False
+        assert cached.age_seconds < 1
+
+    @pytest.mark.asyncio
+    async def test_entry_past_ttl_is_served_stale(self):
+        cache = ScrapeCache(ttl_seconds=0, stale_seconds=3600)
+        await cache.set("12345678", _listing())
+
+        cached = await cache.get("12345678")
+
+        assert cached.stale is True
+        assert cache.stats()["stale_hits"] == 1
+
+    @pytest.mark.asyncio
+    async def test_entry_past_stale_window_is_a_miss(self):
+        cache = ScrapeCache(ttl_seconds=0, stale_seconds=0)
+        await cache.set("12345678", _listing())
+
+        assert await cache.get("12345678") is None
+        assert cache.stats()["misses"] == 1
+
+    @pytest.mark.asyncio
+    async def test_fallback_serves_expired_entries(self):
+        cache = ScrapeCache(ttl_seconds=0, stale_seconds=0)
+        await cache.set("12345678", _listing())
+
+        cached = await cache.fallback("12345678")
+
+        assert cached.property_data.title == "T2 Arroios"
+        assert cached.stale is True
+        assert await cache.fallback("87654321") is None
+        assert cache.stats()["fallbacks"] == 1
+
+    @pytest.mark.asyncio
+    async def test_missing_listing_is_a_miss(self):
+        cache = ScrapeCache(ttl_seconds=3600)
+        assert await cache.get("12345678") is None
+        assert cache.stats()["misses"] == 1
+
+
+class TestMaxAge:
+    @pytest.mark.asyncio
+    async def test_zero_rejects_cached_data(self):
+        cache = ScrapeCache(ttl_seconds=3600)
+        await cache.set("12345678", _listing())
+
+        assert await cache.get("12345678", max_age=0) is None
+        # The entry itself is kept for callers without an override
+        assert await cache.get("12345678") is not None
+
+    @pytest.mark.asyncio
+    async def test_serves_entries_within_max_age_as_fresh(self):
+        cache = ScrapeCache(ttl_seconds=0, stale_seconds=3600)
+        await cache.set("12345678", _listing())
+
+        cached = await cache.get("12345678", max_age=60)
+
+        assert cached.stale is False
+
+    @pytest.mark.asyncio
+    async def test_cannot_extend_past_the_stale_window(self):
+        cache = ScrapeCache(ttl_seconds=0, stale_seconds=0)
+        await cache.set("12345678", _listing())
+
+        assert await cache.get("12345678", max_age=3600) is None
+
+
+class TestTiers:
+    @pytest.mark.asyncio
+    async def test_sqlite_entry_survives_restart_and_is_promoted(self, tmp_path):
+        path = str(tmp_path / "scrapes.sqlite3")
+        first = ScrapeCache(3600, store=SQLiteKVStore(path, table="scraped_listings"))
+        await first.set("12345678", _listing())
+        first.close()
+
+        second = ScrapeCache(3600, store=SQLiteKVStore(path, table="scraped_listings"))
+        cached = await second.get("12345678")
+
+        assert cached.property_data == _listing()
+        assert second.stats()["memory_entries"] == 1
+        second.close()
+
+    @pytest.mark.asyncio
+    async def test_promoted_entry_keeps_its_age(self, tmp_path):
+        path = str(tmp_path / "scrapes.sqlite3")
+        first = ScrapeCache(0, 3600, store=SQLiteKVStore(path, table="scraped_listings"))
+        await first.set("12345678", _listing())
+        first.close()
+
+        second = ScrapeCache(0, 3600, store=SQLiteKVStore(path, table="scraped_listings"))
+        assert (await second.get("12345678")).stale is True
+        assert (await second.get("12345678")).stale is True  # now from memory
+        second.close()
+
+    @pytest.mark.asyncio
+    async def test_invalidate_clears_every_tier(self):
+        store = SQLiteKVStore(":memory:", table="scraped_listings")
+        cache = ScrapeCache(3600, store=store)
+        await cache.set("12345678", _listing())
+
+        await cache.invalidate("12345678")
+
+        assert await cache.get("12345678") is None
+        assert await store.count() == 0
+        assert cache.stats()["invalidations"] == 1
+
+    @pytest.mark.asyncio
+    async def test_memory_tier_evicts_least_recently_used(self):
+        cache = ScrapeCache(3600, max_memory_entries=2)
+        for property_id in ("1", "2", "3"):
+            await cache.set(property_id, _listing())
+
+        assert await cache.get("1") is None
+        assert await cache.get("3") is not None
+
+    @pytest.mark.asyncio
+    async def test_unreadable_row_is_a_miss(self):
+        store = SQLiteKVStore(":memory:", table="scraped_listings")
+        await store.set("12345678", b"not json")
+        cache = ScrapeCache(3600, store=store)
+
+        assert await cache.get("12345678") is None
+
+
+class TestStats:
+    @pytest.mark.asyncio
+    async def test_counts_hits_misses_and_refreshes(self):
+        cache = ScrapeCache(3600)
+        await cache.set("12345678", _listing())
+        await cache.get("12345678")
+        await cache.get("87654321")
+        cache.record_refresh()
+        cache.record_refresh(failed=True)
+
+        stats = cache.stats()
+
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+        assert stats["stores"] == 1
+        assert stats["hit_rate"] == 0.5
+        assert stats["refreshes"] == 2
+        assert stats["refresh_failures"] == 1
+
+
+class TestBuildScrapeCache:
+    def test_disabled_returns_none(self):
+        assert build_scrape_cache(ScrapeCacheConfig(enabled=False)) is None
+
+    def test_memory_backend_has_no_store(self):
+        cache = build_scrape_cache(ScrapeCacheConfig(backend="memory", ttl_seconds=60))
+        assert cache.store is None
+        assert cache.ttl_seconds == 60
+
+    def test_sqlite_backend(self, tmp_path):
+        path = str(tmp_path / "scrapes.sqlite3")
+        cache = build_scrape_cache(ScrapeCacheConfig(sqlite_path=path))
+        assert cache.store.table == "scraped_listings"
+        cache.close()
+
+    def test_unknown_backend_raises(self):
+        with pytest.raises(ValueError, match="redis"):
+            build_scrape_cache(ScrapeCacheConfig(backend="redis"))
@@ -0,0 +1,232 @@
+"""
+Tests for the in-process single-flight primitives.
+
+Covers SingleFlight call coalescing (shared results and errors, cancelled
+waiters, cancelling the call once nobody waits) and StreamSingleFlight runs (buffered replay for late subscribers,
+errors, cancellation once the last subscriber leaves) and their resume
+support (sequence ids, ring buffer, grace period, Last-Event-ID parsing).
+"""
+
+import asyncio
+
+import pytest
+
+from app.services.single_flight import (
+    SharedRun,
+    SingleFlight,
+    StreamSingleFlight,
+    parse_event_id,
+)
+
+
+class TestSingleFlight:
+    @pytest.mark.asyncio
+    async def test_concurrent_callers_share_one_call(self):
+        flights: SingleFlight[int] = SingleFlight()
+        calls = 0
+
+        async def _work() -> int:
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return 42
+
+        results = await asyncio.gather(*(flights.do("k", _work) for _ in range(5)))
+
+        assert results == [42] * 5
+        assert calls == 1
+        assert flights.stats() == {"executions": 1, "coalesced": 4, "in_flight": 0}
+
+    @pytest.mark.asyncio
+    async def test_key_is_released_after_completion(self):
+        flights: SingleFlight[int] = SingleFlight()
+
+        async def _work() -> int:
+            return 1
+
+        await flights.do("k", _work)
+        await flights.do("k", _work)
+        assert flights.executions == 2
+
+    @pytest.mark.asyncio
+    async def test_cancelled_waiter_does_not_cancel_others(self):
+        flights: SingleFlight[str] = SingleFlight()
+        release = asyncio.Event()
+
+        async def _work() -> str:
+            await release.wait()
+            return "done"
+
+        first = asyncio.create_task(flights.do("k", _work))
+        second = asyncio.create_task(flights.do("k", _work))
+        await asyncio.sleep(0)
+        first.cancel()
+        release.set()
+
+        assert await second == "done"
+        with pytest.raises(asyncio.CancelledError):
+            await first
+
+
+    @pytest.mark.asyncio
+    async def test_call_cancelled_once_every_waiter_is_cancelled(self):
+        flights: SingleFlight[str] = SingleFlight()
+        started = asyncio.Event()
+        cancelled = asyncio.Event()
+
+        async def _work() -> str:
+            started.set()
+            try:
+                await asyncio.Event().wait()
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+            return "never"
+
+        waiters = [asyncio.create_task(flights.do("k", _work)) for _ in range(2)]
+        await started.wait()
+        waiters[0].cancel()
+        await asyncio.sleep(0)
+        assert not cancelled.is_set()
+
+        waiters[1].cancel()
+        await asyncio.wait_for(cancelled.wait(), timeout=1)
+        await asyncio.sleep(0)
+        assert flights.in_flight() == 0
+
+
+class TestStreamSingleFlight:
+    @staticmethod
+    def _producer(gate: asyncio.Event, fail: bool = False):
+        async def _produce(run: SharedRun) -> str:
+            run.publish("a")
+            await gate.wait()
+            run.publish("b")
+            if fail:
+                raise RuntimeError("boom")
+            return "result"
+
+        return _produce
+
+    @pytest.mark.asyncio
+    async def test_late_subscriber_replays_buffer_then_follows_live(self):
+        flights = StreamSingleFlight()
+        gate = asyncio.Event()
+        first = flights.join("k", self._producer(gate))
+        await asyncio.sleep(0.01)
+
+        late = flights.join("k", self._producer(gate))
+        assert late is first
+        assert list(late.events) == ["a"]
+
+        async def _collect(run: SharedRun) -> list[str]:
+            return [event async for event in run.subscribe()]
+
+        tasks = [asyncio.create_task(_collect(first)), asyncio.create_task(_collect(late))]
+        await asyncio.sleep(0)
+        gate.set()
+
+        assert await asyncio.gather(*tasks) == [["a", "b"], ["a", "b"]]
+        assert first.result == "result"
+        assert flights.stats() == {
+            "executions": 1, "coalesced": 1, "resumed": 0, "in_flight": 0
+        }
+
+    @pytest.mark.asyncio
+    async def test_error_is_shared(self):
+        flights = StreamSingleFlight()
+        gate = asyncio.Event()
+        gate.set()
+        run = flights.join("k", self._producer(gate, fail=True))
+
+        with pytest.raises(RuntimeError, match="boom"):
+            await run.wait()
+        assert list(run.events) == ["a", "b"]
+
+    @pytest.mark.asyncio
+    async def test_run_cancelled_only_when_last_subscriber_leaves(self):
+        flights = StreamSingleFlight()
+        gate = asyncio.Event()
+        run = flights.join("k", self._producer(gate))
+        flights.join("k", self._producer(gate))
+        await asyncio.sleep(0)
+
+        flights.leave(run)
+        await asyncio.sleep(0)
+        assert not run.task.done()
+
+        flights.leave(run)
+        await asyncio.sleep(0)
+        assert run.done
+        assert isinstance(run.error, asyncio.CancelledError)
+        assert flights.in_flight() == 0
+
+
+class TestResumableRuns:
+    @pytest.mark.asyncio
+    async def test_follow_after_seq_skips_events_already_received(self):
+        flights = StreamSingleFlight(grace_seconds=10)
+        gate = asyncio.Event()
+        gate.set()
+        run = flights.join("k", TestStreamSingleFlight._producer(gate))
+        await run.wait()
+
+        assert run.event_id(1) == f"{run.id}:1"
+        assert [item async for item in run.follow(after=1)] == [(2, "b")]
+
+    @pytest.mark.asyncio
+    async def test_ring_buffer_drops_oldest_events(self):
+        run = SharedRun("k", max_events=3)
+        for n in range(5):
+            run.publish(n)
+        run.finish()
+
+        assert run.first_seq == 3
+        assert [item async for item in run.follow()] == [(3, 2), (4, 3), (5, 4)]
+
+    @pytest.mark.asyncio
+    async def test_run_survives_disconnect_within_grace_period(self):
+        flights = StreamSingleFlight(grace_seconds=10)
+        gate = asyncio.Event()
+        run = flights.join("k", TestStreamSingleFlight._producer(gate))
+        await asyncio.sleep(0)
+        flights.leave(run)  # connection dropped after "a"
+
+        resumed = flights.resume(run.id, "k")
+        assert resumed is run
+        gate.set()
+        assert [item async for item in resumed.follow(after=1)] == [(2, "b")]
+        flights.leave(resumed)
+        assert run.result == "result"
+        assert flights.stats()["resumed"] == 1
+
+        # Finished runs stay resumable for the grace period
+        assert flights.resume(run.id, "k") is run
+
+    @pytest.mark.asyncio
+    async def test_abandoned_run_cancelled_after_grace_period(self):
+        flights = StreamSingleFlight(grace_seconds=0.01)
+        run = flights.join("k", TestStreamSingleFlight._producer(asyncio.Event()))
+        await asyncio.sleep(0)
+        flights.leave(run)
+
+        await asyncio.sleep(0.05)
+        assert isinstance(run.error, asyncio.CancelledError)
+        assert flights.resume(run.id, "k") is None
+
+    @pytest.mark.asyncio
+    async def test_resume_rejects_unknown_id_or_other_key(self):
+        flights = StreamSingleFlight(grace_seconds=10)
+        run = flights.start("chat:user-1", TestStreamSingleFlight._producer(asyncio.Event()))
+
+        assert flights.resume("nope", "chat:user-1") is None
+        assert flights.resume(run.id, "chat:user-2") is None
+        # start() runs are never coalesced by join()
+        assert flights.join("chat:user-1", TestStreamSingleFlight._producer(asyncio.Event())) is not run
+        assert flights.in_flight() == 2
+
+    def test_parse_event_id(self):
+        assert parse_event_id("abc123:7") == ("abc123", 7)
+        assert parse_event_id(None) is None
+        assert parse_event_id("7") is None
+        assert parse_event_id("abc:x") is None